@@ -0,0 +1,156 @@
+"""
+启动导入耗时基准测试
+
+在全新的子进程中用 `python -X importtime` 导入各入口模块，统计导入耗时（取中位数）、
+按顶层包汇总的自身耗时，以及是否加载了重依赖（torch / whisper / yt-dlp / openai / httpx / numpy）。
+入口模块导入时加载了重依赖，或耗时超过 --budget 指定的上限时，以非零状态退出。
+
+用法：
+    python benchmarks/bench_import_time.py
+    python benchmarks/bench_import_time.py --budget cli=400 --budget package=50 --repeat 7
+    python benchmarks/bench_import_time.py --target web_app --top 15
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+# 入口模块：包本身、CLI（check 等命令）、处理器（只走字幕的任务）、Web 应用（/health）
+TARGETS = {
+    'package': 'import video_note_generator',
+    'cli': 'import video_note_generator.cli',
+    'processor': 'import video_note_generator.processor',
+    'web_app': 'import web_app',
+}
+
+HEAVY_MODULES = ('torch', 'whisper', 'yt_dlp', 'openai', 'httpx', 'numpy')
+
+
+def _parse_importtime(stderr: str) -> Tuple[float, Counter]:
+    """
+    解析 -X importtime 输出
+
+    Returns:
+        (顶层导入的累计耗时合计 ms, {顶层包名: 自身耗时 ms})
+    """
+    total = 0.0
+    by_package: Counter = Counter()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        # 模块名前固定有 1 个空格，每深一层多 2 个空格
+        stripped = name.lstrip(' ')
+        depth = (len(name) - len(stripped) - 1) // 2
+        if depth == 0 and stripped not in ('site', 'encodings'):
+            total += int(cumulative_us) / 1000
+        by_package[stripped.split('.')[0]] += int(self_us) / 1000
+    return total, by_package
+
+
+def measure(code: str, repeat: int) -> dict:
+    """在子进程中重复导入，返回耗时中位数、按包汇总的耗时与加载的重依赖"""
+    probe = (
+        f'{code}\n'
+        'import json, sys\n'
+        f'print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))\n'
+    )
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [str(PROJECT_DIR / 'src'), str(PROJECT_DIR)] + ([env['PYTHONPATH']] if env.get('PYTHONPATH') else [])
+    )
+    # 首轮可能包含 .pyc 编译耗时，额外预热一次不计入结果
+    runs: List[float] = []
+    packages: Counter = Counter()
+    heavy: List[str] = []
+    for index in range(repeat + 1):
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', probe],
+            capture_output=True, text=True, cwd=PROJECT_DIR, env=env
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else '导入失败')
+        if index == 0:
+            continue
+        total, by_package = _parse_importtime(proc.stderr)
+        runs.append(total)
+        packages = by_package
+        heavy = json.loads(proc.stdout.strip().splitlines()[-1])
+    return {
+        'median_ms': statistics.median(runs),
+        'min_ms': min(runs),
+        'packages': packages,
+        'heavy_modules': heavy,
+    }
+
+
+def parse_budgets(values: List[str]) -> Dict[str, float]:
+    budgets = {}
+    for value in values:
+        target, _, ms = value.partition('=')
+        if target not in TARGETS or not ms:
+            raise SystemExit(f'无效的 --budget: {value}（格式 目标=毫秒，目标可选 {", ".join(TARGETS)}）')
+        budgets[target] = float(ms)
+    return budgets
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='启动导入耗时基准测试')
+    parser.add_argument('--target', choices=list(TARGETS), action='append', help='只测量指定入口（可重复）')
+    parser.add_argument('--repeat', type=int, default=5, help='每个入口的测量次数')
+    parser.add_argument('--budget', action='append', default=[], help='耗时上限，如 cli=400（毫秒，可重复）')
+    parser.add_argument('--top', type=int, default=8, help='列出自身耗时最多的顶层包数量')
+    parser.add_argument('--json', type=Path, default=None, help='把结果写入 JSON 文件')
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    budgets = parse_budgets(args.budget)
+    targets = args.target or list(TARGETS)
+
+    failures = []
+    report = {}
+    for target in targets:
+        try:
+            result = measure(TARGETS[target], args.repeat)
+        except RuntimeError as e:
+            print(f'{target}: 导入失败: {e}')
+            failures.append(f'{target} 导入失败')
+            continue
+        report[target] = result
+
+        budget = budgets.get(target)
+        status = ''
+        if budget is not None:
+            status = f'  上限 {budget:.0f}ms ' + ('✓' if result['median_ms'] <= budget else '✗')
+            if result['median_ms'] > budget:
+                failures.append(f'{target} 导入耗时 {result["median_ms"]:.0f}ms 超过上限 {budget:.0f}ms')
+        if result['heavy_modules']:
+            failures.append(f'{target} 导入时加载了重依赖: {", ".join(result["heavy_modules"])}')
+
+        print(f"\n{target}: 中位数 {result['median_ms']:.1f}ms  最小 {result['min_ms']:.1f}ms{status}")
+        print(f"  重依赖: {', '.join(result['heavy_modules']) or '无'}")
+        for package, ms in result['packages'].most_common(args.top):
+            print(f'  {ms:>9.1f}ms  {package}')
+
+    if args.json:
+        args.json.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+
+    if failures:
+        print()
+        for failure in failures:
+            print(f'✗ {failure}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
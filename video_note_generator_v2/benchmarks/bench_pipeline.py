@@ -0,0 +1,487 @@
+"""
+视频笔记流水线基准测试
+
+所有外部服务（OpenRouter、B站接口、Unsplash、视频文件源）都由本地替身提供，
+结果可重复、不依赖网络。按阶段统计墙钟时间、CPU 时间、峰值内存与调用次数。
+
+场景：
+    subtitle    B站视频有官方字幕：字幕提取 → 整理 → 小红书 → 博客
+    transcribe  无字幕直链媒体：下载 → 转录 → 整理 → 小红书 → 博客
+    json3       仅解析 YouTube json3 字幕（字幕解析热点）
+    playlist    B站分P视频展开为逐集任务并发处理（可选生成合并笔记）
+
+用法：
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --scenario transcribe --transcriber whisper --whisper-model tiny
+    python benchmarks/bench_pipeline.py --jobs 4 --llm-latency 0.5 --llm-concurrency 8 --json result.json
+"""
+import argparse
+import functools
+import json
+import logging
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR))
+sys.path.insert(0, str(BENCH_DIR.parent / 'src'))
+
+from fixtures import write_fixtures  # noqa: E402
+from stand_ins import (  # noqa: E402
+    BILIBILI_API_HOST,
+    SUBTITLE_HOST,
+    FakeBilibiliAPI,
+    FakeOpenAIServer,
+    FakeUnsplashAPI,
+    StandInServer,
+    mount_static,
+    rewriting_session,
+)
+
+
+# 只走字幕的场景不应加载 torch / whisper
+HEAVY_MODULES = ('torch', 'whisper', 'yt_dlp', 'openai', 'httpx', 'numpy')
+
+
+def _peak_rss_mb(children: bool = False) -> float:
+    if resource is None:
+        return 0.0
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    # macOS 单位为字节，Linux 为 KB
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _process_cpu() -> float:
+    if resource is None:
+        return time.process_time()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+class StageRecorder:
+    """
+    按阶段累计耗时
+
+    CPU 时间取调用线程自身的 CPU（time.thread_time），并发任务之间互不干扰；
+    阶段内部派生的线程或子进程（分片下载、ffmpeg）不计入，另见汇总中的进程级数据。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages: Dict[str, dict] = defaultdict(
+            lambda: {'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'peak_rss_mb': 0.0}
+        )
+        self._order: List[str] = []
+
+    def wrap(self, obj, attr: str, stage: str):
+        """把 obj.attr 替换为计时包装（只影响该实例）"""
+        original = getattr(obj, attr)
+
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            wall_start = time.perf_counter()
+            cpu_start = time.thread_time()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self._record(
+                    stage,
+                    time.perf_counter() - wall_start,
+                    time.thread_time() - cpu_start
+                )
+
+        setattr(obj, attr, timed)
+
+    def _record(self, stage: str, wall: float, cpu: float):
+        with self._lock:
+            if stage not in self._order:
+                self._order.append(stage)
+            entry = self.stages[stage]
+            entry['calls'] += 1
+            entry['wall'] += wall
+            entry['cpu'] += cpu
+            entry['peak_rss_mb'] = max(entry['peak_rss_mb'], _peak_rss_mb())
+
+    def rows(self) -> List[dict]:
+        with self._lock:
+            return [{'stage': name, **self.stages[name]} for name in self._order]
+
+
+class FakeTranscriber:
+    """
+    转录替身（未安装 Whisper 时使用）
+
+    按 每次调用的固定开销 + 音频时长 × 实时率 休眠，返回固定文本，用于测量转录以外的开销。
+    批量接口只付一次固定开销，不假设批内计算有加速。
+    调用串行执行，模拟单个模型实例上的计算密集型推理。
+    """
+
+    def __init__(self, real_time_factor: float = 0.05, text_chars: int = 6000, call_overhead: float = 0.0):
+        self.real_time_factor = real_time_factor
+        self.text_chars = text_chars
+        self.call_overhead = call_overhead
+        self._lock = threading.Lock()
+
+    def transcribe(self, audio_path: str, model_name: str = 'medium', language: str = 'zh', **kwargs) -> str:
+        with self._lock:
+            time.sleep(self.call_overhead + self._duration(audio_path) * self.real_time_factor)
+        return self._text(self.text_chars)
+
+    def transcribe_batch(self, audio_paths, model_name: str = 'medium', language: str = 'zh', **kwargs):
+        seconds = sum(self._duration(path) for path in audio_paths)
+        with self._lock:
+            time.sleep(self.call_overhead + seconds * self.real_time_factor)
+        return [self._text(self.text_chars) for _ in audio_paths]
+
+    def transcribe_windowed(self, audio_path: str, model_name: str = 'medium', language: str = 'zh',
+                            window_seconds: float = 300, ffmpeg: str = 'ffmpeg', **kwargs) -> str:
+        from video_note_generator.audio_stream import FFmpegPCMStream
+
+        with FFmpegPCMStream(ffmpeg=ffmpeg, buffer_seconds=window_seconds, input_path=audio_path) as stream:
+            return self.transcribe_pcm_stream(stream.windows(window_seconds))
+
+    @staticmethod
+    def _duration(audio_path: str) -> float:
+        import wave
+        with wave.open(str(audio_path), 'rb') as wav:
+            return wav.getnframes() / wav.getframerate()
+
+    def transcribe_pcm_stream(self, windows, model_name: str = 'medium', language: str = 'zh', **kwargs) -> str:
+        from video_note_generator.audio_stream import SAMPLE_RATE
+
+        seconds = 0.0
+        for window in windows:
+            seconds += len(window) / SAMPLE_RATE
+            time.sleep(len(window) / SAMPLE_RATE * self.real_time_factor)
+        return self._text(self.text_chars) if seconds else ''
+
+    @staticmethod
+    def _text(chars: int) -> str:
+        sentence = '这是转录替身输出的一句话，模拟语音识别的结果。'
+        return (sentence * (chars // len(sentence) + 1))[:chars]
+
+
+def _make_direct_downloader(base_url: str, duration: int, logger: logging.Logger):
+    """创建只处理本地替身直链的下载器（注册到最前面）"""
+    from urllib.parse import urlsplit
+
+    from video_note_generator.downloader.base import BaseDownloader, VideoInfo
+    from video_note_generator.downloader.http_file_downloader import HttpFileDownloader, stream_url
+
+    class DirectMediaDownloader(BaseDownloader):
+        def supports(self, url: str) -> bool:
+            return url.startswith(base_url)
+
+        def download(self, url: str, output_dir: Path, audio_only: bool = True):
+            target = Path(output_dir) / Path(urlsplit(url).path).name
+            path = HttpFileDownloader(url, target).download()
+            return str(path), self._info(url)
+
+        def open_audio_stream(self, url: str):
+            return stream_url(url), self._info(url)
+
+        @staticmethod
+        def _info(url: str) -> VideoInfo:
+            return VideoInfo(
+                title='基准测试媒体',
+                uploader='benchmark',
+                description='',
+                duration=duration,
+                platform='local',
+                url=url
+            )
+
+    return DirectMediaDownloader(logger=logger)
+
+
+def build_processor(args, server: StandInServer, work_dir: Path, logger: logging.Logger, event_loop=None):
+    """用替身服务组装处理器（传入 event_loop 时与 Web 应用一样走异步 LLM 处理器）"""
+    from video_note_generator.config import Settings
+    from video_note_generator.downloader.base import VideoInfo
+    from video_note_generator.processor import VideoNoteProcessor
+    from video_note_generator.subtitle_extractor import SubtitleExtractor
+
+    settings = Settings(
+        _env_file=None,
+        openrouter_api_key='bench',
+        openrouter_api_url=f'{server.base_url}/v1',
+        unsplash_access_key='bench',
+        ai_model='bench/main',
+        ai_light_model=args.light_model,
+        whisper_model=args.whisper_model,
+        output_dir=work_dir / 'output',
+        cache_dir=work_dir / 'cache',
+        log_dir=work_dir / 'logs',
+        llm_cache_enabled=args.llm_cache,
+        llm_requests_per_minute=args.llm_rpm,
+        llm_max_concurrency=args.llm_concurrency,
+        content_chunk_size=args.chunk_size,
+        stream_transcription=args.stream,
+        incremental_transcription=args.incremental,
+        ffmpeg_path=args.ffmpeg,
+        transcribe_batch_size=args.batch_size,
+        playlist_concurrency=args.playlist_concurrency,
+    )
+    settings.output_dir.mkdir(parents=True, exist_ok=True)
+
+    processor = VideoNoteProcessor(settings, logger, event_loop=event_loop)
+
+    processor.subtitle_extractor = SubtitleExtractor(session=rewriting_session({
+        f'https://{BILIBILI_API_HOST}': f'{server.base_url}/bilibili',
+        f'https://{SUBTITLE_HOST}': f'{server.base_url}/bilibili',
+    }))
+    processor.playlist_expander.subtitle_extractor = processor.subtitle_extractor
+    processor.image_service.base_url = f'{server.base_url}/unsplash'
+    processor.downloader_registry._downloaders.insert(
+        0, _make_direct_downloader(f'{server.base_url}/static/', int(args.audio_seconds), logger)
+    )
+
+    # yt-dlp 元数据查询会访问外网，这里改为读取替身 B站接口
+    def video_info(url: str) -> Optional[VideoInfo]:
+        bvid = url.split('?', 1)[0].rstrip('/').rsplit('/', 1)[-1]
+        data = processor.subtitle_extractor.session.get(
+            f'https://{BILIBILI_API_HOST}/x/web-interface/view',
+            params={'bvid': bvid},
+            timeout=10
+        ).json()['data']
+        return VideoInfo(
+            title=data['title'],
+            uploader=data['owner']['name'],
+            description=data['desc'],
+            duration=data['duration'],
+            platform='Bilibili',
+            url=url
+        )
+
+    processor._get_video_info_without_download = video_info
+
+    if args.transcriber == 'fake':
+        processor.transcriber = FakeTranscriber(real_time_factor=args.fake_rtf, call_overhead=args.fake_overhead)
+        if processor.transcription_batcher:
+            processor.transcription_batcher.transcriber = processor.transcriber
+
+    return processor
+
+
+def instrument(processor, recorder: StageRecorder):
+    """给处理器的各阶段挂上计时"""
+    recorder.wrap(processor.subtitle_extractor, 'extract', 'subtitle')
+    recorder.wrap(processor, '_get_video_info_without_download', 'video_info')
+    recorder.wrap(processor.downloader_registry, 'download', 'download')
+    recorder.wrap(processor.downloader_registry, 'open_audio_stream', 'stream_open')
+    recorder.wrap(processor.transcriber, 'transcribe', 'transcribe')
+    recorder.wrap(processor.transcriber, 'transcribe_batch', 'transcribe_batch')
+    recorder.wrap(processor.transcriber, 'transcribe_windowed', 'windowed')
+    # 流式转录时下载与解码在后台线程，墙钟时间计入此阶段
+    recorder.wrap(processor.transcriber, 'transcribe_pcm_stream', 'stream')
+    recorder.wrap(processor.ai_processor, 'organize_long_content', 'organize')
+    recorder.wrap(processor.xiaohongshu_generator, 'generate_metadata', 'xhs_metadata')
+    recorder.wrap(processor.image_service, 'get_photos_for_xiaohongshu', 'images')
+    recorder.wrap(processor.xiaohongshu_generator, 'generate', 'xhs_content')
+    recorder.wrap(processor.blog_generator, 'generate', 'blog')
+
+
+def run_json3(args, server: StandInServer, recorder: StageRecorder):
+    """仅测量 json3 字幕下载与解析"""
+    from video_note_generator.subtitle_extractor import SubtitleExtractor
+
+    extractor = SubtitleExtractor()
+    recorder.wrap(extractor, '_download_text', 'json3_parse')
+    for _ in range(args.jobs):
+        extractor._download_text(f'{server.base_url}/static/captions.json3', 'json3', rolling=True)
+
+
+@contextmanager
+def background_loop(enabled: bool):
+    """模拟 Web 应用的主事件循环：在后台线程中运行，结束时关闭共享 LLM 客户端"""
+    if not enabled:
+        yield None
+        return
+
+    import asyncio
+    from video_note_generator.ai_processor import AsyncAIProcessor
+
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, name='bench-loop', daemon=True)
+    thread.start()
+    try:
+        yield loop
+    finally:
+        asyncio.run_coroutine_threadsafe(AsyncAIProcessor.aclose_shared_clients(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+def run_pipeline(args, server: StandInServer, work_dir: Path, recorder: StageRecorder, logger):
+    with background_loop(args.async_llm) as loop:
+        processor = build_processor(args, server, work_dir, logger, event_loop=loop)
+        instrument(processor, recorder)
+        return _run_jobs(args, server, processor, logger)
+
+
+def _run_jobs(args, server: StandInServer, processor, logger) -> int:
+
+    if args.scenario == 'playlist':
+        # 一个分P视频展开为 --parts 集，按 playlist_concurrency 并发处理
+        playlist = processor.playlist_expander.expand('https://www.bilibili.com/video/BV1bench0000')
+        if not playlist:
+            logger.warning('分P视频未能展开')
+            return 1
+        result = processor.process_playlist(playlist, merge=args.merge)
+        failed = sum(1 for entry in playlist.entries if len(result.results.get(entry.url) or []) < 4)
+        if args.merge and not result.merged_file:
+            failed += 1
+        if failed:
+            logger.warning(f'{failed} 集未生成全部文件')
+        return failed
+
+    if args.scenario == 'subtitle':
+        urls = [f'https://www.bilibili.com/video/BV1bench{i:04d}' for i in range(args.jobs)]
+    else:
+        urls = [f'{server.base_url}/static/sample.wav' for _ in range(args.jobs)]
+
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        results = list(pool.map(
+            lambda url: processor.process_video(url, generate_xiaohongshu=True, generate_blog=True),
+            urls
+        ))
+
+    failed = sum(1 for files in results if len(files) < 4)
+    if failed:
+        logger.warning(f'{failed} 个任务未生成全部文件')
+    return failed
+
+
+def print_report(report: dict):
+    print()
+    print(f"场景: {report['scenario']}  任务数: {report['jobs']}  "
+          f"总耗时: {report['wall']:.3f}s  进程CPU: {report['cpu']:.3f}s")
+    print(f"峰值内存: 本进程 {report['peak_rss_mb']:.1f}MB  子进程 {report['children_peak_rss_mb']:.1f}MB")
+    print()
+    print(f"{'阶段':<14}{'调用':>6}{'墙钟(s)':>12}{'CPU(s)':>10}{'峰值RSS(MB)':>14}")
+    for row in report['stages']:
+        print(f"{row['stage']:<14}{row['calls']:>6}{row['wall']:>12.3f}"
+              f"{row['cpu']:>10.3f}{row['peak_rss_mb']:>14.1f}")
+    print()
+    print('LLM 调用:', json.dumps(report['llm_calls'], ensure_ascii=False))
+    print('已加载的重依赖:', ', '.join(report['heavy_modules']) or '无')
+    print('替身接口调用:')
+    for path, count in sorted(report['http_calls'].items()):
+        print(f'  {count:>5}  {path}')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='视频笔记流水线基准测试（本地替身服务）')
+    parser.add_argument('--scenario', choices=['subtitle', 'transcribe', 'json3', 'playlist'], default='subtitle')
+    parser.add_argument('--jobs', type=int, default=1, help='并发处理的视频数')
+    parser.add_argument('--llm-latency', type=float, default=0.2, help='替身 LLM 每次调用的基础延迟（秒）')
+    parser.add_argument('--llm-per-char', type=float, default=0.0, help='替身 LLM 每输出一个字符的额外延迟（秒）')
+    parser.add_argument('--llm-output-chars', type=int, default=2000, help='替身 LLM 每次输出的字符数上限')
+    parser.add_argument('--llm-concurrency', type=int, default=4, help='LLM 最大并发（llm_max_concurrency）')
+    parser.add_argument('--llm-rpm', type=int, default=6000, help='LLM 每分钟请求数（llm_requests_per_minute）')
+    parser.add_argument('--llm-cache', action='store_true', help='开启 LLM 响应缓存')
+    parser.add_argument('--async-llm', action='store_true', help='与 Web 应用一样在共享事件循环上执行 LLM 请求')
+    parser.add_argument('--light-model', default=None, help='轻量任务模型（ai_light_model）')
+    parser.add_argument('--chunk-size', type=int, default=2000, help='内容分块大小（content_chunk_size）')
+    parser.add_argument('--subtitle-lines', type=int, default=600, help='替身字幕条数')
+    parser.add_argument('--parts', type=int, default=6, help='playlist 场景的分P数')
+    parser.add_argument('--playlist-concurrency', type=int, default=3, help='同时处理的分集数（playlist_concurrency）')
+    parser.add_argument('--merge', action='store_true', help='playlist 场景生成合并笔记')
+    parser.add_argument('--audio-seconds', type=float, default=30.0, help='测试音频时长（秒）')
+    parser.add_argument('--transcriber', choices=['fake', 'whisper'], default='fake')
+    parser.add_argument('--fake-rtf', type=float, default=0.05, help='转录替身的实时率')
+    parser.add_argument('--fake-overhead', type=float, default=0.0, help='转录替身每次调用的固定开销（秒）')
+    parser.add_argument('--whisper-model', default='tiny')
+    parser.add_argument('--batch-size', type=int, default=1, help='短音频批量转录的批大小（transcribe_batch_size）')
+    parser.add_argument('--stream', action='store_true', help='transcribe 场景使用流式转录（stream_transcription）')
+    parser.add_argument('--incremental', action='store_true', help='transcribe 场景边下载边转录（incremental_transcription）')
+    parser.add_argument('--ffmpeg', default=None, help='ffmpeg 可执行文件（ffmpeg_path）')
+    parser.add_argument('--download-rate', type=float, default=None, help='静态文件限速（KB/s），模拟慢速下载')
+    parser.add_argument('--json', type=Path, default=None, help='把结果写入 JSON 文件')
+    parser.add_argument('--keep', action='store_true', help='保留临时工作目录')
+    parser.add_argument('-v', '--verbose', action='store_true', help='输出流水线日志')
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='%(asctime)s %(levelname)s %(name)s: %(message)s'
+    )
+    logger = logging.getLogger('bench')
+
+    work_dir = Path(tempfile.mkdtemp(prefix='vng_bench_'))
+    write_fixtures(work_dir / 'static', args.audio_seconds, args.subtitle_lines)
+
+    llm = FakeOpenAIServer(
+        latency=args.llm_latency,
+        per_char_latency=args.llm_per_char,
+        output_chars=args.llm_output_chars
+    )
+    server = StandInServer()
+    llm.mount(server)
+    FakeBilibiliAPI(
+        subtitle_lines=args.subtitle_lines,
+        parts=args.parts if args.scenario == 'playlist' else 1
+    ).mount(server)
+    FakeUnsplashAPI().mount(server)
+    mount_static(server, work_dir / 'static', rate=args.download_rate * 1024 if args.download_rate else None)
+    server.start()
+
+    recorder = StageRecorder()
+    failed = 0
+    try:
+        wall_start = time.perf_counter()
+        cpu_start = _process_cpu()
+
+        if args.scenario == 'json3':
+            run_json3(args, server, recorder)
+        else:
+            failed = run_pipeline(args, server, work_dir, recorder, logger)
+
+        report = {
+            'scenario': args.scenario,
+            'jobs': args.jobs,
+            'wall': time.perf_counter() - wall_start,
+            'cpu': _process_cpu() - cpu_start,
+            'peak_rss_mb': _peak_rss_mb(),
+            'children_peak_rss_mb': _peak_rss_mb(children=True),
+            'stages': recorder.rows(),
+            'llm_calls': dict(llm.calls),
+            'http_calls': server.counts(),
+            'heavy_modules': [name for name in HEAVY_MODULES if name in sys.modules],
+            'failed_jobs': failed,
+            'options': {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()},
+        }
+    finally:
+        server.stop()
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        else:
+            print(f'工作目录: {work_dir}')
+
+    print_report(report)
+    if args.json:
+        args.json.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
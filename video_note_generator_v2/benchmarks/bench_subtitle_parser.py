@@ -0,0 +1,192 @@
+"""
+字幕解析基准测试
+
+生成大体积字幕文件（SRT、YouTube 自动字幕风格的滚动 VTT、json3、ASS、B站 JSON），
+对比两种解析方式：
+- whole：整个文件读入内存后解析（原实现：文本格式按行过滤时间戳，JSON 整体 json.loads）
+- stream：按 64KB 块流式解析（subtitle_parser.iter_segments + dedupe_rolling）
+
+报告耗时（中位数）、解析期间的峰值内存（tracemalloc，单独一轮测量）以及输出字符数，
+滚动 VTT 的输出字符数差异即去重节省的文本量。
+
+用法：
+    python benchmarks/bench_subtitle_parser.py
+    python benchmarks/bench_subtitle_parser.py --cues 200000 --format vtt --format json3
+"""
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from functools import partial
+from pathlib import Path
+from typing import Callable, Dict, List
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / 'src'))
+sys.path.insert(0, str(BENCH_DIR))
+
+from stand_ins import youtube_json3  # noqa: E402
+from video_note_generator.subtitle_parser import (  # noqa: E402
+    dedupe_rolling,
+    iter_segments,
+    join_segments,
+)
+
+CHUNK_SIZE = 64 * 1024
+WORDS = 'the quick brown fox jumps over the lazy dog while we talk about compounding knowledge'.split()
+
+
+def _timestamp(seconds: float, sep: str) -> str:
+    ms = int(round(seconds * 1000))
+    h, ms = divmod(ms, 3_600_000)
+    m, ms = divmod(ms, 60_000)
+    s, ms = divmod(ms, 1000)
+    return f'{h:02d}:{m:02d}:{s:02d}{sep}{ms:03d}'
+
+
+def _sentence(i: int) -> str:
+    return ' '.join(WORDS[(i + k) % len(WORDS)] for k in range(6)) + f' {i}'
+
+
+def write_srt(path: Path, cues: int):
+    with path.open('w', encoding='utf-8') as f:
+        for i in range(cues):
+            start = i * 2.0
+            f.write(f'{i + 1}\n{_timestamp(start, ",")} --> {_timestamp(start + 1.9, ",")}\n')
+            f.write(f'<i>{_sentence(i)}</i>\n\n')
+
+
+def write_rolling_vtt(path: Path, cues: int):
+    """YouTube 自动字幕：每条 cue 两行，第一行重复上一条的第二行；中间夹 10ms 的过渡 cue"""
+    with path.open('w', encoding='utf-8') as f:
+        f.write('WEBVTT\nKind: captions\nLanguage: en\n\n')
+        previous = ''
+        for i in range(cues):
+            start = i * 2.0
+            line = _sentence(i)
+            f.write(f'{_timestamp(start, ".")} --> {_timestamp(start + 1.99, ".")} align:start position:0%\n')
+            f.write(f'{previous}\n{line}<00:00:00.500><c> tail</c>\n\n' if previous else f'{line}\n\n')
+            f.write(f'{_timestamp(start + 1.99, ".")} --> {_timestamp(start + 2.0, ".")} align:start position:0%\n')
+            f.write(f'{line} tail\n \n\n')
+            previous = line + ' tail'
+
+
+def write_ass(path: Path, cues: int):
+    with path.open('w', encoding='utf-8') as f:
+        f.write('[Script Info]\nTitle: bench\n\n[V4+ Styles]\nFormat: Name, Fontname\nStyle: Default,Arial\n\n')
+        f.write('[Events]\nFormat: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n')
+        for i in range(cues):
+            start = i * 2.0
+            f.write(
+                f'Dialogue: 0,{_timestamp(start, ".")[1:-1]},{_timestamp(start + 1.9, ".")[1:-1]},'
+                f'Default,,0,0,0,,{{\\i1}}{_sentence(i)}\\N第二行, with comma\n'
+            )
+
+
+def write_json3(path: Path, cues: int):
+    path.write_text(json.dumps(youtube_json3(cues)), encoding='utf-8')
+
+
+def write_bilibili(path: Path, cues: int):
+    body = [
+        {'from': i * 2.0, 'to': i * 2.0 + 1.9, 'location': 2, 'content': f'第{i}句字幕 {_sentence(i)}'}
+        for i in range(cues)
+    ]
+    path.write_text(json.dumps({'font_size': 0.4, 'body': body}, ensure_ascii=False), encoding='utf-8')
+
+
+FORMATS: Dict[str, Callable[[Path, int], None]] = {
+    'srt': write_srt,
+    'vtt': write_rolling_vtt,
+    'ass': write_ass,
+    'json3': write_json3,
+    'bilibili': write_bilibili,
+}
+
+
+# ---- 整体解析（原实现） ----
+
+def parse_whole(path: Path, fmt: str) -> str:
+    if fmt == 'json3':
+        data = json.loads(path.read_bytes())
+        parts = []
+        for event in data.get('events', []):
+            for seg in event.get('segs', []):
+                text = seg.get('utf8', '')
+                if text and text != '\n':
+                    parts.append(text)
+        return ' '.join(parts)
+    if fmt == 'bilibili':
+        body = json.loads(path.read_bytes()).get('body', [])
+        return ' '.join(item.get('content', '') for item in body)
+
+    parts = []
+    for line in path.read_text(encoding='utf-8').split('\n'):
+        line = line.strip()
+        if not line or line.isdigit() or '-->' in line or line.startswith('WEBVTT'):
+            continue
+        parts.append(line)
+    return ' '.join(parts)
+
+
+# ---- 流式解析 ----
+
+def parse_stream(path: Path, fmt: str) -> str:
+    with path.open('rb') as f:
+        chunks = iter(partial(f.read, CHUNK_SIZE), b'')
+        return join_segments(dedupe_rolling(iter_segments(chunks, fmt)))
+
+
+def measure(func: Callable[[Path, str], str], path: Path, fmt: str, repeat: int) -> Dict[str, float]:
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = func(path, fmt)
+        runs.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    func(path, fmt)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'median_ms': statistics.median(runs), 'peak_mb': peak / 1024 / 1024, 'chars': len(text)}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='字幕解析基准测试')
+    parser.add_argument('--cues', type=int, default=50_000, help='每个文件的字幕条数')
+    parser.add_argument('--repeat', type=int, default=3, help='每个用例的测量次数')
+    parser.add_argument('--format', choices=list(FORMATS), action='append', help='只运行指定格式（可重复）')
+    parser.add_argument('--json', type=Path, default=None, help='把结果写入 JSON 文件')
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    formats: List[str] = args.format or list(FORMATS)
+    report = {}
+
+    print(f"{'格式':<10}{'文件':>9}{'方式':>8}{'中位数':>12}{'峰值内存':>12}{'输出字符':>12}")
+    with tempfile.TemporaryDirectory(prefix='bench_subtitle_') as tmp:
+        for fmt in formats:
+            path = Path(tmp) / f'captions.{fmt}'
+            FORMATS[fmt](path, args.cues)
+            size_mb = path.stat().st_size / 1024 / 1024
+            report[fmt] = {'file_mb': size_mb}
+            for name, func in (('whole', parse_whole), ('stream', parse_stream)):
+                result = measure(func, path, fmt, args.repeat)
+                report[fmt][name] = result
+                print(
+                    f"{fmt:<10}{size_mb:>7.1f}MB{name:>8}{result['median_ms']:>10.1f}ms"
+                    f"{result['peak_mb']:>10.1f}MB{result['chars']:>12}"
+                )
+
+    if args.json:
+        args.json.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""
+文本后处理正则基准测试
+
+对 extract_urls / clean_text / 小红书结果解析与格式化 / 博客格式化分别构造两类输入：
+- 常规输入：10 万字以上的生成结果（含标题区、正文、元信息、标签）
+- 对抗输入：长空白行、大量只有开头没有结尾的分节标记、长标签串等，
+  专门触发懒惰匹配与 ^\\s* 类模式的回溯（按行首逐个重试时耗时随长度平方增长）
+
+任一用例的中位耗时超过 --max-ms 时以非零状态退出，用于发现灾难性回溯。
+
+用法：
+    python benchmarks/bench_text_patterns.py
+    python benchmarks/bench_text_patterns.py --size 500000 --max-ms 500
+    python benchmarks/bench_text_patterns.py --case blog --adversarial-only
+"""
+import argparse
+import json
+import logging
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / 'src'))
+
+from video_note_generator.generators.blog import BlogGenerator  # noqa: E402
+from video_note_generator.generators.xiaohongshu import XiaohongshuGenerator  # noqa: E402
+from video_note_generator.utils.text_utils import clean_text, extract_urls  # noqa: E402
+
+PARAGRAPH = (
+    '这一段讨论的是视频里提到的核心观点：复利不仅存在于财富，也存在于知识与关系之中。'
+    '作者用三个例子说明了长期主义为什么难以坚持，以及如何设计环境让正确的事情更容易发生。'
+)
+
+
+def _repeat_to(unit: str, size: int) -> str:
+    return unit * (size // len(unit) + 1)
+
+
+def _body(size: int) -> str:
+    return _repeat_to(PARAGRAPH + '\n\n', size)
+
+
+# ---- 常规输入 ----
+
+def make_url_text(size: int) -> str:
+    unit = (
+        '推荐看 https://www.bilibili.com/video/BV1xx411c7mD?p=2 和 BV1Ab411c7mE，'
+        '还有 v.douyin.com/iRNBho6u 以及 https://youtu.be/dQw4w9WgXcQ?si=abc 。\n'
+        + PARAGRAPH + '\n'
+    )
+    return _repeat_to(unit, size)
+
+
+def make_xhs_result(size: int) -> str:
+    titles = '\n'.join(f'{i}. 标题示例第{i}个，帮你读懂长期主义' for i in range(1, 6))
+    tags = ' '.join(f'#标签{i}' for i in range(10))
+    return f'一、标题\n{titles}\n\n二、正文\n{_body(size)}\n三、标签\n{tags}\n'
+
+
+def make_xhs_content(size: int) -> str:
+    tags = ' '.join(f'#标签{i}' for i in range(10))
+    return f'# 原始标题\n\n{_body(size)}\n\n---\n\n{tags}\n'
+
+
+def make_blog(size: int) -> str:
+    header = '思想来源 (Source): 某频道\n原始视频 (Video): https://example.com/v\n\n'
+    footer = (
+        '\n\n---\n\n**文章元信息**\n- 思想来源：某频道\n- 原始视频：https://example.com/v\n'
+        '\n---\n*本文由 AI 辅助创作*\n'
+    )
+    return header + '# 标题\n\n' + _body(size) + footer
+
+
+# ---- 对抗输入 ----
+
+def make_whitespace_run(size: int) -> str:
+    # 每个行首都能匹配 ^\s*，整段空白后却没有"思想来源"
+    return '正文开头' + '\n' * size + '正文结尾'
+
+
+def make_blog_source_lines(size: int) -> str:
+    # 大量"- 思想来源"，后面都没有"- 原始视频"
+    return _repeat_to('- 思想来源 某频道\n', size)
+
+
+def make_blog_separators(size: int) -> str:
+    return _repeat_to('---\n\n\n\n*斜体说明*\n', size)
+
+
+def make_xhs_title_markers(size: int) -> str:
+    # 大量"一、标题"，没有"二、正文"
+    return _repeat_to('一、标题\n1. 候选标题\n', size)
+
+
+def make_xhs_tag_runs(size: int) -> str:
+    # 每段都是一串标签，但最后跟着普通文字，末尾标签模式在每段都会失败
+    return _repeat_to('\n\n' + '#标签 ' * 30 + '正文\n', size)
+
+
+def make_heading_spaces(size: int) -> str:
+    # 开头是 "#" 加一长串空白且没有换行
+    return '#' + ' ' * size
+
+
+def build_cases(size: int) -> List[Tuple[str, str, bool, Callable[[str], object], str]]:
+    """返回 (名称, 分组, 是否对抗输入, 被测函数, 输入文本)"""
+    logger = logging.getLogger('bench')
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    xhs = XiaohongshuGenerator(ai_processor=None, logger=logger)
+    blog = BlogGenerator(ai_processor=None, logger=logger)
+
+    def format_note(text: str):
+        return xhs.format_note(text, '标题', ['标签'], ['a.jpg', 'b.jpg', 'c.jpg'])
+
+    def format_blog(text: str):
+        return blog.format_blog(text, {})
+
+    return [
+        ('extract_urls', 'text', False, extract_urls, make_url_text(size)),
+        ('clean_text', 'text', False, clean_text, _body(size)),
+        ('xhs_parse_result', 'xhs', False, xhs._parse_result, make_xhs_result(size)),
+        ('xhs_format_note', 'xhs', False, format_note, make_xhs_content(size)),
+        ('blog_format', 'blog', False, format_blog, make_blog(size)),
+        ('clean_text/whitespace', 'text', True, clean_text, make_whitespace_run(size)),
+        ('extract_urls/whitespace', 'text', True, extract_urls, make_whitespace_run(size)),
+        ('xhs_parse_result/title_markers', 'xhs', True, xhs._parse_result, make_xhs_title_markers(size)),
+        ('xhs_format_note/tag_runs', 'xhs', True, format_note, make_xhs_tag_runs(size)),
+        ('xhs_format_note/heading_spaces', 'xhs', True, format_note, make_heading_spaces(size)),
+        ('blog_format/whitespace', 'blog', True, format_blog, make_whitespace_run(size)),
+        ('blog_format/source_lines', 'blog', True, format_blog, make_blog_source_lines(size)),
+        ('blog_format/separators', 'blog', True, format_blog, make_blog_separators(size)),
+    ]
+
+
+def measure(func: Callable[[str], object], text: str, repeat: int) -> Dict[str, float]:
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        runs.append((time.perf_counter() - start) * 1000)
+    return {'median_ms': statistics.median(runs), 'max_ms': max(runs)}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='文本后处理正则基准测试')
+    parser.add_argument('--size', type=int, default=120_000, help='每个输入的字符数')
+    parser.add_argument('--repeat', type=int, default=5, help='每个用例的测量次数')
+    parser.add_argument('--max-ms', type=float, default=250.0, help='单个用例中位耗时上限（毫秒）')
+    parser.add_argument('--case', choices=['text', 'xhs', 'blog'], action='append', help='只运行指定分组（可重复）')
+    parser.add_argument('--adversarial-only', action='store_true', help='只运行对抗输入')
+    parser.add_argument('--json', type=Path, default=None, help='把结果写入 JSON 文件')
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    report = {}
+    failures = []
+
+    print(f"{'用例':<34}{'字符数':>10}{'中位数':>12}{'最大':>12}")
+    for name, group, adversarial, func, text in build_cases(args.size):
+        if args.case and group not in args.case:
+            continue
+        if args.adversarial_only and not adversarial:
+            continue
+        result = measure(func, text, args.repeat)
+        result['chars'] = len(text)
+        report[name] = result
+        mark = '' if result['median_ms'] <= args.max_ms else '  ✗'
+        print(f"{name:<34}{len(text):>10}{result['median_ms']:>10.2f}ms{result['max_ms']:>10.2f}ms{mark}")
+        if mark:
+            failures.append(f"{name} 中位耗时 {result['median_ms']:.0f}ms 超过上限 {args.max_ms:.0f}ms")
+
+    if args.json:
+        args.json.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+
+    if failures:
+        print()
+        for failure in failures:
+            print(f'✗ {failure}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,175 @@
+"""
+长音频转录内存基准测试
+
+生成一段合成长音频，分别用整文件转录（model.transcribe(path)）和按窗口转录
+（transcribe_windowed）处理，每种方式在独立子进程中运行，比较转录期间新增的峰值 RSS。
+按窗口转录的峰值超过 --max-rss-mb 时以非零状态退出，可作为内存上限的回归检查。
+
+转录替身模拟 Whisper 的内存行为：整文件时先解码全部音频为 float32，
+再对整段音频做 STFT（与 whisper.log_mel_spectrogram 相同的帧长/步长）。
+
+用法：
+    python benchmarks/bench_transcribe_memory.py --minutes 120
+    python benchmarks/bench_transcribe_memory.py --mode windowed --minutes 240 --max-rss-mb 300
+    python benchmarks/bench_transcribe_memory.py --transcriber whisper --whisper-model tiny --minutes 30
+"""
+import argparse
+import json
+import logging
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR))
+sys.path.insert(0, str(BENCH_DIR.parent / 'src'))
+
+from fixtures import make_wav  # noqa: E402
+
+SAMPLE_RATE = 16000
+N_FFT = 400
+HOP_LENGTH = 160
+
+
+def _peak_rss_mb() -> float:
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 单位为字节，Linux 为 KB
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class FakeWhisperModel:
+    """转录替身：按 Whisper 的方式解码整段输入并计算频谱，返回按时长生成的文本"""
+
+    def __init__(self, ffmpeg: str):
+        self.ffmpeg = ffmpeg
+
+    def _load_audio(self, path: str):
+        import numpy as np
+
+        # 与 whisper.load_audio 相同：一次性读取 ffmpeg 的全部输出
+        cmd = [self.ffmpeg, '-nostdin', '-i', path, '-f', 's16le', '-ac', '1',
+               '-acodec', 'pcm_s16le', '-ar', str(SAMPLE_RATE), '-']
+        out = subprocess.run(cmd, capture_output=True, check=True).stdout
+        return np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
+
+    def transcribe(self, audio, **kwargs) -> dict:
+        import numpy as np
+
+        if isinstance(audio, str):
+            audio = self._load_audio(audio)
+        frames = np.lib.stride_tricks.sliding_window_view(audio, N_FFT)[::HOP_LENGTH]
+        magnitudes = np.abs(np.fft.rfft(frames, axis=-1)) ** 2
+        seconds = len(audio) / SAMPLE_RATE
+        del magnitudes
+        return {'text': '字' * int(seconds)}
+
+
+def run_child(args) -> dict:
+    """在当前进程中执行一种转录方式，返回内存与耗时"""
+    from video_note_generator.transcriber import WhisperTranscriber
+
+    transcriber = WhisperTranscriber(
+        logger=logging.getLogger('bench'),
+        cache_dir=Path(tempfile.mkdtemp(prefix='vng_mem_cache_'))
+    )
+    if args.transcriber == 'fake':
+        model = FakeWhisperModel(args.ffmpeg)
+        transcriber._load_model = lambda model_name='medium': model
+    else:
+        transcriber._load_model(args.whisper_model)
+
+    baseline = _peak_rss_mb()
+    started = time.perf_counter()
+    if args.child == 'full':
+        text = transcriber.transcribe(str(args.audio), model_name=args.whisper_model, use_cache=False)
+    else:
+        text = transcriber.transcribe_windowed(
+            str(args.audio),
+            model_name=args.whisper_model,
+            use_cache=False,
+            window_seconds=args.window_seconds,
+            ffmpeg=args.ffmpeg
+        )
+    return {
+        'mode': args.child,
+        'seconds': time.perf_counter() - started,
+        'baseline_rss_mb': baseline,
+        'peak_rss_mb': _peak_rss_mb(),
+        'delta_rss_mb': _peak_rss_mb() - baseline,
+        'chars': len(text),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='长音频转录内存基准测试')
+    parser.add_argument('--minutes', type=float, default=120, help='合成音频时长（分钟）')
+    parser.add_argument('--mode', choices=['full', 'windowed', 'both'], default='both')
+    parser.add_argument('--transcriber', choices=['fake', 'whisper'], default='fake')
+    parser.add_argument('--whisper-model', default='tiny')
+    parser.add_argument('--window-seconds', type=float, default=300, help='按窗口转录的窗口长度（秒）')
+    parser.add_argument('--ffmpeg', default='ffmpeg', help='ffmpeg 可执行文件')
+    parser.add_argument('--max-rss-mb', type=float, default=400,
+                        help='按窗口转录新增峰值 RSS 的上限（MB），超出时退出码为 1')
+    parser.add_argument('--json', type=Path, default=None, help='把结果写入 JSON 文件')
+    # 内部使用：子进程执行单个方式
+    parser.add_argument('--child', choices=['full', 'windowed'], help=argparse.SUPPRESS)
+    parser.add_argument('--audio', type=Path, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.child:
+        print(json.dumps(run_child(args)))
+        return 0
+
+    work_dir = Path(tempfile.mkdtemp(prefix='vng_mem_'))
+    try:
+        audio = make_wav(work_dir / 'long.wav', args.minutes * 60)
+        modes = ['full', 'windowed'] if args.mode == 'both' else [args.mode]
+        results = []
+        for mode in modes:
+            cmd = [
+                sys.executable, __file__, '--child', mode, '--audio', str(audio),
+                '--transcriber', args.transcriber, '--whisper-model', args.whisper_model,
+                '--window-seconds', str(args.window_seconds), '--ffmpeg', args.ffmpeg,
+            ]
+            proc = subprocess.run(cmd, capture_output=True, text=True)
+            if proc.returncode != 0:
+                print(f'{mode} 运行失败:\n{proc.stderr[-2000:]}', file=sys.stderr)
+                return 2
+            results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print()
+    print(f"音频时长: {args.minutes:.0f} 分钟  转录器: {args.transcriber}  窗口: {args.window_seconds:.0f}s")
+    print(f"{'方式':<10}{'耗时(s)':>10}{'基线RSS(MB)':>14}{'峰值RSS(MB)':>14}{'新增(MB)':>12}")
+    for row in results:
+        print(f"{row['mode']:<10}{row['seconds']:>10.2f}{row['baseline_rss_mb']:>14.1f}"
+              f"{row['peak_rss_mb']:>14.1f}{row['delta_rss_mb']:>12.1f}")
+
+    if args.json:
+        args.json.write_text(json.dumps({'options': {k: str(v) for k, v in vars(args).items()},
+                                         'results': results}, ensure_ascii=False, indent=2),
+                             encoding='utf-8')
+
+    windowed = next((row for row in results if row['mode'] == 'windowed'), None)
+    if windowed and windowed['delta_rss_mb'] > args.max_rss_mb:
+        print(f"按窗口转录新增峰值 RSS {windowed['delta_rss_mb']:.1f}MB 超过上限 {args.max_rss_mb:.0f}MB")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""
+基准测试样本生成
+
+样本在运行时生成到临时目录，不提交二进制文件。
+"""
+import json
+import math
+import struct
+import wave
+from pathlib import Path
+
+from stand_ins import bilibili_subtitle, youtube_json3
+
+
+def make_wav(path: Path, seconds: float, sample_rate: int = 16000) -> Path:
+    """
+    生成单声道 16bit PCM 测试音频（分块写入，长音频也不占用大量内存）
+
+    Args:
+        path: 输出路径
+        seconds: 时长（秒）
+        sample_rate: 采样率
+
+    Returns:
+        音频文件路径
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    total = int(seconds * sample_rate)
+    block = sample_rate  # 每次写入 1 秒
+
+    # 440Hz 正弦波，每秒切换音量，避免被当作静音整段跳过；
+    # 每秒恰好是整数个周期，两种音量的 1 秒数据预先生成后重复写入（数小时的样本也只需几秒）
+    blocks = [
+        struct.pack(
+            f'<{block}h',
+            *(int(amplitude * math.sin(2 * math.pi * 440 * i / sample_rate)) for i in range(block))
+        )
+        for amplitude in (8000, 3000)
+    ]
+
+    with wave.open(str(path), 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        for start in range(0, total, block):
+            count = min(block, total - start)
+            wav.writeframes(blocks[(start // block) % 2][:count * 2])
+    return path
+
+
+def write_fixtures(directory: Path, audio_seconds: float, subtitle_lines: int) -> dict:
+    """
+    生成基准测试需要的全部样本
+
+    Args:
+        directory: 样本目录
+        audio_seconds: 音频时长（秒）
+        subtitle_lines: 字幕条数
+
+    Returns:
+        {样本名: 文件路径}
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    json3_path = directory / 'captions.json3'
+    json3_path.write_text(json.dumps(youtube_json3(subtitle_lines)), encoding='utf-8')
+
+    bilibili_path = directory / 'bilibili_subtitle.json'
+    bilibili_path.write_text(
+        json.dumps(bilibili_subtitle(subtitle_lines), ensure_ascii=False),
+        encoding='utf-8'
+    )
+
+    return {
+        'audio': make_wav(directory / 'sample.wav', audio_seconds),
+        'json3': json3_path,
+        'bilibili_subtitle': bilibili_path,
+    }
@@ -0,0 +1,412 @@
+"""
+基准测试用的本地替身服务
+
+用本地 HTTP 服务替代流水线依赖的所有外部服务，保证基准测试可重复、无网络依赖：
+- FakeOpenAIServer: OpenAI 兼容的 chat/completions 接口（可配置延迟）
+- FakeBilibiliAPI: B站视频信息、字幕列表、字幕内容接口
+- FakeUnsplashAPI: Unsplash 图片搜索接口
+- 静态文件服务: 提供音频样本、json3 字幕等（支持 HEAD 与 Range）
+
+所有服务共用一个 StandInServer，按路径前缀分发，并记录每个接口的调用次数。
+"""
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# body 为可迭代对象时逐段发送（需在 headers 中给出 Content-Length）
+Response = Tuple[int, Dict[str, str], Union[bytes, Iterable[bytes]]]
+Route = Callable[['_Handler', Dict[str, str], bytes], Response]
+
+
+def _json_response(payload, status: int = 200) -> Response:
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    return status, {'Content-Type': 'application/json; charset=utf-8'}, body
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """按路径前缀把请求分发给替身服务"""
+
+    protocol_version = 'HTTP/1.1'
+    server: 'StandInServer'
+
+    def log_message(self, format, *args):  # noqa: A002 - 覆盖基类签名
+        pass
+
+    def _dispatch(self, with_body: bool):
+        length = int(self.headers.get('Content-Length') or 0)
+        payload = self.rfile.read(length) if length else b''
+        path = urlsplit(self.path).path
+        query = {k: v[0] for k, v in parse_qs(urlsplit(self.path).query).items()}
+
+        route = self.server.match(path)
+        if route is None:
+            status, headers, body = 404, {'Content-Type': 'text/plain'}, b'not found'
+        else:
+            self.server.count(path)
+            status, headers, body = route(self, query, payload)
+
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if 'Content-Length' not in headers:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if not with_body:
+            return
+        if isinstance(body, bytes):
+            self.wfile.write(body)
+        else:
+            for piece in body:
+                self.wfile.write(piece)
+
+    def do_GET(self):
+        self._dispatch(with_body=True)
+
+    def do_POST(self):
+        self._dispatch(with_body=True)
+
+    def do_HEAD(self):
+        self._dispatch(with_body=False)
+
+
+class StandInServer(ThreadingHTTPServer):
+    """承载所有替身服务的本地 HTTP 服务"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self._routes: Dict[str, Route] = {}
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def route(self, prefix: str, handler: Route):
+        """注册路径前缀对应的处理函数"""
+        self._routes[prefix] = handler
+
+    def match(self, path: str) -> Optional[Route]:
+        # 最长前缀优先
+        for prefix in sorted(self._routes, key=len, reverse=True):
+            if path.startswith(prefix):
+                return self._routes[prefix]
+        return None
+
+    def count(self, path: str):
+        with self._lock:
+            self._counts[path] += 1
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+    def reset_counts(self):
+        with self._lock:
+            self._counts.clear()
+
+    def start(self) -> 'StandInServer':
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class FakeOpenAIServer:
+    """
+    OpenAI 兼容的 chat/completions 替身
+
+    每次调用按 latency + 输出字数 × per_char_latency 休眠，模拟模型生成耗时；
+    请求了 JSON 输出（response_format）时返回小红书元数据结构。
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.2,
+        per_char_latency: float = 0.0,
+        output_chars: int = 2000
+    ):
+        self.latency = latency
+        self.per_char_latency = per_char_latency
+        self.output_chars = output_chars
+        self.calls: Counter = Counter()
+        self.prompt_chars = 0
+        self._lock = threading.Lock()
+
+    def mount(self, server: StandInServer, prefix: str = '/v1'):
+        server.route(f'{prefix}/chat/completions', self._chat)
+        server.route(f'{prefix}/models', self._models)
+
+    def _models(self, handler, query, payload) -> Response:
+        return _json_response({'object': 'list', 'data': [{'id': 'bench-model', 'object': 'model'}]})
+
+    def _chat(self, handler, query, payload) -> Response:
+        request = json.loads(payload or b'{}')
+        model = request.get('model', 'unknown')
+        messages = request.get('messages', [])
+        prompt = ''.join(str(m.get('content', '')) for m in messages)
+        max_tokens = request.get('max_tokens') or self.output_chars
+
+        with self._lock:
+            self.calls[model] += 1
+            self.prompt_chars += len(prompt)
+
+        if request.get('response_format'):
+            content = json.dumps({
+                'titles': ['基准测试标题一', '基准测试标题二', '基准测试标题三'],
+                'tags': ['效率', '学习', '工具', '方法', '笔记'],
+                'image_keywords': 'desk, notebook, coffee',
+            }, ensure_ascii=False)
+        else:
+            size = max(1, min(self.output_chars, max_tokens))
+            sentence = '这是基准测试生成的段落内容，用于模拟模型输出。\n\n'
+            content = (sentence * (size // len(sentence) + 1))[:size]
+
+        time.sleep(self.latency + len(content) * self.per_char_latency)
+
+        return _json_response({
+            'id': 'chatcmpl-bench',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop',
+            }],
+            'usage': {
+                'prompt_tokens': len(prompt),
+                'completion_tokens': len(content),
+                'total_tokens': len(prompt) + len(content),
+            },
+        })
+
+
+BILIBILI_API_HOST = 'api.bilibili.com'
+SUBTITLE_HOST = 'aisubtitle.hdslb.com'
+
+
+class FakeBilibiliAPI:
+    """B站视频信息与字幕接口替身"""
+
+    def __init__(self, subtitle_lines: int = 600, duration: int = 1200, parts: int = 1):
+        self.subtitle_lines = subtitle_lines
+        self.duration = duration
+        self.parts = parts
+
+    def mount(self, server: StandInServer, prefix: str = '/bilibili'):
+        self.base_url = server.base_url
+        server.route(f'{prefix}/x/web-interface/view', self._view)
+        server.route(f'{prefix}/x/player/wbi/v2', self._player)
+        server.route(f'{prefix}/x/player/playurl', self._playurl)
+        server.route(f'{prefix}/subtitle/', self._subtitle)
+
+    def _view(self, handler, query, payload) -> Response:
+        bvid = query.get('bvid', 'BV1bench')
+        data = {
+            'bvid': bvid,
+            'cid': 10001,
+            'title': f'基准测试视频 {bvid}',
+            'desc': '本地替身返回的视频简介',
+            'duration': self.duration,
+            'owner': {'name': '基准测试UP主'},
+            'pic': f'{self.base_url}/static/cover.jpg',
+        }
+        if self.parts > 1:
+            # 分P视频：每P一个 cid，字幕地址按 cid 区分
+            data['pages'] = [
+                {'cid': 10001 + i, 'page': i + 1, 'part': f'第{i + 1}讲', 'duration': self.duration}
+                for i in range(self.parts)
+            ]
+        return _json_response({'code': 0, 'data': data})
+
+    def _player(self, handler, query, payload) -> Response:
+        # 协议相对的线上字幕地址，由 RewriteAdapter 改写回本地
+        return _json_response({
+            'code': 0,
+            'data': {
+                'subtitle': {
+                    'subtitles': [{
+                        'lan': 'zh-CN',
+                        'lan_doc': '中文（自动生成）',
+                        'subtitle_url': f"//{SUBTITLE_HOST}/subtitle/{query.get('cid', '0')}.json",
+                    }],
+                },
+            },
+        })
+
+    def _playurl(self, handler, query, payload) -> Response:
+        # DASH 音频流指向 mount_static 挂载的样例音频
+        return _json_response({
+            'code': 0,
+            'data': {
+                'dash': {
+                    'audio': [{
+                        'id': 30280,
+                        'bandwidth': 192000,
+                        'codecs': 'mp4a.40.2',
+                        'baseUrl': f'{self.base_url}/static/sample.wav',
+                        'backupUrl': [],
+                    }],
+                },
+            },
+        })
+
+    def _subtitle(self, handler, query, payload) -> Response:
+        return _json_response(bilibili_subtitle(self.subtitle_lines))
+
+
+class FakeUnsplashAPI:
+    """Unsplash 图片搜索接口替身"""
+
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+
+    def mount(self, server: StandInServer, prefix: str = '/unsplash'):
+        self.base_url = f'{server.base_url}{prefix}'
+        server.route(f'{prefix}/search/photos', self._search)
+
+    def _search(self, handler, query, payload) -> Response:
+        time.sleep(self.latency)
+        count = int(query.get('per_page', 3))
+        keyword = query.get('query', 'bench')
+        results = [
+            {'urls': {
+                'regular': f'{self.base_url}/photos/{keyword}-{i}.jpg',
+                'small': f'{self.base_url}/photos/{keyword}-{i}-small.jpg',
+            }}
+            for i in range(count)
+        ]
+        return _json_response({'total': count, 'results': results})
+
+
+def _throttled(data: bytes, rate: float, piece: int = 64 * 1024):
+    for start in range(0, len(data), piece):
+        time.sleep(min(piece, len(data) - start) / rate)
+        yield data[start:start + piece]
+
+
+def mount_static(
+    server: StandInServer,
+    directory: Path,
+    prefix: str = '/static',
+    rate: Optional[float] = None
+):
+    """
+    挂载静态文件目录（支持 HEAD 与单段 Range 请求，供分片下载器使用）
+
+    Args:
+        rate: 限速（字节/秒），用于模拟慢速下载；为空时不限速
+    """
+    directory = Path(directory)
+
+    def send(status: int, headers: Dict[str, str], data: bytes) -> Response:
+        if not rate:
+            return status, headers, data
+        headers['Content-Length'] = str(len(data))
+        return status, headers, _throttled(data, rate)
+
+    def handle(handler, query, payload) -> Response:
+        name = urlsplit(handler.path).path[len(prefix):].lstrip('/')
+        path = (directory / name).resolve()
+        if directory.resolve() not in path.parents or not path.is_file():
+            return 404, {'Content-Type': 'text/plain'}, b'not found'
+
+        data = path.read_bytes()
+        content_type = {
+            '.json': 'application/json',
+            '.json3': 'application/json',
+            '.wav': 'audio/wav',
+            '.jpg': 'image/jpeg',
+        }.get(path.suffix, 'application/octet-stream')
+        headers = {'Content-Type': content_type, 'Accept-Ranges': 'bytes'}
+
+        match = re.match(r'bytes=(\d+)-(\d*)$', handler.headers.get('Range', ''))
+        if match:
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) else len(data) - 1
+            end = min(end, len(data) - 1)
+            headers['Content-Range'] = f'bytes {start}-{end}/{len(data)}'
+            return send(206, headers, data[start:end + 1])
+
+        if handler.command == 'HEAD':
+            headers['Content-Length'] = str(len(data))
+            return 200, headers, b''
+        return send(200, headers, data)
+
+    server.route(prefix, handle)
+
+
+def bilibili_subtitle(lines: int) -> dict:
+    """生成B站字幕 JSON（body 列表）"""
+    return {
+        'body': [
+            {
+                'from': i * 2.0,
+                'to': i * 2.0 + 1.9,
+                'content': f'第{i}句字幕内容，讲解视频中的一个要点。',
+            }
+            for i in range(lines)
+        ],
+    }
+
+
+def youtube_json3(lines: int) -> dict:
+    """生成 YouTube json3 字幕（events/segs 结构，含换行分隔事件）"""
+    events = []
+    for i in range(lines):
+        events.append({
+            'tStartMs': i * 2000,
+            'dDurationMs': 1900,
+            'segs': [{'utf8': f'Caption line {i} about'}, {'utf8': ' the topic at hand'}],
+        })
+        events.append({'tStartMs': i * 2000 + 1900, 'segs': [{'utf8': '\n'}]})
+    return {'events': events}
+
+
+class RewriteAdapter(HTTPAdapter):
+    """
+    requests 传输适配器：把发往指定线上域名的请求改写到本地替身服务
+
+    挂载到 requests.Session 上，被测代码无需感知替身的存在。
+    """
+
+    def __init__(self, target: str, **kwargs):
+        super().__init__(**kwargs)
+        self.target = target.rstrip('/')
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        path = parts.path + (f'?{parts.query}' if parts.query else '')
+        request.url = f'{self.target}{path}'
+        return super().send(request, **kwargs)
+
+
+def rewriting_session(mapping: Dict[str, str]) -> requests.Session:
+    """
+    创建把线上地址改写到本地的 Session
+
+    Args:
+        mapping: {线上地址前缀: 本地地址前缀}，例如
+            {"https://api.bilibili.com": "http://127.0.0.1:8000/bilibili"}
+    """
+    session = requests.Session()
+    for remote, local in mapping.items():
+        session.mount(remote, RewriteAdapter(local))
+    return session
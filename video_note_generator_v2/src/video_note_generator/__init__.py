@@ -8,20 +8,34 @@ __version__ = "2.0.0"
 __author__ = "Your Name"
 __email__ = "grow8org@gmail.com"
 
-from .config import get_settings, Settings
-from .processor import VideoNoteProcessor
-from .downloader import VideoInfo, DownloadError
-from .transcriber import WhisperTranscriber
-from .ai_processor import AIProcessor
-from .utils.logger import setup_logger
-
-__all__ = [
-    "get_settings",
-    "Settings",
-    "VideoNoteProcessor",
-    "VideoInfo",
-    "DownloadError",
-    "WhisperTranscriber",
-    "AIProcessor",
-    "setup_logger",
-]
+import importlib
+
+# 导出名 -> 所在子模块；首次访问时才导入（PEP 562），
+# 避免 `import video_note_generator` 连带导入 openai / yt-dlp 等重依赖
+_EXPORTS = {
+    "get_settings": ".config",
+    "Settings": ".config",
+    "VideoNoteProcessor": ".processor",
+    "VideoInfo": ".downloader",
+    "DownloadError": ".downloader",
+    "WhisperTranscriber": ".transcriber",
+    "AIProcessor": ".ai_processor",
+    "NoteIndex": ".note_index",
+    "PlaylistExpander": ".playlist",
+    "setup_logger": ".utils.logger",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,16 +1,668 @@
 """
 AI 内容处理模块
 
-使用 OpenRouter 进行内容生成和优化
+使用 OpenRouter 进行内容生成和优化（openai SDK 在创建客户端时才导入）
 """
-from typing import Optional, List
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Optional, List, Dict, Tuple
+from dataclasses import dataclass, field
+import asyncio
+import hashlib
+import json
 import logging
-from openai import OpenAI
+import re
+import sqlite3
+import threading
+import time
+import weakref
+from pathlib import Path
 
+from .utils.metrics import LLM_REQUESTS, record_cache, record_llm_usage
+from .utils.rate_limiter import RateLimiter, backoff_delay
+from .utils import tracing
 from .utils.text_utils import split_content
 
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+
+class CompletionCache:
+    """LLM 响应缓存管理器（SQLite 持久化）"""
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        ttl: int = 7 * 24 * 3600,
+        max_entries: int = 5000,
+        logger: Optional[logging.Logger] = None
+    ):
+        """
+        初始化缓存管理器
+
+        Args:
+            cache_dir: 缓存目录
+            ttl: 缓存有效期（秒），0 表示永不过期
+            max_entries: 最大条目数，超出后按最近访问时间淘汰
+            logger: 日志记录器
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.cache_dir / "completions.sqlite3"
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.db_path),
+            timeout=30,
+            check_same_thread=False
+        )
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS completions (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_completions_accessed "
+                "ON completions (accessed_at)"
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def make_key(**request) -> str:
+        """
+        生成缓存键
+
+        Args:
+            **request: 完整的请求参数（模型、提示词、温度等）
+
+        Returns:
+            缓存键
+        """
+        payload = json.dumps(request, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        return self.ttl > 0 and now - created_at > self.ttl
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        从缓存获取响应
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            缓存的响应，如果不存在或已过期返回None
+        """
+        now = time.time()
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT response, created_at FROM completions WHERE key = ?",
+                    (key,)
+                ).fetchone()
+
+                if row and not self._is_expired(row[1], now):
+                    self._conn.execute(
+                        "UPDATE completions SET accessed_at = ? WHERE key = ?",
+                        (now, key)
+                    )
+                    self._conn.commit()
+                    self.hits += 1
+                    record_cache('llm', hit=True)
+                    return row[0]
+
+                if row:
+                    self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                record_cache('llm', hit=False)
+                return None
+
+        except sqlite3.Error as e:
+            self.logger.warning(f"读取LLM缓存失败: {e}")
+            self.misses += 1
+            record_cache('llm', hit=False)
+            return None
+
+    def set(self, key: str, response: str):
+        """
+        保存响应到缓存
+
+        Args:
+            key: 缓存键
+            response: 响应内容
+        """
+        now = time.time()
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO completions "
+                    "(key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, response, now, now)
+                )
+                self._evict(now)
+                self._conn.commit()
+        except sqlite3.Error as e:
+            self.logger.warning(f"保存LLM缓存失败: {e}")
+
+    def _evict(self, now: float):
+        """清理过期条目，并按最近访问时间淘汰超出容量的条目（调用方需持有锁）"""
+        if self.ttl > 0:
+            self._conn.execute(
+                "DELETE FROM completions WHERE created_at < ?",
+                (now - self.ttl,)
+            )
+
+        count = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM completions WHERE key IN ("
+                "SELECT key FROM completions ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,)
+            )
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute("DELETE FROM completions")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        """
+        获取缓存统计信息
+
+        Returns:
+            包含命中数、未命中数、命中率和条目数的字典
+        """
+        total = self.hits + self.misses
+        try:
+            with self._lock:
+                entries = self._conn.execute(
+                    "SELECT COUNT(*) FROM completions"
+                ).fetchone()[0]
+        except sqlite3.Error:
+            entries = -1
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries,
+        }
+
+
+# 进程内共享的 LLM 缓存（同一数据库文件只打开一个连接，Web 应用每个任务新建处理器时复用）
+_caches: Dict[str, CompletionCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_completion_cache(
+    cache_dir: Path,
+    ttl: int = 7 * 24 * 3600,
+    max_entries: int = 5000,
+    logger: Optional[logging.Logger] = None
+) -> CompletionCache:
+    """
+    获取共享的 LLM 响应缓存（同一目录只创建一次，配置以首次创建时为准）
+
+    Args:
+        cache_dir: 缓存目录
+        ttl: 缓存有效期（秒），0 表示永不过期
+        max_entries: 最大条目数
+        logger: 日志记录器
+
+    Returns:
+        缓存实例
+    """
+    key = str(Path(cache_dir).resolve())
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = CompletionCache(cache_dir, ttl=ttl, max_entries=max_entries, logger=logger)
+            _caches[key] = cache
+        return cache
+
+
+# 任务类型（用于按任务选择模型）
+TASK_ORGANIZE = "organize"
+TASK_BLOG = "blog"
+TASK_XIAOHONGSHU = "xiaohongshu"
+TASK_TITLES = "titles"
+TASK_KEYWORDS = "keywords"
+TASK_TRANSLATE = "translate"
+TASK_METADATA = "metadata"
+
+# 轻量任务：输出短、对模型能力要求低，适合交给便宜快速的模型
+LIGHT_TASKS = frozenset({TASK_TITLES, TASK_KEYWORDS, TASK_TRANSLATE, TASK_METADATA})
+
+# JSON 模式（结构化输出）
+JSON_RESPONSE_FORMAT = {"type": "json_object"}
+
+
+@dataclass
+class NoteMetadata:
+    """笔记元信息（一次结构化调用同时生成）"""
+    titles: List[str] = field(default_factory=list)
+    tags: List[str] = field(default_factory=list)
+    image_keywords: Optional[str] = None
+
+
+def parse_json_response(text: Optional[str]) -> Optional[dict]:
+    """
+    解析模型返回的 JSON 对象
+
+    兼容模型在 JSON 外包裹代码块或附加说明文字的情况
+
+    Args:
+        text: 模型输出
+
+    Returns:
+        解析得到的字典，失败返回None
+    """
+    if not text:
+        return None
+
+    text = re.sub(r'^```(?:json)?\s*|\s*```$', '', text.strip())
+    try:
+        data = json.loads(text)
+    except ValueError:
+        start, end = text.find('{'), text.rfind('}')
+        if start < 0 or end <= start:
+            return None
+        try:
+            data = json.loads(text[start:end + 1])
+        except ValueError:
+            return None
+
+    return data if isinstance(data, dict) else None
+
+
+class ModelRouter:
+    """
+    模型路由器
+
+    按任务类型选择主模型，并维护一条基于延迟的回退链：
+    主模型超时或出错时，按各回退模型近期的延迟和失败率依次接替。
+    延迟统计在进程内所有路由器之间共享。
+    """
+
+    # 模型健康统计：{模型: [延迟EWMA(秒), 失败率EWMA]}
+    _stats: Dict[str, List[float]] = {}
+    _stats_lock = threading.Lock()
+
+    _EWMA_ALPHA = 0.3
+
+    def __init__(
+        self,
+        default_model: str,
+        light_model: Optional[str] = None,
+        task_models: Optional[Dict[str, str]] = None,
+        fallback_models: Optional[List[str]] = None,
+        request_timeout: float = 600.0,
+        light_timeout: float = 30.0
+    ):
+        """
+        初始化模型路由器
+
+        Args:
+            default_model: 默认模型（长文本生成等重任务）
+            light_model: 轻量任务（关键词、标题、翻译）使用的模型，None 表示使用默认模型
+            task_models: 按任务覆盖的模型 {任务: 模型}
+            fallback_models: 回退模型列表
+            request_timeout: 普通任务的单次请求超时（秒）
+            light_timeout: 轻量任务的单次请求超时（秒），超时后尽快切换回退模型
+        """
+        self.default_model = default_model
+        self.light_model = light_model
+        self.task_models = dict(task_models or {})
+        self.fallback_models = list(fallback_models or [])
+        self.request_timeout = request_timeout
+        self.light_timeout = light_timeout
+
+    def primary_model(self, task: Optional[str] = None) -> str:
+        """获取任务的主模型"""
+        if task and task in self.task_models:
+            return self.task_models[task]
+        if task in LIGHT_TASKS and self.light_model:
+            return self.light_model
+        return self.default_model
+
+    def timeout(self, task: Optional[str] = None) -> float:
+        """获取任务的单次请求超时"""
+        return self.light_timeout if task in LIGHT_TASKS else self.request_timeout
+
+    def chain(self, task: Optional[str] = None) -> List[str]:
+        """
+        获取任务的模型调用链
+
+        主模型在前（近期失败率过高时降到最后），回退模型按健康分排序，
+        尚无统计数据的模型保持配置顺序排在已知模型之后
+
+        Args:
+            task: 任务类型
+
+        Returns:
+            模型名称列表
+        """
+        primary = self.primary_model(task)
+        candidates = []
+        for model in self.fallback_models + [self.default_model]:
+            if model != primary and model not in candidates:
+                candidates.append(model)
+
+        with self._stats_lock:
+            scores = {model: self._score(model) for model in candidates + [primary]}
+
+        fallbacks = sorted(
+            candidates,
+            key=lambda m: (scores[m] is None, scores[m] or 0.0, candidates.index(m))
+        )
+
+        primary_stats = self._stats.get(primary)
+        if primary_stats and primary_stats[1] > 0.5 and fallbacks:
+            return fallbacks + [primary]
+        return [primary] + fallbacks
+
+    def _score(self, model: str) -> Optional[float]:
+        """健康分（越小越好）：延迟按失败率加权，调用方需持有锁"""
+        stats = self._stats.get(model)
+        if not stats:
+            return None
+        latency, failure_rate = stats
+        return latency * (1 + 4 * failure_rate)
+
+    def record(self, model: str, latency: float, success: bool):
+        """
+        记录一次调用结果
+
+        Args:
+            model: 模型名称
+            latency: 耗时（秒）
+            success: 是否成功
+        """
+        alpha = self._EWMA_ALPHA
+        failure = 0.0 if success else 1.0
+        with self._stats_lock:
+            stats = self._stats.get(model)
+            if stats is None:
+                self._stats[model] = [latency, failure]
+            else:
+                stats[0] = (1 - alpha) * stats[0] + alpha * latency
+                stats[1] = (1 - alpha) * stats[1] + alpha * failure
+
+
+class _AIProcessorBase:
+    """AI 处理器公共逻辑（提示词构建、缓存键），同步与异步实现共用"""
+
+    def __init__(
+        self,
+        model: str,
+        logger: Optional[logging.Logger] = None,
+        cache: Optional[CompletionCache] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        max_retries: int = 5,
+        router: Optional[ModelRouter] = None
+    ):
+        self.logger = logger or logging.getLogger(__name__)
+        self.model = model
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.router = router or ModelRouter(default_model=model)
+
+    def _build_messages(self, system_prompt: str, user_prompt: str) -> List[dict]:
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+
+    def _after_response(self, headers):
+        """请求成功后根据响应头更新限流器"""
+        if self.rate_limiter:
+            self.rate_limiter.update_from_headers(headers)
+            self.rate_limiter.on_success()
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """
+        判断请求错误是否值得重试
+
+        429、5xx、408/409、超时和连接错误会重试，其余错误（如鉴权失败、参数错误）直接失败
 
-class AIProcessor:
+        Args:
+            error: 请求抛出的异常
+            attempt: 已重试次数
+
+        Returns:
+            重试前需要等待的秒数，不应重试时返回None
+        """
+        from openai import APIConnectionError, APIStatusError, RateLimitError
+
+        if attempt >= self.max_retries:
+            return None
+
+        if isinstance(error, APIStatusError):
+            status = error.status_code
+            if status != 429 and status not in (408, 409) and status < 500:
+                return None
+        elif not isinstance(error, APIConnectionError):
+            # APITimeoutError 是 APIConnectionError 的子类
+            return None
+
+        headers = None
+        if isinstance(error, APIStatusError):
+            headers = error.response.headers
+        retry_after = RateLimiter.parse_retry_after(headers)
+
+        if isinstance(error, RateLimitError) and self.rate_limiter:
+            self.rate_limiter.on_rate_limited(retry_after)
+
+        delay = backoff_delay(attempt)
+        if retry_after:
+            delay = max(delay, retry_after)
+        return delay
+
+    def _next_attempt(
+        self,
+        error: Exception,
+        attempt: int,
+        model_index: int,
+        models: List[str]
+    ) -> Optional[Tuple[float, int]]:
+        """
+        决定请求失败后的下一步
+
+        可恢复错误先沿回退链切换到下一个模型（不等待），整条链都失败后
+        按退避时间等待并从头再来；模型不可用类错误（400/404/422）只在
+        回退链内切换；鉴权等其余错误直接放弃
+
+        Args:
+            error: 请求抛出的异常
+            attempt: 已失败次数
+            model_index: 当前模型在调用链中的累计下标
+            models: 模型调用链
+
+        Returns:
+            (等待秒数, 下一个模型下标)，放弃时返回None
+        """
+        from openai import APIStatusError
+
+        next_index = model_index + 1
+        switches_model = next_index % len(models) != 0
+
+        delay = self._retry_delay(error, attempt)
+        if delay is not None:
+            return (0.0 if switches_model else delay), next_index
+
+        if (
+            isinstance(error, APIStatusError)
+            and error.status_code in (400, 404, 422)
+            and next_index < len(models)
+        ):
+            return 0.0, next_index
+
+        return None
+
+    def _record_success(self, model: str, task: Optional[str], response, latency: float):
+        """记录成功请求的耗时与 token 用量"""
+        self.router.record(model, latency, success=True)
+        usage = getattr(response, 'usage', None)
+        record_llm_usage(model, task, usage, latency)
+        span = tracing.current_span()
+        if span is not None and usage is not None:
+            span.set_attributes(
+                prompt_tokens=getattr(usage, 'prompt_tokens', None),
+                completion_tokens=getattr(usage, 'completion_tokens', None)
+            )
+
+    def _record_error(self, model: str, task: Optional[str], latency: float):
+        """记录失败请求"""
+        self.router.record(model, latency, success=False)
+        LLM_REQUESTS.inc(model=model, task=task or 'default', status='error')
+
+    def _log_fallback(self, error: Exception, model: str, next_model: str, delay: float):
+        if next_model != model:
+            self.logger.warning(f"模型 {model} 请求失败（{error}），切换到回退模型 {next_model}")
+        else:
+            self.logger.warning(
+                f"AI 请求失败（{error}），{delay:.1f} 秒后重试 ({model})"
+            )
+
+    def _log_failure(self, error: Exception, attempt: int):
+        if attempt:
+            self.logger.error(f"AI 生成失败（已重试 {attempt} 次）: {error}")
+        else:
+            self.logger.error(f"AI 生成失败: {error}")
+
+    def _cache_key(
+        self,
+        model: str,
+        system_prompt: str,
+        user_prompt: str,
+        temperature: float,
+        max_tokens: int,
+        response_format: Optional[dict] = None
+    ) -> str:
+        request = dict(
+            model=model,
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        if response_format:
+            request["response_format"] = response_format
+        return CompletionCache.make_key(**request)
+
+    @staticmethod
+    def _request_options(response_format: Optional[dict]) -> dict:
+        return {"response_format": response_format} if response_format else {}
+
+    @staticmethod
+    def _default_headers(app_name: str, http_referer: str) -> dict:
+        return {
+            "HTTP-Referer": http_referer,
+            "X-Title": app_name,
+        }
+
+    def _build_organize_prompts(self, content: str) -> Tuple[str, str]:
+        """构建内容整理的 (系统提示词, 用户提示词)"""
+        system_prompt = """你是一位著名的科普作家和博客作者，著作等身，屡获殊荣，尤其在内容创作领域有深厚的造诣。
+
+请使用 4C 模型（建立联系 Connection、展示冲突 Conflict、强调改变 Change、即时收获 Catch）为转录的文字内容创建结构。
+
+写作要求：
+- 从用户的问题出发，引导读者理解核心概念及其背景
+- 使用第二人称与读者对话，语气亲切平实
+- 确保所有观点和内容基于用户提供的转录文本
+- 如无具体实例，则不编造
+- 涉及复杂逻辑时，使用直观类比
+- 避免内容重复冗余
+- 逻辑递进清晰，从问题开始，逐步深入
+
+Markdown格式要求：
+- 大标题突出主题，吸引眼球，最好使用疑问句
+- 小标题简洁有力，结构清晰，尽量使用单词或短语
+- 直入主题，在第一部分清晰阐述问题和需求
+- 正文使用自然段，避免使用列表形式
+- 内容翔实，避免过度简略，特别注意保留原文中的数据和示例信息
+- 如有来源URL，使用文内链接形式
+- 保留原文中的Markdown格式图片链接"""
+
+        user_prompt = f"""请根据以下转录文字内容，创作一篇结构清晰、易于理解的博客文章。
+
+转录文字内容：
+
+{content}"""
+
+        return system_prompt, user_prompt
+
+    def _build_translate_prompts(self, text: str) -> Tuple[str, str]:
+        """构建关键词翻译的 (系统提示词, 用户提示词)"""
+        system_prompt = """你是一个翻译助手。请将输入的中文关键词翻译成最相关的1-3个英文关键词，用逗号分隔。
+直接返回翻译结果，不要加任何解释。
+
+例如：
+输入：'保险理财知识'
+输出：insurance,finance,investment"""
+
+        return system_prompt, text
+
+    def _build_image_keyword_prompts(self, content: str) -> Tuple[str, str]:
+        """构建图片关键词提取的 (系统提示词, 用户提示词)"""
+        system_prompt = """你是一个图片关键词提取专家。请从给定的视频内容中提取3-5个最核心的、适合图片搜索的英文关键词。
+
+要求：
+1. 关键词必须是具体的、可视化的名词或短语
+2. 优先提取主题、场景、物体、人物、活动等视觉元素
+3. 避免抽象概念，选择能找到相关图片的词汇
+4. 直接输出英文关键词，用逗号分隔
+5. 不要加任何解释或说明
+
+例如：
+内容：讲解Python编程基础，包括变量、函数和循环的使用
+输出：python programming,coding,computer,software development
+
+内容：介绍咖啡拉花技巧，如何制作完美的卡布奇诺
+输出：coffee art,cappuccino,barista,latte art,cafe
+
+内容：旅行vlog记录日本京都的寺庙和樱花
+输出：kyoto japan,temple,cherry blossom,japanese culture,travel"""
+
+        # 只使用前500字符来提取关键词
+        content_preview = content[:500] if len(content) > 500 else content
+
+        user_prompt = f"""请从以下内容中提取3-5个适合图片搜索的英文关键词：
+
+{content_preview}
+
+直接输出英文关键词（用逗号分隔）："""
+
+        return system_prompt, user_prompt
+
+    def _clean_image_keywords(self, result: Optional[str]) -> Optional[str]:
+        """清理关键词结果，移除可能的多余字符"""
+        if result:
+            result = result.strip().strip('"\'')
+            self.logger.info(f"提取的图片搜索关键词: {result}")
+        return result
+
+
+class AIProcessor(_AIProcessorBase):
     """AI 内容处理器"""
 
     def __init__(
@@ -20,7 +672,11 @@ class AIProcessor:
         model: str = "google/gemini-pro",
         app_name: str = "video_note_generator",
         http_referer: str = "https://github.com",
-        logger: Optional[logging.Logger] = None
+        logger: Optional[logging.Logger] = None,
+        cache: Optional[CompletionCache] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        max_retries: int = 5,
+        router: Optional[ModelRouter] = None
     ):
         """
         初始化 AI 处理器
@@ -32,17 +688,31 @@ class AIProcessor:
             app_name: 应用名称
             http_referer: HTTP Referer
             logger: 日志记录器
+            cache: LLM 响应缓存（None 表示不缓存）
+            rate_limiter: 共享的速率限制器（None 表示不限速）
+            max_retries: 429/5xx/超时等可恢复错误的最大重试次数
+            router: 模型路由器（None 表示所有任务都使用 model）
         """
-        self.logger = logger or logging.getLogger(__name__)
-        self.model = model
+        super().__init__(
+            model=model,
+            logger=logger,
+            cache=cache,
+            rate_limiter=rate_limiter,
+            max_retries=max_retries,
+            router=router
+        )
 
+        # openai SDK 请求时通过 sys.modules 查看 httpx，若 httpx 正在被其他线程导入，
+        # 会拿到未初始化完的模块；创建客户端前先完成导入
+        import httpx  # noqa: F401  pylint: disable=unused-import
+        from openai import OpenAI
+
+        # 重试由本类统一处理（带抖动退避并反馈给限流器），关闭 SDK 自带重试
         self.client = OpenAI(
             api_key=api_key,
             base_url=base_url,
-            default_headers={
-                "HTTP-Referer": http_referer,
-                "X-Title": app_name,
-            }
+            default_headers=self._default_headers(app_name, http_referer),
+            max_retries=0
         )
 
         # 测试连接
@@ -70,7 +740,10 @@ class AIProcessor:
         system_prompt: str,
         user_prompt: str,
         temperature: float = 0.7,
-        max_tokens: int = 2000
+        max_tokens: int = 2000,
+        use_cache: bool = True,
+        task: Optional[str] = None,
+        response_format: Optional[dict] = None
     ) -> Optional[str]:
         """
         生成内容
@@ -80,73 +753,143 @@ class AIProcessor:
             user_prompt: 用户提示词
             temperature: 温度参数
             max_tokens: 最大 token 数
+            use_cache: 是否使用缓存（False 时跳过缓存直接请求）
+            task: 任务类型（TASK_*），用于选择模型和超时
+            response_format: 结构化输出格式（如 JSON_RESPONSE_FORMAT）
 
         Returns:
             生成的内容
         """
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=temperature,
-                max_tokens=max_tokens
+        models = self.router.chain(task)
+        timeout = self.router.timeout(task)
+
+        cache_key = None
+        if self.cache and use_cache:
+            # 按首选模型查找；写入时按实际回答的模型，回退模型的回答不冒充首选模型
+            cache_key = self._cache_key(
+                self.router.primary_model(task),
+                system_prompt,
+                user_prompt,
+                temperature,
+                max_tokens,
+                response_format
             )
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self.logger.debug("使用缓存的 AI 生成结果")
+                tracing.add_event("llm.cache_hit", task=task or "default")
+                return cached
 
-            if response.choices:
-                return response.choices[0].message.content.strip()
+        messages = self._build_messages(system_prompt, user_prompt)
+        attempt = 0
+        model_index = 0
+        while True:
+            model = models[model_index % len(models)]
+            started = time.monotonic()
+            try:
+                with tracing.span("llm.request", model=model, task=task or "default", attempt=attempt + 1):
+                    response = self._request(
+                        timeout=timeout,
+                        model=model,
+                        messages=messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        **self._request_options(response_format)
+                    )
+                    self._record_success(model, task, response, time.monotonic() - started)
+                break
+            except Exception as e:
+                self._record_error(model, task, time.monotonic() - started)
+                step = self._next_attempt(e, attempt, model_index, models)
+                if step is None:
+                    self._log_failure(e, attempt)
+                    return None
+                delay, model_index = step
+                attempt += 1
+                self._log_fallback(e, model, models[model_index % len(models)], delay)
+                if delay > 0:
+                    time.sleep(delay)
 
+        # content 可能为 None（如被内容过滤截断），空结果按失败处理且不缓存
+        content = (response.choices[0].message.content or "").strip() if response.choices else ""
+        if not content:
+            self.logger.warning(f"模型 {model} 返回了空内容")
             return None
 
-        except Exception as e:
-            self.logger.error(f"AI 生成失败: {e}")
-            return None
+        if cache_key:
+            answered_key = self._cache_key(
+                model, system_prompt, user_prompt, temperature, max_tokens, response_format
+            )
+            self.cache.set(answered_key, content)
+        return content
 
-    def organize_content(self, content: str) -> str:
+    def _request(self, timeout: float, **kwargs):
+        """在限流器控制下发出一次请求"""
+        completions = self.client.with_options(timeout=timeout).chat.completions
+        if not self.rate_limiter:
+            raw = completions.with_raw_response.create(**kwargs)
+            return raw.parse()
+
+        # 先等令牌再占并发名额，被限速的请求不占着名额干等
+        self.rate_limiter.acquire()
+        with self.rate_limiter.slot():
+            raw = completions.with_raw_response.create(**kwargs)
+        self._after_response(raw.headers)
+        return raw.parse()
+
+    def generate_json(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        task: Optional[str] = None
+    ) -> Optional[dict]:
         """
-        整理内容为结构化文章
+        以 JSON 模式生成结构化内容
 
         Args:
-            content: 原始内容
+            system_prompt: 系统提示词（需说明输出的 JSON 结构）
+            user_prompt: 用户提示词
+            temperature: 温度参数
+            max_tokens: 最大 token 数
+            task: 任务类型（TASK_*）
 
         Returns:
-            整理后的内容
+            解析后的字典，失败返回None
         """
-        system_prompt = """你是一位著名的科普作家和博客作者，著作等身，屡获殊荣，尤其在内容创作领域有深厚的造诣。
-
-请使用 4C 模型（建立联系 Connection、展示冲突 Conflict、强调改变 Change、即时收获 Catch）为转录的文字内容创建结构。
+        result = self.generate_completion(
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            task=task,
+            response_format=JSON_RESPONSE_FORMAT
+        )
 
-写作要求：
-- 从用户的问题出发，引导读者理解核心概念及其背景
-- 使用第二人称与读者对话，语气亲切平实
-- 确保所有观点和内容基于用户提供的转录文本
-- 如无具体实例，则不编造
-- 涉及复杂逻辑时，使用直观类比
-- 避免内容重复冗余
-- 逻辑递进清晰，从问题开始，逐步深入
+        data = parse_json_response(result)
+        if result and data is None:
+            self.logger.warning("AI 返回的内容不是有效的 JSON")
+        return data
 
-Markdown格式要求：
-- 大标题突出主题，吸引眼球，最好使用疑问句
-- 小标题简洁有力，结构清晰，尽量使用单词或短语
-- 直入主题，在第一部分清晰阐述问题和需求
-- 正文使用自然段，避免使用列表形式
-- 内容翔实，避免过度简略，特别注意保留原文中的数据和示例信息
-- 如有来源URL，使用文内链接形式
-- 保留原文中的Markdown格式图片链接"""
-
-        user_prompt = f"""请根据以下转录文字内容，创作一篇结构清晰、易于理解的博客文章。
+    def organize_content(self, content: str) -> str:
+        """
+        整理内容为结构化文章
 
-转录文字内容：
+        Args:
+            content: 原始内容
 
-{content}"""
+        Returns:
+            整理后的内容
+        """
+        system_prompt, user_prompt = self._build_organize_prompts(content)
 
         result = self.generate_completion(
             system_prompt=system_prompt,
             user_prompt=user_prompt,
             temperature=0.7,
-            max_tokens=4000
+            max_tokens=4000,
+            task=TASK_ORGANIZE
         )
 
         return result if result else content
@@ -177,7 +920,8 @@ Markdown格式要求：
 
         for i, chunk in enumerate(chunks, 1):
             self.logger.info(f"正在处理第 {i}/{len(chunks)} 部分...")
-            organized_chunk = self.organize_content(chunk)
+            with tracing.span("llm.organize_chunk", chunk_index=i, chunk_count=len(chunks), chars=len(chunk)):
+                organized_chunk = self.organize_content(chunk)
             if organized_chunk:
                 organized_chunks.append(organized_chunk)
 
@@ -193,18 +937,14 @@ Markdown格式要求：
         Returns:
             英文关键词
         """
-        system_prompt = """你是一个翻译助手。请将输入的中文关键词翻译成最相关的1-3个英文关键词，用逗号分隔。
-直接返回翻译结果，不要加任何解释。
-
-例如：
-输入：'保险理财知识'
-输出：insurance,finance,investment"""
+        system_prompt, user_prompt = self._build_translate_prompts(text)
 
         result = self.generate_completion(
             system_prompt=system_prompt,
-            user_prompt=text,
+            user_prompt=user_prompt,
             temperature=0.3,
-            max_tokens=50
+            max_tokens=50,
+            task=TASK_TRANSLATE
         )
 
         return result
@@ -219,44 +959,437 @@ Markdown格式要求：
         Returns:
             英文关键词（逗号分隔）
         """
-        system_prompt = """你是一个图片关键词提取专家。请从给定的视频内容中提取3-5个最核心的、适合图片搜索的英文关键词。
+        system_prompt, user_prompt = self._build_image_keyword_prompts(content)
 
-要求：
-1. 关键词必须是具体的、可视化的名词或短语
-2. 优先提取主题、场景、物体、人物、活动等视觉元素
-3. 避免抽象概念，选择能找到相关图片的词汇
-4. 直接输出英文关键词，用逗号分隔
-5. 不要加任何解释或说明
+        result = self.generate_completion(
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+            temperature=0.3,
+            max_tokens=100,
+            task=TASK_KEYWORDS
+        )
 
-例如：
-内容：讲解Python编程基础，包括变量、函数和循环的使用
-输出：python programming,coding,computer,software development
+        return self._clean_image_keywords(result)
 
-内容：介绍咖啡拉花技巧，如何制作完美的卡布奇诺
-输出：coffee art,cappuccino,barista,latte art,cafe
 
-内容：旅行vlog记录日本京都的寺庙和樱花
-输出：kyoto japan,temple,cherry blossom,japanese culture,travel"""
+class AsyncAIProcessor(_AIProcessorBase):
+    """
+    异步 AI 内容处理器
 
-        # 只使用前500字符来提取关键词
-        content_preview = content[:500] if len(content) > 500 else content
+    与 AIProcessor 接口一致，基于共享的 AsyncOpenAI 客户端（连接池复用），
+    适合在单个事件循环中并发驱动大量请求（如 FastAPI 层）。
+    CLI 等同步场景请继续使用 AIProcessor。
+    """
 
-        user_prompt = f"""请从以下内容中提取3-5个适合图片搜索的英文关键词：
+    # 共享客户端：事件循环 -> {连接配置: 客户端}，避免每个处理器各自建立连接池；
+    # 以循环对象为弱引用键，循环被回收后其条目自动消失，不会被复用同一 id 的新循环误取
+    _shared_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+    _clients_lock = threading.Lock()
 
-{content_preview}
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = "https://openrouter.ai/api/v1",
+        model: str = "google/gemini-pro",
+        app_name: str = "video_note_generator",
+        http_referer: str = "https://github.com",
+        logger: Optional[logging.Logger] = None,
+        cache: Optional[CompletionCache] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        max_retries: int = 5,
+        router: Optional[ModelRouter] = None,
+        max_connections: int = 100,
+        max_concurrency: int = 8
+    ):
+        """
+        初始化异步 AI 处理器
 
-直接输出英文关键词（用逗号分隔）："""
+        Args:
+            api_key: API 密钥
+            base_url: API 基础 URL
+            model: 使用的模型名称
+            app_name: 应用名称
+            http_referer: HTTP Referer
+            logger: 日志记录器
+            cache: LLM 响应缓存（None 表示不缓存）
+            rate_limiter: 共享的速率限制器（None 表示不限速）
+            max_retries: 429/5xx/超时等可恢复错误的最大重试次数
+            router: 模型路由器（None 表示所有任务都使用 model）
+            max_connections: 共享连接池的最大连接数
+            max_concurrency: organize_long_content 并发处理的分块数
+        """
+        super().__init__(
+            model=model,
+            logger=logger,
+            cache=cache,
+            rate_limiter=rate_limiter,
+            max_retries=max_retries,
+            router=router
+        )
+        self.api_key = api_key
+        self.base_url = base_url
+        self.app_name = app_name
+        self.http_referer = http_referer
+        self.max_connections = max_connections
+        self.max_concurrency = max(1, max_concurrency)
 
-        result = self.generate_completion(
+    @property
+    def client(self) -> AsyncOpenAI:
+        """获取当前事件循环上的共享 AsyncOpenAI 客户端（需在事件循环内调用）"""
+        import httpx
+        from openai import AsyncOpenAI
+
+        loop = asyncio.get_running_loop()
+        key = (self.api_key, self.base_url, self.app_name, self.http_referer)
+
+        with self._clients_lock:
+            clients = self._shared_clients.setdefault(loop, {})
+            client = clients.get(key)
+            if client is None:
+                http_client = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_connections
+                    ),
+                    timeout=httpx.Timeout(600.0, connect=10.0)
+                )
+                client = AsyncOpenAI(
+                    api_key=self.api_key,
+                    base_url=self.base_url,
+                    default_headers=self._default_headers(self.app_name, self.http_referer),
+                    http_client=http_client,
+                    max_retries=0
+                )
+                clients[key] = client
+            return client
+
+    @classmethod
+    async def aclose_shared_clients(cls):
+        """关闭当前事件循环上的共享客户端（应用关闭时调用）"""
+        with cls._clients_lock:
+            clients = cls._shared_clients.pop(asyncio.get_running_loop(), {})
+
+        for client in clients.values():
+            await client.close()
+
+    async def test_connection(self) -> bool:
+        """
+        测试 API 连接
+
+        Returns:
+            连接是否成功
+        """
+        try:
+            self.logger.info("正在测试 OpenRouter API 连接...")
+            await self.client.models.list()
+            self.logger.info("OpenRouter API 连接成功")
+            return True
+        except Exception as e:
+            self.logger.warning(f"OpenRouter API 连接测试失败: {e}")
+            self.logger.warning("将继续尝试使用 API，但可能会遇到问题")
+            return False
+
+    async def generate_completion(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        use_cache: bool = True,
+        task: Optional[str] = None,
+        response_format: Optional[dict] = None
+    ) -> Optional[str]:
+        """
+        生成内容
+
+        Args:
+            system_prompt: 系统提示词
+            user_prompt: 用户提示词
+            temperature: 温度参数
+            max_tokens: 最大 token 数
+            use_cache: 是否使用缓存（False 时跳过缓存直接请求）
+            task: 任务类型（TASK_*），用于选择模型和超时
+            response_format: 结构化输出格式（如 JSON_RESPONSE_FORMAT）
+
+        Returns:
+            生成的内容
+        """
+        loop = asyncio.get_running_loop()
+
+        models = self.router.chain(task)
+        timeout = self.router.timeout(task)
+
+        cache_key = None
+        if self.cache and use_cache:
+            # 按首选模型查找；写入时按实际回答的模型，回退模型的回答不冒充首选模型
+            cache_key = self._cache_key(
+                self.router.primary_model(task),
+                system_prompt,
+                user_prompt,
+                temperature,
+                max_tokens,
+                response_format
+            )
+            # SQLite 访问放到线程池，避免阻塞事件循环
+            cached = await loop.run_in_executor(None, self.cache.get, cache_key)
+            if cached is not None:
+                self.logger.debug("使用缓存的 AI 生成结果")
+                tracing.add_event("llm.cache_hit", task=task or "default")
+                return cached
+
+        messages = self._build_messages(system_prompt, user_prompt)
+        attempt = 0
+        model_index = 0
+        while True:
+            model = models[model_index % len(models)]
+            started = time.monotonic()
+            try:
+                with tracing.span("llm.request", model=model, task=task or "default", attempt=attempt + 1):
+                    response = await self._request(
+                        timeout=timeout,
+                        model=model,
+                        messages=messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        **self._request_options(response_format)
+                    )
+                    self._record_success(model, task, response, time.monotonic() - started)
+                break
+            except Exception as e:
+                self._record_error(model, task, time.monotonic() - started)
+                step = self._next_attempt(e, attempt, model_index, models)
+                if step is None:
+                    self._log_failure(e, attempt)
+                    return None
+                delay, model_index = step
+                attempt += 1
+                self._log_fallback(e, model, models[model_index % len(models)], delay)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+        # content 可能为 None（如被内容过滤截断），空结果按失败处理且不缓存
+        content = (response.choices[0].message.content or "").strip() if response.choices else ""
+        if not content:
+            self.logger.warning(f"模型 {model} 返回了空内容")
+            return None
+
+        if cache_key:
+            answered_key = self._cache_key(
+                model, system_prompt, user_prompt, temperature, max_tokens, response_format
+            )
+            await loop.run_in_executor(None, self.cache.set, answered_key, content)
+        return content
+
+    async def _request(self, timeout: float, **kwargs):
+        """在限流器控制下发出一次请求"""
+        completions = self.client.with_options(timeout=timeout).chat.completions
+        if not self.rate_limiter:
+            raw = await completions.with_raw_response.create(**kwargs)
+            return raw.parse()
+
+        # 先等令牌再占并发名额，被限速的请求不占着名额干等
+        await self.rate_limiter.acquire_async()
+        async with self.rate_limiter.async_slot():
+            raw = await completions.with_raw_response.create(**kwargs)
+        self._after_response(raw.headers)
+        return raw.parse()
+
+    async def generate_json(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        task: Optional[str] = None
+    ) -> Optional[dict]:
+        """
+        以 JSON 模式生成结构化内容
+
+        Args:
+            system_prompt: 系统提示词（需说明输出的 JSON 结构）
+            user_prompt: 用户提示词
+            temperature: 温度参数
+            max_tokens: 最大 token 数
+            task: 任务类型（TASK_*）
+
+        Returns:
+            解析后的字典，失败返回None
+        """
+        result = await self.generate_completion(
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            task=task,
+            response_format=JSON_RESPONSE_FORMAT
+        )
+
+        data = parse_json_response(result)
+        if result and data is None:
+            self.logger.warning("AI 返回的内容不是有效的 JSON")
+        return data
+
+    async def organize_content(self, content: str) -> str:
+        """
+        整理内容为结构化文章
+
+        Args:
+            content: 原始内容
+
+        Returns:
+            整理后的内容
+        """
+        system_prompt, user_prompt = self._build_organize_prompts(content)
+
+        result = await self.generate_completion(
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+            temperature=0.7,
+            max_tokens=4000,
+            task=TASK_ORGANIZE
+        )
+
+        return result if result else content
+
+    async def organize_long_content(
+        self,
+        content: str,
+        chunk_size: int = 2000
+    ) -> str:
+        """
+        整理长内容（分块并发处理，结果保持原始顺序）
+
+        Args:
+            content: 原始内容
+            chunk_size: 分块大小
+
+        Returns:
+            整理后的内容
+        """
+        if not content or not content.strip():
+            return ""
+
+        # 分割内容
+        chunks = split_content(content, max_chars=chunk_size)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        self.logger.info(f"内容将分为 {len(chunks)} 个部分进行处理")
+
+        async def organize_chunk(index: int, chunk: str) -> str:
+            async with semaphore:
+                self.logger.info(f"正在处理第 {index}/{len(chunks)} 部分...")
+                with tracing.span(
+                    "llm.organize_chunk",
+                    chunk_index=index,
+                    chunk_count=len(chunks),
+                    chars=len(chunk)
+                ):
+                    return await self.organize_content(chunk)
+
+        organized_chunks = await asyncio.gather(
+            *(organize_chunk(i, chunk) for i, chunk in enumerate(chunks, 1))
+        )
+
+        return "\n\n".join(chunk for chunk in organized_chunks if chunk)
+
+    async def translate_to_english(self, text: str) -> Optional[str]:
+        """
+        将中文翻译成英文关键词
+
+        Args:
+            text: 中文文本
+
+        Returns:
+            英文关键词
+        """
+        system_prompt, user_prompt = self._build_translate_prompts(text)
+
+        return await self.generate_completion(
             system_prompt=system_prompt,
             user_prompt=user_prompt,
             temperature=0.3,
-            max_tokens=100
+            max_tokens=50,
+            task=TASK_TRANSLATE
         )
 
-        if result:
-            # 清理结果，移除可能的多余字符
-            result = result.strip().strip('"\'')
-            self.logger.info(f"提取的图片搜索关键词: {result}")
+    async def extract_image_keywords(self, content: str) -> Optional[str]:
+        """
+        从内容中提取适合图片搜索的英文关键词
 
-        return result
+        Args:
+            content: 视频内容文本
+
+        Returns:
+            英文关键词（逗号分隔）
+        """
+        system_prompt, user_prompt = self._build_image_keyword_prompts(content)
+
+        result = await self.generate_completion(
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+            temperature=0.3,
+            max_tokens=100,
+            task=TASK_KEYWORDS
+        )
+
+        return self._clean_image_keywords(result)
+
+
+class LoopBoundAIProcessor:
+    """
+    在工作线程中使用 AsyncAIProcessor 的同步适配器
+
+    接口与 AIProcessor 一致：每次调用把协程提交到指定的事件循环（如 Web 应用的主循环）执行并等待结果。
+    各任务的 LLM 请求因此共用该循环上的共享连接池，长内容的分块也在循环上并发整理；
+    下载、转录等阻塞步骤仍留在调用方的线程中。调用线程的上下文随协程一起提交，链路追踪与用量统计照常归属当前任务。
+    """
+
+    def __init__(self, processor: AsyncAIProcessor, loop: asyncio.AbstractEventLoop):
+        """
+        初始化适配器
+
+        Args:
+            processor: 异步 AI 处理器
+            loop: 执行请求的事件循环（需在其他线程中运行）
+        """
+        self.processor = processor
+        self.loop = loop
+
+    def __getattr__(self, name: str):
+        # cache、router、model 等属性直接取自异步处理器
+        return getattr(self.processor, name)
+
+    def _run(self, coro):
+        """在事件循环上执行协程并等待结果"""
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            coro.close()
+            raise RuntimeError("不能在 AI 处理器所在的事件循环线程中同步等待请求")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def generate_completion(self, *args, **kwargs) -> Optional[str]:
+        """同 AIProcessor.generate_completion"""
+        return self._run(self.processor.generate_completion(*args, **kwargs))
+
+    def generate_json(self, *args, **kwargs) -> Optional[dict]:
+        """同 AIProcessor.generate_json"""
+        return self._run(self.processor.generate_json(*args, **kwargs))
+
+    def organize_content(self, content: str) -> str:
+        """同 AIProcessor.organize_content"""
+        return self._run(self.processor.organize_content(content))
+
+    def organize_long_content(self, content: str, chunk_size: int = 2000) -> str:
+        """同 AIProcessor.organize_long_content（分块在事件循环上并发处理）"""
+        return self._run(self.processor.organize_long_content(content, chunk_size=chunk_size))
+
+    def translate_to_english(self, text: str) -> Optional[str]:
+        """同 AIProcessor.translate_to_english"""
+        return self._run(self.processor.translate_to_english(text))
+
+    def extract_image_keywords(self, content: str) -> Optional[str]:
+        """同 AIProcessor.extract_image_keywords"""
+        return self._run(self.processor.extract_image_keywords(content))
@@ -0,0 +1,429 @@
+"""
+流式音频解码模块
+
+下载得到的字节直接写入 ffmpeg 的 stdin，ffmpeg 在 stdout 输出 16kHz 单声道 PCM，
+放入有界环形缓冲区，由转录器按窗口逐段读取：
+- 下载、解码、转录三者同时进行，不产生中间文件
+- 缓冲区写满时 ffmpeg 的输出被阻塞，进而阻塞下载，内存占用有上限
+- FileTailFeeder 跟随正在下载的文件，用于下载器只能写文件的情况（增量转录）
+"""
+from __future__ import annotations
+
+import logging
+import subprocess
+import threading
+from collections import deque
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional, Union
+
+from .utils import tracing
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# 与 Whisper 的输入格式一致（whisper.audio.SAMPLE_RATE / CHUNK_LENGTH）
+SAMPLE_RATE = 16000
+BYTES_PER_SAMPLE = 2
+WINDOW_SECONDS = 30
+
+
+class PCMRingBuffer:
+    """有界的 PCM 字节环形缓冲区（一个写入线程、一个读取线程）"""
+
+    def __init__(self, capacity_seconds: float = 120, sample_rate: int = SAMPLE_RATE):
+        """
+        初始化缓冲区
+
+        Args:
+            capacity_seconds: 容量（秒）
+            sample_rate: 采样率
+        """
+        self.capacity = int(capacity_seconds * sample_rate) * BYTES_PER_SAMPLE
+        self._buffer = bytearray(self.capacity)
+        self._start = 0
+        self._size = 0
+        self._closed = False
+        self._error: Optional[BaseException] = None
+        self._cond = threading.Condition()
+        self.total_bytes = 0
+
+    @property
+    def error(self) -> Optional[BaseException]:
+        """写入端关闭时附带的错误"""
+        return self._error
+
+    def write(self, data: bytes) -> bool:
+        """
+        写入数据，空间不足时阻塞等待读取
+
+        Args:
+            data: PCM 字节
+
+        Returns:
+            缓冲区已关闭（读取端放弃）时返回 False
+        """
+        view = memoryview(data)
+        while view:
+            with self._cond:
+                while self._size == self.capacity and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return False
+                end = (self._start + self._size) % self.capacity
+                count = min(len(view), self.capacity - self._size, self.capacity - end)
+                self._buffer[end:end + count] = view[:count]
+                self._size += count
+                self.total_bytes += count
+                self._cond.notify_all()
+            view = view[count:]
+        return True
+
+    def read(self, size: int) -> bytes:
+        """
+        读取 size 字节，数据不足时阻塞；写入端关闭后返回剩余数据（可能为空）
+
+        Args:
+            size: 字节数
+
+        Returns:
+            读取到的数据
+        """
+        out = bytearray()
+        with self._cond:
+            while len(out) < size:
+                while self._size == 0 and not self._closed:
+                    self._cond.wait()
+                if self._size == 0:
+                    break
+                count = min(size - len(out), self._size, self.capacity - self._start)
+                out += self._buffer[self._start:self._start + count]
+                self._start = (self._start + count) % self.capacity
+                self._size -= count
+                self._cond.notify_all()
+        return bytes(out)
+
+    def close(self, error: Optional[BaseException] = None):
+        """
+        关闭缓冲区，唤醒所有等待的读写方
+
+        Args:
+            error: 写入端失败时的异常（读完剩余数据后由读取方抛出）
+        """
+        with self._cond:
+            self._closed = True
+            if error is not None and self._error is None:
+                self._error = error
+            self._cond.notify_all()
+
+
+class FFmpegPCMStream:
+    """
+    ffmpeg 流式解码器
+
+    三种输入方式：
+    - 传入字节迭代器（如 HTTP 响应流），由内部线程写入 ffmpeg
+    - 传入 input_path，由 ffmpeg 直接读取本地文件（可随机访问，支持 moov 在末尾的 mp4）
+    - 都不传，调用方自行 feed() / close_input()
+    """
+
+    def __init__(
+        self,
+        source: Optional[Iterable[bytes]] = None,
+        ffmpeg: str = "ffmpeg",
+        buffer_seconds: float = 120,
+        logger: Optional[logging.Logger] = None,
+        input_path: Optional[Union[str, Path]] = None
+    ):
+        """
+        初始化解码器
+
+        Args:
+            source: 媒体字节迭代器（可选）
+            ffmpeg: ffmpeg 可执行文件
+            buffer_seconds: PCM 缓冲区容量（秒）
+            logger: 日志记录器
+            input_path: 本地媒体文件（可选，与 source 二选一）
+        """
+        if source is not None and input_path is not None:
+            raise ValueError("source 与 input_path 只能指定一个")
+        self.source = source
+        self.input_path = input_path
+        self.ffmpeg = ffmpeg
+        self.buffer = PCMRingBuffer(buffer_seconds)
+        self.logger = logger or logging.getLogger(__name__)
+        self.bytes_in = 0
+        self._process: Optional[subprocess.Popen] = None
+        self._threads: list = []
+        self._stopped = threading.Event()
+        self._stderr: deque = deque(maxlen=20)
+
+    @property
+    def decoded_seconds(self) -> float:
+        """已解码的音频时长（秒）"""
+        return self.buffer.total_bytes / BYTES_PER_SAMPLE / SAMPLE_RATE
+
+    def start(self) -> 'FFmpegPCMStream':
+        """启动 ffmpeg 和读写线程"""
+        cmd = [
+            self.ffmpeg, "-hide_banner", "-loglevel", "error",
+            "-i", str(self.input_path) if self.input_path is not None else "pipe:0",
+            "-vn", "-f", "s16le", "-acodec", "pcm_s16le", "-ac", "1", "-ar", str(SAMPLE_RATE),
+            "pipe:1",
+        ]
+        self._process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL if self.input_path is not None else subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        targets = [(self._read_stdout, "pcm-reader"), (self._read_stderr, "pcm-stderr")]
+        if self.source is not None:
+            targets.append((self._feed_source, "pcm-feeder"))
+        for target, name in targets:
+            # 追踪上下文带进线程，下载流内的 span 挂在当前阶段下
+            thread = threading.Thread(target=tracing.wrap_context(target), name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def feed(self, data: bytes) -> bool:
+        """
+        写入一段媒体字节（ffmpeg 处理不过来时阻塞）
+
+        Args:
+            data: 媒体数据
+
+        Returns:
+            解码器已停止时返回 False
+        """
+        if self._stopped.is_set() or self._process is None or self._process.stdin is None:
+            return False
+        try:
+            self._process.stdin.write(data)
+        except (BrokenPipeError, ValueError, OSError):
+            return False
+        self.bytes_in += len(data)
+        return True
+
+    def close_input(self):
+        """输入结束，ffmpeg 处理完剩余数据后退出"""
+        if self._process is not None and self._process.stdin is not None:
+            try:
+                self._process.stdin.close()
+            except OSError:
+                pass
+
+    def windows(self, seconds: float = WINDOW_SECONDS) -> Iterator[np.ndarray]:
+        """
+        按固定时长读取音频窗口（最后一个窗口可能较短）
+
+        Args:
+            seconds: 窗口长度（秒）
+
+        Yields:
+            float32 波形，取值范围 [-1, 1]（与 whisper.load_audio 相同）
+
+        Raises:
+            RuntimeError: 输入或解码失败
+        """
+        import numpy as np
+
+        window_bytes = int(seconds * SAMPLE_RATE) * BYTES_PER_SAMPLE
+        while True:
+            data = self.buffer.read(window_bytes)
+            if len(data) < BYTES_PER_SAMPLE:
+                break
+            data = data[:len(data) - len(data) % BYTES_PER_SAMPLE]
+            yield np.frombuffer(data, np.int16).astype(np.float32) / 32768.0
+        if self.buffer.error is not None:
+            raise RuntimeError(f"流式解码失败: {self.buffer.error}") from self.buffer.error
+
+    def close(self):
+        """停止解码（可重复调用），结束 ffmpeg 和所有线程"""
+        self._stopped.set()
+        self.buffer.close()
+        if self._process is not None and self._process.poll() is None:
+            self._process.kill()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        if self._process is not None:
+            self._process.wait()
+
+    def _feed_source(self):
+        try:
+            for chunk in self.source:
+                if not chunk:
+                    continue
+                if not self.feed(chunk):
+                    break
+        except Exception as e:
+            # 下载失败：记录错误并终止解码，避免把不完整的音频当作完整结果
+            self.buffer.close(e)
+            if self._process.poll() is None:
+                self._process.kill()
+        finally:
+            close = getattr(self.source, "close", None)
+            if close is not None:
+                close()
+            self.close_input()
+
+    def _read_stdout(self):
+        stdout = self._process.stdout
+        while True:
+            data = stdout.read1(64 * 1024)
+            if not data or not self.buffer.write(data):
+                break
+        returncode = self._process.wait()
+        error = None
+        if returncode != 0 and not self._stopped.is_set() and self.buffer.error is None:
+            detail = b"".join(self._stderr).decode("utf-8", "replace").strip()
+            error = RuntimeError(f"ffmpeg 退出码 {returncode}: {detail[-300:]}")
+        self.buffer.close(error)
+
+    def _read_stderr(self):
+        for line in self._process.stderr:
+            self._stderr.append(line)
+
+    def __enter__(self) -> 'FFmpegPCMStream':
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class FileTailFeeder:
+    """
+    跟随正在下载的文件，把新写入的部分依次交给 FFmpegPCMStream
+
+    下载器只报告 (路径, 已写入字节数)，读取在独立线程中进行，不阻塞下载。
+    xxx.part 重命名为 xxx 视为同一个文件；出现其他文件（换了下载器）或文件变短
+    （下载从头重试）时，已送入的数据不再可靠，标记为 invalid 并停止解码。
+    """
+
+    def __init__(
+        self,
+        stream: FFmpegPCMStream,
+        poll_interval: float = 0.5,
+        chunk_size: int = 256 * 1024,
+        logger: Optional[logging.Logger] = None
+    ):
+        """
+        初始化并启动跟随线程
+
+        Args:
+            stream: 已启动的解码器
+            poll_interval: 没有进度通知时检查文件的间隔（秒）
+            chunk_size: 每次送入 ffmpeg 的字节数
+            logger: 日志记录器
+        """
+        self.stream = stream
+        self.poll_interval = poll_interval
+        self.chunk_size = chunk_size
+        self.logger = logger or logging.getLogger(__name__)
+        self.invalid = False
+        self.completed = False
+        self._key: Optional[str] = None
+        self._path: Optional[Path] = None
+        self._limit: Optional[int] = None
+        self._offset = 0
+        self._finished = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(
+            target=tracing.wrap_context(self._run), name="pcm-tail", daemon=True
+        )
+        self._thread.start()
+
+    @staticmethod
+    def _identity(path: Union[str, Path]) -> str:
+        path = str(path)
+        return path[:-len(".part")] if path.endswith(".part") else path
+
+    def update(self, path: Union[str, Path], size: Optional[int] = None):
+        """
+        下载进度通知（可作为 downloader.base.progress_listener 的回调）
+
+        Args:
+            path: 正在写入的文件
+            size: 已写入的字节数，None 表示以文件当前大小为准
+        """
+        with self._cond:
+            if self._finished or self.invalid:
+                return
+            self._switch(path, size)
+            self._cond.notify_all()
+
+    def finish(self, path: Optional[Union[str, Path]] = None):
+        """
+        下载结束（成功或失败），送完剩余数据后关闭 ffmpeg 输入
+
+        Args:
+            path: 最终文件（下载器没有报告进度时，从头读取整个文件）
+        """
+        with self._cond:
+            if path is not None and not self.invalid:
+                self._switch(path, None)
+            self._finished = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def _switch(self, path: Union[str, Path], size: Optional[int]):
+        key = self._identity(path)
+        if self._key is None:
+            self._key = key
+        elif key != self._key:
+            self._invalidate(f"下载文件发生变化: {Path(self._key).name} -> {Path(key).name}")
+            return
+        self._path = Path(path)
+        self._limit = size
+
+    def _invalidate(self, reason: str):
+        if not self.invalid:
+            self.invalid = True
+            self.logger.info(f"增量转录中止（{reason}），下载完成后转录完整文件")
+            self._cond.notify_all()
+
+    def _run(self):
+        try:
+            while True:
+                with self._cond:
+                    if not (self._finished or self.invalid):
+                        self._cond.wait(self.poll_interval)
+                    path, limit, finished = self._path, self._limit, self._finished
+                if self.invalid:
+                    return
+                if path is not None and not self._pump(path, None if finished else limit):
+                    return
+                if finished:
+                    self.completed = self._offset > 0 and not self.invalid
+                    return
+        finally:
+            if self.invalid:
+                self.stream.close()
+            else:
+                self.stream.close_input()
+
+    def _pump(self, path: Path, limit: Optional[int]) -> bool:
+        """读取新写入的部分送入 ffmpeg，返回 False 表示应停止跟随"""
+        if not path.exists():
+            # .part 已被重命名
+            path = Path(self._key)
+            if not path.exists():
+                return True
+        size = path.stat().st_size
+        if size < self._offset:
+            with self._cond:
+                self._invalidate("文件被截断，下载可能已从头重试")
+            return False
+        end = size if limit is None else min(limit, size)
+        if end <= self._offset:
+            return True
+        with open(path, "rb") as f:
+            f.seek(self._offset)
+            while self._offset < end:
+                data = f.read(min(self.chunk_size, end - self._offset))
+                if not data:
+                    break
+                if not self.stream.feed(data):
+                    return False
+                self._offset += len(data)
+        return True
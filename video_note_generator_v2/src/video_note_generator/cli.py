@@ -1,6 +1,7 @@
 """
 命令行界面
 """
+import json
 import sys
 from pathlib import Path
 from typing import List
@@ -9,9 +10,10 @@ from rich.console import Console
 from rich.progress import Progress, SpinnerColumn, TextColumn
 
 from .config import get_settings
+from .utils import metrics
 from .utils.logger import setup_logger
+from .utils.profiling import PROFILE_MODES, maybe_profile
 from .utils.text_utils import extract_urls
-from .processor import VideoNoteProcessor
 
 console = Console()
 
@@ -27,7 +29,22 @@ def cli():
 @click.argument('input_source')
 @click.option('--no-xiaohongshu', is_flag=True, help='不生成小红书版本')
 @click.option('--config', type=click.Path(exists=True), help='配置文件路径')
-def process(input_source: str, no_xiaohongshu: bool, config: str):
+@click.option('--metrics-file', type=click.Path(), help='把运行指标摘要（JSON）写入文件')
+@click.option('--profile', type=click.Choice(PROFILE_MODES), default=None,
+              help='对每个视频做性能剖析，结果保存在输出目录')
+@click.option('--profile-top', type=int, default=30, show_default=True, help='剖析摘要中列出的函数数量')
+@click.option('--no-expand', is_flag=True, help='不展开分P视频、合集和播放列表，只处理链接指向的单个视频')
+@click.option('--merge', is_flag=True, help='分P视频、合集和播放列表额外生成一份合并笔记')
+def process(
+    input_source: str,
+    no_xiaohongshu: bool,
+    config: str,
+    metrics_file: str,
+    profile: str,
+    profile_top: int,
+    no_expand: bool,
+    merge: bool
+):
     """
     处理视频链接或包含链接的文件
 
@@ -35,6 +52,8 @@ def process(input_source: str, no_xiaohongshu: bool, config: str):
     - 单个视频 URL
     - 包含 URL 的文本文件
     - Markdown 文件（自动提取链接）
+
+    B站分P视频、合集与 YouTube 播放列表默认展开为逐集任务并发处理。
     """
     # 加载配置
     settings = get_settings()
@@ -57,7 +76,9 @@ def process(input_source: str, no_xiaohongshu: bool, config: str):
 
     console.print(f"[cyan]找到 {len(urls)} 个视频链接[/cyan]\n")
 
-    # 创建处理器
+    # 创建处理器（处理器依赖较重，只在 process 命令中导入，check 等命令秒开）
+    from .processor import VideoNoteProcessor
+
     processor = VideoNoteProcessor(settings=settings, logger=logger)
 
     # 处理视频
@@ -77,7 +98,27 @@ def process(input_source: str, no_xiaohongshu: bool, config: str):
             console.print(f"\n[yellow]正在处理:[/yellow] {url}")
 
             try:
-                files = processor.process_video(url, generate_xiaohongshu)
+                with maybe_profile(
+                    profile,
+                    settings.output_dir,
+                    name=f"video{i}",
+                    top_n=profile_top,
+                    logger=logger
+                ) as profile_result:
+                    playlist = None if no_expand else processor.playlist_expander.expand(url)
+                    if playlist:
+                        console.print(
+                            f"[cyan]{playlist.kind_name}「{playlist.title}」共 {len(playlist.entries)} 集[/cyan]"
+                        )
+                        result = processor.process_playlist(
+                            playlist, generate_xiaohongshu, merge=merge
+                        )
+                        files = result.files
+                        failed = [entry for entry in playlist.entries if not result.results.get(entry.url)]
+                        for entry in failed:
+                            console.print(f"[red]✗ 第 {entry.index} 集处理失败:[/red] {entry.title}")
+                    else:
+                        files = processor.process_video(url, generate_xiaohongshu)
 
                 if files:
                     console.print(f"[green]✓ 成功生成 {len(files)} 个文件:[/green]")
@@ -86,6 +127,11 @@ def process(input_source: str, no_xiaohongshu: bool, config: str):
                 else:
                     console.print("[red]✗ 处理失败[/red]")
 
+                if profile_result:
+                    console.print("[cyan]剖析结果:[/cyan]")
+                    for file in profile_result.artifacts:
+                        console.print(f"  - {file}")
+
             except Exception as e:
                 console.print(f"[red]✗ 错误: {e}[/red]")
                 logger.error(f"处理视频失败: {url}", exc_info=True)
@@ -94,6 +140,13 @@ def process(input_source: str, no_xiaohongshu: bool, config: str):
 
     console.print("\n[bold green]处理完成！[/bold green]")
 
+    # 输出运行指标摘要
+    summary = json.dumps(metrics.summary(), ensure_ascii=False, indent=2)
+    console.print("\n[cyan]运行指标:[/cyan]")
+    console.print_json(summary)
+    if metrics_file:
+        Path(metrics_file).write_text(summary, encoding='utf-8')
+
 
 @cli.command()
 def check():
@@ -135,6 +188,28 @@ def check():
     console.print("\n[bold green]环境检查完成！[/bold green]")
 
 
+@cli.command()
+@click.option('--search', 'query', default=None, help='搜索词（为空时只补录索引）')
+@click.option('--limit', type=int, default=20, show_default=True, help='最多列出的结果数')
+def notes(query: str, limit: int):
+    """补录笔记索引，或搜索已生成的笔记"""
+    from .note_index import get_note_index
+
+    settings = get_settings()
+    index = get_note_index(settings)
+
+    added = index.backfill(settings.output_dir)
+    if added:
+        console.print(f"[cyan]补录 {added} 条笔记到索引[/cyan]")
+
+    result = index.search(query, page_size=limit) if query else index.list_notes(page_size=limit)
+    console.print(f"[bold]共 {result['total']} 条笔记[/bold]\n")
+    for note in result['items']:
+        console.print(f"[green]#{note['id']}[/green] {note['created_at']}  {note['title']}  [dim]{note['url']}[/dim]")
+        if note.get('snippet'):
+            console.print(f"    {note['snippet']}")
+
+
 def _parse_input_source(input_source: str) -> List[str]:
     """
     解析输入源，提取视频URL
@@ -3,7 +3,7 @@
 
 使用 pydantic 进行类型安全的配置管理
 """
-from typing import Optional
+from typing import Optional, Dict, List
 from pathlib import Path
 from pydantic_settings import BaseSettings
 from pydantic import Field, validator
@@ -45,6 +45,67 @@ class Settings(BaseSettings):
         default="medium",
         description="Whisper模型大小 (tiny/base/small/medium/large)"
     )
+    stream_transcription: bool = Field(
+        default=False,
+        description="无字幕时边下载边解码边转录，不落地中间文件（需要平台提供媒体直链，否则回退为先下载后转录）"
+    )
+    incremental_transcription: bool = Field(
+        default=False,
+        description="先下载后转录时，下载过程中即开始转录已到达的音频窗口"
+    )
+    transcribe_window_seconds: int = Field(
+        default=30,
+        ge=5,
+        le=600,
+        description="流式/增量转录的窗口长度（秒），默认与 Whisper 的 30 秒窗口对齐"
+    )
+    windowed_transcription_seconds: int = Field(
+        default=1800,
+        ge=0,
+        description="音频超过该时长（秒）时按窗口解码转录，峰值内存与时长无关；0 表示关闭"
+    )
+    transcribe_batch_size: int = Field(
+        default=1,
+        ge=1,
+        le=32,
+        description="短音频批量转录的批大小，大于1时并发任务的短音频合并为一次编码/解码"
+    )
+    transcribe_batch_max_seconds: int = Field(
+        default=60,
+        ge=1,
+        le=600,
+        description="参与批量转录的音频最大时长（秒），更长的音频单独转录"
+    )
+    transcribe_batch_wait: float = Field(
+        default=0.5,
+        ge=0,
+        le=30,
+        description="第一个短音频到达后等待凑批的最长时间（秒）"
+    )
+
+    # 多模型路由配置
+    ai_light_model: Optional[str] = Field(
+        default=None,
+        description="轻量任务（图片关键词、标题、翻译）使用的快速模型，为空时使用 ai_model"
+    )
+    ai_task_models: Dict[str, str] = Field(
+        default_factory=dict,
+        description="按任务指定模型（JSON），任务: organize/blog/xiaohongshu/titles/keywords/translate"
+    )
+    ai_fallback_models: List[str] = Field(
+        default_factory=list,
+        description="主模型超时或出错时的回退模型列表（JSON数组）"
+    )
+    ai_request_timeout: float = Field(
+        default=600.0,
+        gt=0,
+        description="长文本生成任务的单次请求超时（秒）"
+    )
+    ai_light_timeout: float = Field(
+        default=30.0,
+        gt=0,
+        description="轻量任务的单次请求超时（秒），超时后切换回退模型"
+    )
 
     # 内容生成配置
     max_tokens: int = Field(
@@ -72,6 +133,36 @@ class Settings(BaseSettings):
         description="采样阈值"
     )
 
+    # LLM 响应缓存配置
+    llm_cache_enabled: bool = Field(default=True, description="是否缓存LLM响应")
+    llm_cache_ttl: int = Field(
+        default=7 * 24 * 3600,
+        ge=0,
+        description="LLM缓存有效期（秒，0表示永不过期）"
+    )
+    llm_cache_max_entries: int = Field(
+        default=5000,
+        ge=1,
+        description="LLM缓存最大条目数（超出后淘汰最久未使用的条目）"
+    )
+
+    # LLM 限流与重试配置（同一进程内所有任务共享）
+    llm_requests_per_minute: int = Field(
+        default=60,
+        ge=1,
+        description="LLM每分钟最大请求数（被限流时会自动下调）"
+    )
+    llm_max_concurrency: int = Field(
+        default=4,
+        ge=1,
+        description="LLM最大并发请求数"
+    )
+    llm_max_retries: int = Field(
+        default=5,
+        ge=0,
+        description="LLM请求遇到429/5xx/超时时的最大重试次数"
+    )
+
     # 笔记样式配置
     use_emoji: bool = Field(default=True, description="是否使用表情符号")
     tag_count: int = Field(
@@ -96,6 +187,11 @@ class Settings(BaseSettings):
         default=Path("logs"),
         description="日志目录"
     )
+    note_index_enabled: bool = Field(default=True, description="是否把生成的笔记写入本地索引（SQLite 全文检索）")
+    note_index_file: Optional[Path] = Field(
+        default=None,
+        description="笔记索引数据库路径，为空时使用 output_dir/notes.db"
+    )
 
     # 代理配置
     http_proxy: Optional[str] = Field(default=None, description="HTTP代理")
@@ -107,12 +203,80 @@ class Settings(BaseSettings):
         description="浏览器cookies文件路径（Netscape格式）"
     )
 
+    # 下载配置
+    download_race: bool = Field(
+        default=False,
+        description="同时启动排名前两位的下载器，先完成者胜出（消耗双倍带宽）"
+    )
+
+    # 字幕配置
+    subtitle_languages: List[str] = Field(
+        default_factory=lambda: ["zh-Hans", "zh-Hant", "zh", "en"],
+        description="字幕语言偏好（JSON数组，依次尝试）"
+    )
+    subtitle_prefer_manual: bool = Field(
+        default=True,
+        description="人工字幕优先于自动生成字幕（即使人工字幕的语言排名更靠后）"
+    )
+    subtitle_allow_auto: bool = Field(default=True, description="是否使用自动生成（语音识别 / AI）字幕")
+    subtitle_allow_translated: bool = Field(
+        default=True,
+        description="是否使用机器翻译成偏好语言的字幕（排在偏好语言的原文字幕之后）"
+    )
+    subtitle_parallel_tracks: int = Field(
+        default=2,
+        ge=1,
+        le=8,
+        description="同时下载的候选字幕轨道数（首选轨道为空或失败时直接使用备选）"
+    )
+
+    # 分P / 合集 / 播放列表配置
+    playlist_concurrency: int = Field(
+        default=3,
+        ge=1,
+        le=16,
+        description="分P、合集、播放列表中同时处理的分集数（LLM 调用仍受全局限流约束）"
+    )
+    playlist_max_entries: int = Field(
+        default=200,
+        ge=1,
+        le=2000,
+        description="单个分P视频、合集或播放列表最多展开的分集数"
+    )
+    playlist_expand_collections: bool = Field(
+        default=False,
+        description="单个B站视频属于合集时，是否展开处理整个合集（合集链接始终展开）"
+    )
+
+    # 部署配置
+    worker_mode: str = Field(
+        default="combined",
+        description="combined: 每个进程都可加载 Whisper；split: 本进程只做字幕与 LLM，无字幕的任务交给转录进程池"
+    )
+    heavy_workers: int = Field(
+        default=1,
+        ge=1,
+        le=16,
+        description="split 模式下的转录进程数（每个进程常驻一个 Whisper 模型）"
+    )
+    light_workers: int = Field(
+        default=3,
+        ge=1,
+        le=64,
+        description="Web 应用处理任务的线程数（split 模式下不加载 Whisper，可以开得更多）"
+    )
+
     # 调试配置
     debug: bool = Field(default=False, description="调试模式")
     log_level: str = Field(
         default="INFO",
         description="日志级别 (DEBUG/INFO/WARNING/ERROR)"
     )
+    tracing_enabled: bool = Field(default=True, description="是否记录链路追踪（JSON Lines）")
+    trace_file: Optional[Path] = Field(
+        default=None,
+        description="追踪文件路径，为空时写入 log_dir/traces.jsonl"
+    )
 
     # FFmpeg配置
     ffmpeg_path: Optional[str] = Field(
@@ -127,6 +291,13 @@ class Settings(BaseSettings):
             raise ValueError("max_paragraphs 必须大于等于 min_paragraphs")
         return v
 
+    @validator("worker_mode")
+    def validate_worker_mode(cls, v):
+        """验证部署模式"""
+        if v not in ("combined", "split"):
+            raise ValueError("worker_mode 必须是 combined 或 split")
+        return v
+
     @validator("output_dir", "cache_dir", "log_dir")
     def ensure_dir_exists(cls, v):
         """确保目录存在"""
@@ -5,6 +5,8 @@ from .base import (
     BaseDownloader,
     VideoInfo,
     DownloadError,
+    DownloadCancelled,
+    DownloadStats,
     DownloaderRegistry
 )
 from .ytdlp_downloader import YtDlpDownloader
@@ -15,6 +17,8 @@ __all__ = [
     'BaseDownloader',
     'VideoInfo',
     'DownloadError',
+    'DownloadCancelled',
+    'DownloadStats',
     'DownloaderRegistry',
     'YtDlpDownloader',
     'BilibiliDownloader',
@@ -2,10 +2,21 @@
 视频下载器基类
 """
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dataclasses import dataclass
-from typing import Optional, Dict
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
 from pathlib import Path
 import logging
+import shutil
+import subprocess
+import threading
+import time
+from urllib.parse import urlsplit
+
+from ..utils import tracing
+from ..utils.metrics import registry as metrics_registry
+from ..utils.url_resolver import detect_platform
 
 
 @dataclass
@@ -36,6 +47,395 @@ class DownloadError(Exception):
         self.details = details
         super().__init__(self.message)
 
+    def __reduce__(self):
+        # 构造参数与 args 不一致，需自定义才能跨进程传递（转录进程池）
+        return self.__class__, (self.message, self.platform, self.error_type, self.details)
+
+
+class DownloadCancelled(DownloadError):
+    """下载被取消（竞速下载中落败的一方）"""
+
+    def __init__(self, platform: str = "unknown"):
+        super().__init__("下载已取消", platform, "cancelled")
+
+    def __reduce__(self):
+        return self.__class__, (self.platform,)
+
+
+# 当前下载任务的取消信号（竞速下载时由注册表设置）
+_cancel_event: ContextVar[Optional[threading.Event]] = ContextVar(
+    "download_cancel_event", default=None
+)
+
+
+def current_cancel_event() -> Optional[threading.Event]:
+    """获取当前下载任务的取消信号（未参与竞速时为 None）"""
+    return _cancel_event.get()
+
+
+def check_cancelled(event: Optional[threading.Event] = None):
+    """
+    检查下载是否已被取消
+
+    Raises:
+        DownloadCancelled: 已取消
+    """
+    event = event or _cancel_event.get()
+    if event is not None and event.is_set():
+        raise DownloadCancelled()
+
+
+def cancellable_sleep(seconds: float):
+    """
+    可被取消打断的等待（用于重试间隔）
+
+    Raises:
+        DownloadCancelled: 等待期间被取消
+    """
+    event = _cancel_event.get()
+    if event is None:
+        time.sleep(seconds)
+    elif event.wait(seconds):
+        raise DownloadCancelled()
+
+
+def ytdlp_cancel_hook() -> Callable[[dict], None]:
+    """
+    生成 yt-dlp progress_hook，下载过程中收到取消信号时中止
+
+    Returns:
+        可加入 options['progress_hooks'] 的回调
+    """
+    event = _cancel_event.get()
+
+    def hook(_progress: dict):
+        check_cancelled(event)
+
+    return hook
+
+
+# 下载进度监听（增量转录时由处理器设置），参数为 (正在写入的文件, 已写入字节数或 None)
+ProgressListener = Callable[[Path, Optional[int]], None]
+
+_progress_listener: ContextVar[Optional[ProgressListener]] = ContextVar(
+    "download_progress_listener", default=None
+)
+
+
+def current_progress_listener() -> Optional[ProgressListener]:
+    """获取当前下载任务的进度监听（未开启增量转录时为 None）"""
+    return _progress_listener.get()
+
+
+@contextmanager
+def progress_listener(listener: ProgressListener):
+    """
+    在代码块内为下载器设置进度监听
+
+    下载器把媒体顺序写入文件时，每写入一段调用 listener(文件路径, 已写入字节数)。
+
+    Args:
+        listener: 进度回调（需要很快返回，不能阻塞下载）
+    """
+    token = _progress_listener.set(listener)
+    try:
+        yield
+    finally:
+        _progress_listener.reset(token)
+
+
+def ytdlp_progress_hooks() -> List[Callable[[dict], None]]:
+    """
+    生成 yt-dlp progress_hooks：检查取消信号，设置了进度监听时转发下载进度
+
+    Returns:
+        可作为 options['progress_hooks'] 的回调列表
+    """
+    hooks = [ytdlp_cancel_hook()]
+    listener = _progress_listener.get()
+    if listener is not None:
+        def report(progress: dict):
+            if progress.get("status") == "downloading" and progress.get("tmpfilename"):
+                listener(Path(progress["tmpfilename"]), progress.get("downloaded_bytes"))
+            elif progress.get("status") == "finished" and progress.get("filename"):
+                # .part 已重命名为正式文件
+                listener(Path(progress["filename"]), None)
+
+        hooks.append(report)
+    return hooks
+
+
+def run_subprocess(
+    cmd: Sequence[str],
+    timeout: float,
+    poll_interval: float = 0.5
+) -> subprocess.CompletedProcess:
+    """
+    运行外部下载工具，超时或收到取消信号时结束子进程
+
+    Args:
+        cmd: 命令行
+        timeout: 超时时间（秒）
+        poll_interval: 检查取消信号的间隔（秒）
+
+    Returns:
+        CompletedProcess（stdout/stderr 为文本）
+
+    Raises:
+        subprocess.TimeoutExpired: 超时
+        DownloadCancelled: 被取消
+    """
+    event = _cancel_event.get()
+    deadline = time.monotonic() + timeout
+    process = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True
+    )
+    try:
+        while True:
+            try:
+                stdout, stderr = process.communicate(timeout=poll_interval)
+                return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+            except subprocess.TimeoutExpired:
+                if event is not None and event.is_set():
+                    raise DownloadCancelled()
+                if time.monotonic() >= deadline:
+                    raise subprocess.TimeoutExpired(cmd, timeout)
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.communicate()
+
+
+def platform_of(url: str) -> str:
+    """从 URL 提取平台标识（用于统计分组）：已知平台用平台名，其余用去掉前缀的主机名"""
+    platform = detect_platform(url)
+    if platform != "unknown":
+        return platform
+    host = (urlsplit(url).hostname or "unknown").lower()
+    for prefix in ("www.", "m.", "mobile."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    return host
+
+
+# 只含音频的流优先（DASH m4a / opus），平台不提供时才退回到音视频合一的格式
+YTDLP_AUDIO_FORMAT = "bestaudio[ext=m4a]/bestaudio[acodec^=opus]/bestaudio/best"
+
+AUDIO_EXTENSIONS = ("m4a", "m4s", "opus", "ogg", "webm", "mp3", "aac", "flac", "wav", "mka")
+VIDEO_EXTENSIONS = ("mp4", "flv", "mkv", "mov", "ts")
+
+# 音频编码 -> 可直接封装（不重新编码）的容器扩展名
+_COPY_CONTAINERS = {
+    "mp4a": "m4a",
+    "aac": "m4a",
+    "opus": "opus",
+    "vorbis": "ogg",
+    "mp3": "mp3",
+    "flac": "flac",
+}
+
+
+def ytdlp_audio_options() -> dict:
+    """
+    yt-dlp 只下载音频的选项
+
+    FFmpegExtractAudio 使用 preferredcodec=best：源文件已经是纯音频时不做处理，
+    需要从视频中提取时原样复制音频流，不再转码为 mp3。
+
+    Returns:
+        可合并进 yt-dlp options 的字典
+    """
+    return {
+        "format": YTDLP_AUDIO_FORMAT,
+        "postprocessors": [{
+            "key": "FFmpegExtractAudio",
+            "preferredcodec": "best",
+        }],
+    }
+
+
+def find_downloaded_file(
+    output_dir: Path,
+    audio_only: bool = True,
+    info: Optional[dict] = None,
+    recursive: bool = False
+) -> Optional[Path]:
+    """
+    查找下载得到的媒体文件（不依赖固定扩展名）
+
+    优先使用 yt-dlp 返回的 requested_downloads 中的最终路径，
+    否则在目录中找最新的媒体文件，audio_only 时音频文件优先。
+
+    Args:
+        output_dir: 下载目录
+        audio_only: 是否优先返回音频文件
+        info: yt-dlp extract_info 的返回值（可选）
+        recursive: 是否搜索子目录
+
+    Returns:
+        文件路径，找不到时返回 None
+    """
+    for item in reversed((info or {}).get("requested_downloads") or []):
+        path = item.get("filepath") or item.get("_filename")
+        if path and Path(path).is_file():
+            return Path(path)
+
+    pattern = "**/*" if recursive else "*"
+    files = [
+        p for p in Path(output_dir).glob(pattern)
+        if p.is_file() and p.suffix.lower().lstrip(".") in AUDIO_EXTENSIONS + VIDEO_EXTENSIONS
+    ]
+    if audio_only:
+        files = [p for p in files if p.suffix.lower().lstrip(".") in AUDIO_EXTENSIONS] or files
+    if not files:
+        return None
+    return max(files, key=lambda p: p.stat().st_mtime)
+
+
+def extract_audio_stream(
+    input_file: Path,
+    acodec: Optional[str] = None,
+    timeout: float = 3600,
+    ffmpeg: str = "ffmpeg"
+) -> Path:
+    """
+    用 ffmpeg 从视频中复制出音频流（-c:a copy，不重新编码）
+
+    按音频编码选择容器，编码未知或容器不兼容时改用 Matroska（可容纳任意编码）。
+
+    Args:
+        input_file: 输入视频
+        acodec: 音频编码（yt-dlp 格式信息中的 acodec，如 mp4a.40.2）
+        timeout: 超时时间（秒）
+        ffmpeg: ffmpeg 可执行文件路径
+
+    Returns:
+        音频文件路径
+
+    Raises:
+        RuntimeError: ffmpeg 执行失败
+    """
+    input_file = Path(input_file)
+    codec = (acodec or "").split(".")[0].lower()
+    extensions = [_COPY_CONTAINERS[codec]] if codec in _COPY_CONTAINERS else []
+    if "mka" not in extensions:
+        extensions.append("mka")
+
+    error = ""
+    for ext in extensions:
+        output_file = input_file.with_suffix(f".{ext}")
+        if output_file == input_file:
+            output_file = input_file.with_name(f"{input_file.stem}_audio.{ext}")
+        cmd = [ffmpeg, "-y", "-i", str(input_file), "-vn", "-map", "0:a:0", "-c:a", "copy", str(output_file)]
+        result = run_subprocess(cmd, timeout=timeout)
+        if result.returncode == 0:
+            return output_file
+        output_file.unlink(missing_ok=True)
+        error = result.stderr[-200:]
+    raise RuntimeError(f"ffmpeg 提取音频失败: {error}")
+
+
+T = TypeVar("T")
+
+DOWNLOAD_ATTEMPTS = metrics_registry.counter(
+    "download_attempts_total", "下载器尝试次数", labels=("downloader", "platform", "status")
+)
+
+
+class DownloadStats:
+    """
+    下载器/下载策略的成功率与耗时统计（进程内共享）
+
+    按 (名称, 平台) 分组，记录尝试次数、成功次数，以及成功和失败时耗时的指数移动平均。
+    期望耗时 = (成功率 × 成功耗时 + 失败率 × 失败耗时) / 成功率，
+    按期望耗时升序依次尝试，可使顺序尝试的总期望时间最小。
+    """
+
+    ALPHA = 0.3
+    DEFAULT_LATENCY = 60.0
+
+    # {(名称, 平台): [尝试次数, 成功次数, 成功耗时EWMA, 失败耗时EWMA]}
+    _stats: Dict[Tuple[str, str], list] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def record(cls, name: str, platform: str, latency: float, success: bool):
+        """
+        记录一次尝试结果
+
+        Args:
+            name: 下载器或策略名称
+            platform: 平台标识
+            latency: 耗时（秒）
+            success: 是否成功
+        """
+        DOWNLOAD_ATTEMPTS.inc(downloader=name, platform=platform, status="success" if success else "failed")
+        with cls._lock:
+            entry = cls._stats.setdefault((name, platform), [0, 0, None, None])
+            entry[0] += 1
+            index = 2 if success else 3
+            if success:
+                entry[1] += 1
+            previous = entry[index]
+            entry[index] = latency if previous is None else (
+                cls.ALPHA * latency + (1 - cls.ALPHA) * previous
+            )
+
+    @classmethod
+    def expected_time(cls, name: str, platform: str) -> float:
+        """
+        估算依靠该下载器成功所需的期望时间（秒）
+
+        没有记录时成功率按 1/2、耗时按 DEFAULT_LATENCY 估计
+        """
+        with cls._lock:
+            attempts, successes, ok_latency, fail_latency = cls._stats.get(
+                (name, platform), [0, 0, None, None]
+            )
+        probability = (successes + 1) / (attempts + 2)
+        ok_latency = cls.DEFAULT_LATENCY if ok_latency is None else ok_latency
+        fail_latency = ok_latency if fail_latency is None else fail_latency
+        return (probability * ok_latency + (1 - probability) * fail_latency) / probability
+
+    @classmethod
+    def order(cls, items: Sequence[T], platform: str, name: Callable[[T], str]) -> List[T]:
+        """
+        按期望耗时排序（耗时相同时保持原有顺序）
+
+        Args:
+            items: 候选下载器或策略
+            platform: 平台标识
+            name: 获取名称的函数
+
+        Returns:
+            排序后的列表
+        """
+        return sorted(items, key=lambda item: cls.expected_time(name(item), platform))
+
+    @classmethod
+    def snapshot(cls) -> Dict[str, dict]:
+        """获取当前统计（调试和展示用）"""
+        with cls._lock:
+            items = list(cls._stats.items())
+        return {
+            f"{name}@{platform}": {
+                "attempts": entry[0],
+                "successes": entry[1],
+                "success_latency": entry[2],
+                "failure_latency": entry[3],
+                "expected_time": round(cls.expected_time(name, platform), 3),
+            }
+            for (name, platform), entry in items
+        }
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._stats.clear()
+
 
 class BaseDownloader(ABC):
     """视频下载器基类"""
@@ -94,6 +494,20 @@ class BaseDownloader(ABC):
         """
         raise NotImplementedError("子类需要实现此方法")
 
+    def open_audio_stream(self, url: str) -> Optional[Tuple[Iterator[bytes], VideoInfo]]:
+        """
+        打开媒体字节流（用于边下载边转录，不落地文件）
+
+        默认不支持，能拿到可直接下载的媒体地址的下载器可以覆盖此方法。
+
+        Args:
+            url: 视频URL
+
+        Returns:
+            (媒体字节迭代器, 视频信息)，不支持时返回 None
+        """
+        return None
+
     def _handle_error(self, error: Exception, url: str) -> str:
         """
         处理错误并返回用户友好的错误消息
@@ -122,20 +536,48 @@ class BaseDownloader(ABC):
 
 
 class DownloaderRegistry:
-    """下载器注册表"""
+    """
+    下载器注册表
+
+    对每个 URL，所有支持它的下载器按历史成功率和耗时（DownloadStats）排序后依次尝试，
+    失败时自动换下一个。开启竞速时同时启动排名前两位的下载器，先成功者胜出，另一方被取消。
+    """
+
+    def __init__(self, race: bool = False):
+        """
+        初始化注册表
 
-    def __init__(self):
+        Args:
+            race: 是否让排名前两位的下载器竞速
+        """
         self._downloaders: list[BaseDownloader] = []
+        self.race = race
+        self.logger = logging.getLogger(__name__)
 
     def register(self, downloader: BaseDownloader):
         """
         注册下载器
 
+        注册顺序只在没有历史数据时作为默认顺序
+
         Args:
             downloader: 下载器实例
         """
         self._downloaders.append(downloader)
 
+    def get_downloaders(self, url: str) -> List[BaseDownloader]:
+        """
+        获取支持该 URL 的全部下载器（按期望耗时排序）
+
+        Args:
+            url: 视频URL
+
+        Returns:
+            下载器列表
+        """
+        candidates = [d for d in self._downloaders if d.supports(url)]
+        return DownloadStats.order(candidates, platform_of(url), name=lambda d: type(d).__name__)
+
     def get_downloader(self, url: str) -> Optional[BaseDownloader]:
         """
         根据URL获取合适的下载器
@@ -144,12 +586,10 @@ class DownloaderRegistry:
             url: 视频URL
 
         Returns:
-            下载器实例，如果没有合适的返回None
+            期望耗时最短的下载器，如果没有合适的返回None
         """
-        for downloader in self._downloaders:
-            if downloader.supports(url):
-                return downloader
-        return None
+        downloaders = self.get_downloaders(url)
+        return downloaders[0] if downloaders else None
 
     def download(
         self,
@@ -169,14 +609,163 @@ class DownloaderRegistry:
             (下载文件路径, 视频信息) 元组
 
         Raises:
-            DownloadError: 如果没有合适的下载器或下载失败
+            DownloadError: 如果没有合适的下载器或全部下载器都失败
         """
-        downloader = self.get_downloader(url)
-        if not downloader:
+        downloaders = self.get_downloaders(url)
+        if not downloaders:
             raise DownloadError(
                 "不支持的视频平台",
                 "unknown",
                 "platform_not_supported"
             )
 
-        return downloader.download(url, output_dir, audio_only)
+        platform = platform_of(url)
+        output_dir = Path(output_dir)
+        last_error: Optional[Exception] = None
+
+        if self.race and len(downloaders) >= 2:
+            result, last_error = self._race(downloaders[:2], url, output_dir, audio_only, platform)
+            if result:
+                return result
+            downloaders = downloaders[2:]
+
+        for downloader in downloaders:
+            result, error = self._attempt(downloader, url, output_dir, audio_only, platform)
+            if result:
+                return result
+            last_error = error or last_error
+            self.logger.warning(f"{type(downloader).__name__} 下载失败，尝试下一个下载器")
+
+        if isinstance(last_error, DownloadError):
+            raise last_error
+        raise DownloadError(
+            f"所有下载器都失败: {last_error}",
+            platform,
+            "all_downloaders_failed",
+            str(last_error) if last_error else None
+        )
+
+    def open_audio_stream(self, url: str) -> Optional[Tuple[Iterator[bytes], VideoInfo]]:
+        """
+        按排序依次尝试打开媒体字节流
+
+        Args:
+            url: 视频URL
+
+        Returns:
+            (媒体字节迭代器, 视频信息)，没有下载器支持时返回 None
+        """
+        for downloader in self.get_downloaders(url):
+            name = type(downloader).__name__
+            try:
+                with tracing.span("download.open_stream", downloader=name, url=url):
+                    opened = downloader.open_audio_stream(url)
+            except DownloadCancelled:
+                raise
+            except Exception as e:
+                self.logger.warning(f"{name} 无法打开媒体流: {e}")
+                continue
+            if opened:
+                self.logger.info(f"使用 {name} 流式下载")
+                return opened
+        return None
+
+    def _attempt(
+        self,
+        downloader: BaseDownloader,
+        url: str,
+        output_dir: Path,
+        audio_only: bool,
+        platform: str
+    ) -> Tuple[Optional[tuple], Optional[Exception]]:
+        """
+        用单个下载器尝试一次，并记录统计
+
+        Returns:
+            (成功时的 (路径, 视频信息), 失败时的异常)
+        """
+        name = type(downloader).__name__
+        started = time.monotonic()
+        try:
+            with tracing.span(
+                "download.downloader",
+                downloader=name,
+                url=url,
+                audio_only=audio_only
+            ):
+                path, info = downloader.download(url, output_dir, audio_only)
+        except DownloadCancelled as e:
+            # 被取消不代表下载器不可用，不计入统计
+            return None, e
+        except Exception as e:
+            DownloadStats.record(name, platform, time.monotonic() - started, success=False)
+            return None, e
+
+        success = bool(path and info)
+        DownloadStats.record(name, platform, time.monotonic() - started, success=success)
+        return ((path, info) if success else None), None
+
+    def _race(
+        self,
+        downloaders: List[BaseDownloader],
+        url: str,
+        output_dir: Path,
+        audio_only: bool,
+        platform: str
+    ) -> Tuple[Optional[tuple], Optional[Exception]]:
+        """
+        多个下载器竞速，先成功者胜出，其余收到取消信号
+
+        每个参赛者使用独立的子目录，落败者退出后自行清理。
+
+        Returns:
+            (胜出者的 (路径, 视频信息), 全部失败时的最后一个异常)
+        """
+        cancel = threading.Event()
+        done = threading.Condition()
+        outcomes: list = []
+
+        def run(downloader: BaseDownloader, index: int):
+            lane_dir = output_dir / f"race_{index}_{type(downloader).__name__}"
+            result, error = None, None
+            try:
+                lane_dir.mkdir(parents=True, exist_ok=True)
+                _cancel_event.set(cancel)
+                result, error = self._attempt(downloader, url, lane_dir, audio_only, platform)
+            except Exception as e:  # pylint: disable=broad-except
+                error = e
+            finally:
+                # 无论成败都要登记结果，否则等待方会一直等下去
+                with done:
+                    won = result is not None and not cancel.is_set()
+                    if won:
+                        cancel.set()
+                    outcomes.append((type(downloader).__name__, result if won else None, error))
+                    done.notify_all()
+            if not won:
+                shutil.rmtree(lane_dir, ignore_errors=True)
+
+        names = [type(d).__name__ for d in downloaders]
+        self.logger.info(f"竞速下载: {' vs '.join(names)}")
+        with tracing.span("download.race", downloaders=names, url=url) as span:
+            for index, downloader in enumerate(downloaders):
+                threading.Thread(
+                    target=tracing.wrap_context(run),
+                    args=(downloader, index),
+                    name=f"download-race-{index}",
+                    daemon=True
+                ).start()
+
+            with done:
+                while True:
+                    winner = next((o for o in outcomes if o[1]), None)
+                    if winner or len(outcomes) == len(downloaders):
+                        break
+                    done.wait()
+
+            if winner:
+                self.logger.info(f"竞速下载胜出: {winner[0]}")
+                span.set_attribute("winner", winner[0])
+                return winner[1], None
+            last_error = next((error for _, _, error in reversed(outcomes) if error), None)
+            return None, last_error
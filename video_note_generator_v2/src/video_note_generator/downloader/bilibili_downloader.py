@@ -3,19 +3,42 @@ Bilibili 专用下载器
 
 使用特定的 API 和策略下载 B站视频
 """
-import re
 import time
+from http.cookiejar import MozillaCookieJar
 from pathlib import Path
 from typing import Optional
-import httpx
 import subprocess
 
-from .base import BaseDownloader, VideoInfo, DownloadError
+from .base import (
+    BaseDownloader,
+    DownloadCancelled,
+    DownloadError,
+    DownloadStats,
+    VideoInfo,
+    cancellable_sleep,
+    check_cancelled,
+    find_downloaded_file,
+    run_subprocess,
+    ytdlp_audio_options,
+    ytdlp_progress_hooks,
+)
+from .http_file_downloader import HttpFileDownloader, DownloadError as HttpDownloadError
+from ..utils import tracing
+from ..utils.url_resolver import is_short_link, parse_url, resolve_url
 
 
 class BilibiliDownloader(BaseDownloader):
     """B站专用下载器"""
 
+    HEADERS = {
+        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Referer': 'https://www.bilibili.com',
+        'Accept': 'application/json, text/plain, */*',
+        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+    }
+    # playurl 的 fnval=16 表示返回 DASH（音视频分离）格式
+    DASH_FNVAL = 16
+
     def __init__(self, logger=None, cookie_file: Optional[str] = None):
         """
         初始化下载器
@@ -28,33 +51,9 @@ class BilibiliDownloader(BaseDownloader):
         self.cookie_file = cookie_file
 
     def supports(self, url: str) -> bool:
-        """检查是否支持该URL"""
-        patterns = [
-            r'bilibili\.com/video/[Bb][Vv][\w]+',
-            r'b23\.tv/[\w]+',  # B站短链接
-        ]
-        return any(re.search(pattern, url) for pattern in patterns)
-
-    def _extract_bvid(self, url: str) -> Optional[str]:
-        """提取 BV 号"""
-        # 处理短链接
-        if 'b23.tv' in url:
-            try:
-                # 短链接需要重定向获取真实URL
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                }
-                response = httpx.get(url, headers=headers, follow_redirects=True, timeout=10)
-                url = str(response.url)
-            except Exception as e:
-                self.logger.warning(f"解析短链接失败: {e}")
-                return None
-
-        # 提取 BV 号
-        match = re.search(r'[Bb][Vv]([\w]+)', url)
-        if match:
-            return f"BV{match.group(1)}"
-        return None
+        """检查是否支持该URL（BV 号链接或 B站短链接）"""
+        parsed = parse_url(url)
+        return parsed.platform == 'bilibili' and (parsed.video_id is not None or is_short_link(url))
 
     def get_video_info(self, url: str) -> Optional[VideoInfo]:
         """
@@ -66,44 +65,78 @@ class BilibiliDownloader(BaseDownloader):
         Returns:
             视频信息
         """
-        bvid = self._extract_bvid(url)
-        if not bvid:
+        resolved = resolve_url(url)
+        if resolved.platform != 'bilibili' or not resolved.video_id:
             return None
 
+        video_data = self._get_view_data(resolved.video_id)
+        if not video_data:
+            return None
+        return self._to_video_info(video_data, url, resolved.part)
+
+    def _get_view_data(self, bvid: str) -> Optional[dict]:
+        """
+        调用 B站 view 接口获取视频元数据（标题、作者、cid 等）
+
+        Args:
+            bvid: BV 号
+
+        Returns:
+            接口返回的 data 字段，失败返回 None
+        """
+        import httpx
+
         try:
             # 使用 B站 API 获取视频信息
             api_url = f"https://api.bilibili.com/x/web-interface/view?bvid={bvid}"
-
-            # 添加必要的请求头
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Referer': 'https://www.bilibili.com',
-                'Accept': 'application/json, text/plain, */*',
-                'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-            }
-
-            response = httpx.get(api_url, headers=headers, timeout=10)
+            response = httpx.get(api_url, headers=self.HEADERS, timeout=10)
             data = response.json()
 
             if data['code'] != 0:
                 self.logger.error(f"获取视频信息失败: {data.get('message')}")
                 return None
 
-            video_data = data['data']
-            return VideoInfo(
-                title=video_data['title'],
-                uploader=video_data['owner']['name'],
-                description=video_data['desc'],
-                duration=video_data['duration'],
-                platform='bilibili',
-                url=url,
-                thumbnail_url=video_data.get('pic')
-            )
+            return data['data']
 
         except Exception as e:
             self.logger.error(f"获取视频信息失败: {e}")
             return None
 
+    @staticmethod
+    def _select_page(video_data: dict, part: Optional[int]) -> Optional[dict]:
+        """
+        选择分P（未指定时为第 1 P）
+
+        Args:
+            video_data: view 接口的 data 字段
+            part: 分P序号（从 1 开始）
+
+        Returns:
+            分P信息（cid、part、duration），接口没有分P列表或序号越界时返回 None
+        """
+        pages = video_data.get('pages') or []
+        part = part or 1
+        return pages[part - 1] if len(pages) >= part else None
+
+    @classmethod
+    def _to_video_info(cls, video_data: dict, url: str, part: Optional[int] = None) -> VideoInfo:
+        title = video_data['title']
+        duration = video_data['duration']
+        page = cls._select_page(video_data, part)
+        if page:
+            duration = page.get('duration', duration)
+            if len(video_data['pages']) > 1:
+                title = f"{title} P{part or 1} {page.get('part', '')}".rstrip()
+        return VideoInfo(
+            title=title,
+            uploader=video_data['owner']['name'],
+            description=video_data['desc'],
+            duration=duration,
+            platform='bilibili',
+            url=url,
+            thumbnail_url=video_data.get('pic')
+        )
+
     def _is_rate_limited(self, error_msg: str) -> bool:
         """检查是否是速率限制错误"""
         rate_limit_indicators = [
@@ -126,7 +159,8 @@ class BilibiliDownloader(BaseDownloader):
         """
         下载视频（带重试机制）
 
-        优先使用 you-get，因为它对 B站支持更好
+        只需要音频时先尝试直接下载 DASH 音频流；you-get 与 yt-dlp 两种方式
+        按历史成功率和耗时排序（没有历史时先用 you-get）
 
         Args:
             url: 视频URL
@@ -137,7 +171,8 @@ class BilibiliDownloader(BaseDownloader):
         Returns:
             (下载文件路径, 视频信息) 元组
         """
-        bvid = self._extract_bvid(url)
+        resolved = resolve_url(url)
+        bvid = resolved.video_id if resolved.platform == 'bilibili' else None
         if not bvid:
             raise DownloadError(
                 "无法解析 BV 号",
@@ -149,32 +184,46 @@ class BilibiliDownloader(BaseDownloader):
         output_dir.mkdir(parents=True, exist_ok=True)
 
         # 获取视频信息
-        video_info = self.get_video_info(url)
-        if not video_info:
+        with tracing.span("bilibili.video_info", bvid=bvid):
+            video_data = self._get_view_data(bvid)
+        if not video_data:
             raise DownloadError(
                 "无法获取视频信息",
                 "bilibili",
                 "info_error"
             )
+        video_info = self._to_video_info(video_data, url, resolved.part)
+
+        methods = DownloadStats.order(
+            [
+                ("you-get", lambda: self._download_with_youget(url, output_dir, audio_only)),
+                ("yt-dlp", lambda: self._download_with_ytdlp(url, output_dir, audio_only)),
+            ],
+            "bilibili",
+            name=lambda method: f"BilibiliDownloader.{method[0]}"
+        )
+        # 分P视频按 p 参数取对应分P的 cid（默认 cid 是第 1 P）
+        page = self._select_page(video_data, resolved.part)
+        cid = page['cid'] if page else video_data.get('cid')
+        if audio_only and cid:
+            # 纯音频流只有几 MB，始终最先尝试
+            methods.insert(0, ("dash-audio", lambda: self._download_dash_audio(bvid, cid, output_dir)))
 
         last_error = None
         for attempt in range(max_retries):
             try:
-                # 方法1: 尝试使用 you-get（对B站支持最好）
-                self.logger.info(f"尝试使用 you-get 下载... (尝试 {attempt + 1}/{max_retries})")
-                result = self._download_with_youget(url, output_dir)
-                if result:
-                    return result, video_info
-
-                # 方法2: 回退到 yt-dlp
-                self.logger.info(f"you-get 失败，尝试使用 yt-dlp... (尝试 {attempt + 1}/{max_retries})")
-                result = self._download_with_ytdlp(url, output_dir, audio_only)
-                if result:
-                    return result, video_info
+                for method_name, method in methods:
+                    check_cancelled()
+                    self.logger.info(f"尝试使用 {method_name} 下载... (尝试 {attempt + 1}/{max_retries})")
+                    result = self._run_method(method_name, method, attempt)
+                    if result:
+                        return result, video_info
 
                 # 如果两种方法都失败，记录错误
                 last_error = "所有下载方法都失败"
 
+            except DownloadCancelled:
+                raise
             except Exception as e:
                 last_error = e
                 error_msg = str(e)
@@ -189,7 +238,8 @@ class BilibiliDownloader(BaseDownloader):
                             f"   这是 B站 的反爬虫保护，不是程序问题\n"
                             f"   等待 {wait_time} 秒后重试... (尝试 {attempt + 1}/{max_retries})"
                         )
-                        time.sleep(wait_time)
+                        with tracing.span("bilibili.retry_wait", seconds=wait_time, reason="rate_limited"):
+                            cancellable_sleep(wait_time)
                         continue
                     else:
                         raise DownloadError(
@@ -222,10 +272,123 @@ class BilibiliDownloader(BaseDownloader):
             str(last_error)
         )
 
+    def _run_method(self, method_name: str, method, attempt: int) -> Optional[str]:
+        """
+        执行一种下载方式，并把耗时和结果计入 DownloadStats
+
+        Args:
+            method_name: dash-audio / you-get / yt-dlp
+            method: 无参下载函数
+            attempt: 第几轮重试（从0开始）
+
+        Returns:
+            下载的文件路径
+        """
+        started = time.monotonic()
+        try:
+            with tracing.span(f"bilibili.{method_name}", attempt=attempt + 1):
+                result = method()
+        except DownloadCancelled:
+            raise
+        except Exception:
+            DownloadStats.record(
+                f"BilibiliDownloader.{method_name}", "bilibili", time.monotonic() - started, success=False
+            )
+            raise
+
+        # 被取消导致的失败不计入统计
+        check_cancelled()
+        DownloadStats.record(
+            f"BilibiliDownloader.{method_name}", "bilibili", time.monotonic() - started, success=bool(result)
+        )
+        return result
+
+    def _load_cookies(self) -> Optional[MozillaCookieJar]:
+        """读取 Netscape 格式的 cookie 文件（未配置或读取失败时返回 None）"""
+        if not self.cookie_file or not Path(self.cookie_file).exists():
+            return None
+        try:
+            jar = MozillaCookieJar(self.cookie_file)
+            jar.load(ignore_discard=True, ignore_expires=True)
+            return jar
+        except Exception as e:
+            self.logger.debug(f"读取cookies文件失败: {e}")
+            return None
+
+    def _download_dash_audio(
+        self,
+        bvid: str,
+        cid: int,
+        output_dir: Path
+    ) -> Optional[str]:
+        """
+        通过 playurl 接口直接下载 DASH 音频流（不下载视频）
+
+        Args:
+            bvid: BV 号
+            cid: 分P的 cid
+            output_dir: 输出目录
+
+        Returns:
+            下载的 m4a 文件路径
+
+        Raises:
+            Exception: 如果遇到速率限制错误，向上层抛出
+        """
+        import httpx
+
+        try:
+            response = httpx.get(
+                "https://api.bilibili.com/x/player/playurl",
+                params={'bvid': bvid, 'cid': cid, 'fnval': self.DASH_FNVAL, 'fourk': 0},
+                headers=self.HEADERS,
+                cookies=self._load_cookies(),
+                timeout=10
+            )
+            if response.status_code == 412:
+                raise RuntimeError("playurl 请求被限流: HTTP 412 Precondition Failed")
+            data = response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            # 接口不可用时交给 you-get / yt-dlp
+            self.logger.warning(f"获取 DASH 音频地址失败: {e}")
+            return None
+        if data.get('code') != 0:
+            if data.get('code') == -412:
+                raise RuntimeError(f"playurl 请求被限流: 412 {data.get('message')}")
+            self.logger.warning(f"获取 DASH 音频地址失败: {data.get('message')}")
+            return None
+
+        audios = ((data.get('data') or {}).get('dash') or {}).get('audio') or []
+        if not audios:
+            self.logger.warning("该视频没有提供 DASH 音频流")
+            return None
+
+        best = max(audios, key=lambda audio: audio.get('bandwidth', 0))
+        urls = [best.get('baseUrl') or best.get('base_url')]
+        urls += best.get('backupUrl') or best.get('backup_url') or []
+        target_path = output_dir / f"{bvid}_{cid}.m4a"
+
+        for stream_url in filter(None, urls):
+            try:
+                downloader = HttpFileDownloader(
+                    stream_url,
+                    target_path,
+                    headers={'User-Agent': self.HEADERS['User-Agent'], 'Referer': self.HEADERS['Referer']}
+                )
+                return str(downloader.download())
+            except HttpDownloadError as e:
+                check_cancelled()
+                self.logger.warning(f"DASH 音频下载失败，尝试备用地址: {e}")
+            except httpx.HTTPError as e:
+                check_cancelled()
+                self.logger.warning(f"DASH 音频地址不可用，尝试备用地址: {e}")
+        return None
+
     def _download_with_youget(
         self,
         url: str,
-        output_dir: Path
+        output_dir: Path,
+        audio_only: bool = True
     ) -> Optional[str]:
         """
         使用 you-get 下载
@@ -233,6 +396,7 @@ class BilibiliDownloader(BaseDownloader):
         Args:
             url: 视频URL
             output_dir: 输出目录
+            audio_only: 是否只需要音频（you-get 不支持单独下载音频，改用最低画质减少流量）
 
         Returns:
             下载的文件路径
@@ -241,7 +405,8 @@ class BilibiliDownloader(BaseDownloader):
             cmd = [
                 'you-get',
                 '--no-proxy',
-                '--format=dash-flv720',  # B站常用格式
+                # B站常用格式；只需要音频时音轨相同，视频取最低画质
+                '--format=dash-flv360' if audio_only else '--format=dash-flv720',
                 '-o', str(output_dir),
                 url
             ]
@@ -250,25 +415,19 @@ class BilibiliDownloader(BaseDownloader):
             if self.cookie_file:
                 cmd.extend(['-c', self.cookie_file])
 
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=600  # 10分钟超时
-            )
+            result = run_subprocess(cmd, timeout=600)  # 10分钟超时
 
             if result.returncode == 0:
                 # 查找下载的文件
-                files = list(output_dir.glob('*.flv'))
-                if not files:
-                    files = list(output_dir.glob('*.mp4'))
-
-                if files:
-                    return str(max(files, key=lambda p: p.stat().st_mtime))
+                file_path = find_downloaded_file(output_dir, audio_only)
+                if file_path:
+                    return str(file_path)
 
             self.logger.warning(f"you-get 下载失败: {result.stderr}")
             return None
 
+        except DownloadCancelled:
+            raise
         except subprocess.TimeoutExpired:
             self.logger.warning("you-get 下载超时")
             return None
@@ -322,16 +481,13 @@ class BilibiliDownloader(BaseDownloader):
                         'api_host': 'api.bilibili.com'
                     }
                 },
+                # 竞速下载落败时中止；增量转录时转发下载进度
+                'progress_hooks': ytdlp_progress_hooks(),
             }
 
             if audio_only:
-                options.update({
-                    'format': 'bestaudio/best',
-                    'postprocessors': [{
-                        'key': 'FFmpegExtractAudio',
-                        'preferredcodec': 'mp3',
-                    }],
-                })
+                # B站 DASH 提供独立的 m4a 音频流，直接下载且不转码
+                options.update(ytdlp_audio_options())
 
             # 如果配置了cookies文件，则使用（避免从浏览器读取时弹窗）
             if self.cookie_file and Path(self.cookie_file).exists():
@@ -339,17 +495,16 @@ class BilibiliDownloader(BaseDownloader):
                 self.logger.debug(f"B站下载使用cookies文件: {self.cookie_file}")
 
             with yt_dlp.YoutubeDL(options) as ydl:
-                ydl.download([url])
+                info = ydl.extract_info(url, download=True)
 
-                # 查找下载的文件
-                ext = 'mp3' if audio_only else 'mp4'
-                files = list(output_dir.glob(f'*.{ext}'))
-                if files:
-                    return str(max(files, key=lambda p: p.stat().st_mtime))
-
-            return None
+            # 查找下载的文件
+            file_path = find_downloaded_file(output_dir, audio_only, info)
+            return str(file_path) if file_path else None
 
+        except DownloadCancelled:
+            raise
         except Exception as e:
+            check_cancelled()
             error_msg = str(e)
 
             # 如果是速率限制错误，向上层抛出以便重试
@@ -12,9 +12,12 @@ import math
 import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Callable, Dict, Optional
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, Optional
 
-import httpx
+from .base import DownloadCancelled, check_cancelled, current_cancel_event, current_progress_listener
+
+if TYPE_CHECKING:
+    import httpx
 
 
 class DownloadError(Exception):
@@ -24,6 +27,71 @@ class DownloadError(Exception):
 ProgressCallback = Callable[[int, Optional[int]], None]
 
 
+def build_client(
+    headers: Optional[Dict[str, str]] = None,
+    proxies: Optional[Dict[str, str]] = None,
+    timeout: float = 30.0
+) -> httpx.Client:
+    """创建 httpx 客户端（兼容新旧版本 httpx 的代理参数）"""
+    import httpx
+
+    client_kwargs = {
+        'headers': headers or {},
+        'follow_redirects': True,
+        'timeout': timeout,
+    }
+
+    # 兼容不同版本的 httpx
+    if proxies:
+        try:
+            # 新版本 httpx 使用 proxy 参数
+            return httpx.Client(proxy=proxies, **client_kwargs)
+        except TypeError:
+            # 旧版本 httpx 使用 proxies 参数
+            client_kwargs['proxies'] = proxies
+            return httpx.Client(**client_kwargs)
+    else:
+        return httpx.Client(**client_kwargs)
+
+
+def stream_url(
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    proxies: Optional[Dict[str, str]] = None,
+    timeout: float = 30.0,
+    chunk_size: int = 64 * 1024
+) -> Iterator[bytes]:
+    """
+    以流的方式顺序读取 URL 内容（不写文件）
+
+    Args:
+        url: 媒体地址
+        headers: 请求头
+        proxies: 代理配置
+        timeout: 超时时间（秒）
+        chunk_size: 每次产出的字节数
+
+    Yields:
+        响应内容分块
+
+    Raises:
+        DownloadError: 请求失败
+    """
+    import httpx
+
+    cancel_event = current_cancel_event()
+    try:
+        with build_client(headers, proxies, timeout) as client:
+            with client.stream("GET", url) as resp:
+                resp.raise_for_status()
+                for chunk in resp.iter_bytes(chunk_size):
+                    check_cancelled(cancel_event)
+                    if chunk:
+                        yield chunk
+    except httpx.HTTPError as exc:
+        raise DownloadError(f"流式下载失败: {exc}") from exc
+
+
 class HttpFileDownloader:
     """多线程 HTTP 下载器"""
 
@@ -55,25 +123,12 @@ class HttpFileDownloader:
         self._downloaded = 0
         self._download_lock = threading.Lock()
         self._file_lock = threading.Lock()
+        # 在创建者线程中捕获取消信号和进度监听（分片线程池中取不到上下文变量）
+        self._cancel_event = current_cancel_event()
+        self._progress_listener = current_progress_listener()
 
     def _build_client(self) -> httpx.Client:
-        client_kwargs = {
-            'headers': self.headers,
-            'follow_redirects': True,
-            'timeout': self.timeout,
-        }
-
-        # 兼容不同版本的 httpx
-        if self.proxies:
-            try:
-                # 新版本 httpx 使用 proxy 参数
-                return httpx.Client(proxy=self.proxies, **client_kwargs)
-            except TypeError:
-                # 旧版本 httpx 使用 proxies 参数
-                client_kwargs['proxies'] = self.proxies
-                return httpx.Client(**client_kwargs)
-        else:
-            return httpx.Client(**client_kwargs)
+        return build_client(self.headers, self.proxies, self.timeout)
 
     def _probe(self) -> None:
         """执行 HEAD 请求探测下载能力"""
@@ -131,6 +186,7 @@ class HttpFileDownloader:
                     resp.raise_for_status()
                     offset = start
                     for chunk in resp.iter_bytes(1024 * 64):
+                        check_cancelled(self._cancel_event)
                         if not chunk:
                             continue
                         with self._file_lock:
@@ -139,6 +195,8 @@ class HttpFileDownloader:
                         offset += len(chunk)
                         self._report_progress(len(chunk))
                 return
+            except DownloadCancelled:
+                raise
             except Exception as exc:  # pylint: disable=broad-except
                 if attempt >= self._MAX_RETRIES:
                     raise DownloadError(f"下载 range {start}-{end} 失败: {exc}") from exc
@@ -152,11 +210,17 @@ class HttpFileDownloader:
                     resp.raise_for_status()
                     with open(self.target_path, "wb") as out:
                         for chunk in resp.iter_bytes(1024 * 64):
+                            check_cancelled(self._cancel_event)
                             if not chunk:
                                 continue
                             out.write(chunk)
                             self._report_progress(len(chunk))
+                            if self._progress_listener:
+                                out.flush()
+                                self._progress_listener(self.target_path, None)
                 return
+            except DownloadCancelled:
+                raise
             except Exception as exc:  # pylint: disable=broad-except
                 if attempt >= self._MAX_RETRIES:
                     raise DownloadError(f"下载失败: {exc}") from exc
@@ -166,7 +230,8 @@ class HttpFileDownloader:
         try:
             self._probe()
 
-            if not self._support_range:
+            # 有进度监听（增量转录）时顺序下载，保证文件从头到尾连续写入
+            if not self._support_range or self._progress_listener:
                 self._download_single()
                 return self.target_path
 
@@ -8,11 +8,25 @@
 """
 import subprocess
 import os
+import time
 from pathlib import Path
 from typing import Optional, List, Dict, Callable
 import logging
 
-from .base import BaseDownloader, VideoInfo, DownloadError
+from .base import (
+    BaseDownloader,
+    DownloadCancelled,
+    DownloadError,
+    DownloadStats,
+    VideoInfo,
+    check_cancelled,
+    find_downloaded_file,
+    run_subprocess,
+    ytdlp_audio_options,
+    ytdlp_progress_hooks,
+)
+from ..utils import tracing
+from ..utils.url_resolver import detect_platform
 
 
 class DownloadStrategy:
@@ -46,24 +60,21 @@ class YtDlpStrategy(DownloadStrategy):
             import yt_dlp
 
             options = {
-                'format': 'bestaudio/best',
                 'outtmpl': str(output_dir / '%(title)s.%(ext)s'),
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                }],
                 'quiet': True,
+                'progress_hooks': ytdlp_progress_hooks(),
+                **ytdlp_audio_options(),
             }
 
             with yt_dlp.YoutubeDL(options) as ydl:
-                ydl.download([url])
+                info = ydl.extract_info(url, download=True)
 
             # 查找下载的文件
-            files = list(output_dir.glob('*.mp3'))
-            if files:
-                return str(max(files, key=os.path.getmtime))
-            return None
+            file_path = find_downloaded_file(output_dir, audio_only=True, info=info)
+            return str(file_path) if file_path else None
 
+        except DownloadCancelled:
+            raise
         except Exception:
             return None
 
@@ -82,21 +93,17 @@ class YouGetStrategy(DownloadStrategy):
     def download(self, url: str, output_dir: Path) -> Optional[str]:
         try:
             cmd = ['you-get', '-o', str(output_dir), url]
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=600
-            )
+            result = run_subprocess(cmd, timeout=600)
 
             if result.returncode == 0:
                 # 查找下载的文件
-                for ext in ['.mp4', '.flv', '.mp3']:
-                    files = list(output_dir.glob(f'*{ext}'))
-                    if files:
-                        return str(max(files, key=os.path.getmtime))
+                file_path = find_downloaded_file(output_dir, audio_only=True)
+                if file_path:
+                    return str(file_path)
             return None
 
+        except DownloadCancelled:
+            raise
         except (subprocess.TimeoutExpired, FileNotFoundError, Exception):
             return None
 
@@ -115,21 +122,17 @@ class GalleryDlStrategy(DownloadStrategy):
     def download(self, url: str, output_dir: Path) -> Optional[str]:
         try:
             cmd = ['gallery-dl', '-d', str(output_dir), url]
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=600
-            )
+            result = run_subprocess(cmd, timeout=600)
 
             if result.returncode == 0:
-                # 查找下载的文件
-                for ext in ['.mp4', '.mp3', '.webm']:
-                    files = list(output_dir.glob(f'**/*{ext}'), recursive=True)
-                    if files:
-                        return str(max(files, key=os.path.getmtime))
+                # 查找下载的文件（gallery-dl 会按站点建子目录）
+                file_path = find_downloaded_file(output_dir, audio_only=True, recursive=True)
+                if file_path:
+                    return str(file_path)
             return None
 
+        except DownloadCancelled:
+            raise
         except (subprocess.TimeoutExpired, FileNotFoundError, Exception):
             return None
 
@@ -155,12 +158,7 @@ class CustomScriptStrategy(DownloadStrategy):
         """
         try:
             cmd = [self.script_path, url, str(output_dir)]
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=600
-            )
+            result = run_subprocess(cmd, timeout=600)
 
             if result.returncode == 0:
                 # 查找最新下载的文件
@@ -169,6 +167,8 @@ class CustomScriptStrategy(DownloadStrategy):
                     return str(max(files, key=os.path.getmtime))
             return None
 
+        except DownloadCancelled:
+            raise
         except (subprocess.TimeoutExpired, FileNotFoundError, Exception):
             return None
 
@@ -189,7 +189,7 @@ class MultiStrategyDownloader(BaseDownloader):
         self.add_strategy(YtDlpStrategy(priority=10))
 
     def add_strategy(self, strategy: DownloadStrategy):
-        """添加下载策略"""
+        """添加下载策略（优先级只在没有历史数据时决定尝试顺序）"""
         self.strategies.append(strategy)
         # 按优先级降序排序
         self.strategies.sort(key=lambda s: s.priority, reverse=True)
@@ -207,6 +207,8 @@ class MultiStrategyDownloader(BaseDownloader):
         """
         使用多个策略尝试下载
 
+        策略按历史成功率和耗时（DownloadStats）排序，没有历史数据时按优先级
+
         Args:
             url: 视频URL
             output_dir: 输出目录
@@ -218,17 +220,30 @@ class MultiStrategyDownloader(BaseDownloader):
         output_dir = Path(output_dir)
         output_dir.mkdir(parents=True, exist_ok=True)
 
-        # 尝试每个可用的策略
-        for strategy in self.strategies:
-            if not strategy.can_handle(url):
-                continue
+        platform = self._extract_platform(url)
+        strategies = DownloadStats.order(
+            [s for s in self.strategies if s.can_handle(url)],
+            platform,
+            name=lambda s: f"MultiStrategy.{s.name}"
+        )
 
+        # 按期望耗时依次尝试
+        for strategy in strategies:
             self.logger.info(f"尝试使用 {strategy.name} 下载...")
 
+            started = time.monotonic()
             try:
-                file_path = strategy.download(url, output_dir)
+                with tracing.span("multi.strategy", strategy=strategy.name) as span:
+                    file_path = strategy.download(url, output_dir)
+                    span.set_attribute("success", bool(file_path))
+
+                check_cancelled()
+                success = bool(file_path and os.path.exists(file_path))
+                DownloadStats.record(
+                    f"MultiStrategy.{strategy.name}", platform, time.monotonic() - started, success=success
+                )
 
-                if file_path and os.path.exists(file_path):
+                if success:
                     self.logger.info(f"✅ 使用 {strategy.name} 下载成功")
 
                     # 创建简单的视频信息
@@ -245,7 +260,12 @@ class MultiStrategyDownloader(BaseDownloader):
                 else:
                     self.logger.warning(f"⚠️ {strategy.name} 下载失败")
 
+            except DownloadCancelled:
+                raise
             except Exception as e:
+                DownloadStats.record(
+                    f"MultiStrategy.{strategy.name}", platform, time.monotonic() - started, success=False
+                )
                 self.logger.warning(f"⚠️ {strategy.name} 出错: {e}")
                 continue
 
@@ -259,18 +279,7 @@ class MultiStrategyDownloader(BaseDownloader):
 
     def _extract_platform(self, url: str) -> str:
         """从URL提取平台名称"""
-        if 'youtube.com' in url or 'youtu.be' in url:
-            return 'youtube'
-        elif 'bilibili.com' in url:
-            return 'bilibili'
-        elif 'douyin.com' in url or 'tiktok.com' in url:
-            return 'tiktok'
-        elif 'twitter.com' in url or 'x.com' in url:
-            return 'twitter'
-        elif 'instagram.com' in url:
-            return 'instagram'
-        else:
-            return 'unknown'
+        return detect_platform(url)
 
     def get_available_strategies(self) -> List[str]:
         """获取可用的策略列表"""
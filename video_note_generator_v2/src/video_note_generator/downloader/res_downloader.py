@@ -11,12 +11,23 @@ from __future__ import annotations
 import os
 import re
 from pathlib import Path
-from typing import Optional, Tuple
-
-import yt_dlp
-
-from .base import BaseDownloader, DownloadError, VideoInfo
-from .http_file_downloader import HttpFileDownloader, DownloadError as HttpDownloadError
+from typing import Iterator, Optional, Tuple
+
+from .base import (
+    BaseDownloader,
+    DownloadCancelled,
+    DownloadError,
+    VideoInfo,
+    AUDIO_EXTENSIONS,
+    check_cancelled,
+    extract_audio_stream,
+    find_downloaded_file,
+    ytdlp_audio_options,
+    ytdlp_progress_hooks,
+)
+from .http_file_downloader import HttpFileDownloader, DownloadError as HttpDownloadError, stream_url
+from ..utils import tracing
+from ..utils.url_resolver import detect_platform, resolve_url
 
 
 def _safe_filename(text: str, default: str = "video") -> str:
@@ -55,17 +66,15 @@ def _safe_filename(text: str, default: str = "video") -> str:
 class ResDownloader(BaseDownloader):
     """借鉴 res-downloader 思路的通用下载器"""
 
-    SUPPORTED_DOMAINS = [
-        "douyin.com",
-        "iesdouyin.com",
-        "tiktok.com",
-        "instagram.com",
-        "facebook.com",
-        "kuaishou.com",
-        "weibo.com",
-        "xhslink.com",
-        "xiaohongshu.com",
-    ]
+    SUPPORTED_PLATFORMS = frozenset({
+        "douyin",
+        "tiktok",
+        "instagram",
+        "facebook",
+        "kuaishou",
+        "weibo",
+        "xiaohongshu",
+    })
 
     def __init__(
         self,
@@ -73,18 +82,22 @@ class ResDownloader(BaseDownloader):
         proxies: Optional[dict] = None,
         cookie_file: Optional[str] = None,
         max_workers: int = 4,
+        ffmpeg_path: Optional[str] = None,
     ):
         super().__init__(logger)
         self.proxies = proxies
         self.cookie_file = cookie_file
         self.max_workers = max_workers
+        self.ffmpeg_path = ffmpeg_path or "ffmpeg"
 
     # pylint: disable=unused-argument
     def supports(self, url: str) -> bool:
-        return any(domain in url for domain in self.SUPPORTED_DOMAINS)
+        return detect_platform(url) in self.SUPPORTED_PLATFORMS
 
     def _extract_with_ytdlp(self, url: str) -> Tuple[dict, dict]:
         """使用 yt-dlp 提取下载信息和请求头"""
+        import yt_dlp
+
         # 预处理URL，尝试获取真实链接
         processed_url = self._preprocess_url(url)
 
@@ -113,8 +126,9 @@ class ResDownloader(BaseDownloader):
                 ydl_opts.update(config)
                 self.logger.debug(f"尝试配置 {i+1}/{len(configs)}: {list(config.keys())}")
 
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    info = ydl.extract_info(processed_url, download=False)
+                with tracing.span("res.extract", config_index=i + 1, options=list(config.keys())):
+                    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                        info = ydl.extract_info(processed_url, download=False)
 
                 if "entries" in info:
                     info = info["entries"][0]
@@ -124,6 +138,7 @@ class ResDownloader(BaseDownloader):
                 return info, http_headers
 
             except Exception as exc:
+                check_cancelled()
                 self.logger.debug(f"配置 {i+1} 失败: {exc}")
                 if i == len(configs) - 1:  # 最后一次尝试
                     raise
@@ -131,43 +146,12 @@ class ResDownloader(BaseDownloader):
         raise DownloadError("所有提取策略都失败了", "generic", "extraction_failed")
 
     def _preprocess_url(self, url: str) -> str:
-        """预处理URL，尝试获取真实的视频链接"""
-        import re
-        import requests
-
-        # 如果是短链接，尝试重定向获取真实链接
-        if any(domain in url for domain in ["douyin.com", "kuaishou.com", "xhslink.com"]):
-            try:
-                # 添加必要的头部信息
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1',
-                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                    'Accept-Language': 'zh-CN,zh;q=0.8,zh-TW;q=0.7,zh-HK;q=0.5,en-US;q=0.3,en;q=0.2',
-                    'Accept-Encoding': 'gzip, deflate, br',
-                    'Connection': 'keep-alive',
-                    'Upgrade-Insecure-Requests': '1',
-                }
-
-                # 对于抖音，添加特定的头部
-                if "douyin.com" in url:
-                    headers.update({
-                        'Referer': 'https://www.douyin.com/',
-                        'Cache-Control': 'no-cache',
-                        'Pragma': 'no-cache',
-                    })
-
-                # 发送请求获取重定向后的URL
-                response = requests.head(url, headers=headers, allow_redirects=True, timeout=10, verify=False)
-                final_url = response.url
-
-                if final_url != url:
-                    self.logger.info(f"URL重定向: {url} -> {final_url}")
-                    return final_url
-
-            except Exception as exc:
-                self.logger.debug(f"URL预处理失败: {exc}")
-
-        return url
+        """预处理URL：展开短链接（结果有缓存）并转换为规范链接"""
+        resolved = resolve_url(url)
+        if resolved.platform == "unknown" or resolved.canonical_url == url:
+            return url
+        self.logger.info(f"URL规范化: {url} -> {resolved.canonical_url}")
+        return resolved.canonical_url
 
     def _download_direct(self, info: dict, headers: dict, output_dir: Path) -> Tuple[str, VideoInfo]:
         direct_url = info.get("url")
@@ -204,37 +188,52 @@ class ResDownloader(BaseDownloader):
         except HttpDownloadError as exc:
             raise DownloadError(str(exc), "generic", "http_download_failed") from exc
 
-        video_info = VideoInfo(
+        return str(file_path), self._to_video_info(info, direct_url)
+
+    def _to_video_info(self, info: dict, fallback_url: str) -> VideoInfo:
+        return VideoInfo(
             title=info.get("title", ""),
             uploader=info.get("uploader", ""),
             description=info.get("description", ""),
             duration=int(info.get("duration", 0) or 0),
             platform=self._detect_platform(info.get("webpage_url", "")),
-            url=info.get("webpage_url", direct_url),
+            url=info.get("webpage_url", fallback_url),
             thumbnail_url=info.get("thumbnail"),
         )
-        return str(file_path), video_info
+
+    def open_audio_stream(self, url: str) -> Optional[Tuple[Iterator[bytes], VideoInfo]]:
+        """
+        打开媒体直链的字节流，交给 ffmpeg 边下边解码（不落地文件）
+
+        优先使用纯音频格式；只有音视频合一的格式时也可以，ffmpeg 只解码音频轨。
+        m3u8 等分段协议不支持流式读取，返回 None。
+
+        Args:
+            url: 视频URL
+
+        Returns:
+            (媒体字节迭代器, 视频信息)
+        """
+        info, headers = self._extract_with_ytdlp(url)
+        audio_format = self._select_audio_format(info)
+        if audio_format:
+            headers = audio_format.get("http_headers") or headers
+            info = {**info, **audio_format}
+
+        direct_url = info.get("url")
+        if not direct_url or (info.get("protocol") or "").startswith("m3u8"):
+            return None
+
+        stream_headers = headers.copy()
+        if "Referer" not in stream_headers and info.get("webpage_url"):
+            stream_headers["Referer"] = info["webpage_url"]
+
+        self.logger.info("流式下载 %s (%s)", info.get("format_id") or info.get("ext"), "纯音频" if audio_format else "音视频")
+        chunks = stream_url(direct_url, headers=stream_headers, proxies=self.proxies)
+        return chunks, self._to_video_info(info, direct_url)
 
     def _detect_platform(self, url: str) -> str:
-        if not url:
-            return "unknown"
-        for domain in self.SUPPORTED_DOMAINS:
-            if domain in url:
-                if "douyin" in domain:
-                    return "douyin"
-                if "tiktok" in domain:
-                    return "tiktok"
-                if "instagram" in domain:
-                    return "instagram"
-                if "facebook" in domain:
-                    return "facebook"
-                if "kuaishou" in domain:
-                    return "kuaishou"
-                if "xiaohongshu" in domain or "xhslink" in domain:
-                    return "xiaohongshu"
-                if "weibo" in domain:
-                    return "weibo"
-        return "unknown"
+        return detect_platform(url) if url else "unknown"
 
     def _handle_error(self, exc: Exception, url: str) -> str:
         """
@@ -365,10 +364,13 @@ class ResDownloader(BaseDownloader):
         for strategy_name, strategy_func in strategies:
             try:
                 self.logger.info(f"尝试策略 {strategy_name}: {url}")
-                result = strategy_func(url, output_dir, audio_only)
+                with tracing.span("res.strategy", strategy=strategy_name):
+                    result = strategy_func(url, output_dir, audio_only)
                 if result and result[0]:  # 成功获得文件路径
                     self.logger.info(f"策略 {strategy_name} 成功")
                     return result
+            except DownloadCancelled:
+                raise
             except Exception as exc:  # pylint: disable=broad-except
                 self.logger.warning(f"策略 {strategy_name} 失败: {exc}")
                 last_error = exc
@@ -385,28 +387,27 @@ class ResDownloader(BaseDownloader):
         """尝试使用ResDownloader的主要下载方法"""
         info, headers = self._extract_with_ytdlp(url)
 
-        # 若存在多种格式，优先选择音频
+        # 平台提供纯音频流时直接下载音频，不下载视频
         if audio_only:
-            requested_format = info.get("requested_formats")
-            if requested_format:
-                # 尝试获取音频流直链
-                audio_stream = None
-                for stream in requested_format:
-                    if stream.get("acodec", "none") != "none":
-                        audio_stream = stream
-                        break
-                if audio_stream and audio_stream.get("url"):
-                    info = {**info, **audio_stream}
-
-        file_path, video_info = self._download_direct(info, headers, output_dir)
-
-        if audio_only and file_path and not file_path.endswith(".mp3"):
-            # 若需要音频但抓到视频，将其交给 ffmpeg 转换
-            audio_path = Path(file_path).with_suffix(".mp3")
-            self.logger.info("正在提取音频轨 %s -> %s", file_path, audio_path)
+            audio_format = self._select_audio_format(info)
+            if audio_format:
+                self.logger.info("使用纯音频格式 %s (%s)", audio_format.get("format_id"), audio_format.get("ext"))
+                headers = audio_format.get("http_headers") or headers
+                info = {**info, **audio_format}
+
+        with tracing.span("res.download_direct", ext=info.get("ext"), vcodec=info.get("vcodec")):
+            file_path, video_info = self._download_direct(info, headers, output_dir)
+
+        if audio_only and file_path and not self._is_audio_only(info):
+            # 只拿到音视频合一的文件时，原样复制出音频流（不重新编码）
+            self.logger.info("正在提取音频轨 %s", file_path)
             try:
-                self._extract_audio(file_path, audio_path)
+                with tracing.span("res.extract_audio", acodec=info.get("acodec")):
+                    audio_path = extract_audio_stream(Path(file_path), info.get("acodec"), ffmpeg=self.ffmpeg_path)
+                self._remove(file_path)
                 return str(audio_path), video_info
+            except DownloadCancelled:
+                raise
             except Exception as exc:  # pylint: disable=broad-except
                 # 转音频失败则返回原文件
                 self.logger.warning("音频提取失败，将返回原文件: %s", exc)
@@ -422,13 +423,11 @@ class ResDownloader(BaseDownloader):
             "quiet": True,
             "no_warnings": True,
             "outtmpl": str(output_dir / "%(title)s.%(ext)s"),
-            "format": "bestaudio/best" if audio_only else "best",
-            "postprocessors": [{
-                "key": "FFmpegExtractAudio",
-                "preferredcodec": "mp3",
-                "preferredquality": "192",
-            }] if audio_only else [],
+            "format": "best",
+            "progress_hooks": ytdlp_progress_hooks(),
         }
+        if audio_only:
+            ydl_opts.update(ytdlp_audio_options())
 
         if self.cookie_file and Path(self.cookie_file).exists():
             ydl_opts["cookiefile"] = self.cookie_file
@@ -452,35 +451,52 @@ class ResDownloader(BaseDownloader):
                         thumbnail_url=info.get("thumbnail"),
                     )
 
-                    # 获取下载的文件路径
-                    downloaded_file = ydl.prepare_filename(info)
-                    if audio_only and not downloaded_file.endswith(".mp3"):
-                        downloaded_file = str(Path(downloaded_file).with_suffix(".mp3"))
+                    # 获取下载的文件路径（后处理后的扩展名以 requested_downloads 为准）
+                    downloaded_file = find_downloaded_file(output_dir, audio_only, info)
+                    if downloaded_file is None:
+                        downloaded_file = Path(ydl.prepare_filename(info))
 
-                    return downloaded_file, video_info
+                    return str(downloaded_file), video_info
 
+        except DownloadCancelled:
+            raise
         except Exception as exc:
+            check_cancelled()
             raise DownloadError(f"yt-dlp备用下载失败: {str(exc)}", "generic", "ytdlp_fallback_failed") from exc
 
-    def _extract_audio(self, input_file: str, output_file: Path) -> None:
-        import subprocess
-
-        cmd = [
-            "ffmpeg",
-            "-y",
-            "-i",
-            input_file,
-            "-vn",
-            "-acodec",
-            "mp3",
-            str(output_file),
+    @staticmethod
+    def _is_audio_only(fmt: dict) -> bool:
+        """格式是否只含音频"""
+        if fmt.get("vcodec"):
+            return fmt["vcodec"] == "none" and fmt.get("acodec", "none") != "none"
+        return (fmt.get("ext") or "") in AUDIO_EXTENSIONS
+
+    def _select_audio_format(self, info: dict) -> Optional[dict]:
+        """
+        从提取结果中选择可直接下载的纯音频格式（码率最高者）
+
+        Args:
+            info: yt-dlp 提取结果
+
+        Returns:
+            格式信息，没有纯音频格式时返回 None
+        """
+        candidates = [
+            fmt for fmt in (info.get("requested_formats") or []) + (info.get("formats") or [])
+            if fmt.get("url")
+            and fmt.get("vcodec") == "none"
+            and fmt.get("acodec", "none") != "none"
+            and not (fmt.get("protocol") or "").startswith("m3u8")
         ]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=False)
-        if result.returncode != 0:
-            raise RuntimeError(f"ffmpeg 提取音频失败: {result.stderr[:200]}")
-        # 转换成功后可以清理原文件的副本避免空间占用
+        if not candidates:
+            return None
+        # m4a 兼容性最好，码率相同时优先
+        return max(candidates, key=lambda fmt: (fmt.get("abr") or fmt.get("tbr") or 0, fmt.get("ext") == "m4a"))
+
+    @staticmethod
+    def _remove(file_path: str) -> None:
+        # 提取出音频后删除视频文件，避免占用空间
         try:
-            os.remove(input_file)
+            os.remove(file_path)
         except OSError:
             pass
-
@@ -1,24 +1,28 @@
 """
 基于 yt-dlp 的通用视频下载器
 """
-import os
-import time
 from pathlib import Path
 from typing import Optional
-import yt_dlp
 
-from .base import BaseDownloader, VideoInfo, DownloadError
+from .base import (
+    BaseDownloader,
+    DownloadCancelled,
+    DownloadError,
+    VideoInfo,
+    cancellable_sleep,
+    check_cancelled,
+    find_downloaded_file,
+    ytdlp_audio_options,
+    ytdlp_progress_hooks,
+)
+from ..utils import tracing
+from ..utils.url_resolver import detect_platform
 
 
 class YtDlpDownloader(BaseDownloader):
     """基于 yt-dlp 的下载器，支持多个平台"""
 
-    SUPPORTED_PLATFORMS = [
-        'youtube.com', 'youtu.be',
-        'bilibili.com',
-        'douyin.com',
-        'tiktok.com',
-    ]
+    SUPPORTED_PLATFORMS = frozenset({'youtube', 'bilibili', 'douyin', 'tiktok'})
 
     MAX_RETRIES = 3
     RETRY_DELAY = 5  # 秒
@@ -38,19 +42,11 @@ class YtDlpDownloader(BaseDownloader):
 
     def supports(self, url: str) -> bool:
         """检查是否支持该URL"""
-        return any(platform in url for platform in self.SUPPORTED_PLATFORMS)
+        return detect_platform(url) in self.SUPPORTED_PLATFORMS
 
     def _get_platform_name(self, url: str) -> str:
         """获取平台名称"""
-        if 'youtube.com' in url or 'youtu.be' in url:
-            return 'youtube'
-        elif 'bilibili.com' in url:
-            return 'bilibili'
-        elif 'douyin.com' in url:
-            return 'douyin'
-        elif 'tiktok.com' in url:
-            return 'tiktok'
-        return 'unknown'
+        return detect_platform(url)
 
     def _build_options(
         self,
@@ -76,13 +72,8 @@ class YtDlpDownloader(BaseDownloader):
         }
 
         if audio_only:
-            options.update({
-                'format': 'bestaudio/best',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                }],
-            })
+            # 优先纯音频流，提取音频时不转码
+            options.update(ytdlp_audio_options())
         else:
             options['format'] = 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best'
 
@@ -109,6 +100,8 @@ class YtDlpDownloader(BaseDownloader):
         Returns:
             视频信息
         """
+        import yt_dlp
+
         try:
             options = {
                 'quiet': True,
@@ -166,12 +159,15 @@ class YtDlpDownloader(BaseDownloader):
         Returns:
             (下载文件路径, 视频信息) 元组
         """
+        import yt_dlp
+
         platform = self._get_platform_name(url)
         output_dir = Path(output_dir)
         output_dir.mkdir(parents=True, exist_ok=True)
 
         # 构建选项
         options = self._build_options(output_dir, audio_only)
+        options['progress_hooks'] = ytdlp_progress_hooks()
 
         # 重试逻辑
         for attempt in range(self.MAX_RETRIES):
@@ -181,7 +177,8 @@ class YtDlpDownloader(BaseDownloader):
                 )
 
                 with yt_dlp.YoutubeDL(options) as ydl:
-                    info = ydl.extract_info(url, download=True)
+                    with tracing.span("ytdlp.download", attempt=attempt + 1, platform=platform):
+                        info = ydl.extract_info(url, download=True)
                     if not info:
                         raise DownloadError(
                             "无法获取视频信息",
@@ -189,23 +186,12 @@ class YtDlpDownloader(BaseDownloader):
                             "info_error"
                         )
 
-                    # 查找下载的文件
-                    expected_ext = 'mp3' if audio_only else 'mp4'
-                    downloaded_files = list(output_dir.glob(f"*.{expected_ext}"))
-
-                    if not downloaded_files:
-                        raise DownloadError(
-                            f"未找到下载的{expected_ext}文件",
-                            platform,
-                            "file_not_found"
-                        )
-
-                    # 获取最新的文件
-                    audio_path = max(downloaded_files, key=os.path.getmtime)
+                    # 查找下载的文件（扩展名取决于平台提供的格式）
+                    audio_path = find_downloaded_file(output_dir, audio_only, info)
 
-                    if not audio_path.exists():
+                    if not audio_path:
                         raise DownloadError(
-                            "下载的文件不存在",
+                            "未找到下载的文件",
                             platform,
                             "file_not_found"
                         )
@@ -223,7 +209,10 @@ class YtDlpDownloader(BaseDownloader):
                     self.logger.info(f"下载成功: {video_info.title}")
                     return str(audio_path), video_info
 
+            except DownloadCancelled:
+                raise
             except Exception as e:
+                check_cancelled()
                 error_msg = self._handle_error(e, url)
                 self.logger.warning(
                     f"下载失败（第{attempt + 1}次）: {error_msg}"
@@ -231,7 +220,8 @@ class YtDlpDownloader(BaseDownloader):
 
                 if attempt < self.MAX_RETRIES - 1:
                     self.logger.info(f"等待{self.RETRY_DELAY}秒后重试...")
-                    time.sleep(self.RETRY_DELAY)
+                    with tracing.span("ytdlp.retry_wait", seconds=self.RETRY_DELAY):
+                        cancellable_sleep(self.RETRY_DELAY)
                 else:
                     # 最后一次尝试失败
                     raise DownloadError(
@@ -5,6 +5,23 @@
 """
 from typing import Optional, Tuple
 import logging
+import re
+
+from ..ai_processor import TASK_BLOG
+
+# AI 在正文前重复输出的元信息行（"思想来源: ...\n原始视频: ..."，可带英文括注）。
+# 只从一段空白的起点尝试匹配（文本开头或非空白字符之后），
+# 长空白行不会在每个行首都重新扫描一遍；保留的换行通过分组放回
+_SOURCE_HEADER = re.compile(
+    r'(?:\A|(?<=\S)([^\S\n]*\n))'
+    r'(?:\s*思想来源'
+    r'(?:\s*\([^)\n]*\):[^\n]*\n原始视频\s*\([^)\n]*\):|:[^\n]*\n原始视频:)'
+    r'[^\n]*\n)+'
+)
+
+# 文末的元信息块与 AI 创作声明：从标记处截断到结尾
+_METADATA_BLOCK = re.compile(r'---\n*\*\*文章元信息\*\*')
+_AI_NOTICE = re.compile(r'---\n*\*本文由 AI 辅助创作')
 
 
 class BlogGenerator:
@@ -148,7 +165,8 @@ class BlogGenerator:
                 system_prompt=system_prompt,
                 user_prompt=user_prompt,
                 max_tokens=max_tokens,
-                temperature=0.8  # 稍高温度以增加创意
+                temperature=0.8,  # 稍高温度以增加创意
+                task=TASK_BLOG
             )
 
             if blog_content:
@@ -177,49 +195,42 @@ class BlogGenerator:
         Returns:
             格式化后的博客文章
         """
-        import re
-
         # 移除AI生成内容中已有的元信息部分（避免重复）
+        content_cleaned = _SOURCE_HEADER.sub(lambda m: m.group(1) or '', content).strip()
 
-        # 首先移除文章开头的元信息（带英文翻译的格式）
-        content_cleaned = re.sub(
-            r'^[\n\s]*思想来源\s*\([^)]*\):[^\n]*\n原始视频\s*\([^)]*\):[^\n]*\n',
-            '',
-            content,
-            flags=re.MULTILINE
-        ).strip()
-
-        # 也移除不带括号的简单格式
-        content_cleaned = re.sub(
-            r'^[\n\s]*思想来源:[^\n]*\n原始视频:[^\n]*\n',
-            '',
-            content_cleaned,
-            flags=re.MULTILINE
-        ).strip()
-
-        # 查找并移除 "思想来源" 到文章结尾的部分
-        content_cleaned = re.sub(
-            r'\n*---\n*\*\*文章元信息\*\*.*$',
-            '',
-            content_cleaned,
-            flags=re.DOTALL
-        ).strip()
-
-        # 移除可能单独出现的元信息行
-        content_cleaned = re.sub(
-            r'\n*- 思想来源.*?\n- 原始视频.*?\n.*$',
-            '',
-            content_cleaned,
-            flags=re.DOTALL
-        ).strip()
-
-        # 移除末尾的AI创作声明
-        content_cleaned = re.sub(
-            r'\n*---\n*\*本文由 AI 辅助创作.*$',
-            '',
-            content_cleaned,
-            flags=re.DOTALL
-        ).strip()
+        # 依次截掉文末的元信息块、单独出现的元信息行和AI创作声明
+        # （都是单次线性查找，不再对全文做 DOTALL 的 .*$ 替换）
+        match = _METADATA_BLOCK.search(content_cleaned)
+        if match:
+            content_cleaned = content_cleaned[:match.start()].strip()
+
+        start = _find_source_lines(content_cleaned)
+        if start >= 0:
+            content_cleaned = content_cleaned[:start].strip()
+
+        match = _AI_NOTICE.search(content_cleaned)
+        if match:
+            content_cleaned = content_cleaned[:match.start()].strip()
 
         # 直接返回清理后的内容，不添加元信息
         return content_cleaned
+
+
+def _find_source_lines(text: str) -> int:
+    """
+    查找 "- 思想来源 ... \n- 原始视频 ...\n" 形式的元信息行
+
+    Args:
+        text: 博客内容
+
+    Returns:
+        元信息的起始位置，未找到返回 -1
+    """
+    start = text.find('- 思想来源')
+    if start < 0:
+        return -1
+    # 第一处 "- 思想来源" 之后没有 "- 原始视频" 行时，后面的也不会有
+    video = text.find('\n- 原始视频', start + len('- 思想来源'))
+    if video < 0 or text.find('\n', video + len('\n- 原始视频')) < 0:
+        return -1
+    return start
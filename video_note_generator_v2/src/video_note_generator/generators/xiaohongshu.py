@@ -5,7 +5,29 @@ import re
 from typing import Optional, List, Tuple
 import logging
 
-from ..ai_processor import AIProcessor
+from ..ai_processor import (
+    AIProcessor,
+    NoteMetadata,
+    TASK_METADATA,
+    TASK_TITLES,
+    TASK_XIAOHONGSHU,
+)
+
+# 标题行前的序号与标记（"1." "2、" "[标题1]" "- "）
+_NUMBERING = re.compile(r'^\d+[.、)\]]\s*')
+_TITLE_LABEL = re.compile(r'^\[?标题\d*\]?\s*', re.IGNORECASE)
+_TITLE_MARKER = re.compile(r'^\[标题\d+\]\s*')
+_BULLET = re.compile(r'^[-*]\s*')
+
+# 生成结果中的分节标题："一. 标题" ... "二. 正文"
+_TITLE_SECTION = re.compile(r'一[.、]\s*标题')
+_CONTENT_SECTION = re.compile(r'二[.、]\s*正文')
+
+_TAG = re.compile(r'#([^\s#]+)')
+
+# 正文开头的一级标题行，以及末尾连续的 #标签
+_LEADING_HEADING = re.compile(r'\A#[ \t][^\n]*\n')
+_TRAILING_TAGS = re.compile(r'\n\n(?:#[^\s#]+\s*)+\Z')
 
 
 class XiaohongshuGenerator:
@@ -29,25 +51,24 @@ class XiaohongshuGenerator:
     def generate(
         self,
         content: str,
-        max_tokens: int = 2000
+        max_tokens: int = 2000,
+        metadata: Optional[NoteMetadata] = None
     ) -> Tuple[str, List[str], List[str]]:
         """
-        生成小红书笔记（分两步：先生成标题，再生成正文）
+        生成小红书笔记（分两步：先生成标题等元信息，再生成正文）
 
         Args:
             content: 输入内容
             max_tokens: 最大 token 数
+            metadata: 已生成的元信息（None 时在此生成）
 
         Returns:
             (笔记内容, 标题列表, 标签列表) 元组
         """
-        # 第一步：生成5个标题
-        self.logger.info("第一步：生成小红书标题...")
-        titles = self._generate_titles(content)
-
-        if not titles:
-            self.logger.warning("标题生成失败，使用默认流程")
-            titles = ["小红书笔记"]
+        # 第一步：生成标题、标签和配图关键词
+        if metadata is None:
+            metadata = self.generate_metadata(content)
+        titles = metadata.titles
 
         # 选择第一个标题作为主标题
         main_title = titles[0] if titles else "小红书笔记"
@@ -58,13 +79,59 @@ class XiaohongshuGenerator:
         xiaohongshu_content = self._generate_content(content, main_title, max_tokens)
 
         if not xiaohongshu_content:
-            return content, titles, []
+            return content, titles, metadata.tags
 
-        # 提取标签
-        tags = self._extract_tags(xiaohongshu_content)
+        # 提取标签（正文未带标签时使用元信息中的标签）
+        tags = self._extract_tags(xiaohongshu_content) or metadata.tags
 
         return xiaohongshu_content, titles, tags
 
+    def generate_metadata(self, content: str) -> NoteMetadata:
+        """
+        第一步：一次结构化调用同时生成标题、标签和英文配图关键词
+
+        结构化调用失败时回退到单独生成标题
+
+        Args:
+            content: 输入内容
+
+        Returns:
+            笔记元信息
+        """
+        self.logger.info("第一步：生成小红书标题、标签和配图关键词...")
+        data = self.ai_processor.generate_json(
+            system_prompt=self._build_metadata_system_prompt(),
+            user_prompt=self._build_metadata_user_prompt(content),
+            temperature=0.8,  # 稍高温度增加创意
+            max_tokens=800,
+            task=TASK_METADATA
+        )
+
+        metadata = NoteMetadata()
+        if data:
+            titles = (self._clean_title(str(t)) for t in data.get('titles') or [])
+            metadata.titles = [t for t in titles if t][:5]
+            metadata.tags = [
+                str(tag).strip().lstrip('#')
+                for tag in data.get('tags') or []
+                if str(tag).strip().lstrip('#')
+            ]
+
+            keywords = data.get('image_keywords')
+            if isinstance(keywords, list):
+                keywords = ','.join(str(k).strip() for k in keywords if str(k).strip())
+            metadata.image_keywords = keywords or None
+
+        if not metadata.titles:
+            self.logger.warning("结构化生成未返回标题，改为单独生成标题")
+            metadata.titles = self._generate_titles(content)
+
+        if not metadata.titles:
+            self.logger.warning("标题生成失败，使用默认流程")
+            metadata.titles = ["小红书笔记"]
+
+        return metadata
+
     def _generate_titles(self, content: str) -> List[str]:
         """
         第一步：生成5个不同风格的标题
@@ -82,7 +149,8 @@ class XiaohongshuGenerator:
             system_prompt=system_prompt,
             user_prompt=user_prompt,
             temperature=0.8,  # 稍高温度增加创意
-            max_tokens=500  # 标题不需要太多token
+            max_tokens=500,  # 标题不需要太多token
+            task=TASK_TITLES
         )
 
         if not result:
@@ -91,17 +159,32 @@ class XiaohongshuGenerator:
         # 解析标题
         titles = []
         for line in result.split('\n'):
-            line = line.strip()
-            # 移除序号和标记
-            line = re.sub(r'^\d+[.、)\]]\s*', '', line)
-            line = re.sub(r'^\[?标题\d*\]?\s*', '', line, flags=re.IGNORECASE)
-            line = re.sub(r'^[-*]\s*', '', line)
-
-            if line and len(line) > 5 and len(line) < 50:
+            line = self._clean_title(line)
+            if line:
                 titles.append(line)
 
         return titles[:5]  # 最多返回5个
 
+    def _clean_title(self, line: str) -> Optional[str]:
+        """
+        清理单个标题（移除序号和标记），长度不合适时返回None
+
+        Args:
+            line: 原始标题行
+
+        Returns:
+            清理后的标题
+        """
+        line = line.strip()
+        # 移除序号和标记
+        line = _NUMBERING.sub('', line)
+        line = _TITLE_LABEL.sub('', line)
+        line = _BULLET.sub('', line)
+
+        if line and len(line) > 5 and len(line) < 50:
+            return line
+        return None
+
     def _generate_content(self, content: str, title: str, max_tokens: int) -> str:
         """
         第二步：根据选定的标题生成正文
@@ -121,7 +204,8 @@ class XiaohongshuGenerator:
             system_prompt=system_prompt,
             user_prompt=user_prompt,
             temperature=0.7,
-            max_tokens=max_tokens
+            max_tokens=max_tokens,
+            task=TASK_XIAOHONGSHU
         )
 
         return result if result else ""
@@ -136,8 +220,7 @@ class XiaohongshuGenerator:
         Returns:
             标签列表
         """
-        tag_matches = re.findall(r'#([^\s#]+)', content)
-        return tag_matches if tag_matches else []
+        return _TAG.findall(content)
 
     def _build_title_system_prompt(self) -> str:
         """构建标题生成的系统提示词"""
@@ -204,6 +287,33 @@ class XiaohongshuGenerator:
 
 请开始生成："""
 
+    def _build_metadata_system_prompt(self) -> str:
+        """构建结构化元信息（标题、标签、配图关键词）的系统提示词"""
+        return self._build_title_system_prompt() + """
+
+### 标签与配图关键词
+你同时负责为笔记提取标签和配图搜索关键词：
+1. 标签：5-10个，包含核心关键词、关联关键词、高转化词、热搜词，不带#号
+2. 配图关键词：3-5个英文关键词，必须是具体的、可视化的名词或短语（主题、场景、物体、人物、活动），避免抽象概念
+
+### 输出格式
+只输出一个 JSON 对象，不要添加任何解释：
+{"titles": ["标题1", "标题2", "标题3", "标题4", "标题5"], "tags": ["标签1", "标签2"], "image_keywords": ["keyword one", "keyword two"]}"""
+
+    def _build_metadata_user_prompt(self, content: str) -> str:
+        """构建结构化元信息的用户提示词"""
+        return f"""请根据以下内容，一次性生成小红书笔记的标题、标签和配图搜索关键词。
+
+内容概要：
+{content[:500]}...
+
+要求：
+1. titles：5个标题，每个使用不同的爆款标题风格，字数控制在20字以内，包含emoji（最多2个），严格遵守平台禁忌词规则
+2. tags：5-10个标签
+3. image_keywords：3-5个适合图片搜索的英文关键词
+
+请输出 JSON："""
+
     def _build_content_system_prompt(self) -> str:
         """构建正文生成的系统提示词"""
         return """## 小红书爆款正文生成专家
@@ -530,15 +640,19 @@ emoji优先用「✨/🔥/✅/💡/❗️/😭/🤔/💪」。
         self.logger.debug(f"正在解析生成结果:\n{result}")
 
         # 提取标题（在"一. 标题"和"二. 正文"之间的内容）
-        title_section_match = re.search(r'一[.、]\s*标题(.*?)二[.、]\s*正文', result, re.DOTALL)
-        if title_section_match:
-            title_section = title_section_match.group(1).strip()
+        # 先找第一处"一. 标题"，再从其后找"二. 正文"，两次线性扫描，不做懒惰匹配回溯
+        title_section_start = _TITLE_SECTION.search(result)
+        content_section_start = (
+            _CONTENT_SECTION.search(result, title_section_start.end()) if title_section_start else None
+        )
+        if content_section_start:
+            title_section = result[title_section_start.end():content_section_start.start()].strip()
             # 提取每一行非空内容作为标题
             for line in title_section.split('\n'):
                 line = line.strip()
                 # 移除可能的序号和标记
-                line = re.sub(r'^\d+[.、)\]]\s*', '', line)
-                line = re.sub(r'^\[标题\d+\]\s*', '', line)
+                line = _NUMBERING.sub('', line)
+                line = _TITLE_MARKER.sub('', line)
                 if line and not line.startswith('#'):
                     titles.append(line)
 
@@ -550,7 +664,7 @@ emoji优先用「✨/🔥/✅/💡/❗️/😭/🤔/💪」。
                 # 跳过明显的标记行
                 if line and not line.startswith('#') and '正文' not in line and '标题' not in line and len(line) > 5:
                     # 移除可能的序号
-                    line = re.sub(r'^\d+[.、)\]]\s*', '', line)
+                    line = _NUMBERING.sub('', line)
                     if line:
                         titles.append(line)
                         if len(titles) >= 5:  # 最多提取5个
@@ -564,7 +678,7 @@ emoji优先用「✨/🔥/✅/💡/❗️/😭/🤔/💪」。
             self.logger.warning("未能提取到标题")
 
         # 提取标签（在"标签："后面的内容）
-        tag_matches = re.findall(r'#([^\s#]+)', result)
+        tag_matches = _TAG.findall(result)
         if tag_matches:
             tags = tag_matches
             self.logger.info(f"提取到 {len(tags)} 个标签")
@@ -598,12 +712,14 @@ emoji优先用「✨/🔥/✅/💡/❗️/😭/🤔/💪」。
 
         # 清理content中可能已有的标题（避免重复）
         # 移除开头的markdown标题
-        content_cleaned = re.sub(r'^#\s+.*?\n', '', content, count=1).strip()
+        content_cleaned = _LEADING_HEADING.sub('', content, count=1).strip()
 
         # 移除content末尾已有的标签（避免重复）
         # 查找并移除末尾的标签部分（以 --- 分隔或连续的 #标签）
-        content_cleaned = re.sub(r'\n\n---\n\n#.*$', '', content_cleaned, flags=re.DOTALL)
-        content_cleaned = re.sub(r'\n\n(#[^\s#]+\s*)+$', '', content_cleaned).strip()
+        separator = content_cleaned.find('\n\n---\n\n#')
+        if separator >= 0:
+            content_cleaned = content_cleaned[:separator]
+        content_cleaned = _TRAILING_TAGS.sub('', content_cleaned).strip()
 
         # 如果有多个标题，先展示所有标题供选择
         if all_titles and len(all_titles) > 1:
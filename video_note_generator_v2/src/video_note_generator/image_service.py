@@ -5,7 +5,6 @@
 """
 from typing import Optional, List
 import logging
-import httpx
 
 
 class UnsplashImageService:
@@ -44,6 +43,8 @@ class UnsplashImageService:
         Returns:
             图片URL列表
         """
+        import httpx
+
         try:
             headers = {
                 'Authorization': f'Client-ID {self.access_key}'
@@ -118,7 +119,8 @@ class UnsplashImageService:
         tags: List[str] = None,
         count: int = 3,
         ai_processor = None,
-        content: str = None
+        content: str = None,
+        keywords: Optional[str] = None
     ) -> List[str]:
         """
         为小红书笔记获取相关图片
@@ -129,14 +131,15 @@ class UnsplashImageService:
             count: 图片数量
             ai_processor: AI 处理器（用于提取关键词）
             content: 视频原始内容（优先使用）
+            keywords: 已生成的英文关键词（提供时不再调用 AI 提取）
 
         Returns:
             图片URL列表
         """
-        search_query = None
+        search_query = keywords
 
         # 优先使用视频内容提取关键词（更准确）
-        if content and ai_processor:
+        if not search_query and content and ai_processor:
             try:
                 self.logger.info("正在从视频内容提取图片搜索关键词...")
                 search_query = ai_processor.extract_image_keywords(content)
@@ -0,0 +1,441 @@
+"""
+笔记索引
+
+把每次生成的笔记（来源 URL、视频信息、各阶段耗时、模型与 token 用量、正文）写入本地 SQLite，
+用 FTS5 全文索引提供分页列表与搜索，不必再扫描输出目录、逐个读取笔记文件。
+
+中文没有空格分词，写入 FTS 表前在每个汉字两侧加空格（每个汉字是一个词），
+查询时把搜索词按同样方式切分后作为短语匹配，任意长度的中文子串都能走索引。
+SQLite 未编译 FTS5 时退化为 LIKE 查询。
+"""
+import json
+import logging
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from .config import Settings
+from .downloader.base import VideoInfo
+
+# 输出文件名：{timestamp}_{kind}.md
+NOTE_FILE_PATTERN = re.compile(r'^(\d{8}_\d{6})_(original|organized|xiaohongshu|blog)\.md$')
+TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"
+
+# 原始/整理版笔记头部的视频信息（补录旧笔记时解析）
+_TITLE_PATTERN = re.compile(r'^# (.+?)(?: - 整理版)?$', re.MULTILINE)
+_FIELD_PATTERNS = {
+    'uploader': re.compile(r'^- 作者：(.*)$', re.MULTILINE),
+    'duration': re.compile(r'^- 时长：(\d+)秒$', re.MULTILINE),
+    'platform': re.compile(r'^- 平台：(.*)$', re.MULTILINE),
+    'url': re.compile(r'^- 链接：(.*)$', re.MULTILINE),
+}
+
+# 中日韩字符（写入 FTS 表前逐字切分）
+_CJK_PATTERN = re.compile(r'([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff])')
+_SEGMENTED_CJK_PATTERN = re.compile(r' ?([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]) ?')
+
+MAX_PAGE_SIZE = 100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    url TEXT NOT NULL,
+    title TEXT NOT NULL DEFAULT '',
+    uploader TEXT NOT NULL DEFAULT '',
+    description TEXT NOT NULL DEFAULT '',
+    platform TEXT NOT NULL DEFAULT '',
+    duration INTEGER NOT NULL DEFAULT 0,
+    thumbnail_url TEXT,
+    source TEXT,
+    ai_model TEXT,
+    whisper_model TEXT,
+    created_at TEXT NOT NULL,
+    files TEXT NOT NULL DEFAULT '[]',
+    usage TEXT,
+    total_seconds REAL,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    content TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS notes_created_at ON notes (created_at DESC, id DESC);
+"""
+
+# FTS 表保存切分后的文本（rowid 与 notes.id 一致），由 _upsert 同步写入
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+    title, uploader, description, content, tokenize='unicode61'
+);
+"""
+
+_FTS_COLUMNS = ('title', 'uploader', 'description', 'content')
+
+# 列表与搜索结果返回的字段（不含正文与用量明细）
+_SUMMARY_COLUMNS = (
+    "id", "key", "url", "title", "uploader", "platform", "duration", "thumbnail_url",
+    "source", "ai_model", "created_at", "files", "total_seconds",
+    "prompt_tokens", "completion_tokens",
+)
+
+
+class NoteIndex:
+    """笔记索引（SQLite，WAL 模式，每次操作使用独立连接，可在多线程中共用）"""
+
+    def __init__(self, db_path: Path, logger: Optional[logging.Logger] = None):
+        """
+        初始化索引（数据库不存在时创建）
+
+        Args:
+            db_path: 数据库文件路径
+            logger: 日志记录器
+        """
+        self.db_path = Path(db_path)
+        self.logger = logger or logging.getLogger(__name__)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.fts_enabled = False
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            try:
+                conn.executescript(_FTS_SCHEMA)
+                self.fts_enabled = True
+            except sqlite3.OperationalError as e:
+                self.logger.warning(f"SQLite 不支持 FTS5，笔记搜索使用 LIKE 查询: {e}")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """打开连接，成功时提交、异常时回滚"""
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def add_note(
+        self,
+        key: str,
+        video_info: VideoInfo,
+        files: Sequence[Path],
+        source: Optional[str] = None,
+        ai_model: Optional[str] = None,
+        whisper_model: Optional[str] = None,
+        usage: Optional[dict] = None,
+        created_at: Optional[datetime] = None
+    ) -> int:
+        """
+        写入一条笔记（同一 key 再次写入时覆盖）
+
+        Args:
+            key: 笔记标识（输出文件名的时间戳前缀）
+            video_info: 视频信息
+            files: 生成的文件
+            source: 文本来源（subtitle/audio 等）
+            ai_model: 生成笔记使用的模型
+            whisper_model: 转录模型（使用字幕时为空）
+            usage: 任务用量（JobUsage.to_dict()）
+            created_at: 生成时间，默认当前时间
+
+        Returns:
+            笔记 ID
+        """
+        with self._connect() as conn:
+            return self._upsert(conn, self._row(
+                key, video_info, files, source, ai_model, whisper_model, usage, created_at
+            ))
+
+    @staticmethod
+    def _row(
+        key: str,
+        video_info: VideoInfo,
+        files: Sequence[Path],
+        source: Optional[str],
+        ai_model: Optional[str],
+        whisper_model: Optional[str],
+        usage: Optional[dict],
+        created_at: Optional[datetime]
+    ) -> dict:
+        models = (usage or {}).get('models', {})
+        return {
+            'key': key,
+            'url': video_info.url,
+            'title': video_info.title or '',
+            'uploader': video_info.uploader or '',
+            'description': video_info.description or '',
+            'platform': video_info.platform or '',
+            'duration': int(video_info.duration or 0),
+            'thumbnail_url': video_info.thumbnail_url,
+            'source': source,
+            'ai_model': ai_model,
+            'whisper_model': whisper_model,
+            'created_at': (created_at or datetime.now()).isoformat(timespec='seconds'),
+            'files': json.dumps([str(f) for f in files], ensure_ascii=False),
+            'usage': json.dumps(usage, ensure_ascii=False) if usage else None,
+            'total_seconds': (usage or {}).get('total_seconds'),
+            'prompt_tokens': sum(entry.get('prompt_tokens', 0) for entry in models.values()),
+            'completion_tokens': sum(entry.get('completion_tokens', 0) for entry in models.values()),
+            'content': _read_notes(files),
+        }
+
+    def _upsert(self, conn: sqlite3.Connection, row: dict) -> int:
+        columns = ', '.join(row)
+        placeholders = ', '.join(f':{name}' for name in row)
+        updates = ', '.join(f'{name} = excluded.{name}' for name in row if name != 'key')
+        conn.execute(
+            f"INSERT INTO notes ({columns}) VALUES ({placeholders}) "
+            f"ON CONFLICT(key) DO UPDATE SET {updates}",
+            row
+        )
+        note_id = conn.execute("SELECT id FROM notes WHERE key = ?", (row['key'],)).fetchone()[0]
+
+        if self.fts_enabled:
+            conn.execute("DELETE FROM notes_fts WHERE rowid = ?", (note_id,))
+            conn.execute(
+                f"INSERT INTO notes_fts (rowid, {', '.join(_FTS_COLUMNS)}) VALUES (?, ?, ?, ?, ?)",
+                [note_id] + [_segment(row[name]) for name in _FTS_COLUMNS]
+            )
+        return note_id
+
+    def get(self, note_id: int) -> Optional[dict]:
+        """
+        获取单条笔记的完整记录（含用量明细，不含正文）
+
+        Args:
+            note_id: 笔记 ID
+
+        Returns:
+            笔记记录，不存在时返回 None
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(_SUMMARY_COLUMNS)}, description, whisper_model, usage "
+                "FROM notes WHERE id = ?",
+                (note_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        note = _to_dict(row)
+        note['usage'] = json.loads(note['usage']) if note['usage'] else None
+        return note
+
+    def list_notes(self, page: int = 1, page_size: int = 20) -> dict:
+        """
+        按生成时间倒序分页列出笔记
+
+        Args:
+            page: 页码（从 1 开始）
+            page_size: 每页条数
+
+        Returns:
+            {'total', 'page', 'page_size', 'items'}
+        """
+        page, page_size = max(page, 1), min(max(page_size, 1), MAX_PAGE_SIZE)
+        with self._connect() as conn:
+            total = conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+            rows = conn.execute(
+                f"SELECT {', '.join(_SUMMARY_COLUMNS)} FROM notes "
+                "ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+                (page_size, (page - 1) * page_size)
+            ).fetchall()
+        return _page(total, page, page_size, [_to_dict(row) for row in rows])
+
+    def search(
+        self,
+        query: str,
+        page: int = 1,
+        page_size: int = 20,
+        sort: str = "recent"
+    ) -> dict:
+        """
+        全文搜索笔记（标题、作者、简介与各版本正文），多个词之间为“且”的关系
+
+        Args:
+            query: 搜索词（空格分隔多个词）
+            page: 页码（从 1 开始）
+            page_size: 每页条数
+            sort: recent 按写入顺序倒序（只读取当前页）；relevance 按 bm25 相关度
+                  （需要为全部匹配项打分，常见词在大库上会慢一个数量级）
+
+        Returns:
+            {'total', 'page', 'page_size', 'items'}，每条附带 snippet（匹配处的上下文）
+        """
+        terms = query.split()
+        if not terms:
+            return self.list_notes(page, page_size)
+        page, page_size = max(page, 1), min(max(page_size, 1), MAX_PAGE_SIZE)
+        offset = (page - 1) * page_size
+
+        # 每个词切分后作为短语匹配（连续的汉字必须相邻出现）
+        phrases = [_segment(term).strip() for term in terms]
+        if self.fts_enabled and all(re.search(r'\w', phrase) for phrase in phrases):
+            match = ' AND '.join('"' + phrase.replace('"', '""') + '"' for phrase in phrases)
+            columns = ', '.join(f'notes.{name}' for name in _SUMMARY_COLUMNS)
+            with self._connect() as conn:
+                total = conn.execute(
+                    "SELECT COUNT(*) FROM notes_fts WHERE notes_fts MATCH ?", (match,)
+                ).fetchone()[0]
+                rows = conn.execute(
+                    f"SELECT {columns}, snippet(notes_fts, -1, '', '', '…', 32) AS snippet "
+                    "FROM notes_fts JOIN notes ON notes.id = notes_fts.rowid "
+                    "WHERE notes_fts MATCH ? "
+                    f"ORDER BY {'rank' if sort == 'relevance' else 'notes_fts.rowid DESC'} LIMIT ? OFFSET ?",
+                    (match, page_size, offset)
+                ).fetchall()
+
+            items = []
+            for row in rows:
+                item = _to_dict(row)
+                item['snippet'] = _SEGMENTED_CJK_PATTERN.sub(r'\1', item['snippet'] or '')
+                items.append(item)
+            return _page(total, page, page_size, items)
+
+        where = ' AND '.join(
+            "(title LIKE ? ESCAPE '\\' OR uploader LIKE ? ESCAPE '\\' "
+            "OR description LIKE ? ESCAPE '\\' OR content LIKE ? ESCAPE '\\')"
+            for _ in terms
+        )
+        params: List[str] = []
+        for term in terms:
+            pattern = '%' + re.sub(r'([\\%_])', r'\\\1', term) + '%'
+            params.extend([pattern] * 4)
+        with self._connect() as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM notes WHERE {where}", params).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT {', '.join(_SUMMARY_COLUMNS)}, content FROM notes WHERE {where} "
+                "ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+                params + [page_size, offset]
+            ).fetchall()
+
+        items = []
+        for row in rows:
+            item = _to_dict(row)
+            item['snippet'] = _snippet(item.pop('content'), terms[0])
+            items.append(item)
+        return _page(total, page, page_size, items)
+
+    def indexed_keys(self) -> set:
+        """已索引的笔记标识"""
+        with self._connect() as conn:
+            return {row[0] for row in conn.execute("SELECT key FROM notes")}
+
+    def backfill(self, output_dir: Path) -> int:
+        """
+        补录输出目录中尚未索引的笔记（根据文件名分组，从笔记头部解析视频信息）
+
+        Args:
+            output_dir: 输出目录
+
+        Returns:
+            新增的笔记数
+        """
+        groups: Dict[str, Dict[str, Path]] = {}
+        for path in Path(output_dir).glob("*.md"):
+            match = NOTE_FILE_PATTERN.match(path.name)
+            if match:
+                groups.setdefault(match.group(1), {})[match.group(2)] = path
+
+        known = self.indexed_keys()
+        rows = []
+        # 按时间顺序写入，使 ID 顺序与生成顺序一致
+        for key, files in sorted(groups.items()):
+            if key in known:
+                continue
+            header_file = files.get('original') or files.get('organized')
+            if header_file is None:
+                continue
+            try:
+                video_info = _parse_header(header_file.read_text(encoding='utf-8'))
+                created_at = datetime.strptime(key, TIMESTAMP_FORMAT)
+            except (OSError, UnicodeDecodeError, ValueError) as e:
+                self.logger.warning(f"跳过无法解析的笔记 {header_file}: {e}")
+                continue
+            ordered = [files[kind] for kind in ('original', 'organized', 'xiaohongshu', 'blog') if kind in files]
+            rows.append(self._row(key, video_info, ordered, None, None, None, None, created_at))
+
+        if rows:
+            with self._connect() as conn:
+                for row in rows:
+                    self._upsert(conn, row)
+            self.logger.info(f"笔记索引补录 {len(rows)} 条")
+        return len(rows)
+
+
+def _segment(text: str) -> str:
+    """在每个中日韩字符两侧加空格，使 unicode61 分词把它们切成单字"""
+    return _CJK_PATTERN.sub(r' \1 ', text or '')
+
+
+def _read_notes(files: Sequence[Path]) -> str:
+    """读取笔记正文（用于全文检索）"""
+    parts = []
+    for path in files:
+        try:
+            parts.append(Path(path).read_text(encoding='utf-8'))
+        except (OSError, UnicodeDecodeError):
+            continue
+    return '\n\n'.join(parts)
+
+
+def _parse_header(text: str) -> VideoInfo:
+    """从原始/整理版笔记头部解析视频信息"""
+    title = _TITLE_PATTERN.search(text)
+    fields = {name: pattern.search(text) for name, pattern in _FIELD_PATTERNS.items()}
+    return VideoInfo(
+        title=title.group(1).strip() if title else '',
+        uploader=fields['uploader'].group(1).strip() if fields['uploader'] else '',
+        description='',
+        duration=int(fields['duration'].group(1)) if fields['duration'] else 0,
+        platform=fields['platform'].group(1).strip() if fields['platform'] else '',
+        url=fields['url'].group(1).strip() if fields['url'] else ''
+    )
+
+
+def _snippet(content: str, term: str, width: int = 40) -> str:
+    """截取匹配处前后的内容"""
+    index = content.lower().find(term.lower())
+    if index < 0:
+        return content[:width * 2]
+    start = max(index - width, 0)
+    end = index + len(term) + width
+    return ('…' if start else '') + content[start:end] + ('…' if end < len(content) else '')
+
+
+def _to_dict(row: sqlite3.Row) -> dict:
+    item = dict(row)
+    if 'files' in item:
+        item['files'] = json.loads(item['files'])
+    return item
+
+
+def _page(total: int, page: int, page_size: int, items: List[dict]) -> dict:
+    return {'total': total, 'page': page, 'page_size': page_size, 'items': items}
+
+
+# 进程内共享的索引实例（按数据库路径）
+_indexes: Dict[Path, NoteIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_note_index(settings: Settings, logger: Optional[logging.Logger] = None) -> NoteIndex:
+    """
+    获取共享的笔记索引
+
+    Args:
+        settings: 配置对象（NOTE_INDEX_FILE 为空时使用 output_dir/notes.db）
+        logger: 日志记录器
+
+    Returns:
+        笔记索引
+    """
+    db_path = Path(settings.note_index_file or settings.output_dir / "notes.db").resolve()
+    with _indexes_lock:
+        index = _indexes.get(db_path)
+        if index is None:
+            index = _indexes[db_path] = NoteIndex(db_path, logger=logger)
+        return index
@@ -0,0 +1,302 @@
+"""
+分P / 合集 / 播放列表展开
+
+把一个链接展开为逐集的视频链接，每集作为独立任务处理：
+- B站分P视频（链接未指定 p 参数时）展开为 ?p=1..N
+- B站合集、系列链接（space.bilibili.com 的 collectiondetail / seriesdetail / lists 页面）按页列出视频；
+  单个视频属于合集时，按配置决定是否展开整个合集
+- YouTube 播放列表（/playlist?list=...）由 yt-dlp 平铺列出，不逐个解析视频
+
+B站视频信息与字幕查询共用 SubtitleExtractor 的缓存，展开后处理各集时不再重复请求 view 接口。
+"""
+import logging
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from .subtitle_extractor import SubtitleExtractor
+from .utils.url_resolver import ResolvedURL, resolve_url
+
+# 展开类型 -> 笔记中显示的名称
+PLAYLIST_KIND_NAMES: Dict[str, str] = {
+    'multipart': '分P视频',
+    'collection': '合集',
+    'series': '系列',
+    'youtube_playlist': '播放列表',
+}
+
+# space.bilibili.com/{mid}/channel/collectiondetail?sid={id}（合集）、seriesdetail?sid={id}（系列）
+_BILIBILI_CHANNEL = re.compile(r'space\.bilibili\.com/(\d+)/channel/(collection|series)detail\?(?:[^#]*&)?sid=(\d+)')
+# space.bilibili.com/{mid}/lists/{id}?type=season|series（新版空间页）
+_BILIBILI_LISTS = re.compile(r'space\.bilibili\.com/(\d+)/lists/(\d+)')
+
+_SEASON_API = 'https://api.bilibili.com/x/polymer/web-space/seasons_archives_list'
+_SERIES_API = 'https://api.bilibili.com/x/series/archives'
+_BILIBILI_PAGE_SIZE = 30
+
+
+@dataclass(frozen=True)
+class PlaylistEntry:
+    """展开后的一集"""
+    url: str
+    title: str
+    index: int
+    duration: int = 0
+
+
+@dataclass
+class Playlist:
+    """展开结果"""
+    kind: str
+    title: str
+    url: str
+    entries: List[PlaylistEntry]
+    uploader: str = ''
+    platform: str = ''
+
+    @property
+    def kind_name(self) -> str:
+        """展开类型的显示名称"""
+        return PLAYLIST_KIND_NAMES.get(self.kind, self.kind)
+
+
+@dataclass
+class PlaylistResult:
+    """逐集处理结果"""
+    playlist: Playlist
+    results: Dict[str, List[Path]] = field(default_factory=dict)
+    merged_file: Optional[Path] = None
+
+    @property
+    def succeeded(self) -> List[PlaylistEntry]:
+        """生成了文件的分集"""
+        return [entry for entry in self.playlist.entries if self.results.get(entry.url)]
+
+    @property
+    def files(self) -> List[Path]:
+        """所有生成的文件（合并笔记在前）"""
+        files = [self.merged_file] if self.merged_file else []
+        for entry in self.playlist.entries:
+            files.extend(self.results.get(entry.url) or [])
+        return files
+
+
+def _bilibili_list_id(url: str) -> Optional[Tuple[str, str, str]]:
+    """
+    识别B站合集 / 系列链接
+
+    Returns:
+        (UP主 mid, collection/series, 列表 ID)，不是合集或系列链接时返回 None
+    """
+    match = _BILIBILI_CHANNEL.search(url)
+    if match:
+        return match.group(1), match.group(2), match.group(3)
+    match = _BILIBILI_LISTS.search(url)
+    if match:
+        list_type = parse_qs(urlsplit(url).query).get('type', ['season'])[0]
+        return match.group(1), 'series' if list_type == 'series' else 'collection', match.group(2)
+    return None
+
+
+def _youtube_list_id(url: str) -> Optional[str]:
+    """YouTube 播放列表页（/playlist?list=...）的列表 ID；带视频 ID 的观看页不算播放列表"""
+    parts = urlsplit(url)
+    if parts.path.rstrip('/') != '/playlist':
+        return None
+    return parse_qs(parts.query).get('list', [None])[0]
+
+
+class PlaylistExpander:
+    """把分P视频、合集、播放列表链接展开为逐集链接"""
+
+    def __init__(
+        self,
+        subtitle_extractor: Optional[SubtitleExtractor] = None,
+        max_entries: int = 200,
+        expand_collections: bool = False,
+        logger: Optional[logging.Logger] = None
+    ):
+        """
+        初始化展开器
+
+        Args:
+            subtitle_extractor: 字幕提取器（复用其 HTTP 会话与B站视频信息缓存），None 时自动创建
+            max_entries: 最多展开的分集数
+            expand_collections: 单个B站视频属于合集时是否展开整个合集
+            logger: 日志记录器
+        """
+        self.subtitle_extractor = subtitle_extractor or SubtitleExtractor()
+        self.max_entries = max_entries
+        self.expand_collections = expand_collections
+        self.logger = logger or logging.getLogger(__name__)
+
+    def expand(self, url: str) -> Optional[Playlist]:
+        """
+        展开链接
+
+        Args:
+            url: 视频、合集或播放列表链接
+
+        Returns:
+            展开结果；单个视频（含指定了分P的链接）或展开失败时返回 None
+        """
+        resolved = resolve_url(url)
+        try:
+            if resolved.platform == 'bilibili':
+                if resolved.video_id:
+                    playlist = self._expand_bilibili_video(resolved)
+                else:
+                    list_id = _bilibili_list_id(url)
+                    playlist = self._expand_bilibili_list(*list_id) if list_id else None
+            elif resolved.platform == 'youtube' and not resolved.video_id:
+                list_id = _youtube_list_id(url)
+                playlist = self._expand_youtube_playlist(list_id) if list_id else None
+            else:
+                playlist = None
+        except Exception as e:  # pylint: disable=broad-except
+            self.logger.warning(f"展开分P/合集/播放列表失败，按单个视频处理: {e}")
+            return None
+
+        if not playlist or not playlist.entries:
+            return None
+        playlist.platform = resolved.display_name
+        if len(playlist.entries) > self.max_entries:
+            self.logger.warning(f"{playlist.kind_name}超过 {self.max_entries} 集，只处理前 {self.max_entries} 集")
+            playlist.entries = playlist.entries[:self.max_entries]
+        self.logger.info(f"{playlist.kind_name}「{playlist.title}」展开为 {len(playlist.entries)} 集")
+        return playlist
+
+    def _expand_bilibili_video(self, resolved: ResolvedURL) -> Optional[Playlist]:
+        """B站视频：属于合集且允许展开时展开合集，否则多P视频展开各P"""
+        if resolved.part:
+            # 链接指定了分P，只处理这一P
+            return None
+
+        video = self.subtitle_extractor.get_bilibili_view(resolved.video_id)
+        if not video:
+            return None
+        uploader = (video.get('owner') or {}).get('name', '')
+
+        season = video.get('ugc_season')
+        if self.expand_collections and season:
+            entries = []
+            for section in season.get('sections') or []:
+                for episode in section.get('episodes') or []:
+                    page = episode.get('page') or {}
+                    url = f"https://www.bilibili.com/video/{episode['bvid']}"
+                    if (page.get('page') or 1) > 1:
+                        url += f"?p={page['page']}"
+                    entries.append(PlaylistEntry(
+                        url=url,
+                        title=episode.get('title', ''),
+                        index=len(entries) + 1,
+                        duration=(episode.get('arc') or {}).get('duration') or page.get('duration') or 0
+                    ))
+            return Playlist(
+                kind='collection',
+                title=season.get('title', ''),
+                url=f"https://space.bilibili.com/{season.get('mid')}/lists/{season.get('id')}?type=season",
+                entries=entries,
+                uploader=uploader
+            )
+
+        pages = video.get('pages') or []
+        if len(pages) <= 1:
+            return None
+        entries = [
+            PlaylistEntry(
+                url=f"{resolved.canonical_url}?p={page['page']}",
+                title=f"P{page['page']} {page.get('part', '')}".rstrip(),
+                index=page['page'],
+                duration=page.get('duration') or 0
+            )
+            for page in pages
+        ]
+        return Playlist(
+            kind='multipart',
+            title=video.get('title', ''),
+            url=resolved.canonical_url,
+            entries=entries,
+            uploader=uploader
+        )
+
+    def _expand_bilibili_list(self, mid: str, kind: str, list_id: str) -> Optional[Playlist]:
+        """B站合集 / 系列：按页列出视频，达到 max_entries 即停止翻页"""
+        session = self.subtitle_extractor.session
+        headers = self.subtitle_extractor.headers
+        entries: List[PlaylistEntry] = []
+        title = ''
+        page_num = 1
+
+        while len(entries) < self.max_entries + 1:
+            if kind == 'collection':
+                params = {'mid': mid, 'season_id': list_id, 'sort_reverse': 'false',
+                          'page_num': page_num, 'page_size': _BILIBILI_PAGE_SIZE}
+                response = session.get(_SEASON_API, params=params, headers=headers, timeout=10)
+            else:
+                params = {'mid': mid, 'series_id': list_id, 'only_normal': 'true', 'sort': 'asc',
+                          'pn': page_num, 'ps': _BILIBILI_PAGE_SIZE}
+                response = session.get(_SERIES_API, params=params, headers=headers, timeout=10)
+            data = response.json()
+            if data.get('code') != 0:
+                raise ValueError(f"获取{PLAYLIST_KIND_NAMES[kind]}列表失败: {data.get('message')}")
+
+            payload = data.get('data') or {}
+            title = title or (payload.get('meta') or {}).get('name', '')
+            archives = payload.get('archives') or []
+            for archive in archives:
+                entries.append(PlaylistEntry(
+                    url=f"https://www.bilibili.com/video/{archive['bvid']}",
+                    title=archive.get('title', ''),
+                    index=len(entries) + 1,
+                    duration=archive.get('duration') or 0
+                ))
+
+            page = payload.get('page') or {}
+            total = page.get('total') or 0
+            if not archives or len(entries) >= total:
+                break
+            page_num += 1
+
+        return Playlist(
+            kind=kind,
+            title=title or f"{PLAYLIST_KIND_NAMES[kind]} {list_id}",
+            url=f"https://space.bilibili.com/{mid}/lists/{list_id}?type={'season' if kind == 'collection' else 'series'}",
+            entries=entries
+        )
+
+    def _expand_youtube_playlist(self, list_id: str) -> Optional[Playlist]:
+        """YouTube 播放列表：只平铺列出条目，不解析各视频的格式"""
+        import yt_dlp
+
+        url = f"https://www.youtube.com/playlist?list={list_id}"
+        ydl_opts = {
+            'quiet': True,
+            'no_warnings': True,
+            'skip_download': True,
+            'extract_flat': 'in_playlist',
+            # 多取一条，用于判断是否被截断
+            'playlistend': self.max_entries + 1,
+        }
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(url, download=False)
+
+        entries = []
+        for item in info.get('entries') or []:
+            if not item or not item.get('id'):
+                continue
+            entries.append(PlaylistEntry(
+                url=f"https://www.youtube.com/watch?v={item['id']}",
+                title=item.get('title') or '',
+                index=len(entries) + 1,
+                duration=int(item.get('duration') or 0)
+            ))
+        return Playlist(
+            kind='youtube_playlist',
+            title=info.get('title') or list_id,
+            url=url,
+            entries=entries,
+            uploader=info.get('uploader') or info.get('channel') or ''
+        )
@@ -1,10 +1,17 @@
 """
 视频笔记生成处理器
 """
+import asyncio
+import os
+import re
 import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Optional
-from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
 import logging
 
 from .config import Settings
@@ -15,30 +22,110 @@ from .downloader import (
     ResDownloader,
     VideoInfo,
 )
-from .transcriber import WhisperTranscriber
-from .ai_processor import AIProcessor
+from .downloader.base import progress_listener
+from .transcriber import WhisperTranscriber, get_transcription_batcher
+from .workers import get_transcription_pool
+from .audio_stream import FFmpegPCMStream, FileTailFeeder
+from .ai_processor import (
+    AIProcessor,
+    AsyncAIProcessor,
+    LoopBoundAIProcessor,
+    ModelRouter,
+    get_completion_cache,
+)
+from .utils.metrics import AUDIO_SECONDS, DOWNLOAD_BYTES, VIDEOS, current_job, stage_timer, track_job
+from .utils.rate_limiter import get_rate_limiter
+from .utils.url_resolver import resolve_url
+from .utils import tracing
 from .generators.xiaohongshu import XiaohongshuGenerator
 from .generators.blog import BlogGenerator
 from .image_service import UnsplashImageService
-from .subtitle_extractor import SubtitleExtractor
+from .subtitle_extractor import SubtitleExtractor, SubtitlePreference
+from .playlist import Playlist, PlaylistExpander, PlaylistResult
+from .note_index import get_note_index
+
+# 整理版笔记中正文开始的标记（合并笔记据此取出各集正文）
+_ORGANIZED_MARKER = "## 内容整理\n\n"
+
+# 合并笔记中各集正文的标题下降两级，挂在分集标题之下
+_HEADING = re.compile(r'^(#{1,4}) ', re.MULTILINE)
+
+# 输出文件名的时间戳（秒级）；并发任务在同一秒开始时顺延，避免互相覆盖文件
+_timestamp_lock = threading.Lock()
+_last_timestamp: Optional[datetime] = None
+
+
+def _allocate_timestamp() -> str:
+    """分配一个本进程内不重复的输出文件时间戳"""
+    global _last_timestamp
+    with _timestamp_lock:
+        moment = datetime.now().replace(microsecond=0)
+        if _last_timestamp is not None and moment <= _last_timestamp:
+            moment = _last_timestamp + timedelta(seconds=1)
+        _last_timestamp = moment
+    return moment.strftime("%Y%m%d_%H%M%S")
 
 
 class VideoNoteProcessor:
     """视频笔记处理器"""
 
-    def __init__(self, settings: Settings, logger: logging.Logger):
+    def __init__(
+        self,
+        settings: Settings,
+        logger: logging.Logger,
+        event_loop: Optional[asyncio.AbstractEventLoop] = None
+    ):
         """
         初始化处理器
 
         Args:
             settings: 配置对象
             logger: 日志记录器
+            event_loop: 执行 LLM 请求的事件循环（Web 应用传入主循环，处理器需在其他线程中使用）；
+                None 时使用同步的 AIProcessor
         """
         self.settings = settings
         self.logger = logger
+        self.event_loop = event_loop
+
+        # 链路追踪（默认写入 log_dir/traces.jsonl）
+        if settings.tracing_enabled:
+            tracing.configure_tracing(settings.trace_file or settings.log_dir / "traces.jsonl")
+
+        self._init_media(settings, logger)
 
+        # split 模式：无字幕的任务交给重型转录进程池，本进程不加载 Whisper
+        self.transcription_pool = None
+        if settings.worker_mode == "split":
+            self.transcription_pool = get_transcription_pool(settings, logger)
+
+        self._init_generation(settings, logger)
+
+    @classmethod
+    def for_transcription(cls, settings: Settings, logger: logging.Logger) -> "VideoNoteProcessor":
+        """
+        创建只包含下载与转录组件的处理器（供重型转录进程使用，不初始化 LLM 与生成器）
+
+        Args:
+            settings: 配置对象
+            logger: 日志记录器
+
+        Returns:
+            处理器实例，只能调用 _transcribe_media
+        """
+        processor = cls.__new__(cls)
+        processor.settings = settings
+        processor.logger = logger
+        if settings.tracing_enabled:
+            tracing.configure_tracing(settings.trace_file or settings.log_dir / "traces.jsonl")
+        processor._init_media(settings, logger)
+        processor.transcription_pool = None
+        return processor
+
+    def _init_media(self, settings: Settings, logger: logging.Logger):
+        """初始化下载器与转录器"""
         # 初始化下载器注册表
-        self.downloader_registry = DownloaderRegistry()
+        self.downloader_registry = DownloaderRegistry(race=settings.download_race)
 
         # 注册 Bilibili 专用下载器（优先级高，先注册）
         bilibili_downloader = BilibiliDownloader(
@@ -51,7 +138,8 @@ class VideoNoteProcessor:
         res_downloader = ResDownloader(
             logger=logger,
             proxies=settings.get_proxies(),
-            cookie_file=settings.cookie_file
+            cookie_file=settings.cookie_file,
+            ffmpeg_path=settings.ffmpeg_path
         )
         self.downloader_registry.register(res_downloader)
 
@@ -69,18 +157,82 @@ class VideoNoteProcessor:
             cache_dir=settings.cache_dir / "transcriptions"
         )
 
+        # 短音频批量转录（进程内共享，不同任务的短音频合并成批）
+        self.transcription_batcher = None
+        if settings.transcribe_batch_size > 1:
+            self.transcription_batcher = get_transcription_batcher(
+                self.transcriber,
+                model_name=settings.whisper_model,
+                language="zh",
+                batch_size=settings.transcribe_batch_size,
+                max_wait=settings.transcribe_batch_wait,
+                max_seconds=settings.transcribe_batch_max_seconds,
+                logger=logger
+            )
+
+    def _init_generation(self, settings: Settings, logger: logging.Logger):
+        """初始化字幕提取、LLM 与各生成器"""
         # 初始化字幕提取器
-        self.subtitle_extractor = SubtitleExtractor()
+        self.subtitle_extractor = SubtitleExtractor(
+            preference=SubtitlePreference(
+                languages=settings.subtitle_languages,
+                prefer_manual=settings.subtitle_prefer_manual,
+                allow_auto=settings.subtitle_allow_auto,
+                allow_translated=settings.subtitle_allow_translated
+            ),
+            parallel_tracks=settings.subtitle_parallel_tracks
+        )
+
+        # 分P / 合集 / 播放列表展开（与字幕提取共用B站视频信息缓存）
+        self.playlist_expander = PlaylistExpander(
+            subtitle_extractor=self.subtitle_extractor,
+            max_entries=settings.playlist_max_entries,
+            expand_collections=settings.playlist_expand_collections,
+            logger=logger
+        )
+
+        # 初始化 LLM 响应缓存
+        completion_cache = None
+        if settings.llm_cache_enabled:
+            completion_cache = get_completion_cache(
+                cache_dir=settings.cache_dir / "llm",
+                ttl=settings.llm_cache_ttl,
+                max_entries=settings.llm_cache_max_entries,
+                logger=logger
+            )
 
         # 初始化 AI 处理器
-        self.ai_processor = AIProcessor(
+        ai_options = dict(
             api_key=settings.openrouter_api_key,
             base_url=settings.openrouter_api_url,
             model=settings.ai_model,
             app_name=settings.openrouter_app_name,
             http_referer=settings.openrouter_http_referer,
-            logger=logger
+            logger=logger,
+            cache=completion_cache,
+            rate_limiter=get_rate_limiter(
+                settings.openrouter_api_url,
+                requests_per_minute=settings.llm_requests_per_minute,
+                max_concurrency=settings.llm_max_concurrency
+            ),
+            max_retries=settings.llm_max_retries,
+            router=ModelRouter(
+                default_model=settings.ai_model,
+                light_model=settings.ai_light_model,
+                task_models=settings.ai_task_models,
+                fallback_models=settings.ai_fallback_models,
+                request_timeout=settings.ai_request_timeout,
+                light_timeout=settings.ai_light_timeout
+            )
         )
+        if self.event_loop is not None:
+            # Web 应用：LLM 请求交给主事件循环上的异步处理器，所有任务共用一个连接池
+            self.ai_processor = LoopBoundAIProcessor(
+                AsyncAIProcessor(**ai_options, max_concurrency=settings.llm_max_concurrency),
+                self.event_loop
+            )
+        else:
+            self.ai_processor = AIProcessor(**ai_options)
 
         # 初始化生成器
         self.xiaohongshu_generator = XiaohongshuGenerator(
@@ -101,6 +253,17 @@ class VideoNoteProcessor:
                 logger=logger
             )
 
+        # 笔记索引（SQLite 全文检索）
+        self.note_index = None
+        if settings.note_index_enabled:
+            self.note_index = get_note_index(settings, logger)
+
+    @contextmanager
+    def _stage(self, name: str, **attributes):
+        """处理阶段：同时记录耗时指标和追踪 span"""
+        with stage_timer(name), tracing.span(f"stage.{name}", **attributes) as span:
+            yield span
+
     def process_video(
         self,
         url: str,
@@ -117,67 +280,78 @@ class VideoNoteProcessor:
         Returns:
             生成的文件路径列表
         """
+        with tracing.span("process_video", url=url) as span, track_job():
+            # 短链接展开、去掉分享参数；未知平台的链接原样使用
+            resolved = resolve_url(url)
+            span.set_attributes(platform=resolved.platform, video_key=resolved.key)
+            if resolved.platform != "unknown" and resolved.canonical_url != url:
+                self.logger.info(f"规范链接: {resolved.canonical_url}")
+                url = resolved.canonical_url
+            generated_files = self._process_video(url, generate_xiaohongshu, generate_blog)
+            span.set_attribute("files", len(generated_files))
+            return generated_files
+
+    def _process_video(
+        self,
+        url: str,
+        generate_xiaohongshu: bool,
+        generate_blog: bool
+    ) -> List[Path]:
+        """处理视频的主流程（由 process_video 包上根 span）"""
         self.logger.info(f"开始处理视频: {url}")
         generated_files = []
 
-        # 创建临时目录
-        temp_dir = self.settings.output_dir / "temp"
-        temp_dir.mkdir(parents=True, exist_ok=True)
+        # 创建临时目录（每个任务独立，避免并发任务互相清理对方的文件）
+        temp_root = self.settings.output_dir / "temp"
+        temp_root.mkdir(parents=True, exist_ok=True)
+        temp_dir = Path(tempfile.mkdtemp(prefix="job_", dir=temp_root))
 
         try:
             # Tier 1: 尝试提取官方字幕（最快，免费，1-5秒）
             self.logger.info("🎯 策略1: 尝试提取官方字幕...")
-            transcript = self.subtitle_extractor.extract(url)
-            audio_path = None
+            with self._stage("subtitle"):
+                transcript = self.subtitle_extractor.extract(url)
+            source = "subtitle"
 
             if transcript:
                 self.logger.info(f"✅ 使用官方字幕（{len(transcript)}字符，耗时<5秒）")
 
-                # 获取视频基本信息（不下载）
-                video_info = self._get_video_info_without_download(url)
+                # 获取视频基本信息（字幕查询时已取得的直接使用，否则单独查询，不下载）
+                video_info = self._video_info_from_subtitles(url) or self._get_video_info_without_download(url)
                 if not video_info:
                     self.logger.warning("无法获取视频信息，使用默认信息")
                     video_info = VideoInfo(
                         title="视频标题",
                         duration=0,
                         uploader="未知",
-                        description=""
+                        description="",
+                        platform="未知",
+                        url=url
                     )
             else:
-                # Tier 2/3: 无字幕，下载并使用Whisper转录
                 self.logger.info("❌ 未找到官方字幕")
-                self.logger.info("🎤 策略2/3: 下载并使用Whisper转录...")
-
-                # 1. 下载视频
-                self.logger.info("正在下载视频...")
-                audio_path, video_info = self.downloader_registry.download(
-                    url=url,
-                    output_dir=temp_dir,
-                    audio_only=True
-                )
-
-                if not audio_path or not video_info:
-                    self.logger.error("视频下载失败")
-                    return generated_files
-
-                self.logger.info(f"视频下载成功: {video_info.title}")
-
-                # 2. 转录音频
-                self.logger.info("正在转录音频...")
-                transcript = self.transcriber.transcribe(
-                    audio_path=audio_path,
-                    model_name=self.settings.whisper_model,
-                    language="zh"
-                )
-
-                if not transcript:
-                    self.logger.error("音频转录失败")
+                if self.transcription_pool:
+                    self.logger.info("🎤 交给转录进程池下载并转录...")
+                    with self._stage("handoff"):
+                        media = self.transcription_pool.transcribe(url)
+                    if media:
+                        AUDIO_SECONDS.inc(media[1].duration or 0)
+                else:
+                    media = self._transcribe_media(url, temp_dir)
+
+                if not media:
+                    VIDEOS.inc(status="failed")
                     return generated_files
+                transcript, video_info, source = media
 
-                self.logger.info(f"转录完成，文本长度: {len(transcript)} 字符")
+            tracing.current_span().set_attributes(
+                platform=video_info.platform,
+                title=video_info.title,
+                source=source
+            )
 
             # 3. 保存原始转录
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            timestamp = _allocate_timestamp()
             original_file = self._save_original_note(
                 video_info=video_info,
                 transcript=transcript,
@@ -187,10 +361,11 @@ class VideoNoteProcessor:
 
             # 4. 整理内容
             self.logger.info("正在整理内容...")
-            organized_content = self.ai_processor.organize_long_content(
-                content=transcript,
-                chunk_size=self.settings.content_chunk_size
-            )
+            with self._stage("organize", chars=len(transcript)):
+                organized_content = self.ai_processor.organize_long_content(
+                    content=transcript,
+                    chunk_size=self.settings.content_chunk_size
+                )
 
             organized_file = self._save_organized_note(
                 video_info=video_info,
@@ -202,35 +377,286 @@ class VideoNoteProcessor:
             # 5. 生成小红书版本
             if generate_xiaohongshu:
                 self.logger.info("正在生成小红书版本...")
-                xiaohongshu_file = self._generate_xiaohongshu_note(
-                    content=organized_content,
-                    timestamp=timestamp
-                )
+                with self._stage("xiaohongshu"):
+                    xiaohongshu_file = self._generate_xiaohongshu_note(
+                        content=organized_content,
+                        timestamp=timestamp
+                    )
                 if xiaohongshu_file:
                     generated_files.append(xiaohongshu_file)
 
             # 6. 生成博客文章
             if generate_blog:
                 self.logger.info("正在生成博客文章...")
-                blog_file = self._generate_blog_note(
-                    content=organized_content,
-                    video_info=video_info,
-                    timestamp=timestamp
-                )
+                with self._stage("blog"):
+                    blog_file = self._generate_blog_note(
+                        content=organized_content,
+                        video_info=video_info,
+                        timestamp=timestamp
+                    )
                 if blog_file:
                     generated_files.append(blog_file)
 
             self.logger.info(f"处理完成，共生成 {len(generated_files)} 个文件")
+            VIDEOS.inc(status="success")
+            self._index_note(timestamp, video_info, generated_files, source)
+            if self.ai_processor.cache:
+                stats = self.ai_processor.cache.stats()
+                self.logger.info(
+                    f"LLM 缓存: 命中 {stats['hits']} 次，未命中 {stats['misses']} 次"
+                )
             return generated_files
 
         except Exception as e:
             self.logger.error(f"处理视频时出错: {e}", exc_info=True)
+            VIDEOS.inc(status="failed")
             return generated_files
 
         finally:
-            # 清理临时文件
-            if temp_dir.exists():
-                shutil.rmtree(temp_dir)
+            # 清理临时文件：竞速下载落败的下载器可能仍在收尾写入（退出后自行清理其子目录），
+            # 清理失败不能覆盖任务结果
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def _index_note(self, timestamp: str, video_info: VideoInfo, files: List[Path], source: str):
+        """把生成的笔记写入索引（失败只记录警告，不影响任务结果）"""
+        if not self.note_index:
+            return
+        job = current_job()
+        try:
+            self.note_index.add_note(
+                key=timestamp,
+                video_info=video_info,
+                files=files,
+                source=source,
+                ai_model=self.settings.ai_model,
+                whisper_model=None if source == "subtitle" else self.settings.whisper_model,
+                usage=job.to_dict() if job else None
+            )
+        except Exception as e:  # pylint: disable=broad-except
+            self.logger.warning(f"写入笔记索引失败: {e}")
+
+    def _transcribe_media(self, url: str, temp_dir: Path) -> Optional[Tuple[str, VideoInfo, str]]:
+        """
+        无字幕时获取转录文本：流式转录，或下载后（增量/批量/按窗口/整文件）转录
+
+        Args:
+            url: 视频URL
+            temp_dir: 下载目录
+
+        Returns:
+            (转录文本, 视频信息, 来源 stream/audio)，下载或转录失败返回 None
+        """
+        streamed = None
+        if self.settings.stream_transcription:
+            self.logger.info("🎤 尝试边下载边转录...")
+            streamed = self._transcribe_stream(url)
+
+        if streamed:
+            transcript, video_info = streamed
+            source = "stream"
+        else:
+            # Tier 2/3: 无字幕，下载并使用Whisper转录
+            source = "audio"
+            self.logger.info("🎤 策略2/3: 下载并使用Whisper转录...")
+
+            # 1. 下载视频（增量模式下同时转录已下载的部分）
+            self.logger.info("正在下载视频...")
+            transcript = None
+            if self.settings.incremental_transcription:
+                audio_path, video_info, transcript = self._download_incremental(url, temp_dir)
+            else:
+                with self._stage("download"):
+                    audio_path, video_info = self.downloader_registry.download(
+                        url=url,
+                        output_dir=temp_dir,
+                        audio_only=True
+                    )
+
+            if not audio_path or not video_info:
+                self.logger.error("视频下载失败")
+                return None
+
+            self.logger.info(f"视频下载成功: {video_info.title}")
+            if os.path.exists(audio_path):
+                DOWNLOAD_BYTES.inc(os.path.getsize(audio_path), platform=video_info.platform)
+
+            # 2. 转录音频
+            if not transcript:
+                transcript = self._transcribe_file(audio_path, video_info)
+
+            if not transcript:
+                self.logger.error("音频转录失败")
+                return None
+
+            AUDIO_SECONDS.inc(video_info.duration or 0)
+
+            self.logger.info(f"转录完成，文本长度: {len(transcript)} 字符")
+
+        return transcript, video_info, source
+
+    def _transcribe_file(self, audio_path: str, video_info: VideoInfo) -> str:
+        """
+        转录已下载的音频文件，按时长选择方式：
+        短音频合并成批，超长音频按窗口解码（内存有上限），其余整文件转录
+
+        Args:
+            audio_path: 音频文件路径
+            video_info: 视频信息（使用其中的时长）
+
+        Returns:
+            转录文本
+        """
+        duration = video_info.duration or 0
+        model_name = self.settings.whisper_model
+
+        if self.transcription_batcher and 0 < duration <= self.settings.transcribe_batch_max_seconds:
+            self.logger.info("正在转录音频（批量）...")
+            with self._stage("transcribe", model=model_name, batched=True):
+                return self.transcription_batcher.transcribe(audio_path)
+
+        windowed_seconds = self.settings.windowed_transcription_seconds
+        if windowed_seconds and duration > windowed_seconds:
+            self.logger.info(f"正在按窗口转录长音频（{duration / 60:.0f} 分钟）...")
+            with self._stage("transcribe", model=model_name, windowed=True):
+                return self.transcriber.transcribe_windowed(
+                    audio_path=audio_path,
+                    model_name=model_name,
+                    language="zh",
+                    ffmpeg=self.settings.ffmpeg_path or "ffmpeg"
+                )
+
+        self.logger.info("正在转录音频...")
+        with self._stage("transcribe", model=model_name):
+            return self.transcriber.transcribe(
+                audio_path=audio_path,
+                model_name=model_name,
+                language="zh"
+            )
+
+    def _transcribe_stream(self, url: str) -> Optional[Tuple[str, VideoInfo]]:
+        """
+        流式转录：下载的字节直接写入 ffmpeg，解码出的 PCM 按窗口交给 Whisper
+
+        Args:
+            url: 视频URL
+
+        Returns:
+            (转录文本, 视频信息)，不支持流式或失败时返回 None（由调用方回退为下载后转录）
+        """
+        try:
+            with self._stage("download", streaming=True):
+                opened = self.downloader_registry.open_audio_stream(url)
+        except Exception as e:
+            self.logger.warning(f"打开媒体流失败: {e}")
+            return None
+        if not opened:
+            self.logger.info("该平台不支持流式下载，改为下载后转录")
+            return None
+
+        chunks, video_info = opened
+        try:
+            with self._stage("transcribe", model=self.settings.whisper_model, streaming=True), \
+                    FFmpegPCMStream(chunks, ffmpeg=self.settings.ffmpeg_path or "ffmpeg", logger=self.logger) as stream:
+                transcript = self.transcriber.transcribe_pcm_stream(
+                    stream.windows(self.settings.transcribe_window_seconds),
+                    model_name=self.settings.whisper_model,
+                    language="zh",
+                    cache_key=resolve_url(url).key
+                )
+        except Exception as e:
+            self.logger.warning(f"流式转录失败，改为下载后转录: {e}")
+            return None
+        if not transcript:
+            return None
+
+        DOWNLOAD_BYTES.inc(stream.bytes_in, platform=video_info.platform)
+        AUDIO_SECONDS.inc(stream.decoded_seconds)
+        self.logger.info(
+            f"流式转录完成: 下载 {stream.bytes_in / 1024 / 1024:.1f}MB，"
+            f"音频 {stream.decoded_seconds:.0f}秒，文本长度 {len(transcript)} 字符"
+        )
+        return transcript, video_info
+
+    def _download_incremental(
+        self,
+        url: str,
+        temp_dir: Path
+    ) -> Tuple[Optional[str], Optional[VideoInfo], Optional[str]]:
+        """
+        下载的同时转录已到达的音频：下载器报告写入进度，FileTailFeeder 把新数据送入
+        ffmpeg，每凑满一个窗口就交给 Whisper，转录文本随下载逐段累积
+
+        Args:
+            url: 视频URL
+            temp_dir: 下载目录
+
+        Returns:
+            (文件路径, 视频信息, 转录文本)；增量转录不可用（下载器未顺序写文件、
+            中途换了下载器、容器不支持流式解码等）时转录文本为 None，由调用方转录完整文件
+        """
+        try:
+            stream = FFmpegPCMStream(ffmpeg=self.settings.ffmpeg_path or "ffmpeg", logger=self.logger).start()
+        except OSError as e:
+            self.logger.warning(f"无法启动 ffmpeg，关闭增量转录: {e}")
+            with self._stage("download"):
+                audio_path, video_info = self.downloader_registry.download(
+                    url=url,
+                    output_dir=temp_dir,
+                    audio_only=True
+                )
+            return audio_path, video_info, None
+        tail = FileTailFeeder(stream, logger=self.logger)
+        outcome = {}
+
+        def download():
+            final_path = None
+            try:
+                with progress_listener(tail.update), self._stage("download", incremental=True):
+                    outcome["result"] = self.downloader_registry.download(
+                        url=url,
+                        output_dir=temp_dir,
+                        audio_only=True
+                    )
+                final_path = outcome["result"][0]
+            except BaseException as e:
+                outcome["error"] = e
+            finally:
+                tail.finish(final_path)
+
+        thread = threading.Thread(
+            target=tracing.wrap_context(download), name="incremental-download", daemon=True
+        )
+        thread.start()
+
+        transcript = None
+        try:
+            with self._stage("transcribe", model=self.settings.whisper_model, incremental=True):
+                transcript = self.transcriber.transcribe_pcm_stream(
+                    stream.windows(self.settings.transcribe_window_seconds),
+                    model_name=self.settings.whisper_model,
+                    language="zh",
+                    on_text=lambda text: self.logger.info(
+                        f"已转录 {stream.decoded_seconds:.0f} 秒音频（下载进行中）"
+                    )
+                )
+        except Exception as e:
+            self.logger.warning(f"增量转录失败，下载完成后转录完整文件: {e}")
+        finally:
+            # 转录提前结束时停止解码，下载不受影响
+            stream.close()
+            thread.join()
+
+        if "error" in outcome:
+            raise outcome["error"]
+        audio_path, video_info = outcome["result"]
+
+        if not tail.completed:
+            transcript = None
+        elif transcript:
+            self.logger.info(
+                f"增量转录完成: 音频 {stream.decoded_seconds:.0f}秒，文本长度 {len(transcript)} 字符"
+            )
+        return audio_path, video_info, transcript
 
     def _save_original_note(
         self,
@@ -270,7 +696,7 @@ class VideoNoteProcessor:
             f.write(f"- 时长：{video_info.duration}秒\n")
             f.write(f"- 平台：{video_info.platform}\n")
             f.write(f"- 链接：{video_info.url}\n\n")
-            f.write(f"## 内容整理\n\n")
+            f.write(_ORGANIZED_MARKER)
             f.write(content)
 
         self.logger.info(f"整理版笔记已保存: {file_path}")
@@ -283,23 +709,32 @@ class VideoNoteProcessor:
     ) -> Optional[Path]:
         """生成小红书笔记"""
         try:
-            # 生成小红书内容
-            xiaohongshu_content, titles, tags = self.xiaohongshu_generator.generate(
-                content=content,
-                max_tokens=self.settings.max_tokens
-            )
+            # 一次结构化调用生成标题、标签和配图关键词
+            metadata = self.xiaohongshu_generator.generate_metadata(content)
+
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                # 配图搜索与正文生成并行进行
+                images_future = None
+                if self.image_service:
+                    images_future = pool.submit(
+                        tracing.wrap_context(self._get_images),
+                        titles=metadata.titles,
+                        tags=metadata.tags,
+                        count=3,
+                        ai_processor=self.ai_processor,
+                        content=content,  # 关键词缺失时用原始内容提取
+                        keywords=metadata.image_keywords
+                    )
 
-            # 获取图片（使用视频原始内容提取关键词）
-            images = []
-            if self.image_service:
-                images = self.image_service.get_photos_for_xiaohongshu(
-                    titles=titles,
-                    tags=tags,
-                    count=3,
-                    ai_processor=self.ai_processor,
-                    content=content  # 传入原始内容，用于提取图片关键词
+                # 生成小红书正文
+                xiaohongshu_content, titles, tags = self.xiaohongshu_generator.generate(
+                    content=content,
+                    max_tokens=self.settings.max_tokens,
+                    metadata=metadata
                 )
 
+                images = images_future.result() if images_future else []
+
             # 格式化并保存
             if titles:
                 formatted_content = self.xiaohongshu_generator.format_note(
@@ -322,6 +757,11 @@ class VideoNoteProcessor:
             self.logger.error(f"生成小红书笔记失败: {e}", exc_info=True)
             return None
 
+    def _get_images(self, **kwargs) -> List[str]:
+        """获取配图（单独计时）"""
+        with self._stage("images"):
+            return self.image_service.get_photos_for_xiaohongshu(**kwargs)
+
     def _generate_blog_note(
         self,
         content: str,
@@ -367,6 +807,28 @@ class VideoNoteProcessor:
             self.logger.error(f"生成博客文章失败: {e}", exc_info=True)
             return None
 
+    def _video_info_from_subtitles(self, url: str) -> Optional[VideoInfo]:
+        """
+        使用字幕查询时一并取得的视频信息（不发请求）
+
+        Args:
+            url: 视频URL
+
+        Returns:
+            VideoInfo对象，没有可用信息时返回None
+        """
+        metadata = self.subtitle_extractor.get_metadata(url)
+        if not metadata or not metadata.get('title'):
+            return None
+        return VideoInfo(
+            title=metadata['title'],
+            duration=metadata.get('duration') or 0,
+            uploader=metadata.get('uploader') or '未知',
+            description=metadata.get('description') or '',
+            platform=resolve_url(url).display_name,
+            url=url
+        )
+
     def _get_video_info_without_download(self, url: str) -> Optional[VideoInfo]:
         """
         获取视频信息（不下载视频）
@@ -392,21 +854,12 @@ class VideoNoteProcessor:
                 info = ydl.extract_info(url, download=False)
 
                 if info:
-                    # 判断平台
-                    platform = "未知"
-                    if 'youtube.com' in url or 'youtu.be' in url:
-                        platform = "YouTube"
-                    elif 'bilibili.com' in url:
-                        platform = "Bilibili"
-                    elif 'tiktok.com' in url:
-                        platform = "TikTok"
-
                     return VideoInfo(
                         title=info.get('title', '未知标题'),
                         duration=info.get('duration', 0),
                         uploader=info.get('uploader', '未知'),
                         description=info.get('description', ''),
-                        platform=platform,
+                        platform=resolve_url(url).display_name,
                         url=url
                     )
         except Exception as e:
@@ -429,15 +882,143 @@ class VideoNoteProcessor:
             处理结果字典 {url: [生成的文件列表]}
         """
         results = {}
+
+        # 同一视频的不同链接只处理一次，结果共享
+        unique: Dict[str, List[str]] = {}
+        for url in urls:
+            unique.setdefault(resolve_url(url).key, []).append(url)
+        if len(unique) < len(urls):
+            self.logger.info(f"{len(urls) - len(unique)} 个链接与其他链接指向同一视频，将共享处理结果")
+        urls = [group[0] for group in unique.values()]
         total = len(urls)
 
-        for i, url in enumerate(urls, 1):
+        def process(i: int, url: str) -> List[Path]:
             self.logger.info(f"处理第 {i}/{total} 个视频")
             try:
-                files = self.process_video(url, generate_xiaohongshu)
-                results[url] = files
+                return self.process_video(url, generate_xiaohongshu)
             except Exception as e:
                 self.logger.error(f"处理视频失败: {url}, 错误: {e}")
-                results[url] = []
-
+                return []
+
+        # 开启批量转录时并发处理，使各任务的短音频能在转录阶段合并成批
+        workers = min(self.settings.transcribe_batch_size, total) if self.transcription_batcher else 1
+        if workers <= 1:
+            for i, url in enumerate(urls, 1):
+                results[url] = process(i, url)
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(tracing.wrap_context(process), i, url) for i, url in enumerate(urls, 1)]
+                for url, future in zip(urls, futures):
+                    results[url] = future.result()
+
+        for group in unique.values():
+            for url in group[1:]:
+                results[url] = results[group[0]]
         return results
+
+    def process_playlist(
+        self,
+        playlist: Playlist,
+        generate_xiaohongshu: bool = True,
+        generate_blog: bool = True,
+        merge: bool = False
+    ) -> PlaylistResult:
+        """
+        逐集处理分P视频、合集或播放列表
+
+        各集作为独立任务并发处理（并发数 playlist_concurrency），LLM 调用共用进程内的限流器，
+        并发数调高也不会超出 OpenRouter 的请求速率
+
+        Args:
+            playlist: 展开结果（见 PlaylistExpander.expand）
+            generate_xiaohongshu: 是否生成小红书版本
+            generate_blog: 是否生成博客文章
+            merge: 是否把各集的整理版合并为一份笔记
+
+        Returns:
+            逐集处理结果
+        """
+        result = PlaylistResult(playlist=playlist)
+        entries = playlist.entries
+        total = len(entries)
+
+        def process(entry) -> List[Path]:
+            self.logger.info(f"处理{playlist.kind_name}第 {entry.index} 集（{entry.index}/{total}）: {entry.title}")
+            try:
+                return self.process_video(entry.url, generate_xiaohongshu, generate_blog)
+            except Exception as e:
+                self.logger.error(f"处理分集失败: {entry.url}, 错误: {e}")
+                return []
+
+        with tracing.span("process_playlist", url=playlist.url, kind=playlist.kind, entries=total) as span:
+            workers = min(self.settings.playlist_concurrency, total)
+            if workers <= 1:
+                for entry in entries:
+                    result.results[entry.url] = process(entry)
+            else:
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="playlist") as pool:
+                    futures = [pool.submit(tracing.wrap_context(process), entry) for entry in entries]
+                    for entry, future in zip(entries, futures):
+                        result.results[entry.url] = future.result()
+
+            succeeded = len(result.succeeded)
+            self.logger.info(f"{playlist.kind_name}「{playlist.title}」处理完成：成功 {succeeded}/{total} 集")
+            if merge and succeeded:
+                result.merged_file = self._save_series_note(result)
+            span.set_attributes(succeeded=succeeded, merged=result.merged_file is not None)
+        return result
+
+    def _save_series_note(self, result: PlaylistResult) -> Optional[Path]:
+        """把各集整理版按集数顺序合并为一份笔记（未成功的分集在目录中标注）"""
+        playlist = result.playlist
+        sections = []
+        toc = []
+        for entry in playlist.entries:
+            organized = next(
+                (f for f in result.results.get(entry.url) or [] if f.name.endswith("_organized.md")), None
+            )
+            if not organized:
+                toc.append(f"{entry.index}. {entry.title}（未生成）")
+                continue
+            try:
+                text = organized.read_text(encoding='utf-8')
+            except OSError as e:
+                self.logger.warning(f"读取分集笔记失败: {organized}: {e}")
+                toc.append(f"{entry.index}. {entry.title}（未生成）")
+                continue
+            body = _HEADING.sub(r'##\1 ', text.split(_ORGANIZED_MARKER, 1)[-1].strip())
+            toc.append(f"{entry.index}. {entry.title}")
+            sections.append(f"## {entry.index}. {entry.title}\n\n- 链接：{entry.url}\n\n{body}\n")
+
+        timestamp = _allocate_timestamp()
+        file_path = self.settings.output_dir / f"{timestamp}_series.md"
+        duration = sum(entry.duration for entry in playlist.entries)
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(f"# {playlist.title} - {playlist.kind_name}笔记\n\n")
+            f.write(f"## {playlist.kind_name}信息\n")
+            if playlist.uploader:
+                f.write(f"- 作者：{playlist.uploader}\n")
+            f.write(f"- 集数：{len(result.succeeded)}/{len(playlist.entries)}\n")
+            f.write(f"- 时长：{duration}秒\n")
+            f.write(f"- 平台：{playlist.platform}\n")
+            f.write(f"- 链接：{playlist.url}\n\n")
+            f.write("## 目录\n\n")
+            f.write("\n".join(toc))
+            f.write("\n\n")
+            f.write("\n".join(sections))
+
+        self.logger.info(f"合并笔记已保存: {file_path}")
+        self._index_note(
+            timestamp,
+            VideoInfo(
+                title=playlist.title,
+                duration=duration,
+                uploader=playlist.uploader or "未知",
+                description=f"{playlist.kind_name}，共 {len(playlist.entries)} 集",
+                platform=playlist.platform,
+                url=playlist.url
+            ),
+            [file_path],
+            "playlist"
+        )
+        return file_path
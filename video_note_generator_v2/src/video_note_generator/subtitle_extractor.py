@@ -2,159 +2,495 @@
 字幕提取器
 
 支持从各平台提取官方字幕，避免不必要的下载和转录
+
+- 每个视频只查询一次元数据（字幕轨道列表 + 标题等信息），结果在进程内缓存
+- 按偏好为轨道排序：人工字幕优先于自动字幕，其次是目标语言，机器翻译的轨道排在原文之后
+- 排名靠前的几条轨道通过共享会话并发下载，取排名最高且内容非空的一条，
+  其余成功下载的轨道同样缓存，换语言或重复任务时不再请求
+- 字幕文件流式下载、逐块解析（见 subtitle_parser），自动字幕的滚动重复行在拼接前合并
+- 解析后的字幕按 (视频, 语言) 缓存
 """
-import re
-import requests
-from typing import Optional, Dict, List
-from pathlib import Path
 import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, Hashable, Iterator, List, Optional, Tuple
+
+import requests
+
+from .subtitle_parser import (
+    SubtitleSegment,
+    dedupe_rolling,
+    format_for_extension,
+    iter_segments,
+    join_segments,
+)
+from .utils import tracing
+from .utils.singleflight import ThreadSingleFlight
+from .utils.url_resolver import ResolvedURL, resolve_url
 
 logger = logging.getLogger(__name__)
 
+# 默认语言偏好（依次尝试）
+DEFAULT_SUBTITLE_LANGUAGES = ('zh-Hans', 'zh-Hant', 'zh', 'en')
+
+# 地区写法 -> 文字写法（B站用 zh-CN，YouTube 用 zh-Hans）
+_LANGUAGE_ALIASES = {
+    'zh-cn': 'zh-hans',
+    'zh-sg': 'zh-hans',
+    'zh-tw': 'zh-hant',
+    'zh-hk': 'zh-hant',
+    'zh-mo': 'zh-hant',
+}
+
+# YouTube 字幕格式偏好（json3 结构最规整；srv3/ttml 等 XML 格式不解析）
+_YOUTUBE_FORMATS = ('json3', 'vtt', 'srt')
+
+# 流式下载字幕的块大小
+_CHUNK_SIZE = 64 * 1024
+
+
+def _normalize_language(lang: str) -> str:
+    """统一语言代码：小写，去掉 B站 AI 字幕的 ai- 前缀与 YouTube 的 -orig 后缀"""
+    lang = lang.lower()
+    if lang.startswith('ai-'):
+        lang = lang[3:]
+    if lang.endswith('-orig'):
+        lang = lang[:-5]
+    return _LANGUAGE_ALIASES.get(lang, lang)
+
+
+@dataclass(frozen=True)
+class SubtitleTrack:
+    """字幕轨道"""
+    lang: str
+    url: str
+    ext: str = 'json'
+    auto: bool = False          # 自动生成（语音识别 / AI）字幕
+    translated: bool = False    # 由其他语言机器翻译而来
+    name: str = ''
+
+
+@dataclass
+class SubtitlePreference:
+    """字幕轨道选择偏好"""
+    languages: List[str] = field(default_factory=lambda: list(DEFAULT_SUBTITLE_LANGUAGES))
+    prefer_manual: bool = True
+    allow_auto: bool = True
+    allow_translated: bool = True
+
+    def with_language(self, language: str) -> "SubtitlePreference":
+        """把指定语言提到最前面"""
+        rest = [lang for lang in self.languages if _normalize_language(lang) != _normalize_language(language)]
+        return replace(self, languages=[language] + rest)
+
+    def _language_rank(self, lang: str) -> Optional[int]:
+        """语言在偏好中的位置（完全匹配优先于主标签匹配），不在偏好中返回 None"""
+        lang = _normalize_language(lang)
+        primary = lang.split('-', 1)[0]
+        for i, preferred in enumerate(self.languages):
+            preferred = _normalize_language(preferred)
+            if preferred == lang:
+                return 2 * i
+            if preferred.split('-', 1)[0] == primary:
+                return 2 * i + 1
+        return None
+
+    def rank(self, tracks: List[SubtitleTrack]) -> List[SubtitleTrack]:
+        """
+        按偏好为轨道排序，并去掉不允许的轨道
+
+        排序依据（prefer_manual 时人工字幕整体排在自动字幕之前）：
+        偏好语言的原文 > 翻译成偏好语言的轨道 > 其他语言的原文（翻译成其他语言的轨道不使用）
+
+        Args:
+            tracks: 候选轨道
+
+        Returns:
+            排序后的轨道列表
+        """
+        ranked = []
+        for index, track in enumerate(tracks):
+            if track.auto and not self.allow_auto:
+                continue
+            if track.translated and not self.allow_translated:
+                continue
+            lang_rank = self._language_rank(track.lang)
+            if lang_rank is None:
+                if track.translated:
+                    continue
+                group, lang_rank = 2, 0
+            else:
+                group = 1 if track.translated else 0
+            manual_first = track.auto if self.prefer_manual else False
+            ranked.append(((manual_first, group, lang_rank, track.auto, index), track))
+        ranked.sort(key=lambda item: item[0])
+        return [track for _, track in ranked]
+
+
+@dataclass
+class VideoSubtitles:
+    """一次元数据查询的结果：字幕轨道与视频信息"""
+    key: str
+    tracks: List[SubtitleTrack]
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+class _TTLCache:
+    """线程安全的 LRU + TTL 缓存"""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            if time.monotonic() - item[1] >= self.ttl:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return item[0]
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# 进程内共享的缓存（Web 应用每个任务新建处理器，缓存需要跨实例）
+_metadata_cache = _TTLCache(ttl=6 * 3600, max_entries=1024)
+_track_cache = _TTLCache(ttl=6 * 3600, max_entries=512)
+# 进行中的轨道下载：并发任务同时未命中缓存时共享同一次下载
+_track_fetches = ThreadSingleFlight()
+
+
+def clear_subtitle_cache():
+    """清空字幕元数据与字幕内容缓存"""
+    _metadata_cache.clear()
+    _track_cache.clear()
+
 
 class SubtitleExtractor:
     """字幕提取器基类"""
 
-    def __init__(self):
+    def __init__(
+        self,
+        session: Optional[requests.Session] = None,
+        preference: Optional[SubtitlePreference] = None,
+        parallel_tracks: int = 2
+    ):
+        """
+        初始化字幕提取器
+
+        Args:
+            session: 共享的 HTTP 会话（复用连接），None 时自动创建
+            preference: 轨道选择偏好，None 时使用默认偏好
+            parallel_tracks: 同时下载的候选轨道数（首选轨道失败或为空时直接使用已下载的备选）
+        """
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
         }
+        self.session = session or requests.Session()
+        self.preference = preference or SubtitlePreference()
+        self.parallel_tracks = max(1, parallel_tracks)
 
-    def extract(self, url: str) -> Optional[str]:
+    def extract(self, url: str, language: Optional[str] = None) -> Optional[str]:
         """
         从URL提取字幕
 
         Args:
             url: 视频URL
+            language: 优先使用的语言（None 时按配置的偏好）
 
         Returns:
             字幕文本，如果没有字幕返回None
         """
-        # 判断平台并调用对应方法
-        if 'youtube.com' in url or 'youtu.be' in url:
-            return self._extract_youtube(url)
-        elif 'bilibili.com' in url:
-            return self._extract_bilibili(url)
-        elif 'tiktok.com' in url:
+        resolved = resolve_url(url)
+        if resolved.platform == 'tiktok':
             return self._extract_tiktok(url)
-        else:
+
+        subtitles = self.get_subtitles(url, resolved)
+        if not subtitles or not subtitles.tracks:
             return None
 
-    def _extract_youtube(self, url: str) -> Optional[str]:
+        preference = self.preference.with_language(language) if language else self.preference
+        candidates = preference.rank(subtitles.tracks)
+        if not candidates:
+            logger.info("没有符合偏好的字幕轨道")
+            return None
+        return self._fetch_best(subtitles.key, candidates)
+
+    def get_subtitles(self, url: str, resolved: Optional[ResolvedURL] = None) -> Optional[VideoSubtitles]:
         """
-        提取YouTube字幕
+        获取视频的字幕轨道列表与基本信息（每个视频只查询一次，结果缓存）
 
-        使用yt-dlp提取字幕，不下载视频
+        Args:
+            url: 视频URL
+            resolved: 已解析的 URL（None 时自动解析）
+
+        Returns:
+            查询结果，平台不支持或查询失败返回 None
         """
-        try:
-            import yt_dlp
-
-            ydl_opts = {
-                'skip_download': True,
-                'writesubtitles': True,
-                'writeautomaticsub': True,
-                'subtitleslangs': ['zh-Hans', 'zh-Hant', 'zh', 'en'],
-                'subtitlesformat': 'json3',
-                'quiet': True,
-                'no_warnings': True,
-            }
+        resolved = resolved or resolve_url(url)
+        if resolved.platform == 'youtube':
+            fetch = self._list_youtube
+        elif resolved.platform == 'bilibili' and resolved.video_id:
+            fetch = self._list_bilibili
+        else:
+            return None
 
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                logger.info("尝试提取YouTube字幕...")
-                info = ydl.extract_info(url, download=False)
-
-                # 优先使用官方字幕
-                subtitles = info.get('subtitles', {})
-                if not subtitles:
-                    # 使用自动生成字幕
-                    subtitles = info.get('automatic_captions', {})
-
-                if subtitles:
-                    # 按优先级选择语言
-                    for lang in ['zh-Hans', 'zh-Hant', 'zh', 'en']:
-                        if lang in subtitles:
-                            subtitle_data = subtitles[lang]
-                            # 选择json3格式
-                            for fmt in subtitle_data:
-                                if fmt.get('ext') == 'json3':
-                                    subtitle_url = fmt['url']
-                                    return self._download_and_parse_json3(subtitle_url)
-
-                    # 如果没有json3，尝试其他格式
-                    first_lang = list(subtitles.keys())[0]
-                    if subtitles[first_lang]:
-                        subtitle_url = subtitles[first_lang][0]['url']
-                        return self._download_and_parse_subtitle(subtitle_url)
-
-                logger.info("该YouTube视频没有字幕")
-                return None
+        cached = _metadata_cache.get(resolved.key)
+        if cached is not None:
+            return cached
 
+        try:
+            subtitles = fetch(url, resolved)
         except Exception as e:
-            logger.warning(f"YouTube字幕提取失败: {e}")
+            # 查询失败不缓存，下次重新请求
+            logger.warning(f"获取字幕列表失败: {e}")
             return None
 
-    def _extract_bilibili(self, url: str) -> Optional[str]:
+        if subtitles is not None:
+            _metadata_cache.put(resolved.key, subtitles)
+        return subtitles
+
+    def get_metadata(self, url: str) -> Optional[Dict[str, Any]]:
         """
-        提取Bilibili字幕
+        获取字幕查询时一并得到的视频信息（标题、UP主、时长、简介），不额外请求
+
+        Args:
+            url: 视频URL
 
-        使用B站API直接获取字幕
+        Returns:
+            视频信息字典，没有缓存的查询结果时返回 None
         """
-        try:
-            # 提取BV号
-            bv_match = re.search(r'BV[\w]+', url)
-            if not bv_match:
-                return None
+        cached = _metadata_cache.get(resolve_url(url).key)
+        return cached.metadata if cached and cached.metadata else None
 
-            bvid = bv_match.group(0)
-            logger.info(f"提取Bilibili字幕: {bvid}")
+    def get_bilibili_view(self, bvid: str) -> Optional[Dict[str, Any]]:
+        """
+        获取B站 view 接口的视频数据（分P列表、所属合集、标题等），结果缓存
 
-            # 1. 获取cid
-            api = f"https://api.bilibili.com/x/web-interface/view?bvid={bvid}"
-            response = requests.get(api, headers=self.headers, timeout=10)
-            data = response.json()
+        字幕查询与分P/合集展开共用，同一视频只请求一次
 
-            if data['code'] != 0:
-                return None
+        Args:
+            bvid: BV 号
 
-            cid = data['data']['cid']
+        Returns:
+            接口返回的 data 字段，失败返回 None
+        """
+        cache_key = ('bilibili-view', bvid)
+        cached = _metadata_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
-            # 2. 获取字幕列表
-            subtitle_api = f"https://api.bilibili.com/x/player/wbi/v2?cid={cid}&bvid={bvid}"
-            response = requests.get(subtitle_api, headers=self.headers, timeout=10)
+        api = f"https://api.bilibili.com/x/web-interface/view?bvid={bvid}"
+        try:
+            response = self.session.get(api, headers=self.headers, timeout=10)
             data = response.json()
+        except Exception as e:
+            logger.warning(f"获取B站视频信息失败: {e}")
+            return None
 
-            if data['code'] != 0:
-                return None
+        if data.get('code') != 0:
+            logger.warning(f"获取B站视频信息失败: {data.get('message')}")
+            return None
 
-            subtitle_info = data['data'].get('subtitle', {})
-            subtitles = subtitle_info.get('subtitles', [])
+        _metadata_cache.put(cache_key, data['data'])
+        return data['data']
 
-            if not subtitles:
-                logger.info("该B站视频没有字幕")
-                return None
+    def _list_youtube(self, url: str, resolved: ResolvedURL) -> Optional[VideoSubtitles]:
+        """
+        查询YouTube字幕轨道
 
-            # 3. 下载第一个字幕
-            subtitle_url = subtitles[0]['subtitle_url']
-            if not subtitle_url.startswith('http'):
-                subtitle_url = 'https:' + subtitle_url
+        使用yt-dlp提取元数据，不下载视频
+        """
+        import yt_dlp
 
-            response = requests.get(subtitle_url, timeout=10)
-            subtitle_data = response.json()
+        ydl_opts = {
+            'skip_download': True,
+            'quiet': True,
+            'no_warnings': True,
+        }
+
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            logger.info("查询YouTube字幕...")
+            info = ydl.extract_info(url, download=False)
 
-            # 4. 解析字幕
-            body = subtitle_data.get('body', [])
-            if body:
-                text_parts = [item.get('content', '') for item in body]
-                subtitle_text = ' '.join(text_parts)
-                logger.info(f"✅ 成功提取B站字幕（{len(body)}条）")
-                return subtitle_text
+        tracks = []
+        for source, auto in (('subtitles', False), ('automatic_captions', True)):
+            for lang, formats in (info.get(source) or {}).items():
+                if lang == 'live_chat' or not formats:
+                    continue
+                fmt = self._choose_format(formats)
+                tracks.append(SubtitleTrack(
+                    lang=lang,
+                    url=fmt['url'],
+                    ext=fmt.get('ext', ''),
+                    auto=auto,
+                    # 自动字幕里除原文外的语言都是 YouTube 机器翻译的（地址带 tlang 参数）
+                    translated=auto and 'tlang=' in fmt['url'],
+                    name=fmt.get('name', '')
+                ))
+
+        metadata = {
+            'title': info.get('title'),
+            'uploader': info.get('uploader'),
+            'duration': info.get('duration'),
+            'description': info.get('description'),
+        }
+        return VideoSubtitles(key=resolved.key, tracks=tracks, metadata=metadata)
+
+    @staticmethod
+    def _choose_format(formats: List[dict]) -> dict:
+        """按格式偏好选择同一语言下的字幕文件"""
+        by_ext = {fmt.get('ext'): fmt for fmt in formats}
+        for ext in _YOUTUBE_FORMATS:
+            if ext in by_ext:
+                return by_ext[ext]
+        return formats[0]
+
+    def _list_bilibili(self, url: str, resolved: ResolvedURL) -> Optional[VideoSubtitles]:
+        """
+        查询Bilibili字幕轨道
+
+        使用B站API直接获取（分P视频按 p 参数选择对应的 cid）
+        """
+        bvid = resolved.video_id
+        logger.info(f"查询Bilibili字幕: {bvid}")
 
+        # 1. 获取cid与视频信息
+        video = self.get_bilibili_view(bvid)
+        if not video:
             return None
 
-        except Exception as e:
-            logger.warning(f"Bilibili字幕提取失败: {e}")
+        cid = video['cid']
+        title = video.get('title')
+        duration = video.get('duration')
+        pages = video.get('pages') or []
+        part = resolved.part or 1
+        if len(pages) >= part:
+            page = pages[part - 1]
+            cid = page['cid']
+            duration = page.get('duration', duration)
+            if len(pages) > 1:
+                # 分P视频的各集标题带上分P序号与名称，避免笔记重名
+                title = f"{title} P{part} {page.get('part', '')}".rstrip()
+
+        metadata = {
+            'title': title,
+            'uploader': (video.get('owner') or {}).get('name'),
+            'duration': duration,
+            'description': video.get('desc'),
+        }
+
+        # 2. 获取字幕列表
+        subtitle_api = f"https://api.bilibili.com/x/player/wbi/v2?cid={cid}&bvid={bvid}"
+        response = self.session.get(subtitle_api, headers=self.headers, timeout=10)
+        data = response.json()
+
+        if data['code'] != 0:
             return None
 
+        subtitle_info = data['data'].get('subtitle') or {}
+        tracks = []
+        for item in subtitle_info.get('subtitles') or []:
+            subtitle_url = item.get('subtitle_url')
+            if not subtitle_url:
+                continue
+            if not subtitle_url.startswith('http'):
+                subtitle_url = 'https:' + subtitle_url
+            lang = item.get('lan', '')
+            tracks.append(SubtitleTrack(
+                lang=lang,
+                url=subtitle_url,
+                ext='json',
+                # ai-zh 等 AI 字幕；type/ai_type 非 0 也表示自动生成
+                auto=lang.startswith('ai-') or bool(item.get('ai_type') or item.get('type')),
+                name=item.get('lan_doc', '')
+            ))
+
+        if not tracks:
+            logger.info("该B站视频没有字幕")
+        return VideoSubtitles(key=resolved.key, tracks=tracks, metadata=metadata)
+
+    def _fetch_best(self, key: str, candidates: List[SubtitleTrack]) -> Optional[str]:
+        """
+        按排名取第一条内容非空的字幕
+
+        每次并发下载 parallel_tracks 条未缓存的候选轨道，首选轨道为空或失败时
+        不必再串行等待下一条；所有成功下载的轨道都写入缓存
+
+        Args:
+            key: 视频缓存键
+            candidates: 按偏好排序的轨道
+
+        Returns:
+            字幕文本，全部为空或失败时返回 None
+        """
+        for start in range(0, len(candidates), self.parallel_tracks):
+            window = candidates[start:start + self.parallel_tracks]
+            texts: Dict[SubtitleTrack, Optional[str]] = {
+                track: _track_cache.get((key, track.lang, track.auto)) for track in window
+            }
+            missing = [track for track in window if texts[track] is None]
+
+            # 排在最前的可用轨道已有缓存时直接返回，不下载备选
+            first = next((track for track in window if texts[track] is None or texts[track]), None)
+            if first is not None and texts[first] is None:
+                if len(missing) == 1:
+                    texts[missing[0]] = self._fetch_track(key, missing[0])
+                else:
+                    with ThreadPoolExecutor(max_workers=len(missing), thread_name_prefix='subtitle') as pool:
+                        futures = {
+                            track: pool.submit(tracing.wrap_context(self._fetch_track), key, track)
+                            for track in missing
+                        }
+                        for track, future in futures.items():
+                            texts[track] = future.result()
+
+            for track in window:
+                text = texts[track]
+                if text:
+                    kind = '自动' if track.auto else '人工'
+                    logger.info(f"✅ 使用{kind}字幕: {track.name or track.lang}（{len(text)}字符）")
+                    return text
+        return None
+
+    def _fetch_track(self, key: str, track: SubtitleTrack) -> Optional[str]:
+        """下载并解析一条轨道（解析结果缓存，下载失败不缓存；同一轨道同时只下载一次）"""
+        cache_key = (key, track.lang, track.auto)
+
+        def fetch() -> Optional[str]:
+            # 其他任务的下载可能在本任务查缓存之后刚刚完成
+            cached = _track_cache.get(cache_key)
+            if cached is not None:
+                return cached
+            with tracing.span("subtitle.fetch", lang=track.lang, auto=track.auto, ext=track.ext):
+                try:
+                    text = self._download_text(track.url, format_for_extension(track.ext), rolling=track.auto)
+                except Exception as e:
+                    logger.warning(f"下载字幕失败（{track.lang}）: {e}")
+                    return None
+            _track_cache.put(cache_key, text)
+            return text
+
+        text, _ = _track_fetches.do(cache_key, fetch)
+        return text
+
     def _extract_tiktok(self, url: str) -> Optional[str]:
         """
         提取TikTok字幕
@@ -164,48 +500,36 @@ class SubtitleExtractor:
         logger.info("TikTok视频通常没有字幕")
         return None
 
-    def _download_and_parse_json3(self, url: str) -> str:
-        """下载并解析json3格式字幕"""
-        try:
-            response = requests.get(url, timeout=10)
-            data = response.json()
-
-            # json3格式: {"events": [{"segs": [{"utf8": "text"}]}]}
-            text_parts = []
-            for event in data.get('events', []):
-                for seg in event.get('segs', []):
-                    text = seg.get('utf8', '')
-                    if text and text != '\n':
-                        text_parts.append(text)
+    def _download_segments(self, url: str, fmt: Optional[str] = None) -> Iterator[SubtitleSegment]:
+        """
+        流式下载并解析字幕
 
-            subtitle_text = ' '.join(text_parts)
-            logger.info(f"✅ 成功提取YouTube字幕（{len(text_parts)}段）")
-            return subtitle_text
+        Args:
+            url: 字幕文件地址
+            fmt: 字幕格式（None 时根据内容判断）
 
-        except Exception as e:
-            logger.error(f"解析json3字幕失败: {e}")
-            return ""
+        Returns:
+            字幕段迭代器
+        """
+        with self.session.get(url, timeout=10, stream=True) as response:
+            response.raise_for_status()
+            yield from iter_segments(response.iter_content(chunk_size=_CHUNK_SIZE), fmt)
 
-    def _download_and_parse_subtitle(self, url: str) -> str:
-        """下载并解析通用字幕格式"""
-        try:
-            response = requests.get(url, timeout=10)
-            content = response.text
-
-            # 简单解析：移除时间戳等标记
-            # 支持SRT、VTT等格式
-            lines = content.split('\n')
-            text_parts = []
-
-            for line in lines:
-                line = line.strip()
-                # 跳过空行、数字行、时间戳行
-                if not line or line.isdigit() or '-->' in line or line.startswith('WEBVTT'):
-                    continue
-                text_parts.append(line)
+    def _download_text(self, url: str, fmt: Optional[str] = None, rolling: bool = False) -> str:
+        """
+        下载字幕并拼成纯文本
 
-            return ' '.join(text_parts)
+        Args:
+            url: 字幕文件地址
+            fmt: 字幕格式（None 时根据内容判断）
+            rolling: 是否为滚动显示的自动字幕（合并相邻段的重复行；人工字幕的重复是原文，保留）
 
-        except Exception as e:
-            logger.error(f"解析字幕失败: {e}")
-            return ""
+        Returns:
+            字幕文本
+        """
+        segments = self._download_segments(url, fmt)
+        if rolling:
+            segments = dedupe_rolling(segments)
+        segments = list(segments)
+        logger.info(f"✅ 成功提取字幕（{len(segments)}段）")
+        return join_segments(segments)
@@ -0,0 +1,462 @@
+"""
+字幕解析
+
+按字节块流式解析 SRT / WebVTT / ASS(SSA) / YouTube json3 / B站字幕 JSON，逐条产出带时间的字幕段：
+- 文本格式逐行解码，不把整个响应读入内存；去掉 VTT 的 cue 设置、HTML/样式标签和 ASS 覆盖代码
+- JSON 格式只定位到事件数组（json3 的 events、B站的 body），之后逐个对象解码
+- dedupe_rolling 合并 YouTube 自动字幕的滚动行（每条 cue 重复上一条的最后一行），
+  避免同一句话在转写文本里出现两三遍，浪费 LLM token
+"""
+import codecs
+import html
+import json
+import re
+from dataclasses import dataclass
+from itertools import chain
+from typing import Iterable, Iterator, List, Optional, Union
+
+# 支持的格式；扩展名 -> 格式
+SUBTITLE_FORMATS = ('srt', 'vtt', 'ass', 'json3', 'bilibili')
+_EXTENSION_FORMATS = {
+    'srt': 'srt',
+    'vtt': 'vtt',
+    'webvtt': 'vtt',
+    'ass': 'ass',
+    'ssa': 'ass',
+    'json3': 'json3',
+    'json': 'bilibili',
+}
+
+# 时间行：每个时间戳分组为 (时, 分, 秒[.毫秒])
+_TIMING = re.compile(
+    r'(?:(\d+):)?(\d{1,2}):(\d{2}(?:[.,]\d{1,3})?)\s*-->\s*(?:(\d+):)?(\d{1,2}):(\d{2}(?:[.,]\d{1,3})?)'
+)
+_MARKUP_TAG = re.compile(r'<[^>\n]*>')
+_ASS_OVERRIDE = re.compile(r'\{\\[^}]*\}')
+
+# ASS [Events] 的默认字段顺序（文件中缺少 Format 行时使用）
+_ASS_DEFAULT_FIELDS = ['layer', 'start', 'end', 'style', 'name', 'marginl', 'marginr', 'marginv', 'effect', 'text']
+
+# JSON 流扫描：数组外找结构字符，字符串内找结束引号或转义
+_JSON_STRUCTURE = re.compile(r'[{}\[\]"]')
+_JSON_STRING_END = re.compile(r'["\\]')
+_JSON_SEPARATOR = re.compile(r'[\s,]*')
+
+
+@dataclass(frozen=True)
+class SubtitleSegment:
+    """带时间的字幕段（多行字幕以换行分隔）"""
+    start: float
+    end: float
+    text: str
+
+
+def format_for_extension(ext: str) -> Optional[str]:
+    """
+    根据扩展名确定字幕格式
+
+    Args:
+        ext: 扩展名（如 vtt、json3）
+
+    Returns:
+        格式名，不支持时返回 None
+    """
+    return _EXTENSION_FORMATS.get(ext.lower().lstrip('.'))
+
+
+def detect_format(head: bytes) -> Optional[str]:
+    """
+    根据内容开头判断字幕格式
+
+    Args:
+        head: 文件开头的若干字节
+
+    Returns:
+        格式名，无法识别（如 TTML 等 XML 字幕）时返回 None
+    """
+    text = head.decode('utf-8', errors='ignore').lstrip('\ufeff \t\r\n')
+    if text.startswith('WEBVTT'):
+        return 'vtt'
+    if text.startswith('[Script Info]') or '[Events]' in text:
+        return 'ass'
+    if text.startswith('{'):
+        return 'json3' if '"events"' in text or '"wireMagic"' in text else 'bilibili'
+    if _TIMING.search(text):
+        return 'srt'
+    return None
+
+
+def iter_segments(chunks: Iterable[bytes], fmt: Optional[str] = None) -> Iterator[SubtitleSegment]:
+    """
+    流式解析字幕
+
+    Args:
+        chunks: 字节块（如 response.iter_content() 的结果）
+        fmt: 格式名（srt/vtt/ass/json3/bilibili），None 时根据第一个字节块判断
+
+    Returns:
+        字幕段迭代器
+
+    Raises:
+        ValueError: 格式不支持或无法识别
+    """
+    chunks = iter(chunks)
+    if fmt is None:
+        # 读到足够判断格式的开头（至少 1KB 或全部内容）
+        head = []
+        size = 0
+        for chunk in chunks:
+            head.append(chunk)
+            size += len(chunk)
+            if size >= 1024:
+                break
+        fmt = detect_format(b''.join(head))
+        chunks = chain(head, chunks)
+    if fmt in ('srt', 'vtt'):
+        return _parse_cues(_iter_lines(chunks))
+    if fmt == 'ass':
+        return _parse_ass(_iter_lines(chunks))
+    if fmt == 'json3':
+        return _parse_json3(_iter_json_array(chunks, 'events'))
+    if fmt == 'bilibili':
+        return _parse_bilibili(_iter_json_array(chunks, 'body'))
+    raise ValueError(f"不支持的字幕格式: {fmt}")
+
+
+def parse_subtitles(data: Union[str, bytes], fmt: Optional[str] = None) -> List[SubtitleSegment]:
+    """
+    解析完整的字幕内容
+
+    Args:
+        data: 字幕内容
+        fmt: 格式名，None 时自动判断
+
+    Returns:
+        字幕段列表
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return list(iter_segments([data], fmt))
+
+
+def dedupe_rolling(segments: Iterable[SubtitleSegment]) -> Iterator[SubtitleSegment]:
+    """
+    去掉相邻字幕段之间重复的行
+
+    YouTube 自动字幕的每条 cue 会重复上一条 cue 的最后一行（滚动显示），
+    并且紧跟一条内容相同、只持续 10ms 的 cue。本函数去掉当前段开头与上一段结尾
+    重合的行，去重后没有新内容的段并入上一段（延长结束时间）。
+
+    Args:
+        segments: 按时间排列的字幕段
+
+    Returns:
+        去重后的字幕段迭代器
+    """
+    pending: Optional[SubtitleSegment] = None
+    previous_lines: List[str] = []
+
+    for segment in segments:
+        lines = segment.text.split('\n')
+        overlap = 0
+        for k in range(min(len(previous_lines), len(lines)), 0, -1):
+            if previous_lines[-k:] == lines[:k]:
+                overlap = k
+                break
+        remaining = lines[overlap:]
+        previous_lines = lines
+        if not remaining:
+            if pending is not None:
+                pending = SubtitleSegment(pending.start, max(pending.end, segment.end), pending.text)
+            continue
+
+        if pending is not None:
+            yield pending
+        pending = SubtitleSegment(segment.start, segment.end, '\n'.join(remaining))
+
+    if pending is not None:
+        yield pending
+
+
+def join_segments(segments: Iterable[SubtitleSegment], separator: str = ' ') -> str:
+    """
+    把字幕段拼成纯文本（段内换行也替换为分隔符）
+
+    Args:
+        segments: 字幕段
+        separator: 分隔符
+
+    Returns:
+        字幕文本
+    """
+    return separator.join(segment.text.replace('\n', separator) for segment in segments)
+
+
+def _iter_lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    """增量解码为文本行（去掉 BOM 与行尾的 \\r，非法字节替换为 U+FFFD）"""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+    pending = ''
+    for chunk in chunks:
+        text = pending + decoder.decode(chunk)
+        if '\r' in text:
+            text = text.replace('\r\n', '\n')
+        lines = text.split('\n')
+        pending = lines.pop()
+        yield from lines
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending.rstrip('\r')
+
+
+def _parse_timestamp(value: str) -> float:
+    """HH:MM:SS.mmm / MM:SS,mmm / H:MM:SS.cc -> 秒"""
+    parts = value.replace(',', '.').split(':')
+    seconds = float(parts[-1])
+    if len(parts) >= 2:
+        seconds += int(parts[-2]) * 60
+    if len(parts) >= 3:
+        seconds += int(parts[-3]) * 3600
+    return seconds
+
+
+def _timing_seconds(hours: Optional[str], minutes: str, seconds: str) -> float:
+    """时间行正则的三个分组 -> 秒"""
+    value = float(seconds.replace(',', '.')) + int(minutes) * 60
+    if hours:
+        value += int(hours) * 3600
+    return value
+
+
+def _clean_line(line: str) -> str:
+    """去掉标签与覆盖代码，反转义 HTML 实体，合并空白"""
+    if '<' in line:
+        line = _MARKUP_TAG.sub('', line)
+    if '{' in line:
+        line = _ASS_OVERRIDE.sub('', line)
+    if '&' in line:
+        line = html.unescape(line)
+    return ' '.join(line.split())
+
+
+def _make_segment(start: float, end: float, lines: List[str]) -> Optional[SubtitleSegment]:
+    cleaned = []
+    for line in lines:
+        text = _clean_line(line)
+        if text:
+            cleaned.append(text)
+    if not cleaned:
+        return None
+    return SubtitleSegment(start, end, '\n'.join(cleaned))
+
+
+def _parse_cues(lines: Iterable[str]) -> Iterator[SubtitleSegment]:
+    """
+    解析 SRT / WebVTT
+
+    以空行分隔块（只含空白的行属于 cue 内容，YouTube 自动字幕中常见）；
+    WEBVTT 头、NOTE/STYLE/REGION 块整体跳过；
+    时间行之后的 cue 设置（align:start 等）忽略。缺少空行分隔时，
+    遇到新的时间行也会开始新的 cue（上一条末尾的 SRT 序号行丢弃）。
+    """
+    timing = None
+    text_lines: List[str] = []
+    skipping = False
+    block_start = True
+
+    for line in lines:
+        stripped = line.strip()
+        if not stripped and line:
+            continue
+        if not stripped:
+            if timing is not None:
+                segment = _make_segment(timing[0], timing[1], text_lines)
+                if segment:
+                    yield segment
+            timing, text_lines, skipping, block_start = None, [], False, True
+            continue
+
+        if block_start:
+            block_start = False
+            if stripped.startswith(('WEBVTT', 'NOTE', 'STYLE', 'REGION')):
+                skipping = True
+        if skipping:
+            continue
+
+        match = _TIMING.match(stripped) if '-->' in stripped else None
+        if match:
+            if timing is not None:
+                if text_lines and text_lines[-1].strip().isdigit():
+                    text_lines.pop()
+                segment = _make_segment(timing[0], timing[1], text_lines)
+                if segment:
+                    yield segment
+            timing = (_timing_seconds(*match.group(1, 2, 3)), _timing_seconds(*match.group(4, 5, 6)))
+            text_lines = []
+        elif timing is not None:
+            text_lines.append(stripped)
+        # 时间行之前的是 cue 标识（SRT 序号），忽略
+
+    if timing is not None:
+        segment = _make_segment(timing[0], timing[1], text_lines)
+        if segment:
+            yield segment
+
+
+def _parse_ass(lines: Iterable[str]) -> Iterator[SubtitleSegment]:
+    """解析 ASS / SSA 的 [Events] 段中的 Dialogue 行"""
+    in_events = False
+    fields = _ASS_DEFAULT_FIELDS
+    for line in lines:
+        stripped = line.strip()
+        if stripped.startswith('['):
+            in_events = stripped.lower() == '[events]'
+            continue
+        if not in_events:
+            continue
+
+        name, _, value = stripped.partition(':')
+        name = name.strip().lower()
+        if name == 'format':
+            fields = [field.strip().lower() for field in value.split(',')]
+        elif name == 'dialogue' and 'text' in fields:
+            values = value.split(',', len(fields) - 1)
+            if len(values) != len(fields):
+                continue
+            row = dict(zip(fields, values))
+            try:
+                start = _parse_timestamp(row['start'].strip())
+                end = _parse_timestamp(row['end'].strip())
+            except (KeyError, ValueError):
+                continue
+            text = _ASS_OVERRIDE.sub('', row['text'])
+            text = text.replace('\\N', '\n').replace('\\n', '\n').replace('\\h', ' ')
+            segment = _make_segment(start, end, text.split('\n'))
+            if segment:
+                yield segment
+
+
+def _parse_json3(events: Iterable[dict]) -> Iterator[SubtitleSegment]:
+    """解析 YouTube json3 事件（segs 逐词拼接，只含换行的追加事件跳过）"""
+    for event in events:
+        segs = event.get('segs')
+        if not segs:
+            continue
+        text = ''.join(seg.get('utf8', '') for seg in segs)
+        if not text.strip():
+            continue
+        start = event.get('tStartMs', 0) / 1000
+        end = start + event.get('dDurationMs', 0) / 1000
+        segment = _make_segment(start, end, text.split('\n'))
+        if segment:
+            yield segment
+
+
+def _parse_bilibili(items: Iterable[dict]) -> Iterator[SubtitleSegment]:
+    """解析B站字幕 body 条目（from/to/content）"""
+    for item in items:
+        segment = _make_segment(
+            float(item.get('from', 0)),
+            float(item.get('to', 0)),
+            str(item.get('content', '')).split('\n')
+        )
+        if segment:
+            yield segment
+
+
+def _iter_json_array(chunks: Iterable[bytes], key: str) -> Iterator[dict]:
+    """
+    流式读取顶层对象中 key 对应数组的元素
+
+    数组之前的内容用结构字符扫描跳过（正确处理字符串与转义），进入数组后
+    逐个用 raw_decode 解码元素，元素不完整时等待下一个字节块。
+    数组结束后不再读取剩余内容。
+
+    Args:
+        chunks: 字节块
+        key: 顶层对象中数组字段的名称
+
+    Returns:
+        数组元素迭代器
+
+    Raises:
+        ValueError: JSON 格式错误
+    """
+    decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+    json_decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    depth = 0
+    in_string = False
+    string_start = 0
+    last_string = None
+    in_array = False
+    final = False
+
+    chunks = iter(chunks)
+    while not final:
+        chunk = next(chunks, None)
+        if chunk is None:
+            final = True
+            buf += decoder.decode(b'', final=True)
+        else:
+            buf += decoder.decode(chunk)
+
+        while not in_array:
+            if in_string:
+                match = _JSON_STRING_END.search(buf, pos)
+                if not match:
+                    pos = len(buf)
+                    break
+                if match.group() == '\\':
+                    if match.end() >= len(buf):
+                        pos = match.start()
+                        break
+                    pos = match.end() + 1
+                    continue
+                in_string = False
+                pos = match.end()
+                if depth == 1:
+                    last_string = buf[string_start:match.start()]
+                continue
+
+            match = _JSON_STRUCTURE.search(buf, pos)
+            if not match:
+                pos = len(buf)
+                break
+            char = match.group()
+            pos = match.end()
+            if char == '"':
+                in_string = True
+                string_start = pos
+            elif char in '{[':
+                depth += 1
+                if char == '[' and depth == 2 and last_string == key:
+                    in_array = True
+            else:
+                depth -= 1
+
+        while in_array:
+            pos = _JSON_SEPARATOR.match(buf, pos).end()
+            if pos >= len(buf):
+                break
+            if buf[pos] == ']':
+                return
+            try:
+                item, end = json_decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError as e:
+                if final:
+                    raise ValueError(f"字幕 JSON 格式错误: {e}") from e
+                break
+            pos = end
+            if isinstance(item, dict):
+                yield item
+
+        # 丢弃已处理的内容（未结束的字符串需要保留，用于读取字段名）
+        keep = string_start if in_string else pos
+        if keep > 0:
+            buf = buf[keep:]
+            pos -= keep
+            string_start -= keep
+
+    if in_array:
+        raise ValueError("字幕 JSON 不完整")
@@ -2,13 +2,29 @@
 音频转录服务模块
 
 使用 Whisper 进行语音识别
+
+whisper（及其依赖的 torch）只在第一次加载模型时导入，
+只用到字幕的任务和 CLI/Web 启动不会付出导入开销。
 """
+from __future__ import annotations
+
 import hashlib
 import pickle
+import queue
+import threading
+import time
+from concurrent.futures import Future
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Tuple, Union
 import logging
-import whisper
+from .audio_stream import SAMPLE_RATE, FFmpegPCMStream
+from .utils.metrics import record_cache
+from .utils import tracing
+
+if TYPE_CHECKING:
+    import numpy as np
+    import torch
+    import whisper
 
 
 class TranscriptionCache:
@@ -55,9 +71,12 @@ class TranscriptionCache:
         if cache_file.exists():
             try:
                 with open(cache_file, 'rb') as f:
-                    return pickle.load(f)
+                    text = pickle.load(f)
+                record_cache('transcription', hit=True)
+                return text
             except Exception:
-                return None
+                pass
+        record_cache('transcription', hit=False)
         return None
 
     def set(self, audio_path: str, model_name: str, text: str):
@@ -121,6 +140,8 @@ class WhisperTranscriber:
             Whisper 模型实例
         """
         if self._model is None or self._model_name != model_name:
+            import whisper
+
             self.logger.info(f"正在加载 Whisper 模型: {model_name}")
 
             # 检测并选择最佳设备
@@ -233,10 +254,12 @@ class WhisperTranscriber:
             cached_text = self.cache.get(audio_path, model_name)
             if cached_text:
                 self.logger.info("使用缓存的转录结果")
+                tracing.add_event("transcription.cache_hit", model=model_name)
                 return cached_text
 
         # 加载模型
-        model = self._load_model(model_name)
+        with tracing.span("whisper.load_model", model=model_name):
+            model = self._load_model(model_name)
         device = self._detect_device()
 
         # 转录
@@ -244,19 +267,12 @@ class WhisperTranscriber:
         self.logger.info("这可能需要几分钟，请耐心等待...")
 
         try:
-            # 默认参数
-            transcribe_options = {
-                'language': language,
-                'task': 'transcribe',
-                'best_of': 5,
-                'initial_prompt': "以下是一段视频的转录内容。请用流畅的中文输出。"
-            }
+            transcribe_options = self._transcribe_options(language, **kwargs)
 
-            # 合并用户提供的参数
-            transcribe_options.update(kwargs)
-
-            result = model.transcribe(audio_path, **transcribe_options)
-            text = result["text"].strip()
+            with tracing.span("whisper.transcribe", model=model_name, device=device) as span:
+                result = model.transcribe(audio_path, **transcribe_options)
+                text = result["text"].strip()
+                span.set_attribute("chars", len(text))
 
             # 保存到缓存
             if use_cache and text:
@@ -277,13 +293,16 @@ class WhisperTranscriber:
                     import os
                     os.environ["WHISPER_DISABLE_FP16"] = "1"
 
+                    import whisper
+
                     # 强制重新加载模型
                     self._model = None
                     self._model_name = None
                     cpu_model = whisper.load_model(model_name, device="cpu")
 
                     self.logger.info("使用 CPU 重新转录...")
-                    result = cpu_model.transcribe(audio_path, **transcribe_options)
+                    with tracing.span("whisper.transcribe", model=model_name, device="cpu", fallback=True):
+                        result = cpu_model.transcribe(audio_path, **transcribe_options)
                     text = result["text"].strip()
 
                     # 保存到缓存
@@ -299,6 +318,279 @@ class WhisperTranscriber:
             else:
                 raise
 
+    DEFAULT_PROMPT = "以下是一段视频的转录内容。请用流畅的中文输出。"
+
+    def _transcribe_options(self, language: str, **kwargs) -> dict:
+        """默认转录参数，合并用户提供的参数"""
+        options = {
+            'language': language,
+            'task': 'transcribe',
+            'best_of': 5,
+            'initial_prompt': self.DEFAULT_PROMPT
+        }
+        options.update(kwargs)
+        return options
+
+    def transcribe_pcm_stream(
+        self,
+        windows: Iterable[np.ndarray],
+        model_name: str = "medium",
+        language: str = "zh",
+        cache_key: Optional[str] = None,
+        on_text: Optional[Callable[[str], None]] = None,
+        **kwargs
+    ) -> str:
+        """
+        逐窗口转录 PCM 音频流（每个窗口到达后立即转录）
+
+        上一个窗口结尾的文本作为下一个窗口的提示词，保持上下文连贯。
+
+        Args:
+            windows: 16kHz 单声道 float32 波形的迭代器（如 FFmpegPCMStream.windows()）
+            model_name: 模型名称
+            language: 语言代码
+            cache_key: 缓存键（如视频URL），为空时不使用缓存
+            on_text: 每个窗口转录完成后的回调，参数为该窗口的文本
+            **kwargs: 其他 Whisper 参数
+
+        Returns:
+            转录文本
+        """
+        if cache_key:
+            cached_text = self.cache.get(cache_key, model_name)
+            if cached_text:
+                self.logger.info("使用缓存的转录结果")
+                tracing.add_event("transcription.cache_hit", model=model_name)
+                return cached_text
+
+        with tracing.span("whisper.load_model", model=model_name):
+            model = self._load_model(model_name)
+
+        self.logger.info("正在流式转录音频...")
+        pieces = []
+        previous = ""
+        for index, window in enumerate(windows):
+            options = self._transcribe_options(language, **kwargs)
+            if previous:
+                options['initial_prompt'] = f"{options['initial_prompt'] or ''}{previous[-100:]}"
+            with tracing.span("whisper.transcribe_window", model=model_name, index=index) as span:
+                result = model.transcribe(window, **options)
+                span.set_attributes(seconds=round(len(window) / SAMPLE_RATE, 2), chars=len(result["text"]))
+            pieces.append(result["text"])
+            previous = result["text"].strip() or previous
+            if on_text and result["text"].strip():
+                on_text(result["text"].strip())
+
+        text = "".join(pieces).strip()
+        if cache_key and text:
+            self.cache.set(cache_key, model_name, text)
+
+        self.logger.info(f"流式转录完成，{len(pieces)} 个窗口，文本长度: {len(text)} 字符")
+        return text
+
+    # 长音频按窗口转录时的窗口长度：窗口内仍由 whisper.transcribe 按 30 秒滑动，
+    # 只在窗口边界处断开，内存占用与窗口长度成正比
+    LONG_AUDIO_WINDOW_SECONDS = 300
+
+    def transcribe_windowed(
+        self,
+        audio_path: str,
+        model_name: str = "medium",
+        language: str = "zh",
+        use_cache: bool = True,
+        window_seconds: float = LONG_AUDIO_WINDOW_SECONDS,
+        ffmpeg: str = "ffmpeg",
+        **kwargs
+    ) -> str:
+        """
+        按窗口转录长音频，峰值内存与音频时长无关
+
+        model.transcribe(audio_path) 会把整个文件解码成波形并一次性计算 mel 频谱，
+        数小时的音频会占用数 GB 内存。这里由 ffmpeg 直接读文件输出 PCM，
+        经有界缓冲区按窗口交给 Whisper，内存中只保留一个窗口。
+
+        Args:
+            audio_path: 音频文件路径
+            model_name: 模型名称
+            language: 语言代码
+            use_cache: 是否使用缓存（与 transcribe 共用缓存键）
+            window_seconds: 窗口长度（秒）
+            ffmpeg: ffmpeg 可执行文件
+            **kwargs: 其他 Whisper 参数
+
+        Returns:
+            转录文本
+        """
+        stream = FFmpegPCMStream(
+            ffmpeg=ffmpeg,
+            buffer_seconds=window_seconds,
+            logger=self.logger,
+            input_path=audio_path
+        )
+        with stream:
+            return self.transcribe_pcm_stream(
+                stream.windows(window_seconds),
+                model_name=model_name,
+                language=language,
+                cache_key=audio_path if use_cache else None,
+                **kwargs
+            )
+
+    # 与 whisper.transcribe 的温度回退判定保持一致
+    COMPRESSION_RATIO_THRESHOLD = 2.4
+    LOGPROB_THRESHOLD = -1.0
+    NO_SPEECH_THRESHOLD = 0.6
+
+    def transcribe_batch(
+        self,
+        audio_paths: List[str],
+        model_name: str = "medium",
+        language: str = "zh",
+        use_cache: bool = True,
+        batch_size: int = 8,
+        max_seconds: float = 60,
+        return_exceptions: bool = False,
+        **kwargs
+    ) -> List[Union[str, Exception]]:
+        """
+        批量转录多个短音频
+
+        每个音频切成 30 秒窗口，所有音频的窗口叠成一个 mel 批次，
+        一次编码器前向 + 一次批量解码，再按音频拆回结果。
+        超过 max_seconds 的音频、批量解码质量不达标（重复/低置信度）的音频
+        以及批量解码出错时，逐个走 transcribe（带温度回退）。
+        单个音频读取或转录失败只影响该音频自身。
+
+        Args:
+            audio_paths: 音频文件路径列表
+            model_name: 模型名称
+            language: 语言代码
+            use_cache: 是否使用缓存
+            batch_size: 每次解码的最大窗口数
+            max_seconds: 参与批量的音频最大时长（秒）
+            return_exceptions: 为 True 时失败的音频在结果中对应其异常，否则抛出第一个异常
+            **kwargs: 其他 whisper.DecodingOptions 参数（逐个转录时同样使用）
+
+        Returns:
+            与 audio_paths 一一对应的转录文本列表（return_exceptions 时失败项为异常）
+        """
+        import whisper
+
+        results: List[Optional[str]] = [None] * len(audio_paths)
+        errors: Dict[int, Exception] = {}
+        pending = []
+        for index, audio_path in enumerate(audio_paths):
+            cached_text = self.cache.get(audio_path, model_name) if use_cache else None
+            if cached_text:
+                results[index] = cached_text
+            else:
+                pending.append(index)
+        if len(pending) < len(audio_paths):
+            tracing.add_event("transcription.cache_hit", model=model_name, count=len(audio_paths) - len(pending))
+
+        with tracing.span("whisper.load_model", model=model_name):
+            model = self._load_model(model_name)
+
+        # (音频序号, 窗口 mel)，长音频单独转录
+        windows: List[Tuple[int, torch.Tensor]] = []
+        single = []
+        for index in pending:
+            # 下载不完整、文件损坏等只记在该音频上，不影响同批的其他音频
+            try:
+                audio = whisper.load_audio(audio_paths[index])
+                if len(audio) > max_seconds * SAMPLE_RATE:
+                    single.append(index)
+                    continue
+                audio_windows = [
+                    (index, whisper.log_mel_spectrogram(
+                        whisper.pad_or_trim(audio[start:start + whisper.audio.N_SAMPLES]),
+                        n_mels=model.dims.n_mels
+                    ))
+                    for start in range(0, max(len(audio), 1), whisper.audio.N_SAMPLES)
+                ]
+            except Exception as e:
+                self.logger.warning(f"读取音频失败（{audio_paths[index]}）: {e}")
+                errors[index] = e
+                continue
+            windows.extend(audio_windows)
+
+        pieces = {index: [] for index, _ in windows}
+        if windows:
+            self.logger.info(f"批量转录 {len(pieces)} 个音频，共 {len(windows)} 个窗口")
+            try:
+                retry = self._decode_windows(model, windows, pieces, language, batch_size, **kwargs)
+            except Exception as e:
+                self.logger.warning(f"批量解码失败，改为逐个转录: {e}")
+                retry = set(pieces)
+            single.extend(sorted(retry))
+            for index, parts in pieces.items():
+                if index in retry:
+                    continue
+                results[index] = "".join(parts).strip()
+                if use_cache and results[index]:
+                    self.cache.set(audio_paths[index], model_name, results[index])
+
+        for index in single:
+            try:
+                results[index] = self.transcribe(
+                    audio_paths[index],
+                    model_name=model_name,
+                    language=language,
+                    use_cache=use_cache,
+                    **kwargs
+                )
+            except Exception as e:
+                errors[index] = e
+
+        if errors and not return_exceptions:
+            raise errors[min(errors)]
+        return [errors[index] if index in errors else (text or "") for index, text in enumerate(results)]
+
+    def _decode_windows(
+        self,
+        model: whisper.Whisper,
+        windows: List[Tuple[int, torch.Tensor]],
+        pieces: dict,
+        language: str,
+        batch_size: int,
+        **kwargs
+    ) -> set:
+        """
+        按 batch_size 分批解码窗口，文本追加到 pieces[音频序号]
+
+        Returns:
+            需要逐个重新转录的音频序号集合
+        """
+        import torch
+        import whisper
+
+        options = whisper.DecodingOptions(
+            language=language,
+            task="transcribe",
+            prompt=self.DEFAULT_PROMPT,
+            fp16=model.device.type != "cpu",
+            without_timestamps=True,
+            **kwargs
+        )
+        retry = set()
+        for start in range(0, len(windows), batch_size):
+            batch = windows[start:start + batch_size]
+            mel = torch.stack([item[1] for item in batch]).to(model.device)
+            with tracing.span("whisper.decode_batch", windows=len(batch)):
+                decoded = whisper.decode(model, mel, options)
+            for (index, _), result in zip(batch, decoded):
+                silent = (
+                    result.no_speech_prob > self.NO_SPEECH_THRESHOLD
+                    and result.avg_logprob < self.LOGPROB_THRESHOLD
+                )
+                if silent:
+                    continue
+                if (result.compression_ratio > self.COMPRESSION_RATIO_THRESHOLD
+                        or result.avg_logprob < self.LOGPROB_THRESHOLD):
+                    retry.add(index)
+                pieces[index].append(result.text)
+        return retry
+
     def get_available_models(self) -> list[str]:
         """
         获取可用的模型列表
@@ -309,6 +601,167 @@ class WhisperTranscriber:
         return ["tiny", "base", "small", "medium", "large", "large-v2"]
 
 
+class TranscriptionBatcher:
+    """
+    把并发任务的短音频转录请求合并成批
+
+    调用方线程提交音频后阻塞等待；后台线程收集 max_wait 秒内（或凑满
+    batch_size 个）到达的请求，调用 transcribe_batch 后把结果分发回各调用方。
+    后台线程空闲 idle_timeout 秒后退出，有新请求时再启动。
+    进程内请通过 get_transcription_batcher 获取共享实例，不同任务的短音频才能合并到同一批。
+    """
+
+    def __init__(
+        self,
+        transcriber: WhisperTranscriber,
+        model_name: str = "medium",
+        language: str = "zh",
+        batch_size: int = 8,
+        max_wait: float = 0.5,
+        max_seconds: float = 60,
+        idle_timeout: float = 30,
+        logger: Optional[logging.Logger] = None
+    ):
+        """
+        初始化批量转录调度器
+
+        Args:
+            transcriber: 转录器（需提供 transcribe_batch）
+            model_name: 模型名称
+            language: 语言代码
+            batch_size: 每批最多合并的音频数
+            max_wait: 第一个请求到达后等待凑批的最长时间（秒）
+            max_seconds: 参与批量的音频最大时长（秒）
+            idle_timeout: 没有请求时后台线程保留的时间（秒）
+            logger: 日志记录器
+        """
+        self.transcriber = transcriber
+        self.model_name = model_name
+        self.language = language
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.max_seconds = max_seconds
+        self.idle_timeout = idle_timeout
+        self.logger = logger or logging.getLogger(__name__)
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def transcribe(self, audio_path: str) -> str:
+        """
+        提交一个音频并等待其转录结果
+
+        Args:
+            audio_path: 音频文件路径
+
+        Returns:
+            转录文本
+        """
+        future: Future = Future()
+        self._queue.put((audio_path, future))
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="transcription-batcher", daemon=True)
+                self._thread.start()
+        return future.result()
+
+    def _collect(self) -> Optional[List[Tuple[str, Future]]]:
+        """等待第一个请求（最长 idle_timeout），再在 max_wait 内尽量凑满一批；空闲超时返回 None"""
+        try:
+            batch = [self._queue.get(timeout=self.idle_timeout)]
+        except queue.Empty:
+            return None
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                # 在锁内确认队列仍为空再退出：提交方入队后若看到线程已退出，会重新启动一个
+                with self._lock:
+                    if self._queue.empty():
+                        self._thread = None
+                        return
+                continue
+            paths = [path for path, _ in batch]
+            try:
+                with tracing.span("whisper.transcribe_batch", model=self.model_name, size=len(batch)):
+                    texts = self.transcriber.transcribe_batch(
+                        paths,
+                        model_name=self.model_name,
+                        language=self.language,
+                        batch_size=self.batch_size,
+                        max_seconds=self.max_seconds,
+                        return_exceptions=True
+                    )
+            except Exception as e:  # pylint: disable=broad-except
+                self.logger.error(f"批量转录失败: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.logger.info(f"批量转录完成: {len(batch)} 个音频")
+            # 单个音频的失败只交给它自己的调用方
+            for (_, future), text in zip(batch, texts):
+                if isinstance(text, Exception):
+                    future.set_exception(text)
+                else:
+                    future.set_result(text)
+
+
+# 进程内共享的批量转录调度器（按模型区分，所有处理器实例共用）
+_batchers: Dict[str, TranscriptionBatcher] = {}
+_batchers_lock = threading.Lock()
+
+
+def get_transcription_batcher(
+    transcriber: WhisperTranscriber,
+    model_name: str,
+    language: str = "zh",
+    batch_size: int = 8,
+    max_wait: float = 0.5,
+    max_seconds: float = 60,
+    logger: Optional[logging.Logger] = None
+) -> TranscriptionBatcher:
+    """
+    获取模型对应的共享批量转录调度器（每个模型只创建一次，配置以首次创建时为准）
+
+    Args:
+        transcriber: 转录器（仅首次创建时使用）
+        model_name: 模型名称
+        language: 语言代码
+        batch_size: 每批最多合并的音频数
+        max_wait: 第一个请求到达后等待凑批的最长时间（秒）
+        max_seconds: 参与批量的音频最大时长（秒）
+        logger: 日志记录器
+
+    Returns:
+        批量转录调度器
+    """
+    with _batchers_lock:
+        batcher = _batchers.get(model_name)
+        if batcher is None:
+            batcher = TranscriptionBatcher(
+                transcriber,
+                model_name=model_name,
+                language=language,
+                batch_size=batch_size,
+                max_wait=max_wait,
+                max_seconds=max_seconds,
+                logger=logger
+            )
+            _batchers[model_name] = batcher
+        return batcher
+
+
 def create_transcriber(
     logger: Optional[logging.Logger] = None,
     cache_dir: Optional[Path] = None
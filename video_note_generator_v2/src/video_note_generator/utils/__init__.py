@@ -3,6 +3,10 @@ Utility modules for video note generator
 """
 from .logger import setup_logger, get_logger
 from .text_utils import split_content, extract_urls, clean_text, truncate_text
+from .rate_limiter import RateLimiter, get_rate_limiter, backoff_delay
+from .metrics import MetricsRegistry, stage_timer
+from .tracing import configure_tracing, wrap_context
+from .profiling import profile_job, maybe_profile
 
 __all__ = [
     'setup_logger',
@@ -11,4 +15,13 @@ __all__ = [
     'extract_urls',
     'clean_text',
     'truncate_text',
+    'RateLimiter',
+    'get_rate_limiter',
+    'backoff_delay',
+    'MetricsRegistry',
+    'stage_timer',
+    'configure_tracing',
+    'wrap_context',
+    'profile_job',
+    'maybe_profile',
 ]
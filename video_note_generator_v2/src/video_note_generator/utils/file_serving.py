@@ -0,0 +1,91 @@
+"""
+生成文件的读取工具（供 Web 接口使用）
+
+- 路径解析：解析符号链接与 ../ 后再确认位于输出目录内
+- 条件请求：根据 stat 结果生成 ETag，文件未变化时直接返回 304，不再读取文件
+- 分段预览：按字节偏移读取一段 UTF-8 文本，大文件的预览不必整篇读入
+"""
+import codecs
+import os
+from pathlib import Path
+from typing import Optional, Tuple
+
+# 预览单次返回的最大字节数
+PREVIEW_LIMIT = 256 * 1024
+
+
+def resolve_output_file(file_path: str, output_dir: Path) -> Optional[Path]:
+    """
+    解析请求的文件路径，确认其位于输出目录内
+
+    Args:
+        file_path: 请求中的文件路径（绝对路径或相对当前目录的路径）
+        output_dir: 输出目录
+
+    Returns:
+        解析后的绝对路径；位于输出目录之外时返回 None
+    """
+    root = Path(output_dir).resolve()
+    resolved = Path(file_path).resolve()
+    try:
+        resolved.relative_to(root)
+    except ValueError:
+        return None
+    return resolved
+
+
+def file_etag(stat_result: os.stat_result) -> str:
+    """根据修改时间与大小生成 ETag（不读取文件内容）"""
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    判断 If-None-Match 是否命中（弱比较，忽略 W/ 前缀）
+
+    Args:
+        if_none_match: 请求头 If-None-Match 的值
+        etag: 当前文件的 ETag
+
+    Returns:
+        命中时返回 True（应返回 304）
+    """
+    if not if_none_match:
+        return False
+
+    def strip_weak(tag: str) -> str:
+        tag = tag.strip()
+        return tag[2:] if tag.startswith('W/') else tag
+
+    candidates = [strip_weak(tag) for tag in if_none_match.split(',')]
+    return '*' in candidates or strip_weak(etag) in candidates
+
+
+def read_text_range(path: Path, offset: int = 0, limit: int = PREVIEW_LIMIT) -> Tuple[str, int]:
+    """
+    从字节偏移处读取至多 limit 字节的 UTF-8 文本
+
+    读取范围的首尾会对齐到完整字符：偏移落在多字节字符中间时跳过残余字节，
+    末尾不完整的字符留给下一段。
+
+    Args:
+        path: 文件路径
+        offset: 起始字节偏移
+        limit: 最多读取的字节数
+
+    Returns:
+        (文本, 下一段的起始字节偏移)
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read(limit)
+
+    # 跳过 UTF-8 续字节（0b10xxxxxx）
+    skip = 0
+    while skip < len(data) and skip < 3 and (data[skip] & 0xC0) == 0x80:
+        skip += 1
+
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    text = decoder.decode(data[skip:], final=len(data) < limit)
+    pending = len(decoder.getstate()[0])
+    return text, offset + len(data) - pending
@@ -0,0 +1,433 @@
+"""
+指标统计模块
+
+进程内的轻量指标（计数器、直方图），可导出为 Prometheus 文本格式或 JSON 摘要：
+- 各处理阶段耗时（字幕、下载、转录、整理、小红书、博客、配图）
+- 下载字节数、转录音频时长
+- LLM 请求数与 token 用量（来自 response.usage）
+- LLM / 转录缓存命中情况
+"""
+import contextvars
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# 阶段耗时直方图分桶（秒），覆盖从字幕提取到长视频转录
+DEFAULT_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric(ABC):
+    """指标基类"""
+
+    type_name = ''
+
+    def __init__(self, name: str, description: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        lines = [
+            f'# HELP {self.name} {self.description}',
+            f'# TYPE {self.name} {self.type_name}',
+        ]
+        lines.extend(self._render_samples())
+        return lines
+
+    @abstractmethod
+    def _render_samples(self) -> List[str]:
+        """Prometheus 文本格式的样本行"""
+        pass
+
+    @abstractmethod
+    def reset(self):
+        """清空已记录的数据"""
+        pass
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+
+    type_name = 'counter'
+
+    def __init__(self, name: str, description: str, labels: Iterable[str] = ()):
+        super().__init__(name, description, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        """
+        增加计数
+
+        Args:
+            amount: 增量（不能为负）
+            **labels: 标签值
+        """
+        if amount < 0:
+            raise ValueError("计数器只能增加")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def values(self) -> Dict[LabelValues, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def _render_samples(self) -> List[str]:
+        return [
+            f'{self.name}{_format_labels(self.label_names, key)} {_format_number(value)}'
+            for key, value in sorted(self.values().items())
+        ]
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(_Metric):
+    """直方图（记录分布、总和与次数）"""
+
+    type_name = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labels: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+        # {标签: [各分桶计数..., 总和, 次数]}
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        """
+        记录一次观测值
+
+        Args:
+            value: 观测值
+            **labels: 标签值
+        """
+        key = self._key(labels)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = [0] * (len(self.buckets) + 2)
+                self._values[key] = data
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[index] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """计时上下文，退出时记录耗时（秒）"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self) -> Dict[LabelValues, dict]:
+        """
+        获取各标签组合的统计
+
+        Returns:
+            {标签: {"count", "sum", "buckets"}}
+        """
+        with self._lock:
+            return {
+                key: {
+                    'count': data[-1],
+                    'sum': data[-2],
+                    'buckets': dict(zip(self.buckets, data[:-2])),
+                }
+                for key, data in self._values.items()
+            }
+
+    def _render_samples(self) -> List[str]:
+        lines = []
+        for key, data in sorted(self.snapshot().items()):
+            for bound, count in data['buckets'].items():
+                labels = _format_labels(self.label_names, key, f'le="{_format_number(bound)}"')
+                lines.append(f'{self.name}_bucket{labels} {count}')
+            labels = _format_labels(self.label_names, key, 'le="+Inf"')
+            lines.append(f'{self.name}_bucket{labels} {data["count"]}')
+            labels = _format_labels(self.label_names, key)
+            lines.append(f'{self.name}_sum{labels} {_format_number(data["sum"])}')
+            lines.append(f'{self.name}_count{labels} {data["count"]}')
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self, namespace: str = 'vng'):
+        self.namespace = namespace
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, description: str, labels: Iterable[str] = ()) -> Counter:
+        """获取或创建计数器（名称自动加命名空间前缀）"""
+        return self._register(Counter(f'{self.namespace}_{name}', description, labels))
+
+    def histogram(
+        self,
+        name: str,
+        description: str,
+        labels: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        """获取或创建直方图（名称自动加命名空间前缀）"""
+        return self._register(Histogram(f'{self.namespace}_{name}', description, labels, buckets))
+
+    def render_prometheus(self) -> str:
+        """
+        导出 Prometheus 文本格式
+
+        Returns:
+            exposition format 0.0.4 文本
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        """清空所有指标的数据（保留注册）"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+
+
+# 进程内共享的默认注册表
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    'stage_duration_seconds', '各处理阶段耗时（秒）', labels=('stage',)
+)
+STAGE_ERRORS = registry.counter(
+    'stage_errors_total', '各处理阶段失败次数', labels=('stage',)
+)
+VIDEOS = registry.counter(
+    'videos_processed_total', '处理的视频数', labels=('status',)
+)
+DOWNLOAD_BYTES = registry.counter(
+    'download_bytes_total', '下载的媒体字节数', labels=('platform',)
+)
+AUDIO_SECONDS = registry.counter(
+    'audio_transcribed_seconds_total', '转录的音频时长（秒）'
+)
+SHARED_JOBS = registry.counter(
+    'jobs_shared_total', '合并到进行中相同任务的请求数'
+)
+LLM_REQUESTS = registry.counter(
+    'llm_requests_total', 'LLM 请求次数', labels=('model', 'task', 'status')
+)
+LLM_TOKENS = registry.counter(
+    'llm_tokens_total', 'LLM token 用量', labels=('model', 'type')
+)
+LLM_SECONDS = registry.histogram(
+    'llm_request_duration_seconds', 'LLM 单次请求耗时（秒）', labels=('model',)
+)
+CACHE_REQUESTS = registry.counter(
+    'cache_requests_total', '缓存查询次数', labels=('cache', 'result')
+)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """
+    记录一个处理阶段的耗时，阶段内抛出异常时同时计入失败次数
+
+    Args:
+        stage: 阶段名称（subtitle/download/transcribe/organize/xiaohongshu/blog/images）
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        job = _current_job.get()
+        if job is not None:
+            job.add_stage(stage, elapsed)
+
+
+class JobUsage:
+    """单个任务的用量：各阶段耗时与各模型的 LLM 请求数、token 数"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.models: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def add_stage(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def add_llm(self, model: str, usage):
+        with self._lock:
+            entry = self.models.setdefault(
+                model, {'requests': 0, 'prompt_tokens': 0, 'completion_tokens': 0}
+            )
+            entry['requests'] += 1
+            if usage is not None:
+                entry['prompt_tokens'] += getattr(usage, 'prompt_tokens', 0) or 0
+                entry['completion_tokens'] += getattr(usage, 'completion_tokens', 0) or 0
+
+    def to_dict(self) -> dict:
+        """导出为可 JSON 序列化的字典（耗时单位：秒）"""
+        with self._lock:
+            return {
+                'total_seconds': round(time.perf_counter() - self.started, 3),
+                'stages': {stage: round(seconds, 3) for stage, seconds in self.stages.items()},
+                'models': {model: dict(entry) for model, entry in self.models.items()},
+            }
+
+
+# 当前任务的用量（tracing.wrap_context 提交到线程池的函数也会记到同一个任务上）
+_current_job: contextvars.ContextVar[Optional[JobUsage]] = contextvars.ContextVar(
+    'current_job', default=None
+)
+
+
+@contextmanager
+def track_job():
+    """
+    统计当前任务的阶段耗时与 LLM 用量（进程级指标照常累计）
+
+    Yields:
+        JobUsage
+    """
+    job = JobUsage()
+    token = _current_job.set(job)
+    try:
+        yield job
+    finally:
+        _current_job.reset(token)
+
+
+def current_job() -> Optional[JobUsage]:
+    """获取当前任务的用量（不在 track_job 内时返回 None）"""
+    return _current_job.get()
+
+
+def record_cache(cache: str, hit: bool):
+    """记录一次缓存查询结果"""
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def record_llm_usage(model: str, task: Optional[str], usage, seconds: float):
+    """
+    记录一次成功的 LLM 请求
+
+    Args:
+        model: 实际使用的模型
+        task: 任务类型
+        usage: response.usage（可能为 None）
+        seconds: 请求耗时
+    """
+    LLM_REQUESTS.inc(model=model, task=task or 'default', status='success')
+    LLM_SECONDS.observe(seconds, model=model)
+    job = _current_job.get()
+    if job is not None:
+        job.add_llm(model, usage)
+    if usage is not None:
+        LLM_TOKENS.inc(getattr(usage, 'prompt_tokens', 0) or 0, model=model, type='prompt')
+        LLM_TOKENS.inc(getattr(usage, 'completion_tokens', 0) or 0, model=model, type='completion')
+
+
+def summary() -> dict:
+    """
+    生成 JSON 摘要（CLI 运行结束时输出）
+
+    Returns:
+        各阶段耗时、下载与转录量、LLM 用量和缓存命中率
+    """
+    stages = {
+        key[0]: {
+            'count': data['count'],
+            'total_seconds': round(data['sum'], 3),
+            'avg_seconds': round(data['sum'] / data['count'], 3) if data['count'] else 0,
+            'errors': STAGE_ERRORS.value(stage=key[0]),
+        }
+        for key, data in STAGE_SECONDS.snapshot().items()
+    }
+
+    llm_requests: Dict[str, Dict[str, float]] = {}
+    for (model, task, status), count in LLM_REQUESTS.values().items():
+        entry = llm_requests.setdefault(model, {})
+        entry[status] = entry.get(status, 0) + count
+
+    tokens: Dict[str, Dict[str, float]] = {}
+    for (model, kind), count in LLM_TOKENS.values().items():
+        tokens.setdefault(model, {})[kind] = count
+
+    caches: Dict[str, dict] = {}
+    for (cache, result), count in CACHE_REQUESTS.values().items():
+        caches.setdefault(cache, {'hit': 0, 'miss': 0})[result] = count
+    for entry in caches.values():
+        total = entry['hit'] + entry['miss']
+        entry['hit_rate'] = round(entry['hit'] / total, 3) if total else 0.0
+
+    return {
+        'videos': {key[0]: count for key, count in VIDEOS.values().items()},
+        'stages': stages,
+        'download_bytes': sum(DOWNLOAD_BYTES.values().values()),
+        'audio_seconds': AUDIO_SECONDS.value(),
+        'llm_requests': llm_requests,
+        'llm_tokens': tokens,
+        'caches': caches,
+    }
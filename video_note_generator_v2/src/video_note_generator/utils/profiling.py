@@ -0,0 +1,249 @@
+"""
+性能剖析模块
+
+对单个处理任务做剖析，产物保存在笔记输出目录：
+- cprofile: 确定性剖析，输出 .prof（可用 snakeviz / pstats 查看）
+- sampling: 采样剖析，只采样执行任务的线程，开销低且多个任务可同时剖析，
+  输出 .folded（火焰图折叠栈格式，可直接交给 flamegraph.pl / speedscope）
+
+两种模式都会生成 _profile.txt，列出最耗时的前 N 个函数。
+未开启剖析时调用方使用 nullcontext，不引入任何额外开销。
+"""
+import cProfile
+import io
+import logging
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+PROFILE_MODES = ("cprofile", "sampling")
+
+# 同一时刻只能有一个 cProfile 处于启用状态
+_cprofile_lock = threading.Lock()
+
+Frame = Tuple[str, str, int]
+
+
+class SamplingProfiler:
+    """定时采样目标线程调用栈的剖析器"""
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 128):
+        """
+        初始化采样剖析器
+
+        Args:
+            interval: 采样间隔（秒）
+            max_depth: 记录的最大栈深度
+        """
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self._target: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, thread_id: Optional[int] = None):
+        """开始采样（默认采样调用线程）"""
+        self._target = thread_id or threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止采样"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                continue
+            stack: List[Frame] = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_name, code.co_firstlineno))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples[tuple(stack)] += 1
+            self.sample_count += 1
+
+    @staticmethod
+    def _label(frame: Frame) -> str:
+        filename, name, line = frame
+        return f"{name} ({Path(filename).name}:{line})"
+
+    def write_folded(self, path: Path):
+        """
+        输出折叠栈格式（每行 "栈帧;栈帧;... 次数"）
+
+        Args:
+            path: 输出文件路径
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(";".join(self._label(frame) for frame in stack))
+                f.write(f" {count}\n")
+
+    def top(self, top_n: int) -> Tuple[List[Tuple[str, int]], List[Tuple[str, int]]]:
+        """
+        统计热点函数
+
+        Returns:
+            (按自身采样数排序, 按包含子调用的采样数排序)，各取前 N 个
+        """
+        own: Dict[Frame, int] = Counter()
+        total: Dict[Frame, int] = Counter()
+        for stack, count in self.samples.items():
+            if not stack:
+                continue
+            own[stack[-1]] += count
+            # 递归调用只计一次
+            for frame in set(stack):
+                total[frame] += count
+        return (
+            [(self._label(frame), count) for frame, count in own.most_common(top_n)],
+            [(self._label(frame), count) for frame, count in total.most_common(top_n)],
+        )
+
+
+class ProfileResult:
+    """剖析结果（任务结束后 artifacts 才会填充）"""
+
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.artifacts: List[Path] = []
+        self.elapsed: float = 0.0
+
+
+def _write_cprofile(profiler: cProfile.Profile, prefix: Path, top_n: int, header: str) -> List[Path]:
+    prof_path = prefix.with_name(prefix.name + ".prof")
+    profiler.dump_stats(str(prof_path))
+
+    buffer = io.StringIO()
+    stats = pstats.Stats(profiler, stream=buffer).strip_dirs()
+    buffer.write(f"{header}\n\n==== 按累计耗时排序（前 {top_n}） ====\n")
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top_n)
+    buffer.write(f"\n==== 按自身耗时排序（前 {top_n}） ====\n")
+    stats.sort_stats(pstats.SortKey.TIME).print_stats(top_n)
+
+    summary_path = prefix.with_name(prefix.name + ".txt")
+    summary_path.write_text(buffer.getvalue(), encoding="utf-8")
+    return [prof_path, summary_path]
+
+
+def _write_sampling(profiler: SamplingProfiler, prefix: Path, top_n: int, header: str) -> List[Path]:
+    folded_path = prefix.with_name(prefix.name + ".folded")
+    profiler.write_folded(folded_path)
+
+    own, total = profiler.top(top_n)
+    samples = max(profiler.sample_count, 1)
+    lines = [
+        header,
+        f"采样间隔: {profiler.interval * 1000:.1f}ms  样本数: {profiler.sample_count}",
+        "",
+        f"==== 自身占比（前 {top_n}） ====",
+    ]
+    lines += [f"{count / samples:7.1%}  {count:>7}  {label}" for label, count in own]
+    lines += ["", f"==== 包含子调用占比（前 {top_n}） ===="]
+    lines += [f"{count / samples:7.1%}  {count:>7}  {label}" for label, count in total]
+
+    summary_path = prefix.with_name(prefix.name + ".txt")
+    summary_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return [folded_path, summary_path]
+
+
+@contextmanager
+def profile_job(
+    output_dir: Path,
+    mode: str = "cprofile",
+    name: str = "job",
+    top_n: int = 30,
+    sample_interval: float = 0.005,
+    logger: Optional[logging.Logger] = None
+):
+    """
+    剖析代码块，结束后把产物写入 output_dir
+
+    cProfile 同一时刻只能启用一个，已被占用时自动改用采样模式。
+
+    Args:
+        output_dir: 产物目录（通常是笔记输出目录）
+        mode: cprofile 或 sampling
+        name: 产物文件名中的任务标识
+        top_n: 摘要中列出的函数数量
+        sample_interval: 采样模式的采样间隔（秒）
+        logger: 日志记录器
+
+    Yields:
+        ProfileResult，退出后 artifacts 为生成的文件列表
+    """
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"不支持的剖析模式: {mode}（可选: {', '.join(PROFILE_MODES)}）")
+    logger = logger or logging.getLogger(__name__)
+
+    use_cprofile = mode == "cprofile" and _cprofile_lock.acquire(blocking=False)
+    if mode == "cprofile" and not use_cprofile:
+        logger.warning("已有任务在使用 cProfile，本任务改用采样剖析")
+        mode = "sampling"
+
+    result = ProfileResult(mode)
+    profiler = cProfile.Profile() if use_cprofile else SamplingProfiler(interval=sample_interval)
+    started = time.perf_counter()
+    if use_cprofile:
+        profiler.enable()
+    else:
+        profiler.start()
+
+    try:
+        yield result
+    finally:
+        if use_cprofile:
+            profiler.disable()
+            _cprofile_lock.release()
+        else:
+            profiler.stop()
+        result.elapsed = time.perf_counter() - started
+
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        prefix = output_dir / f"{timestamp}_{name}_{mode}_profile"
+        # 同一秒内的同名任务追加序号，避免互相覆盖
+        index = 1
+        while prefix.with_name(prefix.name + ".txt").exists():
+            index += 1
+            prefix = output_dir / f"{timestamp}_{name}_{mode}_profile{index}"
+        header = f"任务: {name}  模式: {mode}  耗时: {result.elapsed:.3f}s"
+
+        try:
+            if use_cprofile:
+                result.artifacts = _write_cprofile(profiler, prefix, top_n, header)
+            else:
+                result.artifacts = _write_sampling(profiler, prefix, top_n, header)
+            logger.info(f"剖析结果已保存: {', '.join(str(p) for p in result.artifacts)}")
+        except OSError as e:
+            logger.warning(f"保存剖析结果失败: {e}")
+
+
+def maybe_profile(mode: Optional[str], output_dir: Path, **kwargs):
+    """
+    mode 为空时返回 nullcontext（无任何开销），否则返回 profile_job
+
+    Args:
+        mode: None / cprofile / sampling
+        output_dir: 产物目录
+        **kwargs: 传给 profile_job 的其他参数
+    """
+    if not mode:
+        return nullcontext()
+    return profile_job(output_dir, mode=mode, **kwargs)
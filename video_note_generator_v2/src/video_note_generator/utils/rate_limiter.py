@@ -0,0 +1,309 @@
+"""
+速率限制与重试工具模块
+
+为 LLM 等外部 API 调用提供：
+- 令牌桶限速，根据服务端限流响应头（X-RateLimit-*、Retry-After）自适应调整
+- 进程内共享的并发控制（同步线程与异步协程共用同一份额度，按到达顺序排队，释放时直接交给队首）
+- 带抖动的指数退避
+"""
+import asyncio
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Callable, Deque, Dict, Mapping, Optional
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """
+    计算带抖动的指数退避时间（Full Jitter）
+
+    Args:
+        attempt: 第几次重试（从0开始）
+        base: 基础等待时间（秒）
+        cap: 最大等待时间（秒）
+
+    Returns:
+        等待时间（秒）
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def _parse_duration(value: str) -> Optional[float]:
+    """
+    解析限流响应头中的时间值
+
+    支持秒数（"2"、"0.5"）、毫秒级时间戳（OpenRouter 的 X-RateLimit-Reset）
+    以及 "1m30s"、"250ms" 这类时长格式
+
+    Returns:
+        距离现在的秒数，无法解析返回None
+    """
+    value = value.strip()
+    try:
+        number = float(value)
+    except ValueError:
+        number = None
+
+    if number is not None:
+        # 毫秒级 Unix 时间戳
+        if number > 1e12:
+            return max(0.0, number / 1000 - time.time())
+        # 秒级 Unix 时间戳
+        if number > 1e9:
+            return max(0.0, number - time.time())
+        return max(0.0, number)
+
+    total = 0.0
+    matched = False
+    for amount, unit in re.findall(r'(\d+(?:\.\d+)?)(ms|h|m|s)', value):
+        matched = True
+        amount = float(amount)
+        total += {
+            'ms': amount / 1000,
+            's': amount,
+            'm': amount * 60,
+            'h': amount * 3600,
+        }[unit]
+    return total if matched else None
+
+
+class RateLimiter:
+    """自适应速率限制器（令牌桶 + 并发控制）"""
+
+    def __init__(
+        self,
+        requests_per_minute: int = 60,
+        max_concurrency: int = 4,
+        min_requests_per_minute: int = 2
+    ):
+        """
+        初始化速率限制器
+
+        Args:
+            requests_per_minute: 每分钟最大请求数（速率上限）
+            max_concurrency: 最大并发请求数
+            min_requests_per_minute: 被限流后速率下调的下限
+        """
+        self.max_rate = requests_per_minute / 60.0
+        self.min_rate = min(min_requests_per_minute, requests_per_minute) / 60.0
+        self.rate = self.max_rate
+        self.max_concurrency = max(1, max_concurrency)
+
+        self._tokens = 1.0
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+        # 并发名额：占用数 + 等待队列（线程与协程混排，先到先得）
+        self._slot_lock = threading.Lock()
+        self._in_use = 0
+        self._waiters: Deque[Callable[[], bool]] = deque()
+
+    def _reserve(self) -> float:
+        """预约一个请求令牌，返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._updated_at
+            self._updated_at = now
+            self._tokens = min(1.0, self._tokens + elapsed * self.rate)
+
+            wait = max(0.0, self._paused_until - now)
+            if self._tokens < 1.0:
+                wait = max(wait, (1.0 - self._tokens) / self.rate)
+            # 令牌可以透支，后续请求会按顺序排在后面
+            self._tokens -= 1.0
+            return wait
+
+    def acquire(self):
+        """阻塞直到可以发出下一个请求"""
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """异步等待直到可以发出下一个请求"""
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def _take_or_enqueue(self, waiter: Callable[[], bool]) -> bool:
+        """有空闲名额且无人排队时直接占用，否则排队；返回是否已占用"""
+        with self._slot_lock:
+            if self._in_use < self.max_concurrency and not self._waiters:
+                self._in_use += 1
+                return True
+            self._waiters.append(waiter)
+            return False
+
+    def _release_slot(self):
+        """释放名额：有等待者时直接移交给队首（占用数不变），否则归还"""
+        while True:
+            with self._slot_lock:
+                if not self._waiters:
+                    self._in_use -= 1
+                    return
+                waiter = self._waiters.popleft()
+            # 等待者所在的事件循环已关闭时移交失败，继续交给下一个
+            if waiter():
+                return
+
+    @contextmanager
+    def slot(self):
+        """占用一个并发名额（同步）"""
+        granted = threading.Event()
+
+        def wake() -> bool:
+            granted.set()
+            return True
+
+        if not self._take_or_enqueue(wake):
+            granted.wait()
+        try:
+            yield
+        finally:
+            self._release_slot()
+
+    @asynccontextmanager
+    async def async_slot(self):
+        """占用一个并发名额（异步，与同步调用共享同一份额度，等待时不占线程也不轮询）"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def grant():
+            # 在事件循环线程中执行；等待的协程已取消时把名额转交下一个
+            if future.done():
+                self._release_slot()
+            else:
+                future.set_result(None)
+
+        def wake() -> bool:
+            try:
+                loop.call_soon_threadsafe(grant)
+                return True
+            except RuntimeError:
+                return False
+
+        if not self._take_or_enqueue(wake):
+            try:
+                await future
+            except asyncio.CancelledError:
+                with self._slot_lock:
+                    try:
+                        self._waiters.remove(wake)
+                        queued = True
+                    except ValueError:
+                        queued = False
+                # 名额已移交（结果已设置）但协程随即被取消：归还名额
+                if not queued and future.done() and not future.cancelled():
+                    self._release_slot()
+                raise
+        try:
+            yield
+        finally:
+            self._release_slot()
+
+    def update_from_headers(self, headers: Optional[Mapping[str, str]]):
+        """
+        根据服务端返回的限流响应头调整节奏
+
+        剩余额度耗尽时暂停到重置时间
+
+        Args:
+            headers: HTTP 响应头
+        """
+        if not headers:
+            return
+
+        remaining = (
+            headers.get('x-ratelimit-remaining-requests')
+            or headers.get('x-ratelimit-remaining')
+        )
+        reset = (
+            headers.get('x-ratelimit-reset-requests')
+            or headers.get('x-ratelimit-reset')
+        )
+
+        try:
+            exhausted = remaining is not None and float(remaining) <= 0
+        except ValueError:
+            exhausted = False
+
+        if exhausted and reset:
+            delay = _parse_duration(reset)
+            if delay:
+                self._pause(delay)
+
+    def on_success(self):
+        """请求成功后逐步恢复速率（加性增）"""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None):
+        """
+        请求被限流后降低速率（乘性减），并按 Retry-After 暂停
+
+        Args:
+            retry_after: 服务端建议的等待秒数
+        """
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+        if retry_after:
+            self._pause(retry_after)
+
+    def _pause(self, seconds: float):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    @staticmethod
+    def parse_retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+        """
+        从响应头解析 Retry-After
+
+        Returns:
+            等待秒数，没有该响应头返回None
+        """
+        if not headers:
+            return None
+        value = headers.get('retry-after-ms')
+        if value:
+            try:
+                return float(value) / 1000
+            except ValueError:
+                pass
+        value = headers.get('retry-after')
+        return _parse_duration(value) if value else None
+
+
+# 进程内共享的限流器（同一 API 端点的所有任务共用）
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(
+    name: str,
+    requests_per_minute: int = 60,
+    max_concurrency: int = 4
+) -> RateLimiter:
+    """
+    获取共享的速率限制器（同名限流器只创建一次）
+
+    Args:
+        name: 限流器名称（通常为 API 地址）
+        requests_per_minute: 每分钟最大请求数（仅首次创建时生效）
+        max_concurrency: 最大并发数（仅首次创建时生效）
+
+    Returns:
+        速率限制器实例
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            limiter = RateLimiter(
+                requests_per_minute=requests_per_minute,
+                max_concurrency=max_concurrency
+            )
+            _limiters[name] = limiter
+        return limiter
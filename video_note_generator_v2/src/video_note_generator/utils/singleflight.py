@@ -0,0 +1,85 @@
+"""
+进行中任务去重（single-flight）
+
+同一个键的任务正在执行时，后到的相同请求不再另起一份，而是等待并共享进行中任务的结果。
+SingleFlight 用于事件循环中的协程，ThreadSingleFlight 用于线程池中的同步调用。
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    """异步 single-flight：同一键同时只执行一次（只能在同一个事件循环中使用）"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        执行任务，相同键的任务进行中时直接等待其结果
+
+        Args:
+            key: 去重键
+            factory: 创建任务的函数（只有首个请求会调用）
+
+        Returns:
+            (结果, 是否共享了其他请求的任务)
+        """
+        future = self._calls.get(key)
+        shared = future is not None
+        if future is None:
+            future = asyncio.ensure_future(factory())
+            self._calls[key] = future
+            future.add_done_callback(lambda _: self._calls.pop(key, None))
+
+        # 某个请求被取消（如客户端断开）时不影响共享同一任务的其他请求
+        return await asyncio.shield(future), shared
+
+    def in_flight(self) -> int:
+        """进行中的任务数"""
+        return len(self._calls)
+
+
+class ThreadSingleFlight:
+    """线程版 single-flight：同一键同时只执行一次，其他线程阻塞等待并共享结果"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        执行任务，相同键的任务进行中时等待其结果
+
+        Args:
+            key: 去重键
+            func: 执行任务的函数（只有首个请求会调用，异常同样传给等待方）
+
+        Returns:
+            (结果, 是否共享了其他线程的任务)
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            shared = future is not None
+            if future is None:
+                future = Future()
+                self._calls[key] = future
+
+        if shared:
+            return future.result(), True
+
+        try:
+            future.set_result(func())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+        return future.result(), False
+
+    def in_flight(self) -> int:
+        """进行中的任务数"""
+        with self._lock:
+            return len(self._calls)
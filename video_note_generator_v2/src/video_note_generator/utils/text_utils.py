@@ -4,6 +4,20 @@
 import re
 from typing import List
 
+from .url_resolver import parse_url
+
+# 一次扫描同时匹配完整链接、裸 BV 号与不带协议的抖音短链接；
+# 完整链接里的 BV 号已被整体匹配，不会再单独匹配一次
+_URL_PATTERN = re.compile(
+    r'(?P<url>https?://[^\s<>\[\]"\']+[^\s<>\[\]"\'.,])'
+    r'|(?P<bvid>BV[a-zA-Z0-9]{10})'
+    r'|(?P<douyin>v\.douyin\.com/[a-zA-Z0-9]+)',
+    re.IGNORECASE
+)
+
+# 句末标点（保留分隔符，用于超长段落按句切分）
+_SENTENCE_END = re.compile(r'([。！？])')
+
 
 def split_content(
     text: str,
@@ -44,7 +58,7 @@ def split_content(
                 current_length = 0
 
             # 按句子分割
-            sentences = re.split(r'([。！？])', para)
+            sentences = _SENTENCE_END.split(para)
             current_sentence = []
             current_sentence_length = 0
 
@@ -104,36 +118,31 @@ def extract_urls(text: str) -> List[str]:
     Returns:
         提取到的URL列表
     """
-    url_patterns = [
-        # 标准URL
-        r'https?://[^\s<>\[\]"\']+[^\s<>\[\]"\'.,]',
-        # Bilibili BV号
-        r'BV[a-zA-Z0-9]{10}',
-        # 抖音短链接
-        r'v\.douyin\.com/[a-zA-Z0-9]+',
-    ]
-
     urls = []
-    for pattern in url_patterns:
-        matches = re.finditer(pattern, text, re.IGNORECASE)
-        for match in matches:
-            url = match.group()
-            # 为BV号添加完整的bilibili前缀
-            if url.startswith('BV'):
-                url = f'https://www.bilibili.com/video/{url}'
-            # 为抖音短链接添加https
-            elif url.startswith('v.douyin.com'):
-                url = f'https://{url}'
-            urls.append(url)
-
-    # 去重并保持顺序
+    for match in _URL_PATTERN.finditer(text):
+        url = match.group()
+        # 为BV号添加完整的bilibili前缀
+        if match.lastgroup == 'bvid':
+            url = f'https://www.bilibili.com/video/BV{url[2:]}'
+        # 为抖音短链接添加https
+        elif match.lastgroup == 'douyin':
+            url = f'https://{url}'
+        urls.append(url)
+
+    # 按视频去重并保持顺序（同一视频的完整链接与 BV 号只保留先出现的一个）
     seen = set()
-    return [url for url in urls if not (url in seen or seen.add(url))]
+    unique = []
+    for url in urls:
+        key = parse_url(url).key
+        if key not in seen:
+            seen.add(key)
+            unique.append(url)
+    return unique
 
 
 def clean_text(text: str) -> str:
     """
-    清理文本，移除多余的空白字符
+    清理文本，把连续的空白字符（含换行）合并为一个空格并去掉首尾空白
 
     Args:
         text: 输入文本
@@ -141,13 +150,8 @@ def clean_text(text: str) -> str:
     Returns:
         清理后的文本
     """
-    # 移除多余的空白字符
-    text = re.sub(r'\s+', ' ', text)
-    # 移除首尾空白
-    text = text.strip()
-    # 恢复段落分隔
-    text = re.sub(r' ?(\n) ?', r'\1', text)
-    return text
+    # str.split() 与 \s+ 的空白字符集合相同，且不经过正则引擎
+    return ' '.join(text.split())
 
 
 def truncate_text(text: str, max_length: int = 100, suffix: str = "...") -> str:
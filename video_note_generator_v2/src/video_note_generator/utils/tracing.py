@@ -0,0 +1,267 @@
+"""
+链路追踪模块
+
+OpenTelemetry 风格的轻量追踪：
+- span(): 嵌套的计时区间，带属性、事件和错误状态，父子关系通过 contextvars 自动传递
+- 可插拔的导出器，默认写入本地 JSON Lines 文件（每行一个 span）
+- wrap_context(): 把当前追踪上下文带进线程池任务
+- inject() / attach(): 把追踪上下文序列化后带进进程池任务
+
+未配置导出器时 span 仍会计算父子关系，但不会输出任何内容。
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+
+
+class SpanContext:
+    """span 的标识（跨进程传递时只需要这部分）"""
+
+    __slots__ = ('trace_id', 'span_id')
+
+    def __init__(self, trace_id: str, span_id: str):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+
+class Span(SpanContext):
+    """一个计时区间"""
+
+    __slots__ = (
+        'name', 'parent_id', 'attributes', 'events',
+        'status', 'status_message', 'start_time', '_started', 'duration_ms'
+    )
+
+    def __init__(self, name: str, parent: Optional[SpanContext], attributes: Dict[str, Any]):
+        super().__init__(
+            trace_id=parent.trace_id if parent else os.urandom(16).hex(),
+            span_id=os.urandom(8).hex()
+        )
+        self.name = name
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes)
+        self.events: List[dict] = []
+        self.status = 'ok'
+        self.status_message: Optional[str] = None
+        self.start_time = time.time()
+        self._started = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+
+    def set_attribute(self, key: str, value: Any):
+        """设置属性"""
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes):
+        """批量设置属性"""
+        self.attributes.update(attributes)
+
+    def add_event(self, name: str, **attributes):
+        """记录一个时间点事件（如限流等待、模型切换）"""
+        self.events.append({'name': name, 'time': time.time(), 'attributes': attributes})
+
+    def record_exception(self, error: BaseException):
+        """把 span 标记为失败并记录异常"""
+        self.status = 'error'
+        self.status_message = f"{type(error).__name__}: {error}"
+
+    def end(self):
+        if self.duration_ms is None:
+            self.duration_ms = (time.perf_counter() - self._started) * 1000
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start_time': self.start_time,
+            'duration_ms': round(self.duration_ms or 0.0, 3),
+            'status': self.status,
+            'status_message': self.status_message,
+            'attributes': self.attributes,
+            'events': self.events,
+            'pid': os.getpid(),
+            'thread': threading.current_thread().name,
+        }
+
+
+class SpanExporter(ABC):
+    """导出器基类"""
+
+    @abstractmethod
+    def export(self, span: Span):
+        """
+        导出一个已结束的 span
+
+        Args:
+            span: 已结束的 span
+        """
+        pass
+
+    def shutdown(self):
+        pass
+
+
+class NullExporter(SpanExporter):
+    """丢弃所有 span"""
+
+    def export(self, span: Span):
+        pass
+
+
+class JsonLinesExporter(SpanExporter):
+    """把结束的 span 逐行追加到 JSON Lines 文件（多线程、多进程可共用同一文件）"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str) + '\n'
+        try:
+            with self._lock:
+                # 追加模式下单次 write 的一行不会与其他进程交错
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+        except OSError as e:
+            logging.getLogger(__name__).warning(f"写入追踪数据失败: {e}")
+
+
+_exporter: SpanExporter = NullExporter()
+_current: contextvars.ContextVar[Optional[SpanContext]] = contextvars.ContextVar(
+    'vng_current_span', default=None
+)
+
+
+def set_exporter(exporter: SpanExporter):
+    """替换全局导出器"""
+    global _exporter
+    previous = _exporter
+    _exporter = exporter
+    if previous is not exporter:
+        previous.shutdown()
+
+
+def get_exporter() -> SpanExporter:
+    return _exporter
+
+
+def configure_tracing(path: Union[str, Path]) -> SpanExporter:
+    """
+    启用默认的 JSON Lines 导出（同一路径重复调用不会重建）
+
+    Args:
+        path: 追踪文件路径
+
+    Returns:
+        当前导出器
+    """
+    path = Path(path)
+    if not (isinstance(_exporter, JsonLinesExporter) and _exporter.path == path):
+        set_exporter(JsonLinesExporter(path))
+    return _exporter
+
+
+def current_span() -> Optional[Span]:
+    """获取当前活动的 span（跨进程的远端父级不算）"""
+    span = _current.get()
+    return span if isinstance(span, Span) else None
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Span]:
+    """
+    开启一个 span，退出时结束并导出；块内抛出的异常会记录到 span 上后继续抛出
+
+    Args:
+        name: span 名称（如 "stage.download"、"llm.request"）
+        **attributes: 初始属性
+
+    Yields:
+        Span 实例，可继续 set_attribute / add_event
+    """
+    current = Span(name, _current.get(), attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.record_exception(e)
+        raise
+    finally:
+        _current.reset(token)
+        current.end()
+        _exporter.export(current)
+
+
+def add_event(name: str, **attributes):
+    """在当前 span 上记录事件（没有活动 span 时忽略）"""
+    current = current_span()
+    if current is not None:
+        current.add_event(name, **attributes)
+
+
+def wrap_context(func: Callable) -> Callable:
+    """
+    绑定当前追踪上下文，用于提交到线程池的任务
+
+    Args:
+        func: 要在线程池中执行的函数
+
+    Returns:
+        在提交时上下文中运行 func 的包装函数
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # 每次调用使用副本，同一包装函数可以被多个线程同时执行
+        return context.copy().run(func, *args, **kwargs)
+
+    return run
+
+
+def inject() -> Dict[str, Optional[str]]:
+    """
+    导出当前追踪上下文，随任务参数一起传给子进程
+
+    Returns:
+        可序列化的载体，在子进程中交给 attach()
+    """
+    parent = _current.get()
+    return {
+        'trace_id': parent.trace_id if parent else None,
+        'span_id': parent.span_id if parent else None,
+        'trace_file': str(_exporter.path) if isinstance(_exporter, JsonLinesExporter) else None,
+    }
+
+
+@contextmanager
+def attach(carrier: Optional[Dict[str, Optional[str]]]):
+    """
+    在子进程中恢复父进程的追踪上下文，块内新建的 span 挂在父进程的 span 下
+
+    Args:
+        carrier: inject() 的返回值
+    """
+    if not carrier:
+        yield
+        return
+
+    if carrier.get('trace_file') and isinstance(_exporter, NullExporter):
+        configure_tracing(carrier['trace_file'])
+
+    token = None
+    if carrier.get('trace_id') and carrier.get('span_id'):
+        token = _current.set(SpanContext(carrier['trace_id'], carrier['span_id']))
+    try:
+        yield
+    finally:
+        if token is not None:
+            _current.reset(token)
@@ -0,0 +1,289 @@
+"""
+视频 URL 解析
+
+把任意视频链接映射为 (平台, 视频 ID, 规范 URL)：
+- 平台按主机名后缀查表识别（避免 'x.com' in url 这类子串误判）
+- 视频 ID 用预编译正则提取，同一视频的移动端域名、分享参数、youtu.be 等形式得到同一个 ID
+- 短链接（b23.tv、v.douyin.com、xhslink.com 等）跟随重定向展开，结果在进程内缓存
+
+进行中任务去重、转录缓存、下载统计等按视频/平台维度的逻辑都以解析结果为键。
+"""
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# 主机名后缀 -> 平台
+_HOST_PLATFORMS: Dict[str, str] = {
+    'bilibili.com': 'bilibili',
+    'b23.tv': 'bilibili',
+    'youtube.com': 'youtube',
+    'youtu.be': 'youtube',
+    'douyin.com': 'douyin',
+    'iesdouyin.com': 'douyin',
+    'tiktok.com': 'tiktok',
+    'kuaishou.com': 'kuaishou',
+    'xiaohongshu.com': 'xiaohongshu',
+    'xhslink.com': 'xiaohongshu',
+    'weibo.com': 'weibo',
+    'weibo.cn': 'weibo',
+    'instagram.com': 'instagram',
+    'facebook.com': 'facebook',
+    'fb.watch': 'facebook',
+    'twitter.com': 'twitter',
+    'x.com': 'twitter',
+}
+
+# 需要跟随重定向才能得到视频 ID 的短链接域名
+_SHORT_LINK_HOSTS = frozenset({
+    'b23.tv', 'v.douyin.com', 'xhslink.com', 'v.kuaishou.com', 'vm.tiktok.com', 'vt.tiktok.com',
+})
+
+# 平台 -> 视频 ID 正则（第一个分组为 ID）
+_VIDEO_ID_PATTERNS: Dict[str, "re.Pattern[str]"] = {
+    'bilibili': re.compile(r'(?:/video/|[?&]bvid=)(BV[0-9A-Za-z]{10})', re.IGNORECASE),
+    'youtube': re.compile(
+        r'(?:youtube\.com/(?:watch\?(?:[^#]*&)?v=|shorts/|live/|embed/)|youtu\.be/)([0-9A-Za-z_-]{11})'
+    ),
+    'douyin': re.compile(r'/(?:video|note|share/video)/(\d+)'),
+    'tiktok': re.compile(r'/video/(\d+)'),
+    'kuaishou': re.compile(r'/(?:short-video|fw/photo)/([0-9A-Za-z]+)'),
+    'xiaohongshu': re.compile(r'/(?:explore|discovery/item)/([0-9a-f]{24})'),
+}
+
+# 平台 -> 规范 URL（只需视频 ID 即可访问的平台；小红书需要 xsec_token，保留原链接参数）
+_CANONICAL_URLS: Dict[str, str] = {
+    'bilibili': 'https://www.bilibili.com/video/{}',
+    'youtube': 'https://www.youtube.com/watch?v={}',
+    'douyin': 'https://www.douyin.com/video/{}',
+    'kuaishou': 'https://www.kuaishou.com/short-video/{}',
+}
+
+# 平台 -> 笔记中显示的名称
+PLATFORM_DISPLAY_NAMES: Dict[str, str] = {
+    'youtube': 'YouTube',
+    'bilibili': 'Bilibili',
+    'tiktok': 'TikTok',
+    'douyin': '抖音',
+    'kuaishou': '快手',
+    'xiaohongshu': '小红书',
+    'weibo': '微博',
+    'instagram': 'Instagram',
+    'facebook': 'Facebook',
+    'twitter': 'Twitter',
+}
+
+_BILIBILI_PART = re.compile(r'(?:^|&)p=(\d+)')
+
+# 分享、统计类参数，不影响指向的视频
+_TRACKING_PARAMS = re.compile(r'^(?:utm_\w+|spm_id_from|share_\w+|vd_source|si|feature|is_story_h5)$')
+
+_MOBILE_USER_AGENT = (
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 '
+    '(KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1'
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ResolvedURL:
+    """URL 解析结果"""
+    platform: str
+    video_id: Optional[str]
+    canonical_url: str
+    part: Optional[int] = None
+
+    @property
+    def key(self) -> str:
+        """视频维度的去重键：能识别视频 ID 时为 "平台:ID"（B站分P附带 ?p=N），否则为规范 URL"""
+        if not self.video_id:
+            return self.canonical_url
+        suffix = f"?p={self.part}" if self.part and self.part > 1 else ""
+        return f"{self.platform}:{self.video_id}{suffix}"
+
+    @property
+    def display_name(self) -> str:
+        """平台显示名称"""
+        return PLATFORM_DISPLAY_NAMES.get(self.platform, "未知")
+
+
+def _host(url: str) -> str:
+    return (urlsplit(url.strip()).hostname or '').lower()
+
+
+def detect_platform(url: str) -> str:
+    """
+    根据主机名识别平台
+
+    Args:
+        url: 视频URL
+
+    Returns:
+        平台标识（bilibili/youtube/douyin/...），无法识别时返回 "unknown"
+    """
+    labels = _host(url).split('.')
+    for i in range(len(labels) - 1):
+        platform = _HOST_PLATFORMS.get('.'.join(labels[i:]))
+        if platform:
+            return platform
+    return 'unknown'
+
+
+def is_short_link(url: str) -> bool:
+    """是否为需要跟随重定向的短链接"""
+    return _host(url) in _SHORT_LINK_HOSTS
+
+
+def normalize_url(url: str) -> str:
+    """
+    规范化 URL：小写协议与主机名，去掉片段与分享统计参数，参数按名称排序
+
+    Args:
+        url: 原始URL
+
+    Returns:
+        规范化后的URL
+    """
+    parts = urlsplit(url.strip())
+    query = sorted(
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not _TRACKING_PARAMS.match(name)
+    )
+    return urlunsplit((
+        parts.scheme.lower() or 'https',
+        parts.netloc.lower(),
+        parts.path.rstrip('/') or '/',
+        urlencode(query),
+        ''
+    ))
+
+
+def parse_url(url: str) -> ResolvedURL:
+    """
+    解析 URL（不访问网络，短链接原样保留，video_id 为 None）
+
+    Args:
+        url: 视频URL
+
+    Returns:
+        解析结果
+    """
+    url = url.strip()
+    platform = detect_platform(url)
+    pattern = _VIDEO_ID_PATTERNS.get(platform)
+    match = pattern.search(url) if pattern else None
+    if not match:
+        return ResolvedURL(platform, None, normalize_url(url))
+
+    video_id = match.group(1)
+    part = None
+    if platform == 'bilibili':
+        video_id = 'BV' + video_id[2:]
+        part_match = _BILIBILI_PART.search(urlsplit(url).query)
+        part = int(part_match.group(1)) if part_match else None
+
+    template = _CANONICAL_URLS.get(platform)
+    canonical_url = template.format(video_id) if template else normalize_url(url)
+    if part and part > 1:
+        canonical_url += f"?p={part}"
+    return ResolvedURL(platform, video_id, canonical_url, part)
+
+
+class URLResolver:
+    """URL 解析器：展开短链接（带缓存）后解析"""
+
+    def __init__(self, ttl: float = 24 * 3600, max_entries: int = 2048, timeout: float = 10):
+        """
+        初始化解析器
+
+        Args:
+            ttl: 短链接展开结果的缓存时间（秒）
+            max_entries: 最多缓存的短链接数
+            timeout: 展开短链接的请求超时（秒）
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._cache: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._session = None
+
+    def resolve(self, url: str) -> ResolvedURL:
+        """
+        解析 URL，短链接先跟随重定向展开
+
+        Args:
+            url: 视频URL
+
+        Returns:
+            解析结果（短链接展开失败时按原链接解析）
+        """
+        url = url.strip()
+        if is_short_link(url):
+            expanded = self._expand(url)
+            if expanded:
+                return parse_url(expanded)
+        return parse_url(url)
+
+    def _expand(self, url: str) -> Optional[str]:
+        """展开短链接（成功的结果缓存 ttl 秒，失败不缓存）"""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(url)
+            if cached and now - cached[1] < self.ttl:
+                self._cache.move_to_end(url)
+                return cached[0]
+
+        try:
+            expanded = self._follow_redirects(url)
+        except Exception as e:  # pylint: disable=broad-except
+            logger.warning(f"展开短链接失败 {url}: {e}")
+            return None
+
+        if expanded != url:
+            logger.info(f"短链接展开: {url} -> {expanded}")
+        with self._lock:
+            self._cache[url] = (expanded, now)
+            self._cache.move_to_end(url)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return expanded
+
+    def _follow_redirects(self, url: str) -> str:
+        """跟随重定向，只取最终地址，不读取响应体"""
+        import requests
+
+        with self._lock:
+            if self._session is None:
+                self._session = requests.Session()
+                self._session.headers['User-Agent'] = _MOBILE_USER_AGENT
+        response = self._session.get(url, allow_redirects=True, stream=True, timeout=self.timeout)
+        response.close()
+        return response.url
+
+    def clear(self):
+        """清空短链接缓存"""
+        with self._lock:
+            self._cache.clear()
+
+
+# 进程内共享的解析器（短链接缓存在各处理器、Web 请求之间共用）
+_resolver = URLResolver()
+
+
+def resolve_url(url: str) -> ResolvedURL:
+    """
+    解析 URL（使用共享解析器，短链接会访问网络并缓存结果）
+
+    Args:
+        url: 视频URL
+
+    Returns:
+        解析结果
+    """
+    return _resolver.resolve(url)
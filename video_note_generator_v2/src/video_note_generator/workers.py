@@ -0,0 +1,158 @@
+"""
+转录工作进程池
+
+worker_mode=split 时按负载拆分进程：
+- 轻量 worker（Web 线程池 / CLI 进程）：字幕提取 + LLM 生成，从不导入 whisper/torch
+- 重型 worker（本模块的进程池）：只有找不到字幕的任务才通过进程池的本地队列交过来，
+  下载并转录后把文本返回；进程启动时加载 Whisper 模型并常驻
+
+这样可以开很多廉价的轻量 worker，只为少数重型进程预留 Whisper 的内存。
+"""
+import logging
+import multiprocessing
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional, Tuple
+
+from .config import Settings
+from .utils import tracing
+
+if TYPE_CHECKING:
+    from .downloader import VideoInfo
+    from .processor import VideoNoteProcessor
+
+# 重型进程内的处理器（只含下载与转录组件）
+_worker: Optional["VideoNoteProcessor"] = None
+
+
+def _init_worker(settings: Settings, log_level: int):
+    """重型进程初始化：创建处理器并预加载 Whisper 模型"""
+    global _worker
+    from .processor import VideoNoteProcessor
+
+    logging.basicConfig(
+        level=log_level,
+        format='%(asctime)s - %(levelname)s - [transcribe-worker %(process)d] %(message)s'
+    )
+    logger = logging.getLogger("video_note_generator.worker")
+    _worker = VideoNoteProcessor.for_transcription(settings, logger)
+    try:
+        _worker.transcriber._load_model(settings.whisper_model)
+    except Exception as e:  # pylint: disable=broad-except
+        # 预加载失败不影响进程启动，首个任务会再次尝试并报告错误
+        logger.warning(f"预加载 Whisper 模型失败: {e}")
+
+
+def _transcribe(url: str, carrier: dict) -> Optional[Tuple[str, "VideoInfo", str]]:
+    """在重型进程中下载并转录（span 挂在提交任务的父进程 span 下）"""
+    settings = _worker.settings
+    temp_root = settings.output_dir / "temp"
+    temp_root.mkdir(parents=True, exist_ok=True)
+    temp_dir = Path(tempfile.mkdtemp(prefix="worker_", dir=temp_root))
+    try:
+        with tracing.attach(carrier), tracing.span("worker.transcribe", url=url, pid=os.getpid()):
+            return _worker._transcribe_media(url, temp_dir)
+    except Exception as e:
+        # 第三方异常不一定能 pickle，无法传回父进程时会导致整个进程池失效
+        try:
+            pickle.dumps(e)
+        except Exception:  # pylint: disable=broad-except
+            raise RuntimeError(f"{type(e).__name__}: {e}") from None
+        raise
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+class TranscriptionWorkerPool:
+    """重型转录进程池（spawn 启动，子进程不继承父进程的线程与锁）"""
+
+    def __init__(
+        self,
+        settings: Settings,
+        max_workers: int = 1,
+        logger: Optional[logging.Logger] = None
+    ):
+        """
+        初始化进程池（子进程在第一个任务提交时启动）
+
+        Args:
+            settings: 配置对象（会传给子进程）
+            max_workers: 重型进程数
+            logger: 日志记录器
+        """
+        self.settings = settings
+        self.max_workers = max_workers
+        self.logger = logger or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._executor = self._create_executor()
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.settings, self.logger.getEffectiveLevel())
+        )
+
+    def transcribe(self, url: str) -> Optional[Tuple[str, "VideoInfo", str]]:
+        """
+        提交任务并等待结果
+
+        Args:
+            url: 视频URL
+
+        Returns:
+            (转录文本, 视频信息, 来源)，下载或转录失败返回 None
+        """
+        with self._lock:
+            executor = self._executor
+        try:
+            return executor.submit(_transcribe, url, tracing.inject()).result()
+        except BrokenProcessPool as e:
+            # 重型进程异常退出（如被 OOM 杀掉）：重建进程池，本任务失败
+            self.logger.error(f"转录进程异常退出: {e}")
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = self._create_executor()
+            return None
+
+    def shutdown(self, wait: bool = True):
+        """关闭进程池"""
+        with self._lock:
+            self._executor.shutdown(wait=wait)
+
+
+# 进程内共享的转录进程池（所有处理器实例共用）
+_pool: Optional[TranscriptionWorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_transcription_pool(
+    settings: Settings,
+    logger: Optional[logging.Logger] = None
+) -> TranscriptionWorkerPool:
+    """
+    获取共享的转录进程池（只创建一次，配置以首次创建时为准）
+
+    Args:
+        settings: 配置对象
+        logger: 日志记录器
+
+    Returns:
+        转录进程池
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = TranscriptionWorkerPool(
+                settings,
+                max_workers=settings.heavy_workers,
+                logger=logger
+            )
+        return _pool
@@ -62,6 +62,8 @@ async function processSingle() {
 
     const genXiaohongshu = document.getElementById('gen-xiaohongshu').checked;
     const genBlog = document.getElementById('gen-blog').checked;
+    const expandPlaylist = document.getElementById('expand-playlist').checked;
+    const mergePlaylist = document.getElementById('merge-playlist').checked;
 
     // 显示进度
     const progressContainer = document.getElementById('single-progress');
@@ -89,7 +91,9 @@ async function processSingle() {
             body: JSON.stringify({
                 url: url,
                 generate_xiaohongshu: genXiaohongshu,
-                generate_blog: genBlog
+                generate_blog: genBlog,
+                expand_playlist: expandPlaylist,
+                merge_playlist: mergePlaylist
             }),
             signal: controller.signal
         });
@@ -204,6 +208,8 @@ async function processBatch() {
 
     const genXiaohongshu = document.getElementById('gen-xiaohongshu').checked;
     const genBlog = document.getElementById('gen-blog').checked;
+    const expandPlaylist = document.getElementById('expand-playlist').checked;
+    const mergePlaylist = document.getElementById('merge-playlist').checked;
 
     // 显示进度
     const progressContainer = document.getElementById('batch-progress');
@@ -225,7 +231,9 @@ async function processBatch() {
             body: JSON.stringify({
                 urls: urls,
                 generate_xiaohongshu: genXiaohongshu,
-                generate_blog: genBlog
+                generate_blog: genBlog,
+                expand_playlist: expandPlaylist,
+                merge_playlist: mergePlaylist
             })
         });
 
@@ -331,6 +339,7 @@ function displaySingleResult(data, url) {
         data.files.forEach(file => {
             const fileName = file.split('/').pop();
             const fileType = fileName.includes('xiaohongshu') ? '📱 小红书笔记' :
+                            fileName.includes('series') ? '📚 合集笔记' :
                             fileName.includes('blog') ? '📝 博客文章' :
                             fileName.includes('organized') ? '📋 整理版' : '📄 原始转录';
 
@@ -454,13 +463,32 @@ function updateBatchUrlCount() {
     }
 }
 
+/**
+ * 获取文件预览内容（大文件分段返回；文件未变化时浏览器用 ETag 复用缓存）
+ */
+async function fetchFileContent(filePath, offset = 0) {
+    const response = await fetch(`/api/file-content/${encodeURIComponent(filePath)}?offset=${offset}`);
+    if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
+    }
+    return response.json();
+}
+
+/**
+ * 格式化字节数
+ */
+function formatBytes(bytes) {
+    if (bytes < 1024) return `${bytes} B`;
+    if (bytes < 1024 * 1024) return `${(bytes / 1024).toFixed(1)} KB`;
+    return `${(bytes / 1024 / 1024).toFixed(1)} MB`;
+}
+
 /**
  * 预览文件
  */
 async function previewFile(filePath) {
     try {
-        const response = await fetch(`/api/file-content/${encodeURIComponent(filePath)}`);
-        const data = await response.json();
+        const data = await fetchFileContent(filePath);
 
         // 创建预览弹窗
         const preview = document.createElement('div');
@@ -526,14 +554,18 @@ async function previewFile(filePath) {
                         font-size: 0.9rem;
                         line-height: 1.6;
                         color: var(--text-primary);
-                    ">${escapeHtml(data.content)}</pre>
+                    " class="preview-content">${escapeHtml(data.content)}</pre>
                 </div>
                 <div style="
                     padding: 1rem 1.5rem;
                     border-top: 1px solid var(--border-color);
                     display: flex;
                     justify-content: flex-end;
+                    gap: 0.5rem;
                 ">
+                    <button class="btn btn-download preview-more-btn" style="display: none;">
+                        ⬇️ 加载更多
+                    </button>
                     <button class="btn btn-download" onclick="downloadFile('${filePath}')">
                         📥 下载文件
                     </button>
@@ -543,6 +575,22 @@ async function previewFile(filePath) {
 
         document.body.appendChild(preview);
 
+        // 大文件分段预览：按需加载后续内容
+        const contentEl = preview.querySelector('.preview-content');
+        const moreBtn = preview.querySelector('.preview-more-btn');
+        let nextOffset = data.next_offset;
+        const updateMoreBtn = (page) => {
+            moreBtn.style.display = page.truncated ? '' : 'none';
+            moreBtn.textContent = `⬇️ 加载更多（已显示 ${formatBytes(page.next_offset)} / ${formatBytes(page.size)}）`;
+        };
+        updateMoreBtn(data);
+        moreBtn.addEventListener('click', async () => {
+            const page = await fetchFileContent(filePath, nextOffset);
+            contentEl.textContent += page.content;
+            nextOffset = page.next_offset;
+            updateMoreBtn(page);
+        });
+
         // 关闭按钮点击事件
         const closeBtn = preview.querySelector('.modal-close-btn');
         closeBtn.addEventListener('click', () => {
@@ -780,10 +828,11 @@ function escapeHtml(text) {
  */
 async function copyFileContent(filePath) {
     try {
-        const response = await fetch(`/api/file-content/${encodeURIComponent(filePath)}`);
-        const data = await response.json();
+        // 复制完整内容（预览接口只返回第一段）
+        const response = await fetch(`/api/download/${encodeURIComponent(filePath)}`);
+        const content = await response.text();
 
-        await navigator.clipboard.writeText(data.content);
+        await navigator.clipboard.writeText(content);
         showToast('✅ 内容已复制到剪贴板', 'success');
 
     } catch (error) {
@@ -849,10 +898,10 @@ async function previewAllFiles(filePaths) {
 
         // 加载所有文件内容
         for (const filePath of filePaths) {
-            const response = await fetch(`/api/file-content/${encodeURIComponent(filePath)}`);
-            const data = await response.json();
+            const data = await fetchFileContent(filePath);
             const fileName = filePath.split('/').pop();
             const fileType = fileName.includes('xiaohongshu') ? '📱 小红书笔记' :
+                            fileName.includes('series') ? '📚 合集笔记' :
                             fileName.includes('blog') ? '📝 博客文章' :
                             fileName.includes('organized') ? '📋 整理版笔记' : '📄 原始转录';
 
@@ -874,7 +923,7 @@ async function previewAllFiles(filePaths) {
                     ">
                         <h3 style="margin: 0; color: var(--text-primary);">${fileType}</h3>
                         <div>
-                            <button class="btn btn-download" onclick="copyText(\`${data.content.replace(/`/g, '\\`')}\`)" style="margin-right: 0.5rem;">
+                            <button class="btn btn-download" onclick="copyFileContent('${filePath}')" style="margin-right: 0.5rem;">
                                 📋 复制
                             </button>
                             <button class="btn btn-download" onclick="downloadFile('${filePath}')">
@@ -898,6 +947,12 @@ async function previewAllFiles(filePaths) {
                         max-height: 500px;
                         overflow-y: auto;
                     ">${escapeHtml(data.content)}</pre>
+                    ${data.truncated ? `
+                    <div style="
+                        font-size: 0.85rem;
+                        color: var(--text-muted);
+                        margin-top: 0.75rem;
+                    ">仅显示前 ${formatBytes(data.next_offset)}（共 ${formatBytes(data.size)}），完整内容请下载或单独预览</div>` : ''}
                 </div>
             `;
         }
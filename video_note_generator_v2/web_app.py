@@ -2,10 +2,12 @@
 """
 视频笔记生成器 - FastAPI Web应用
 """
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, PlainTextResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel, Field
 from pathlib import Path
 import sys
@@ -19,9 +21,16 @@ from concurrent.futures import ThreadPoolExecutor
 # 添加src到路径
 sys.path.insert(0, str(Path(__file__).parent / "src"))
 
-from video_note_generator.config import Settings
-from video_note_generator.processor import VideoNoteProcessor
+from video_note_generator.config import Settings, get_settings as _get_settings, reload_settings
 from video_note_generator.utils.cookie_manager import CookieManager
+from video_note_generator.utils import metrics
+from video_note_generator.utils.singleflight import SingleFlight
+from video_note_generator.utils.url_resolver import resolve_url
+from video_note_generator.utils.profiling import PROFILE_MODES, maybe_profile
+from video_note_generator.note_index import NoteIndex, get_note_index
+from video_note_generator.utils.file_serving import (
+    PREVIEW_LIMIT, etag_matches, file_etag, read_text_range, resolve_output_file
+)
 
 # 创建FastAPI应用
 app = FastAPI(
@@ -30,6 +39,28 @@ app = FastAPI(
     version="2.0.0"
 )
 
+
+class CompressionMiddleware:
+    """响应压缩：安装了 brotli-asgi 时优先 brotli（回退 gzip），否则 gzip；Range 请求不压缩"""
+
+    def __init__(self, app, minimum_size: int = 1024):
+        self.app = app
+        try:
+            from brotli_asgi import BrotliMiddleware
+            self.compressed_app = BrotliMiddleware(app, minimum_size=minimum_size, gzip_fallback=True)
+        except ImportError:
+            self.compressed_app = GZipMiddleware(app, minimum_size=minimum_size)
+
+    async def __call__(self, scope, receive, send):
+        # 分段响应按原始字节偏移返回，压缩后偏移就对不上了
+        if scope["type"] == "http" and any(name == b"range" for name, _ in scope["headers"]):
+            await self.app(scope, receive, send)
+            return
+        await self.compressed_app(scope, receive, send)
+
+
+app.add_middleware(CompressionMiddleware)
+
 # 挂载静态文件
 static_dir = Path(__file__).parent / "static"
 static_dir.mkdir(exist_ok=True)
@@ -47,8 +78,20 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# 线程池用于处理视频（避免阻塞异步循环）
-executor = ThreadPoolExecutor(max_workers=3)
+# 线程池用于处理视频（避免阻塞异步循环），大小取自 LIGHT_WORKERS，首个任务时创建
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_executor(settings: Settings) -> ThreadPoolExecutor:
+    """获取处理任务的线程池"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.light_workers)
+    return _executor
+
+
+# 进行中的任务（同一视频、同样选项的并发请求共享一次处理）
+_inflight = SingleFlight()
 
 
 # ========== 请求/响应模型 ==========
@@ -57,19 +100,35 @@ class VideoProcessRequest(BaseModel):
     url: str = Field(..., description="视频URL")
     generate_xiaohongshu: bool = Field(True, description="是否生成小红书笔记")
     generate_blog: bool = Field(True, description="是否生成博客文章")
+    profile: Optional[str] = Field(None, description="性能剖析模式（cprofile/sampling），为空时不剖析")
+    expand_playlist: bool = Field(True, description="把分P视频、合集、播放列表展开为逐集任务")
+    merge_playlist: bool = Field(False, description="展开后额外生成一份合并笔记")
+
+
+class PartResult(BaseModel):
+    url: str
+    title: str
+    success: bool
+    files: List[str] = []
 
 
 class VideoProcessResponse(BaseModel):
     success: bool
     message: str
     files: List[str] = []
+    profile_files: List[str] = []
     error: Optional[str] = None
+    shared: bool = Field(False, description="是否复用了进行中的相同任务的结果")
+    parts: List[PartResult] = Field([], description="分P/合集/播放列表的逐集结果（单个视频时为空）")
+    merged_file: Optional[str] = Field(None, description="合并笔记路径")
 
 
 class BatchProcessRequest(BaseModel):
     urls: List[str] = Field(..., description="视频URL列表")
     generate_xiaohongshu: bool = Field(True, description="是否生成小红书笔记")
     generate_blog: bool = Field(True, description="是否生成博客文章")
+    expand_playlist: bool = Field(True, description="把分P视频、合集、播放列表展开为逐集任务")
+    merge_playlist: bool = Field(False, description="展开后额外生成一份合并笔记")
 
 
 class BatchProcessResponse(BaseModel):
@@ -88,9 +147,9 @@ class ConfigCheckResponse(BaseModel):
 # ========== 工具函数 ==========
 
 def get_settings() -> Settings:
-    """获取配置"""
+    """获取配置（进程内缓存，不再每个请求都解析 .env）"""
     try:
-        return Settings()
+        return _get_settings()
     except Exception as e:
         logger.error(f"配置加载失败: {e}")
         raise
@@ -106,24 +165,50 @@ def process_video_sync(
     url: str,
     generate_xiaohongshu: bool,
     generate_blog: bool,
-    settings: Settings
+    settings: Settings,
+    profile: Optional[str] = None,
+    expand_playlist: bool = True,
+    merge_playlist: bool = False,
+    event_loop: Optional[asyncio.AbstractEventLoop] = None
 ) -> VideoProcessResponse:
-    """同步处理单个视频（在线程池中运行）"""
+    """
+    同步处理单个视频，或逐集处理分P视频、合集、播放列表（在线程池中运行）
+
+    传入 event_loop 时，LLM 请求在该事件循环上由共享的异步处理器执行。
+    """
     try:
         logger.info(f"开始处理视频: {url}")
 
-        # 创建处理器
-        processor = VideoNoteProcessor(settings=settings, logger=logger)
-
-        # 处理视频
-        files = processor.process_video(
-            url=url,
-            generate_xiaohongshu=generate_xiaohongshu,
-            generate_blog=generate_blog
-        )
+        # 创建处理器（首个任务时才导入处理器及其依赖，/health 等接口不受影响）
+        from video_note_generator.processor import VideoNoteProcessor
+
+        processor = VideoNoteProcessor(settings=settings, logger=logger, event_loop=event_loop)
+
+        # 处理视频（按需剖析）
+        playlist_result = None
+        with maybe_profile(profile, settings.output_dir, logger=logger) as profile_result:
+            playlist = processor.playlist_expander.expand(url) if expand_playlist else None
+            if playlist:
+                playlist_result = processor.process_playlist(
+                    playlist,
+                    generate_xiaohongshu=generate_xiaohongshu,
+                    generate_blog=generate_blog,
+                    merge=merge_playlist
+                )
+                files = playlist_result.files
+            else:
+                files = processor.process_video(
+                    url=url,
+                    generate_xiaohongshu=generate_xiaohongshu,
+                    generate_blog=generate_blog
+                )
 
         # 转换Path对象为字符串
         file_paths = [str(f) for f in files]
+        profile_paths = [str(f) for f in profile_result.artifacts] if profile_result else []
+
+        if playlist_result:
+            return playlist_response(playlist_result, file_paths, profile_paths)
 
         # 检查是否真的生成了文件
         if not files or len(files) == 0:
@@ -131,6 +216,7 @@ def process_video_sync(
             return VideoProcessResponse(
                 success=False,
                 message="处理失败：未生成任何文件",
+                profile_files=profile_paths,
                 error="视频处理过程中出现错误，没有生成笔记文件。可能原因：1) 视频无法下载 2) 音频提取失败 3) 转录失败"
             )
 
@@ -139,7 +225,8 @@ def process_video_sync(
         return VideoProcessResponse(
             success=True,
             message=f"成功生成 {len(files)} 个文件",
-            files=file_paths
+            files=file_paths,
+            profile_files=profile_paths
         )
 
     except Exception as e:
@@ -153,6 +240,74 @@ def process_video_sync(
         )
 
 
+def playlist_response(result, file_paths: List[str], profile_paths: List[str]) -> VideoProcessResponse:
+    """分P视频、合集、播放列表的处理结果（至少一集成功即视为成功）"""
+    playlist = result.playlist
+    parts = [
+        PartResult(
+            url=entry.url,
+            title=entry.title,
+            success=bool(result.results.get(entry.url)),
+            files=[str(f) for f in result.results.get(entry.url) or []]
+        )
+        for entry in playlist.entries
+    ]
+    succeeded = sum(1 for part in parts if part.success)
+    message = f"{playlist.kind_name}共 {len(parts)} 集，成功 {succeeded} 集，生成 {len(file_paths)} 个文件"
+    logger.info(f"{playlist.kind_name}处理完成: {playlist.url}, {message}")
+    return VideoProcessResponse(
+        success=succeeded > 0,
+        message=message,
+        files=file_paths,
+        profile_files=profile_paths,
+        error=None if succeeded == len(parts) else f"{len(parts) - succeeded} 集处理失败",
+        parts=parts,
+        merged_file=str(result.merged_file) if result.merged_file else None
+    )
+
+
+async def run_video_job(
+    url: str,
+    generate_xiaohongshu: bool,
+    generate_blog: bool,
+    settings: Settings,
+    profile: Optional[str] = None,
+    expand_playlist: bool = True,
+    merge_playlist: bool = False
+) -> VideoProcessResponse:
+    """在线程池中处理视频；同一视频已在处理时等待并共享其结果，不再占用线程"""
+    loop = asyncio.get_running_loop()
+    # 短链接展开会访问网络，放到默认线程池中执行
+    resolved = await loop.run_in_executor(None, resolve_url, url)
+    # 不带 p 参数的分P链接会展开全部分P，?p=1 只处理第一P，两者 resolved.key 相同；
+    # 展开时按 part 区分（None 与 1 不同），避免互相拿到对方的结果
+    part = resolved.part if expand_playlist else None
+    key = (
+        resolved.key, part, generate_xiaohongshu, generate_blog, profile, expand_playlist, merge_playlist
+    )
+
+    async def start():
+        return await loop.run_in_executor(
+            get_executor(settings),
+            process_video_sync,
+            url,
+            generate_xiaohongshu,
+            generate_blog,
+            settings,
+            profile,
+            expand_playlist,
+            merge_playlist,
+            loop
+        )
+
+    result, shared = await _inflight.do(key, start)
+    if shared:
+        logger.info(f"复用进行中的相同任务: {url}")
+        metrics.SHARED_JOBS.inc()
+        return result.model_copy(update={"shared": True})
+    return result
+
+
 # ========== API路由 ==========
 
 @app.get("/", response_class=HTMLResponse)
@@ -165,7 +320,8 @@ async def read_root(request: Request):
 async def check_config():
     """检查配置状态"""
     try:
-        settings = get_settings()
+        # 重新读取 .env，修改配置后点“检查”即可生效
+        settings = reload_settings()
 
         # 检查API密钥是否配置
         api_configured = (
@@ -207,22 +363,26 @@ async def process_video(request: VideoProcessRequest):
                 detail="无效的URL格式（需以http://或https://开头）"
             )
 
+        if request.profile and request.profile not in PROFILE_MODES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"不支持的剖析模式（可选: {', '.join(PROFILE_MODES)}）"
+            )
+
         # 获取配置
         settings = get_settings()
 
         # 在线程池中处理视频（避免阻塞事件循环）
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(
-            executor,
-            process_video_sync,
+        return await run_video_job(
             request.url,
             request.generate_xiaohongshu,
             request.generate_blog,
-            settings
+            settings,
+            request.profile,
+            request.expand_playlist,
+            request.merge_playlist
         )
 
-        return result
-
     except HTTPException:
         raise
     except Exception as e:
@@ -247,16 +407,14 @@ async def batch_process(request: BatchProcessRequest):
 
         # 处理所有视频
         results = []
-        loop = asyncio.get_event_loop()
-
         for url in request.urls:
-            result = await loop.run_in_executor(
-                executor,
-                process_video_sync,
+            result = await run_video_job(
                 url,
                 request.generate_xiaohongshu,
                 request.generate_blog,
-                settings
+                settings,
+                expand_playlist=request.expand_playlist,
+                merge_playlist=request.merge_playlist
             )
             results.append(result)
 
@@ -278,26 +436,47 @@ async def batch_process(request: BatchProcessRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def resolve_request_file(file_path: str) -> Path:
+    """解析请求的文件路径（必须是输出目录内已存在的文件）"""
+    settings = get_settings()
+    full_path = resolve_output_file(file_path, settings.output_dir)
+
+    # 安全检查：解析 ../ 与符号链接后仍需位于输出目录内
+    if full_path is None:
+        raise HTTPException(status_code=403, detail="禁止访问此文件")
+
+    if not full_path.is_file():
+        raise HTTPException(status_code=404, detail="文件不存在")
+
+    return full_path
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """文件未变化时返回 304 响应"""
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    return None
+
+
 @app.get("/api/download/{file_path:path}")
-async def download_file(file_path: str):
-    """下载生成的文件"""
+async def download_file(request: Request, file_path: str):
+    """下载生成的文件（支持 ETag 与 Range）"""
     try:
-        # 安全检查：确保文件在输出目录内
-        settings = get_settings()
-        full_path = Path(file_path)
-
-        # 检查文件是否存在
-        if not full_path.exists() or not full_path.is_file():
-            raise HTTPException(status_code=404, detail="文件不存在")
+        full_path = resolve_request_file(file_path)
+        stat_result = full_path.stat()
+        etag = file_etag(stat_result)
 
-        # 检查文件是否在允许的目录内
-        if not str(full_path).startswith(str(settings.output_dir)):
-            raise HTTPException(status_code=403, detail="禁止访问此文件")
+        cached = not_modified(request, etag)
+        if cached is not None:
+            return cached
 
+        # FileResponse 分块读取文件并处理 Range，不会整篇读入内存
         return FileResponse(
             path=full_path,
             filename=full_path.name,
-            media_type='text/markdown'
+            media_type='text/markdown; charset=utf-8',
+            headers={"ETag": etag, "Cache-Control": "no-cache"},
+            stat_result=stat_result
         )
 
     except HTTPException:
@@ -308,28 +487,36 @@ async def download_file(file_path: str):
 
 
 @app.get("/api/file-content/{file_path:path}")
-async def get_file_content(file_path: str):
-    """获取文件内容（用于预览）"""
+async def get_file_content(
+    request: Request,
+    file_path: str,
+    offset: int = Query(0, ge=0, description="起始字节偏移"),
+    limit: int = Query(PREVIEW_LIMIT, ge=1024, le=4 * PREVIEW_LIMIT, description="最多返回的字节数")
+):
+    """获取文件内容（用于预览，大文件分段返回）"""
     try:
-        # 安全检查
-        settings = get_settings()
-        full_path = Path(file_path)
-
-        if not full_path.exists() or not full_path.is_file():
-            raise HTTPException(status_code=404, detail="文件不存在")
-
-        if not str(full_path).startswith(str(settings.output_dir)):
-            raise HTTPException(status_code=403, detail="禁止访问此文件")
-
-        # 读取文件内容
-        with open(full_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-        return JSONResponse(content={
-            "filename": full_path.name,
-            "content": content,
-            "size": len(content)
-        })
+        full_path = resolve_request_file(file_path)
+        stat_result = full_path.stat()
+        etag = file_etag(stat_result)
+
+        # 文件未变化时不再读取和序列化（重新打开历史记录时浏览器会带上 If-None-Match）
+        cached = not_modified(request, etag)
+        if cached is not None:
+            return cached
+
+        content, next_offset = await run_in_threadpool(read_text_range, full_path, offset, limit)
+
+        return JSONResponse(
+            content={
+                "filename": full_path.name,
+                "content": content,
+                "size": stat_result.st_size,
+                "offset": offset,
+                "next_offset": next_offset,
+                "truncated": next_offset < stat_result.st_size
+            },
+            headers={"ETag": etag, "Cache-Control": "no-cache"}
+        )
 
     except HTTPException:
         raise
@@ -338,12 +525,61 @@ async def get_file_content(file_path: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def get_index() -> NoteIndex:
+    """获取笔记索引（未启用时返回 404）"""
+    settings = get_settings()
+    if not settings.note_index_enabled:
+        raise HTTPException(status_code=404, detail="笔记索引未启用（NOTE_INDEX_ENABLED=false）")
+    return get_note_index(settings, logger)
+
+
+@app.get("/api/notes")
+async def list_notes(
+    page: int = Query(1, ge=1, description="页码"),
+    page_size: int = Query(20, ge=1, le=100, description="每页条数")
+):
+    """分页列出已生成的笔记（按生成时间倒序）"""
+    index = get_index()
+    return await run_in_threadpool(index.list_notes, page, page_size)
+
+
+@app.get("/api/notes/search")
+async def search_notes(
+    q: str = Query(..., min_length=1, description="搜索词（空格分隔多个词）"),
+    page: int = Query(1, ge=1, description="页码"),
+    page_size: int = Query(20, ge=1, le=100, description="每页条数"),
+    sort: str = Query("recent", pattern="^(recent|relevance)$", description="recent: 最新在前；relevance: 按相关度")
+):
+    """全文搜索已生成的笔记"""
+    index = get_index()
+    return await run_in_threadpool(index.search, q, page, page_size, sort)
+
+
+@app.get("/api/notes/{note_id}")
+async def get_note(note_id: int):
+    """获取单条笔记的元数据（视频信息、文件、耗时与 token 用量）"""
+    index = get_index()
+    note = await run_in_threadpool(index.get, note_id)
+    if note is None:
+        raise HTTPException(status_code=404, detail="笔记不存在")
+    return note
+
+
 @app.get("/health")
 async def health_check():
     """健康检查端点"""
     return {"status": "ok", "timestamp": datetime.now().isoformat()}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Prometheus 指标端点"""
+    return PlainTextResponse(
+        metrics.registry.render_prometheus(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
 # ========== 启动事件 ==========
 
 @app.on_event("startup")
@@ -355,7 +591,7 @@ async def startup_event():
 
     # 自动检测和导出 cookies
     try:
-        settings = Settings()
+        settings = get_settings()
         cookie_file = settings.cookie_file or "cookies.txt"
         cookie_manager = CookieManager(cookie_file=cookie_file, logger=logger)
 
@@ -385,12 +621,30 @@ async def startup_event():
         logger.error(f"❌ Cookies 初始化失败：{e}")
         logger.warning("💡 程序将继续运行，但可能无法处理某些视频\n")
 
+    # 补录索引之前生成的笔记（已索引的会跳过，在后台线程中进行）
+    try:
+        settings = get_settings()
+        if settings.note_index_enabled:
+            index = get_note_index(settings, logger)
+            asyncio.get_running_loop().run_in_executor(None, index.backfill, settings.output_dir)
+    except Exception as e:
+        logger.warning(f"笔记索引初始化失败：{e}")
+
     logger.info("=" * 60)
     logger.info("✅ 应用启动完成！")
     logger.info("🌐 访问: http://localhost:8001")
     logger.info("=" * 60)
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭时释放主事件循环上的共享 LLM 客户端"""
+    if "video_note_generator.ai_processor" in sys.modules:
+        from video_note_generator.ai_processor import AsyncAIProcessor
+
+        await AsyncAIProcessor.aclose_shared_clients()
+
+
 # ========== 启动配置 ==========
 
 if __name__ == "__main__":